@@ -57,6 +57,11 @@ def create_app(config_name: str = None) -> Flask:
     from app.concurrency_manager import init_concurrency_hooks
     init_concurrency_hooks(app)
 
+    # Build and warm the chatbot pipeline before the first chat request
+    if app.config.get('CHATBOT_WARMUP') and not app.testing:
+        from app.services.chatbot.warmup import start_warmup
+        start_warmup(app)
+
     app.logger.info(f"OpsToolKit v{__version__} initialized")
 
     return app
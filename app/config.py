@@ -75,6 +75,61 @@ class Config:
     CHATBOT_UPLOAD_TIMEOUT = int(os.getenv('CHATBOT_UPLOAD_TIMEOUT', '6000'))  # 10 minutes for large uploads
     CHATBOT_BATCH_THRESHOLD = int(os.getenv('CHATBOT_BATCH_THRESHOLD', '2000'))  # Use batch API for 2000+ chunks (direct API can handle up to 2048 in one call)
 
+    # Embedding backend: 'openai' (text-embedding-3-small) or 'hashing' (local, offline, deterministic)
+    CHATBOT_EMBEDDING_BACKEND = os.getenv('CHATBOT_EMBEDDING_BACKEND', 'openai')
+
+    # Embedding storage profile (changing it requires scripts/migrate_embedding_profile.py)
+    CHATBOT_EMBEDDING_DIMENSIONS = int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536'))  # e.g. 512 (text-embedding-3 `dimensions`)
+    CHATBOT_EMBEDDING_DTYPE = os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32')  # float32 or float16
+
+    # Vector store engine: 'chroma' (ChromaDB HNSW), 'numpy' (in-process exact search, memory-mapped)
+    # or 'ivfpq' (numpy engine + IVF-PQ approximate index, for multi-million-chunk corpora)
+    CHATBOT_VECTOR_ENGINE = os.getenv('CHATBOT_VECTOR_ENGINE', 'chroma')
+    CHATBOT_USE_HYBRID = os.getenv('CHATBOT_USE_HYBRID', 'true').lower() == 'true'  # Semantic + BM25 keyword search (RRF)
+    CHATBOT_WARMUP = os.getenv('CHATBOT_WARMUP', 'true').lower() == 'true'  # Build and warm the pipeline at startup
+
+    # ChromaDB HNSW index (changing space / M / construction_ef / search_ef requires scripts/migrate_hnsw_index.py;
+    # pick values with scripts/hnsw_benchmark.py)
+    CHATBOT_HNSW_SPACE = os.getenv('CHATBOT_HNSW_SPACE', 'cosine')  # cosine, ip or l2
+    CHATBOT_HNSW_M = int(os.getenv('CHATBOT_HNSW_M', '16'))  # Graph links per node
+    CHATBOT_HNSW_CONSTRUCTION_EF = int(os.getenv('CHATBOT_HNSW_CONSTRUCTION_EF', '100'))  # Build-time candidate list
+    CHATBOT_HNSW_SEARCH_EF = int(os.getenv('CHATBOT_HNSW_SEARCH_EF', '64'))  # Query-time candidate list (recall vs latency)
+
+    # IVF-PQ engine knobs (measure with scripts/ann_recall_report.py)
+    CHATBOT_ANN_NPROBE = int(os.getenv('CHATBOT_ANN_NPROBE', '16'))  # Coarse lists probed per query (recall vs latency)
+    CHATBOT_ANN_RERANK_DEPTH = int(os.getenv('CHATBOT_ANN_RERANK_DEPTH', '200'))  # Candidates rescored exactly per query
+    CHATBOT_ANN_NLIST = int(os.getenv('CHATBOT_ANN_NLIST', '0'))  # Coarse lists at training (0 = ~4*sqrt(chunks))
+    CHATBOT_ANN_PQ_SUBSPACES = int(os.getenv('CHATBOT_ANN_PQ_SUBSPACES', '0'))  # PQ bytes per vector (0 = dimensions/16)
+
+    # Cross-encoder re-ranking (only candidates within the margin of the leader's semantic score are scored)
+    CHATBOT_RERANK_CANDIDATES = int(os.getenv('CHATBOT_RERANK_CANDIDATES', '100'))  # Retrieval candidate pool
+    CHATBOT_COLLAPSE_EVENTS = os.getenv('CHATBOT_COLLAPSE_EVENTS', 'true').lower() == 'true'  # One hit per event, full event text
+    CHATBOT_RERANK_MAX_DEPTH = int(os.getenv('CHATBOT_RERANK_MAX_DEPTH', '30'))  # Max candidates re-ranked
+    CHATBOT_RERANK_MARGIN = float(os.getenv('CHATBOT_RERANK_MARGIN', '0.15'))  # Semantic-score margin (0 = no pruning)
+    CHATBOT_RERANK_BATCH_SIZE = int(os.getenv('CHATBOT_RERANK_BATCH_SIZE', '32'))  # Pairs per CrossEncoder.predict batch
+    CHATBOT_RERANK_THREADS = int(os.getenv('CHATBOT_RERANK_THREADS', '0'))  # Torch CPU threads per worker (0 = auto)
+    CHATBOT_RERANK_CACHE_SIZE = int(os.getenv('CHATBOT_RERANK_CACHE_SIZE', '4096'))  # LRU cross-encoder scores
+    CHATBOT_RERANK_PROCESSES = int(os.getenv('CHATBOT_RERANK_PROCESSES', '0'))  # Re-rank worker processes per app worker (0 = in-process)
+    CHATBOT_RERANK_TIMEOUT = float(os.getenv('CHATBOT_RERANK_TIMEOUT', '2.0'))  # Seconds before falling back to semantic order
+    CHATBOT_RERANK_SERVER = os.getenv('CHATBOT_RERANK_SERVER', '')  # Shared rerank server (host:port or socket path)
+    CHATBOT_RERANK_AUTHKEY = os.getenv('CHATBOT_RERANK_AUTHKEY', '')  # Rerank server shared secret (required with CHATBOT_RERANK_SERVER)
+    CHATBOT_RETRIEVAL_CACHE_SIZE = int(os.getenv('CHATBOT_RETRIEVAL_CACHE_SIZE', '512'))  # Cached retrieval results (0 = off)
+    CHATBOT_RETRIEVAL_CACHE_TTL = float(os.getenv('CHATBOT_RETRIEVAL_CACHE_TTL', '600'))  # Seconds a cached result stays valid
+    CHATBOT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHATBOT_CONTEXT_TOKEN_BUDGET', '6000'))  # Prompt tokens for retrieved events
+    CHATBOT_CONTEXT_MAX_DOC_TOKENS = int(os.getenv('CHATBOT_CONTEXT_MAX_DOC_TOKENS', '1500'))  # Per-event cap before trimming the summary
+    CHATBOT_ANSWER_CACHE_SIZE = int(os.getenv('CHATBOT_ANSWER_CACHE_SIZE', '256'))  # Cached answers (0 = off)
+    CHATBOT_ANSWER_CACHE_THRESHOLD = float(os.getenv('CHATBOT_ANSWER_CACHE_THRESHOLD', '0.95'))  # Min query-embedding cosine for a hit
+    CHATBOT_ANSWER_CACHE_TTL = float(os.getenv('CHATBOT_ANSWER_CACHE_TTL', '21600'))  # Seconds an answer stays valid
+    CHATBOT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHATBOT_HISTORY_TOKEN_BUDGET', '2000'))  # Verbatim history tokens; older turns become a note
+    CHATBOT_CONVERSATION_TTL = float(os.getenv('CHATBOT_CONVERSATION_TTL', '86400'))  # Seconds an idle conversation is kept
+
+    # Direct embedding pipeline (requests packed by token budget, sent concurrently)
+    CHATBOT_EMBED_WORKERS = int(os.getenv('CHATBOT_EMBED_WORKERS', '4'))  # Concurrent embedding requests
+    CHATBOT_EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv('CHATBOT_EMBED_MAX_TOKENS_PER_REQUEST', '250000'))  # OpenAI hard limit is 300K
+    CHATBOT_EMBED_MAX_ITEMS_PER_REQUEST = int(os.getenv('CHATBOT_EMBED_MAX_ITEMS_PER_REQUEST', '2048'))  # OpenAI hard limit
+    CHATBOT_EMBED_MAX_RETRIES = int(os.getenv('CHATBOT_EMBED_MAX_RETRIES', '3'))  # Retries per request on rate limit / server errors
+    CHATBOT_BATCH_POLL_INTERVAL = int(os.getenv('CHATBOT_BATCH_POLL_INTERVAL', '60'))  # Seconds between Batch API status checks
+
     # =========================================================================
     # OpenAI Configuration (per FR-006, FR-008, FR-009)
     # =========================================================================
@@ -98,6 +153,12 @@ class Config:
         'app/services/chatbot/data/DR_database_PBI.xlsx'
     )
 
+    # Server-side chatbot conversations (the session only holds an id)
+    CHATBOT_CONVERSATION_DB_PATH = BASE_DIR / os.getenv(
+        'CHATBOT_CONVERSATION_DB_PATH',
+        'app/data/chatbot/conversations.db'
+    )
+
     # DR-Tracker data files (hazards, program areas, VBA, preprompt)
     DR_TRACKER_DATA_DIR = BASE_DIR / 'app' / 'data' / 'dr_tracker'
 
@@ -0,0 +1,137 @@
+"""
+Prompt Layout and Prompt-Cache Metrics for OpsToolKit.
+
+OpenAI caches prompt prefixes of 1024 tokens or more. When a request starts
+with a prefix it has seen recently, those tokens skip prefill and are billed
+at a discount. The cache only matches when every earlier token is
+identical, so a date in the first line or a user message before the
+instructions makes every request a miss.
+
+PromptLayout assembles messages from the most to the least stable part:
+
+    1. static system prompt      (identical for every call of a tool)
+    2. static guidelines         (identical for every call, or for a day)
+    3. semi-static history       (grows by one turn per request)
+    4. dynamic content           (query, retrieved context, uploaded report)
+
+It also sends a prompt_cache_key derived from the static parts, so requests
+that share a prefix are routed to the same cache. The cached token counts
+reported in each response's usage are recorded per tool
+(get_prompt_cache_stats) to check the hit ratio in production.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PromptLayout:
+    """Cache-friendly message layout for one tool."""
+    tool: str
+    system: str
+    guidelines: Optional[str] = None
+
+    @property
+    def cache_key(self) -> str:
+        """Routing key shared by all requests with this static prefix."""
+        digest = hashlib.sha256(f"{self.system}\n{self.guidelines or ''}".encode('utf-8')).hexdigest()
+        return f"{self.tool}-{digest[:16]}"
+
+    def messages(self, dynamic: str, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Build the chat messages, static parts first.
+
+        Args:
+            dynamic: Content that changes on every request (sent as the user message)
+            history: Previous conversation messages
+
+        Returns:
+            List of {role, content} dicts
+        """
+        messages = [{"role": "system", "content": self.system}]
+        if self.guidelines:
+            messages.append({"role": "system", "content": self.guidelines})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": dynamic})
+        return messages
+
+    def request_options(self) -> Dict[str, Any]:
+        """Extra chat.completions.create() arguments (prompt_cache_key in the body)."""
+        return {'extra_body': {'prompt_cache_key': self.cache_key}}
+
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens served from the cache, as reported in a response's usage."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return int(getattr(details, 'cached_tokens', None) or 0)
+
+
+class PromptCacheStats:
+    """Thread-safe per-tool prompt and cached token counters."""
+
+    def __init__(self):
+        self._tools: Dict[str, Dict[str, int]] = {}
+        self._lock = Lock()
+
+    def record(self, tool: str, usage) -> int:
+        """
+        Add one response's usage to the tool's counters.
+
+        Args:
+            tool: Tool name (e.g. 'chatbot', 'dr_tracker')
+            usage: Usage object of the response (None is ignored)
+
+        Returns:
+            Cached prompt tokens of this response
+        """
+        if usage is None:
+            return 0
+        prompt_tokens = int(getattr(usage, 'prompt_tokens', 0) or 0)
+        cached = cached_tokens(usage)
+
+        with self._lock:
+            counters = self._tools.setdefault(tool, {
+                'requests': 0, 'requests_with_hits': 0, 'prompt_tokens': 0, 'cached_tokens': 0
+            })
+            counters['requests'] += 1
+            counters['requests_with_hits'] += cached > 0
+            counters['prompt_tokens'] += prompt_tokens
+            counters['cached_tokens'] += cached
+
+        logger.debug(f"Prompt cache ({tool}): {cached}/{prompt_tokens} prompt tokens cached")
+        return cached
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counters and cache-hit ratio (cached / prompt tokens) per tool."""
+        with self._lock:
+            return {
+                tool: {
+                    **counters,
+                    'cache_hit_ratio': (round(counters['cached_tokens'] / counters['prompt_tokens'], 3)
+                                        if counters['prompt_tokens'] else 0.0)
+                }
+                for tool, counters in self._tools.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tools.clear()
+
+
+# Global statistics instance (per worker process)
+_prompt_cache_stats = PromptCacheStats()
+
+
+def get_prompt_cache_stats() -> PromptCacheStats:
+    """
+    Get the global prompt-cache statistics.
+
+    Returns:
+        PromptCacheStats: Counters of this worker process
+    """
+    return _prompt_cache_stats
@@ -158,15 +158,35 @@ def session_info():
     return jsonify(info), 200
 
 
+@landing_bp.route('/api/prompt-cache')
+@login_required
+def prompt_cache_info():
+    """
+    Get OpenAI prompt-cache metrics per tool (this worker process).
+
+    Returns:
+        JSON response with prompt/cached token counts and cache-hit ratios
+    """
+    from flask import jsonify
+    from app.prompt_cache import get_prompt_cache_stats
+
+    return jsonify({'tools': get_prompt_cache_stats().stats()}), 200
+
+
 @landing_bp.route('/health')
 def health():
     """
     Health check endpoint for monitoring.
 
+    With ?ready, also reports the chatbot warm-up and answers 503 while it
+    is still running (readiness probe for load balancers). A failed warm-up
+    is reported as degraded with 200: it is retried in the background and
+    the other tools keep working.
+
     Returns:
         JSON response with service status
     """
-    from flask import jsonify, current_app
+    from flask import jsonify, current_app, request
     from datetime import datetime
 
     # Check if essential services are configured
@@ -180,4 +200,15 @@ def health():
         }
     }
 
+    if 'ready' in request.args:
+        from app.services.chatbot.warmup import WARMUP_RUNNING, get_warmup_status
+
+        warmup = get_warmup_status()
+        status['services']['chatbot'] = warmup.to_dict()
+        if warmup.state == WARMUP_RUNNING:
+            status['status'] = 'starting'
+            return jsonify(status), 503
+        if warmup.degraded:
+            status['status'] = 'degraded'
+
     return jsonify(status), 200
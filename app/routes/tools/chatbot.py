@@ -5,15 +5,21 @@ Modern RAG implementation with rate limiting and upload support.
 Per chatbot_revised.md: 20 q/m rate limiting, all users can upload.
 """
 
+import json
 import logging
 import uuid
-from flask import Blueprint, render_template, request, jsonify, session
+from queue import Queue, Empty
+from threading import Thread
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, session, stream_with_context
 from flask_login import login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 from werkzeug.utils import secure_filename
 
 from app.services.chatbot.chatbot_service import get_chatbot_service
+from app.services.chatbot.batch_jobs import TERMINAL_STATUSES
+from app.services.chatbot.conversation_store import get_conversation_store
 from app.concurrency_manager import get_openai_queue
 
 logger = logging.getLogger(__name__)
@@ -27,25 +33,112 @@ limiter = Limiter(
 # Create blueprint
 chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/tools/chatbot')
 
+# Seconds a stream may wait for the OpenAI queue before giving up (as /send)
+STREAM_QUEUE_TIMEOUT = 90
+
+# Seconds between SSE keep-alive comments while waiting
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Seconds a completed stream's commit token stays valid
+STREAM_COMMIT_MAX_AGE = 600
+
+
+def _conversation_id() -> str:
+    """Current user's conversation id, starting a conversation if needed."""
+    store = get_conversation_store()
+    user_id = str(current_user.id)
+
+    # Histories kept in the cookie by earlier versions are dropped
+    session.pop('chatbot_history', None)
+    session.pop('chatbot_committed', None)
+
+    conversation_id = session.get('chatbot_conversation_id')
+    if not store.exists(conversation_id, user_id):
+        conversation_id = store.new_conversation(user_id)
+        session['chatbot_conversation_id'] = conversation_id
+    return conversation_id
+
 
 def get_user_chat_history():
-    """Get current user's chat history from session."""
-    if 'chatbot_history' not in session:
-        session['chatbot_history'] = []
-    return session['chatbot_history']
+    """Get current user's chat history from the conversation store."""
+    return get_conversation_store().get_messages(_conversation_id(), str(current_user.id))
 
 
-def add_to_chat_history(role: str, content: str):
-    """Add message to current user's chat history."""
-    history = get_user_chat_history()
-    history.append({'role': role, 'content': content})
+def add_exchange_to_chat_history(message: str, response: str, exchange_id=None,
+                                 conversation_id=None, user_id=None):
+    """
+    Add a question and its answer to the user's chat history.
+
+    Args:
+        message: User message
+        response: Assistant response
+        exchange_id: If given, the exchange is stored only once
+        conversation_id: Conversation to extend (default: the session's)
+        user_id: Owner (default: the current user)
+
+    Returns:
+        bool: True if the exchange was stored
+    """
+    return get_conversation_store().append(
+        conversation_id or _conversation_id(),
+        user_id or str(current_user.id),
+        [{'role': 'user', 'content': message}, {'role': 'assistant', 'content': response}],
+        exchange_id=exchange_id
+    )
+
+
+def validate_message(data):
+    """
+    Extract the chat message from a JSON body.
+
+    Returns:
+        (message, None) or (None, (error response, status))
+    """
+    if not data or 'message' not in data:
+        return None, (jsonify({'error': 'No message provided'}), 400)
+
+    message = data['message'].strip()
+
+    if not message:
+        return None, (jsonify({'error': 'Empty message'}), 400)
+
+    if len(message) > 1000:
+        return None, (jsonify({'error': 'Message too long (max 1000 characters)'}), 400)
+
+    return message, None
+
+
+def knowledge_base_error(service):
+    """
+    Refuse chats while the knowledge base is empty (answers would be ungrounded).
+
+    Returns:
+        None, or (error response, status)
+    """
+    if not service.get_stats()['loaded']:
+        return jsonify({'error': 'Knowledge base not loaded. Please contact administrator.'}), 503
+    return None
+
+
+def summarize_context(context_used):
+    """Score and preview of each retrieved document for the browser."""
+    return [
+        {
+            'score': round(ctx['score'], 3),
+            'preview': ctx['text'][:200] + '...' if len(ctx['text']) > 200 else ctx['text']
+        }
+        for ctx in context_used or []
+    ]
 
-    # Limit history to last 20 messages
-    if len(history) > 20:
-        history = history[-20:]
 
-    session['chatbot_history'] = history
-    session.modified = True
+def _commit_serializer() -> URLSafeTimedSerializer:
+    """Signs completed stream exchanges so /stream/commit can trust them."""
+    return URLSafeTimedSerializer(current_app.secret_key, salt='chatbot-stream-commit')
+
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @chatbot_bp.route('/', methods=['GET'])
@@ -102,18 +195,9 @@ def send_message():
     """
     try:
         # Get message from request
-        data = request.get_json()
-
-        if not data or 'message' not in data:
-            return jsonify({'error': 'No message provided'}), 400
-
-        message = data['message'].strip()
-
-        if not message:
-            return jsonify({'error': 'Empty message'}), 400
-
-        if len(message) > 1000:
-            return jsonify({'error': 'Message too long (max 1000 characters)'}), 400
+        message, error = validate_message(request.get_json())
+        if error:
+            return error
 
         logger.info(f"Chat message from {current_user.id}: '{message[:50]}...'")
 
@@ -121,12 +205,9 @@ def send_message():
         service = get_chatbot_service()
 
         # Check if knowledge base is loaded
-        if not service.knowledge_base is None:
-            stats = service.get_stats()
-            if not stats['loaded']:
-                return jsonify({
-                    'error': 'Knowledge base not loaded. Please contact administrator.'
-                }), 503
+        error = knowledge_base_error(service)
+        if error:
+            return error
 
         # Get chat history
         history = get_user_chat_history()
@@ -164,22 +245,13 @@ def send_message():
             return jsonify({'error': result.get('error', 'Chat failed')}), 500
 
         # Add to chat history
-        add_to_chat_history('user', message)
-        add_to_chat_history('assistant', result['response'])
-
-        # Format context for response
-        context_summary = []
-        if result['context_used']:
-            for ctx in result['context_used']:
-                context_summary.append({
-                    'score': round(ctx['score'], 3),
-                    'preview': ctx['text'][:200] + '...' if len(ctx['text']) > 200 else ctx['text']
-                })
+        add_exchange_to_chat_history(message, result['response'])
 
         response_data = {
             'response': result['response'],
-            'context': context_summary,
-            'processing_time': round(result['processing_time'], 2)
+            'context': summarize_context(result['context_used']),
+            'processing_time': round(result['processing_time'], 2),
+            'cached': result.get('cached', False)
         }
 
         logger.info(f"Chat response sent (time: {result['processing_time']:.2f}s)")
@@ -191,6 +263,136 @@ def send_message():
         return jsonify({'error': 'An error occurred processing your message'}), 500
 
 
+@chatbot_bp.route('/stream', methods=['POST'])
+@login_required
+@limiter.limit("20/minute")  # Same budget as /send
+def stream_message():
+    """
+    Process chat message and stream the AI response as server-sent events.
+
+    Accepts JSON with 'message' field. Events:
+        context: {'context': [...]} once retrieval is done
+        token: {'text': str} per generated fragment
+        done: {'response', 'processing_time', 'commit_token'}
+        error: {'error': str}
+
+    The exchange is added to the chat history when the stream completes.
+    The done event's commit_token can also be posted to /stream/commit;
+    an exchange is stored once either way.
+
+    Returns:
+        text/event-stream response
+    """
+    message, error = validate_message(request.get_json(silent=True))
+    if error:
+        return error
+
+    logger.info(f"Streaming chat message from {current_user.id}: '{message[:50]}...'")
+
+    service = get_chatbot_service()
+
+    # Same guard as /send: nothing to ground (or cache) an answer on
+    error = knowledge_base_error(service)
+    if error:
+        return error
+
+    conversation_id = _conversation_id()
+    user_id = str(current_user.id)
+    history = get_conversation_store().get_messages(conversation_id, user_id)
+    serializer = _commit_serializer()
+    app = current_app._get_current_object()
+    events: Queue = Queue()
+
+    def produce():
+        """Run retrieval and generation, handing events to the response."""
+        with app.app_context():
+            try:
+                for event in service.chat_stream(message, history, include_context=True):
+                    events.put(event)
+            except Exception as e:
+                logger.error(f"Streaming chat failed: {e}", exc_info=True)
+                events.put({'event': 'error', 'data': {'error': 'An error occurred processing your message'}})
+            finally:
+                events.put(None)
+
+    # OpenAI calls still go through the FIFO queue when it is enabled
+    queue = get_openai_queue()
+    if queue.enabled:
+        queue.enqueue(f"chatbot_stream_{uuid.uuid4()}", produce)
+    else:
+        Thread(target=produce, daemon=True, name="chatbot-stream").start()
+
+    def generate():
+        waited = 0
+        started = False
+        while True:
+            try:
+                event = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except Empty:
+                waited += STREAM_KEEPALIVE_SECONDS
+                if not started and waited >= STREAM_QUEUE_TIMEOUT:
+                    yield _sse('error', {'error': 'Chat processing timeout'})
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            if event is None:
+                return
+            started = True
+
+            name, data = event['event'], event['data']
+            if name == 'context':
+                data = {'context': summarize_context(data['context_used'])}
+            elif name == 'done':
+                exchange_id = uuid.uuid4().hex
+                add_exchange_to_chat_history(message, data['response'], exchange_id=exchange_id,
+                                             conversation_id=conversation_id, user_id=user_id)
+                data = {
+                    'response': data['response'],
+                    'processing_time': round(data['processing_time'], 2),
+                    'cached': data.get('cached', False),
+                    'commit_token': serializer.dumps({
+                        'id': exchange_id, 'user': user_id, 'conversation': conversation_id,
+                        'message': message, 'response': data['response']
+                    })
+                }
+                logger.info(f"Chat stream completed (time: {data['processing_time']:.2f}s)")
+            yield _sse(name, data)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@chatbot_bp.route('/stream/commit', methods=['POST'])
+@login_required
+def commit_stream():
+    """
+    Add a completed streamed exchange to the chat history.
+
+    Accepts JSON with the 'commit_token' from the stream's done event.
+
+    Returns:
+        JSON response confirming the commit
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        exchange = _commit_serializer().loads(data.get('commit_token', ''), max_age=STREAM_COMMIT_MAX_AGE)
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired commit token'}), 400
+
+    if exchange['user'] != str(current_user.id):
+        return jsonify({'error': 'Invalid or expired commit token'}), 400
+
+    # Usually already stored when the stream completed; a token is committed once
+    add_exchange_to_chat_history(exchange['message'], exchange['response'], exchange_id=exchange['id'],
+                                 conversation_id=exchange.get('conversation'))
+
+    return jsonify({'success': True})
+
+
 @chatbot_bp.route('/clear', methods=['POST'])
 @login_required
 def clear_history():
@@ -200,8 +402,9 @@ def clear_history():
     Returns:
         JSON response confirming clear
     """
-    session['chatbot_history'] = []
-    session.modified = True
+    conversation_id = session.pop('chatbot_conversation_id', None)
+    if conversation_id:
+        get_conversation_store().clear(conversation_id)
 
     logger.info(f"Chat history cleared for {current_user.id}")
 
@@ -257,10 +460,12 @@ def upload():
         # Get upload history
         service = get_chatbot_service()
         upload_history = service.update_service.get_upload_history(limit=10)
+        batch_jobs = service.batch_jobs.list_jobs(limit=10)
 
         return render_template(
             'tools/chatbot_upload.html',
-            upload_history=upload_history
+            upload_history=upload_history,
+            batch_jobs=batch_jobs
         )
 
     # POST - process upload
@@ -294,7 +499,8 @@ def upload():
                 'success': True,
                 'message': result.message,
                 'version_id': result.version_id,
-                'changes': result.changes
+                'changes': result.changes,
+                'batch_job_id': result.batch_job_id or None
             })
         else:
             logger.error(f"Upload failed: {result.error}")
@@ -308,6 +514,114 @@ def upload():
         return jsonify({'error': str(e)}), 500
 
 
+@chatbot_bp.route('/batch-jobs', methods=['GET'])
+@login_required
+def batch_jobs():
+    """
+    Get status of Batch API embedding jobs.
+
+    Returns:
+        JSON response with recent batch jobs and poller state
+    """
+    try:
+        service = get_chatbot_service()
+        jobs = service.batch_jobs.list_jobs(limit=20)
+
+        return jsonify({
+            'success': True,
+            'jobs': jobs,
+            'pending': len([job for job in jobs if job['status'] not in TERMINAL_STATUSES]),
+            'poller_running': service.batch_poller.is_running()
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting batch jobs: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@chatbot_bp.route('/index-versions', methods=['GET'])
+@login_required
+def index_versions():
+    """
+    Get live and previous vector index versions.
+
+    Returns:
+        JSON response with version names and document counts
+    """
+    try:
+        service = get_chatbot_service()
+        return jsonify({'success': True, **service.vector_store.list_versions()})
+
+    except Exception as e:
+        logger.error(f"Error getting index versions: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@chatbot_bp.route('/index-versions/rollback', methods=['POST'])
+@login_required
+def rollback_index():
+    """
+    Make the previous vector index version live again.
+
+    Returns:
+        JSON response with the new live version
+    """
+    try:
+        service = get_chatbot_service()
+        live = service.vector_store.rollback()
+        # Other workers see the new live version through the cache keys
+        service.retrieval_cache.invalidate()
+        service.answer_cache.purge()
+        logger.warning(f"Index rolled back to {live} by {current_user.id}")
+
+        return jsonify({'success': True, 'live': live})
+
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error rolling back index: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@chatbot_bp.route('/answer-cache', methods=['GET'])
+@login_required
+def answer_cache_stats():
+    """
+    Get answer cache hit/miss metrics.
+
+    Returns:
+        JSON response with cache statistics
+    """
+    try:
+        service = get_chatbot_service()
+        return jsonify({'success': True, **service.answer_cache.stats()})
+
+    except Exception as e:
+        logger.error(f"Error getting answer cache stats: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@chatbot_bp.route('/answer-cache/purge', methods=['POST'])
+@login_required
+def purge_answer_cache():
+    """
+    Drop all cached answers (e.g. after changing the prompt).
+
+    Returns:
+        JSON response with the number of answers dropped
+    """
+    try:
+        service = get_chatbot_service()
+        dropped = service.answer_cache.purge()
+        logger.warning(f"Answer cache purged by {current_user.id} ({dropped} answers)")
+
+        return jsonify({'success': True, 'purged': dropped})
+
+    except Exception as e:
+        logger.error(f"Error purging answer cache: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
 @chatbot_bp.route('/update-history', methods=['GET'])
 @login_required
 def update_history():
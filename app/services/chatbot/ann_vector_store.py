@@ -0,0 +1,133 @@
+"""
+IVF-PQ Vector Store for DR Knowledge Chatbot.
+
+Approximate-search engine (CHATBOT_VECTOR_ENGINE=ivfpq) for corpora where a
+full scan of the embedding matrix per query is too slow. It is the NumPy
+store (same generations, filters, BM25 and facet indexes) plus an IVF-PQ
+index (ivf_index.py) written into every generation:
+
+- Below min_rows, or when filters leave few enough rows, search stays exact.
+- A generation without an index (written by the numpy engine) is searched
+  exactly; the next publish under the write lock builds and saves it.
+- Incremental writes reuse the live quantizers: rows carried over keep their
+  list and codes, only new rows are encoded. The quantizers are retrained
+  when the corpus has grown RETRAIN_GROWTH times past the training size, and
+  on every full rebuild.
+
+nprobe / rerank_depth (CHATBOT_ANN_NPROBE / CHATBOT_ANN_RERANK_DEPTH) set the
+recall / latency trade-off; measure it with scripts/ann_recall_report.py.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.chatbot.ivf_index import DEFAULT_NPROBE, DEFAULT_RERANK_DEPTH, IVFPQIndex
+from app.services.chatbot.numpy_vector_store import IndexSnapshot, NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+# Corpus size below which exact search is fast enough and no index is built
+ANN_MIN_ROWS = 50000
+
+# Filtered candidate sets up to this size are scored exactly
+EXACT_MAX_ROWS = 20000
+
+# Retrain the quantizers once the corpus is this many times the training size
+RETRAIN_GROWTH = 2.0
+
+
+class IVFPQVectorStore(NumpyVectorStore):
+    """NumPy store searched through an IVF-PQ index with exact rescoring."""
+
+    def __init__(self, persist_directory: str = "app/data/chatbot/vector_index",
+                 embedding_dimensions: Optional[int] = None, embedding_dtype: str = "float32",
+                 nprobe: int = DEFAULT_NPROBE, rerank_depth: int = DEFAULT_RERANK_DEPTH,
+                 nlist: int = 0, subspaces: int = 0, min_rows: int = ANN_MIN_ROWS):
+        """
+        Initialize IVF-PQ vector store.
+
+        Args:
+            persist_directory: Path to persistent storage (shared with the numpy engine)
+            embedding_dimensions: Expected vector dimension (None = not enforced)
+            embedding_dtype: Matrix precision on disk ("float32" or "float16")
+            nprobe: Coarse lists probed per query
+            rerank_depth: Approximate candidates rescored exactly per query
+            nlist: Coarse lists when training (0 = ~4 * sqrt(rows))
+            subspaces: PQ subspaces when training (0 = d / 16)
+            min_rows: Corpus size from which the index is built
+        """
+        super().__init__(persist_directory, embedding_dimensions, embedding_dtype)
+        self.nprobe = nprobe
+        self.rerank_depth = rerank_depth
+        self.nlist = nlist
+        self.subspaces = subspaces
+        self.min_rows = min_rows
+
+    # ------------------------------------------------------------------
+    # Index maintenance (NumpyVectorStore hooks)
+    # ------------------------------------------------------------------
+
+    def _load_extras(self, gen_dir: Path, snapshot: IndexSnapshot, persist_missing: bool) -> None:
+        if IVFPQIndex.exists(gen_dir):
+            snapshot.extras["ann"] = IVFPQIndex.load(gen_dir)
+        elif snapshot.count >= self.min_rows:
+            # Generation written by the numpy engine or below the threshold at the time
+            if not persist_missing:
+                logger.warning(f"No IVF-PQ index in {self.collection_name}/{snapshot.generation}, "
+                               "searching exactly until the next write")
+                return
+            logger.info(f"Building IVF-PQ index for {self.collection_name}/{snapshot.generation}")
+            index = IVFPQIndex.build(snapshot.matrix, nlist=self.nlist, subspaces=self.subspaces)
+            self._save_into_generation(gen_dir, index.save, "ann.json")
+            snapshot.extras["ann"] = index
+
+    def _write_extras(self, gen_dir: Path, count: int, source_rows: Optional[np.ndarray]) -> None:
+        if count < self.min_rows:
+            return
+
+        matrix = np.load(gen_dir / "embeddings.npy", mmap_mode='r')
+        live = self._snapshot.extras.get("ann") if self._snapshot is not None else None
+
+        if (source_rows is None or live is None or live.dimensions != matrix.shape[1]
+                or count > live.trained_rows * RETRAIN_GROWTH):
+            index = IVFPQIndex.build(matrix, nlist=self.nlist, subspaces=self.subspaces)
+        else:
+            new_rows = np.flatnonzero(source_rows < 0)
+            carried = source_rows >= 0
+            labels = np.empty(count, dtype=np.int32)
+            codes = np.empty((count, live.subspaces), dtype=np.uint8)
+            labels[carried] = live.labels[source_rows[carried]]
+            codes[carried] = live.codes[source_rows[carried]]
+            if len(new_rows):
+                labels[new_rows], codes[new_rows] = live.encode(matrix[new_rows])
+            index = live.with_rows(labels, codes)
+            logger.debug(f"IVF-PQ index updated: {len(new_rows)} rows encoded, {int(carried.sum())} reused")
+
+        index.save(gen_dir)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _rank(self, snap: IndexSnapshot, queries: np.ndarray, mask: Optional[np.ndarray],
+              top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        index = snap.extras.get("ann")
+        if index is None or (mask is not None and int(mask.sum()) <= EXACT_MAX_ROWS):
+            return super()._rank(snap, queries, mask, top_k)
+        return index.search(snap.matrix, queries, top_k, nprobe=self.nprobe,
+                            rerank_depth=self.rerank_depth, mask=mask)
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get collection statistics (with ANN index settings)."""
+        stats = super().get_collection_stats()
+        index = self._current().extras.get("ann")
+        stats["ann"] = {
+            "enabled": index is not None,
+            "nprobe": self.nprobe,
+            "rerank_depth": self.rerank_depth,
+            **(index.stats() if index is not None else {"min_rows": self.min_rows})
+        }
+        return stats
@@ -0,0 +1,187 @@
+"""
+Semantic Answer Cache for DR Knowledge Chatbot.
+
+Paraphrased questions ("measles in Canada this year?" / "2025 measles cases
+in Canada") retrieve the same events and get the same answer, but each one
+pays for a full LLM generation. RAGOrchestrator stores generated answers
+here and serves a stored answer when:
+
+    - the new query's embedding is within `threshold` cosine similarity of
+      the cached query's embedding,
+    - retrieval returned the same set of events, and
+    - the knowledge base version is unchanged.
+
+Follow-ups that lean on the conversation ("and in Mexico?", "tell me more
+about it") are never cached or served: their answer depends on history the
+embedding does not see (is_follow_up).
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Words and phrases that point back into the conversation ("this"/"that"/
+# "there" are left out: "this year", "events that...", "were there" are standalone)
+_FOLLOW_UP_REFERENCES = re.compile(
+    r"\b(it|its|they|them|their|those|these|he|she|same|previous|above|earlier|former|latter|"
+    r"again|instead|tell me more|more (details|info|information)|the (first|second|last) one)\b",
+    re.I
+)
+
+# Openings of elliptical follow-ups ("and in Mexico?", "what about 2023?")
+_FOLLOW_UP_OPENINGS = re.compile(r"^\s*(and|also|but|or|what about|how about|same|then|so)\b", re.I)
+
+# Messages this short with a history are assumed to be follow-ups
+FOLLOW_UP_MAX_WORDS = 3
+
+
+def is_follow_up(message: str, history: Optional[List[Dict[str, str]]]) -> bool:
+    """Whether a message depends on the previous turns (always False without history)."""
+    if not history:
+        return False
+    return (len(message.split()) <= FOLLOW_UP_MAX_WORDS
+            or bool(_FOLLOW_UP_OPENINGS.search(message))
+            or bool(_FOLLOW_UP_REFERENCES.search(message)))
+
+
+@dataclass
+class CachedAnswer:
+    """One stored answer."""
+    query: str
+    version_id: str
+    event_ids: frozenset
+    response: str
+    created_at: float
+    hits: int = 0
+
+
+class AnswerCache:
+    """Thread-safe answer store searched by query-embedding similarity."""
+
+    def __init__(self, max_entries: int = 256, threshold: float = 0.95, ttl_seconds: float = 21600,
+                 version_source: Optional[Callable[[], str]] = None):
+        """
+        Args:
+            max_entries: Answers kept (0 disables the cache); the oldest are evicted
+            threshold: Minimum cosine similarity between query embeddings
+            ttl_seconds: Seconds an answer stays valid (answers mention "today")
+            version_source: Returns the current knowledge base version id
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.version_source = version_source or (lambda: "")
+        self._entries: List[CachedAnswer] = []
+        self._matrix: Optional[np.ndarray] = None  # Unit query embeddings, one row per entry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float) -> None:
+        keep = [i for i, entry in enumerate(self._entries) if now - entry.created_at <= self.ttl_seconds]
+        if len(keep) < len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._matrix = self._matrix[keep] if keep else None
+
+    def lookup(self, query_embedding, event_ids: Iterable[str]) -> Optional[CachedAnswer]:
+        """
+        Stored answer for a similar query over the same events and version.
+
+        Args:
+            query_embedding: Embedding of the new query
+            event_ids: Events retrieved for the new query
+
+        Returns:
+            The best matching CachedAnswer, or None
+        """
+        if not self.enabled:
+            return None
+        version_id = self.version_source()
+        events = frozenset(event_ids)
+        query = self._unit(query_embedding)
+
+        with self._lock:
+            self._expire(time.time())
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            for row in np.argsort(-similarities):
+                if similarities[row] < self.threshold:
+                    break
+                entry = self._entries[row]
+                if entry.version_id == version_id and entry.event_ids == events:
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, query_embedding, event_ids: Iterable[str], response: str) -> None:
+        """Store a generated answer, evicting the oldest beyond max_entries."""
+        if not self.enabled:
+            return
+        vector = self._unit(query_embedding)
+        entry = CachedAnswer(query=query, version_id=self.version_source(), event_ids=frozenset(event_ids),
+                             response=response, created_at=time.time())
+
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != vector.shape[0]:
+                self._entries, self._matrix = [], None  # Embedding profile changed
+            self._entries.append(entry)
+            self._matrix = vector[None, :] if self._matrix is None else np.vstack([self._matrix, vector])
+            if len(self._entries) > self.max_entries:
+                drop = len(self._entries) - self.max_entries
+                self._entries = self._entries[drop:]
+                self._matrix = self._matrix[drop:]
+
+    def record_skip(self) -> None:
+        """Count a follow-up that bypassed the cache."""
+        with self._lock:
+            self.skipped += 1
+
+    def purge(self, version_id: Optional[str] = None) -> int:
+        """
+        Drop all stored answers (admin purge, or a new knowledge base version).
+
+        Returns:
+            Number of answers dropped
+        """
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries, self._matrix = [], None
+            return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'skipped_follow_ups': self.skipped,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'threshold': self.threshold
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
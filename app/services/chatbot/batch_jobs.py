@@ -0,0 +1,384 @@
+"""
+Batch Job Tracking for DR Knowledge Chatbot.
+
+Persists Batch API embedding jobs and resumes them in the background.
+A job submitted by load_knowledge_base or process_upload is recorded on disk;
+a poller thread checks it, downloads the output into the embedding cache and
+hands it back to the owning service to finish the vector store load. Records
+survive restarts, so a job is picked up again by the next process.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.chatbot.embedding_service import (
+    BATCH_FAILED_STATUSES,
+    BatchJob,
+    EmbeddingService,
+)
+from app.services.chatbot.file_lock import file_lock, try_exclusive_lock
+from app.services.chatbot.settings import get_app
+
+logger = logging.getLogger(__name__)
+
+# Local statuses on top of the Batch API ones
+STATUS_FINALIZING = "finalizing"      # Output downloaded, being applied
+STATUS_APPLIED = "applied"            # Vector store load finished
+STATUS_APPLY_FAILED = "apply_failed"  # Output downloaded but load failed
+
+TERMINAL_STATUSES = (STATUS_APPLIED, STATUS_APPLY_FAILED) + BATCH_FAILED_STATUSES
+
+# A finalizing claim older than this is considered abandoned (process died)
+CLAIM_TIMEOUT_SECONDS = 1800
+
+
+class BatchJobStore:
+    """
+    JSON-backed registry of Batch API jobs.
+
+    Every operation re-reads the file under an exclusive file lock, so
+    several gunicorn workers can share one registry.
+    """
+
+    def __init__(self, data_dir: str = "app/data/chatbot"):
+        """
+        Initialize batch job store.
+
+        Args:
+            data_dir: Directory for the registry file
+        """
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+
+        self.jobs_file = self.data_dir / "batch_jobs.json"
+        self.lock_file = self.data_dir / "batch_jobs.lock"
+        self.submit_lock_file = self.data_dir / "batch_submit.lock"
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and (where available) an exclusive file lock."""
+        with self._thread_lock, file_lock(self.lock_file):
+            yield
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.jobs_file.exists():
+            return {}
+        try:
+            with open(self.jobs_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading batch job registry: {e}")
+            return {}
+
+    def _write(self, jobs: Dict[str, Dict[str, Any]]):
+        tmp_path = self.jobs_file.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(jobs, f, indent=2)
+        os.replace(tmp_path, self.jobs_file)
+
+    def add(self, batch_job: BatchJob, purpose: str, **context) -> Dict[str, Any]:
+        """
+        Record a newly submitted batch job.
+
+        Args:
+            batch_job: Submitted job
+            purpose: Completion handler name (e.g. 'knowledge_base_load', 'upload')
+            **context: Values the handler needs to finish the load
+
+        Returns:
+            The stored record
+        """
+        now = datetime.now().isoformat()
+        record = {
+            "id": batch_job.id,
+            "purpose": purpose,
+            "status": batch_job.status,
+            "input_file_id": batch_job.input_file_id,
+            "output_file_id": batch_job.output_file_id,
+            "request_count": batch_job.request_count,
+            "created_at": now,
+            "updated_at": now,
+            "completed_at": None,
+            "claimed_at": None,
+            "error": None,
+            "context": context
+        }
+        with self._locked():
+            jobs = self._read()
+            jobs[batch_job.id] = record
+            self._write(jobs)
+        logger.info(f"Tracking batch job {batch_job.id} ({purpose})")
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job record by ID."""
+        with self._locked():
+            return self._read().get(job_id)
+
+    def update(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """
+        Update fields on a job record.
+
+        Returns:
+            Updated record, or None if the job is unknown
+        """
+        with self._locked():
+            jobs = self._read()
+            record = jobs.get(job_id)
+            if record is None:
+                return None
+            record.update(fields)
+            record["updated_at"] = datetime.now().isoformat()
+            self._write(jobs)
+            return record
+
+    def claim(self, job_id: str) -> bool:
+        """
+        Claim a completed job for finalizing so only one worker applies it.
+
+        Returns:
+            True if this caller now owns the job
+        """
+        with self._locked():
+            jobs = self._read()
+            record = jobs.get(job_id)
+            if record is None or record["status"] in TERMINAL_STATUSES:
+                return False
+
+            if record["status"] == STATUS_FINALIZING and record.get("claimed_at"):
+                claimed_at = datetime.fromisoformat(record["claimed_at"])
+                if (datetime.now() - claimed_at).total_seconds() < CLAIM_TIMEOUT_SECONDS:
+                    return False
+                logger.warning(f"Re-claiming abandoned batch job {job_id}")
+
+            now = datetime.now().isoformat()
+            record.update(status=STATUS_FINALIZING, claimed_at=now, updated_at=now,
+                          claimed_by=os.getpid())
+            self._write(jobs)
+            return True
+
+    def list_jobs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List job records, newest first."""
+        with self._locked():
+            jobs = list(self._read().values())
+        jobs.sort(key=lambda r: r.get("created_at", ""), reverse=True)
+        return jobs[:limit] if limit else jobs
+
+    def pending_jobs(self) -> List[Dict[str, Any]]:
+        """List jobs that still need polling or applying."""
+        return [r for r in self.list_jobs() if r["status"] not in TERMINAL_STATUSES]
+
+    def find_pending(self, purpose: str, **context) -> Optional[Dict[str, Any]]:
+        """
+        Pending job for the same purpose and context values, if any.
+
+        Args:
+            purpose: Completion handler name
+            **context: Context values the job must have (e.g. source_file)
+
+        Returns:
+            Newest matching record, or None
+        """
+        for record in self.pending_jobs():
+            if record["purpose"] == purpose and all(
+                    record["context"].get(key) == value for key, value in context.items()):
+                return record
+        return None
+
+    @contextmanager
+    def submitting(self):
+        """
+        Serialize find_pending() + submit + add() across threads and processes.
+
+        Uses its own lock file, so the registry stays usable (by the poller)
+        while a submission uploads its input.
+        """
+        with file_lock(self.submit_lock_file):
+            yield
+
+
+class BatchJobPoller:
+    """
+    Background thread that drives tracked batch jobs to completion.
+
+    Completion handlers are registered per purpose and receive the job
+    record once its embeddings are in the cache. Handlers run inside the
+    Flask app context so CHATBOT_* settings apply to resumed jobs.
+
+    Every gunicorn worker has a poller, but only the one holding the
+    exclusive lock on batch_poller.lock polls; the others wait and take
+    over if its process dies.
+    """
+
+    def __init__(
+        self,
+        store: BatchJobStore,
+        embedding_service: EmbeddingService,
+        poll_interval: int = 60,
+        app=None
+    ):
+        """
+        Initialize batch job poller.
+
+        Args:
+            store: Job registry
+            embedding_service: Service used to query and download batches
+            poll_interval: Seconds between polling rounds
+            app: Flask app whose context handlers run in (default: the
+                current app when the poller starts, if any)
+        """
+        self.store = store
+        self.embedding_service = embedding_service
+        self.poll_interval = poll_interval
+        self.app = app
+        self.leader_lock_file = store.data_dir / "batch_poller.lock"
+
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def register_handler(self, purpose: str, handler: Callable[[Dict[str, Any]], None]):
+        """Register the completion handler for a job purpose."""
+        self._handlers[purpose] = handler
+
+    def track(self, batch_job: BatchJob, purpose: str, **context) -> Dict[str, Any]:
+        """
+        Persist a submitted job and make sure the poller is running.
+
+        Args:
+            batch_job: Submitted job
+            purpose: Completion handler name
+            **context: Values the handler needs
+
+        Returns:
+            The stored record
+        """
+        record = self.store.add(batch_job, purpose, **context)
+        self.start()
+        return record
+
+    def start(self):
+        """Start the poller thread if it is not already running."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.app is None:
+                self.app = get_app()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="BatchJobPoller")
+            self._thread.start()
+            logger.info(f"Batch job poller started (interval: {self.poll_interval}s)")
+
+    def stop(self):
+        """Stop the poller thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def is_running(self) -> bool:
+        """Check whether the poller thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _app_context(self):
+        return self.app.app_context() if self.app is not None else nullcontext()
+
+    def _run(self):
+        """Poll until no pending jobs remain (restarted by the next track())."""
+        leader_fh = None
+        try:
+            while not self._stop_event.is_set():
+                pending = self.store.pending_jobs()
+                if not pending:
+                    logger.info("No pending batch jobs - poller exiting")
+                    return
+
+                # One process polls; the rest retry the election each round
+                if leader_fh is None:
+                    leader_fh = try_exclusive_lock(self.leader_lock_file)
+                    if leader_fh is None:
+                        logger.debug("Batch jobs are polled by another process")
+
+                if leader_fh is not None:
+                    with self._app_context():
+                        for record in pending:
+                            try:
+                                self.poll_once(record["id"])
+                            except Exception as e:
+                                logger.error(f"Error polling batch job {record['id']}: {e}", exc_info=True)
+
+                self._stop_event.wait(self.poll_interval)
+        finally:
+            if leader_fh is not None:
+                leader_fh.close()
+
+    def poll_once(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Check one job and finalize it if the Batch API reports completion.
+
+        Args:
+            job_id: Batch job ID
+
+        Returns:
+            Updated record (None if unknown)
+        """
+        record = self.store.get(job_id)
+        if record is None or record["status"] in TERMINAL_STATUSES:
+            return record
+
+        if record["status"] != STATUS_FINALIZING:
+            batch_job = self.embedding_service.get_batch_status(job_id)
+
+            if batch_job.status in BATCH_FAILED_STATUSES:
+                logger.error(f"Batch job {job_id} ended with status: {batch_job.status}")
+                return self.store.update(job_id, status=batch_job.status,
+                                         error=f"Batch API status: {batch_job.status}")
+
+            if batch_job.status != "completed":
+                return self.store.update(job_id, status=batch_job.status)
+
+            self.store.update(job_id, output_file_id=batch_job.output_file_id,
+                              error_file_id=batch_job.error_file_id)
+
+        if not self.store.claim(job_id):
+            return self.store.get(job_id)
+
+        return self._finalize(job_id)
+
+    def _finalize(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Download output into the cache and run the purpose handler."""
+        record = self.store.get(job_id)
+        start_time = time.time()
+
+        try:
+            batch_job = BatchJob(
+                id=record["id"],
+                status="completed",
+                input_file_id=record["input_file_id"],
+                output_file_id=record.get("output_file_id")
+            )
+            embeddings = self.embedding_service.collect_batch_results(batch_job)
+
+            handler = self._handlers.get(record["purpose"])
+            if handler is None:
+                raise RuntimeError(f"No completion handler registered for '{record['purpose']}'")
+
+            handler(record)
+
+            logger.info(f"Batch job {job_id} applied ({len(embeddings)} embeddings, "
+                        f"{time.time() - start_time:.1f}s)")
+            return self.store.update(job_id, status=STATUS_APPLIED,
+                                     embeddings_received=len(embeddings),
+                                     completed_at=datetime.now().isoformat())
+
+        except Exception as e:
+            logger.error(f"Failed to apply batch job {job_id}: {e}", exc_info=True)
+            return self.store.update(job_id, status=STATUS_APPLY_FAILED, error=str(e))
@@ -0,0 +1,382 @@
+"""
+BM25 Keyword Index for DR Knowledge Chatbot.
+
+Inverted index over chunk text, used by VectorStore.keyword_search so that
+hybrid_search (semantic + BM25, fused with RRF) needs no extra network or
+model calls.
+
+Postings are stored in CSR form (one contiguous slice per term), so a query
+term is scored with a handful of array operations over its postings:
+    indptr[t]:indptr[t+1]  -> slice of rows / tfs for term t
+Updates never re-tokenize existing chunks: deleting rows remaps the posting
+arrays, and new rows are merged into the sorted postings in linear time.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Common English function words (surveillance text is English)
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have in into is it its of on or
+that the their there these this to was were which will with
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens without stopwords."""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Immutable BM25 index over rows 0..n-1.
+
+    select() and extend() return new indexes, so a published index can be
+    searched while the next one is being built.
+    """
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, rows: np.ndarray,
+                 tfs: np.ndarray, doc_len: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize from CSR arrays (use BM25Index.build() or load() instead).
+
+        Args:
+            vocab: Term -> term id
+            indptr: Posting offsets per term (len(vocab) + 1)
+            rows: Posting row numbers, grouped by term
+            tfs: Posting term frequencies
+            doc_len: Token count per row
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        self.vocab = vocab
+        self.indptr = indptr
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def empty(cls) -> "BM25Index":
+        """Index without rows."""
+        return cls({}, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                   np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int32))
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        """Index texts as rows 0..n-1."""
+        return cls.empty().extend(texts)
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _posting_terms(self) -> np.ndarray:
+        """Term id of every posting (postings are grouped by term)."""
+        return np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))
+
+    def select(self, keep_rows: Sequence[int]) -> "BM25Index":
+        """
+        New index containing only keep_rows (renumbered 0..len-1 in order).
+
+        Args:
+            keep_rows: Row numbers to keep, ascending
+        """
+        keep_rows = np.asarray(keep_rows, dtype=np.int64)
+        new_row = np.full(self.n_docs, -1, dtype=np.int64)
+        new_row[keep_rows] = np.arange(len(keep_rows))
+
+        kept = new_row[self.rows] >= 0
+        terms = self._posting_terms()[kept]
+        indptr = np.zeros(len(self.indptr), dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.indptr) - 1), out=indptr[1:])
+
+        return BM25Index(self.vocab, indptr, new_row[self.rows[kept]].astype(np.int32),
+                         np.asarray(self.tfs[kept]), np.asarray(self.doc_len[keep_rows]), self.k1, self.b)
+
+    def extend(self, texts: Iterable[str]) -> "BM25Index":
+        """
+        New index with texts appended as rows n, n+1, ...
+
+        Args:
+            texts: Texts to add
+        """
+        vocab = dict(self.vocab)
+        token_ids: List[int] = []
+        new_lens: List[int] = []
+
+        for text in texts:
+            tokens = tokenize(text)
+            new_lens.append(len(tokens))
+            token_ids.extend([vocab.setdefault(term, len(vocab)) for term in tokens])
+
+        if not new_lens:
+            return self
+
+        # (term, row) pairs with their counts, sorted by term then row
+        token_rows = np.repeat(np.arange(self.n_docs, self.n_docs + len(new_lens), dtype=np.int64),
+                               new_lens)
+        keys, counts = np.unique(np.asarray(token_ids, dtype=np.int64) * (self.n_docs + len(new_lens))
+                                 + token_rows, return_counts=True)
+        new_terms = (keys // (self.n_docs + len(new_lens))).astype(np.int32)
+        new_rows = (keys % (self.n_docs + len(new_lens))).astype(np.int32)
+        new_tfs = counts.astype(np.float32)
+
+        # Merge the (small, sorted) new postings into the sorted existing ones
+        old_terms = self._posting_terms()
+        positions = np.searchsorted(old_terms, new_terms, side='right') + np.arange(len(new_terms))
+        total = len(old_terms) + len(new_terms)
+        is_old = np.ones(total, dtype=bool)
+        is_old[positions] = False
+
+        rows = np.empty(total, dtype=np.int32)
+        rows[is_old] = self.rows
+        rows[positions] = new_rows
+
+        tfs = np.empty(total, dtype=np.float32)
+        tfs[is_old] = self.tfs
+        tfs[positions] = new_tfs
+
+        counts = np.bincount(old_terms, minlength=len(vocab)) + np.bincount(new_terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        doc_len = np.concatenate([np.asarray(self.doc_len), np.asarray(new_lens, dtype=np.int32)])
+        return BM25Index(vocab, indptr, rows, tfs, doc_len, self.k1, self.b)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every row for a query.
+
+        Args:
+            query: Query text
+
+        Returns:
+            float32 array of length n_docs (0 for rows without a query term)
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if not self.n_docs:
+            return scores
+
+        norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_len, dtype=np.float32) / max(self.avgdl, 1e-9))
+
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            if start == end:
+                continue
+
+            rows = self.rows[start:end]
+            tf = self.tfs[start:end]
+            df = end - start
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            # Rows are unique within a term's postings, so fancy-index add is safe
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm[rows])
+
+        return scores
+
+    def top(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Best-scoring rows for a query.
+
+        Args:
+            query: Query text
+            top_k: Number of rows to return
+            mask: Optional boolean row mask (prefilter)
+
+        Returns:
+            List of (row, score), best first, scores > 0 only
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, directory: Path, prefix: str = "bm25") -> None:
+        """Write the index as .npy arrays plus a JSON vocabulary."""
+        directory = Path(directory)
+        np.save(directory / f"{prefix}_indptr.npy", self.indptr)
+        np.save(directory / f"{prefix}_rows.npy", np.asarray(self.rows))
+        np.save(directory / f"{prefix}_tfs.npy", np.asarray(self.tfs))
+        np.save(directory / f"{prefix}_doc_len.npy", np.asarray(self.doc_len))
+        with open(directory / f"{prefix}_vocab.json", 'w') as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": sorted(self.vocab, key=self.vocab.get)}, f)
+
+    @classmethod
+    def exists(cls, directory: Path, prefix: str = "bm25") -> bool:
+        return (Path(directory) / f"{prefix}_vocab.json").exists()
+
+    @classmethod
+    def load(cls, directory: Path, prefix: str = "bm25") -> "BM25Index":
+        """Load an index written by save() (posting arrays are memory-mapped)."""
+        directory = Path(directory)
+        with open(directory / f"{prefix}_vocab.json", 'r') as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            path = directory / f"{prefix}_{name}.npy"
+            # Zero-length arrays cannot be memory-mapped
+            return np.load(path, mmap_mode='r') if path.stat().st_size > 128 else np.load(path)
+
+        return cls(
+            vocab={term: i for i, term in enumerate(meta["terms"])},
+            indptr=np.load(directory / f"{prefix}_indptr.npy"),
+            rows=load_array("rows"),
+            tfs=load_array("tfs"),
+            doc_len=np.load(directory / f"{prefix}_doc_len.npy"),
+            k1=meta.get("k1", 1.5),
+            b=meta.get("b", 0.75)
+        )
+
+
+class KeywordIndex:
+    """
+    Persisted BM25 index keyed by chunk ID.
+
+    Used by engines whose own storage has no row order to share (ChromaDB).
+    Re-adding an ID replaces its text; other processes pick up saved
+    changes on their next search.
+    """
+
+    def __init__(self, index_dir: str):
+        """
+        Initialize keyword index.
+
+        Args:
+            index_dir: Directory for the index files
+        """
+        self.index_dir = Path(index_dir)
+        self.index: BM25Index = BM25Index.empty()
+        self.ids: List[str] = []
+        self._loaded_stamp = None
+        self._dirty = False  # unsaved in-memory changes (never overwritten by a reload)
+        self._reload()
+
+    def _stamp(self):
+        try:
+            stat = (self.index_dir / "ids.json").stat()
+            return (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        """Load from disk if the saved index changed."""
+        stamp = self._stamp()
+        if self._dirty or stamp is None or stamp == self._loaded_stamp:
+            return
+        try:
+            with open(self.index_dir / "ids.json", 'r') as f:
+                ids = json.load(f)
+            self.index = BM25Index.load(self.index_dir)
+            self.ids = ids
+            self._loaded_stamp = stamp
+        except Exception as e:
+            logger.error(f"Error loading keyword index: {e}")
+
+    @property
+    def count(self) -> int:
+        self._reload()
+        return len(self.ids)
+
+    def upsert(self, ids: List[str], texts: List[str], save: bool = True) -> None:
+        """Add or replace texts by chunk ID (save=False defers the write to a later save())."""
+        self._reload()
+        replaced = set(ids)
+        keep = [row for row, chunk_id in enumerate(self.ids) if chunk_id not in replaced]
+        self.index = self.index.select(keep).extend(texts)
+        self.ids = [self.ids[row] for row in keep] + list(ids)
+        if save:
+            self.save()
+        else:
+            self._dirty = True
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove chunk IDs."""
+        self._reload()
+        removed = set(ids)
+        keep = [row for row, chunk_id in enumerate(self.ids) if chunk_id not in removed]
+        if len(keep) == len(self.ids):
+            return
+        self.index = self.index.select(keep)
+        self.ids = [self.ids[row] for row in keep]
+        self.save()
+
+    def rebuild(self, ids: List[str], texts: List[str]) -> None:
+        """Replace the whole index."""
+        self.index = BM25Index.build(texts)
+        self.ids = list(ids)
+        self.save()
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self.rebuild([], [])
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Best-scoring chunk IDs for a query.
+
+        Returns:
+            List of (chunk_id, score), best first
+        """
+        self._reload()
+        return [(self.ids[row], score) for row, score in self.index.top(query, top_k)]
+
+    def save(self) -> None:
+        """Write to a temporary directory and swap it in."""
+        tmp_dir = self.index_dir.with_name(self.index_dir.name + ".tmp")
+        old_dir = self.index_dir.with_name(self.index_dir.name + ".old")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        self.index.save(tmp_dir)
+        with open(tmp_dir / "ids.json", 'w') as f:
+            json.dump(self.ids, f)
+
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if self.index_dir.exists():
+            os.rename(self.index_dir, old_dir)
+        os.rename(tmp_dir, self.index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self._loaded_stamp = self._stamp()
+        self._dirty = False
+
+    def destroy(self) -> None:
+        """Delete the index files."""
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+        self.index = BM25Index.empty()
+        self.ids = []
+        self._loaded_stamp = None
+        self._dirty = False
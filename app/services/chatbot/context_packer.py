@@ -0,0 +1,147 @@
+"""
+Token-budgeted Context Packing for DR Knowledge Chatbot.
+
+Sending every retrieved event in full makes the prompt size (and so
+time-to-first-token and cost) swing with the length of the events that
+happen to match. ContextPacker fills a fixed token budget instead:
+
+    - documents are taken greedily by score;
+    - a document longer than max_doc_tokens, or one that no longer fits,
+      has its summary cut at a sentence boundary (header, classification
+      and references are kept so the event stays citable);
+    - a document that does not fit even trimmed is skipped, and smaller
+      lower-ranked ones may still fill the remaining space.
+
+Tokens are counted with the cl100k_base tiktoken encoding used by
+DataProcessor for chunking.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from app.services.chatbot.retrieval_service import RetrievalResult
+
+logger = logging.getLogger(__name__)
+
+# Same encoding as DataProcessor's chunker
+TOKEN_ENCODING = "cl100k_base"
+
+# Summary section of Event.to_text(): "**Summary:**\n...\n\n**Classification:**"
+_SUMMARY = re.compile(r"(\*\*Summary:\*\*\n)(.*?)(?=\n\n\*\*|\Z)", re.S)
+
+# Sentence ends: ., ! or ? followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Marker appended to a trimmed summary
+TRIM_MARKER = " [...]"
+
+
+@dataclass
+class PackedContext:
+    """Documents selected for the prompt and their rendered context."""
+    text: str
+    documents: List[RetrievalResult]
+    token_count: int
+    trimmed: int = 0
+    dropped: List[str] = field(default_factory=list)  # Event IDs left out
+
+
+def trim_summary(text: str, sentences: int) -> str:
+    """Keep the first `sentences` sentences of the text's summary section."""
+    match = _SUMMARY.search(text)
+    if match is None:
+        return text
+    parts = _SENTENCE_END.split(match.group(2).strip())
+    if sentences >= len(parts):
+        return text
+    summary = " ".join(parts[:sentences]) + TRIM_MARKER
+    return text[:match.start(2)] + summary + text[match.end(2):]
+
+
+def count_summary_sentences(text: str) -> int:
+    """Number of sentences in the text's summary section (0 if there is none)."""
+    match = _SUMMARY.search(text)
+    return len(_SENTENCE_END.split(match.group(2).strip())) if match else 0
+
+
+class ContextPacker:
+    """Fill a token budget with rendered documents, best score first."""
+
+    def __init__(self, budget_tokens: int = 6000, max_doc_tokens: int = 1500, encoding=None):
+        """
+        Args:
+            budget_tokens: Tokens available for the whole context
+            max_doc_tokens: Tokens allowed per document before its summary is trimmed
+            encoding: Object with encode(text) -> tokens (default: tiktoken TOKEN_ENCODING)
+        """
+        self.budget_tokens = budget_tokens
+        self.max_doc_tokens = max_doc_tokens
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def _fit(self, doc: RetrievalResult, render: Callable[[RetrievalResult, str], str],
+             limit: int) -> Optional[Tuple[str, int, bool]]:
+        """Render doc within limit tokens, trimming its summary if needed (None if impossible)."""
+        block = render(doc, doc.text)
+        tokens = self.count_tokens(block)
+        if tokens <= limit:
+            return block, tokens, False
+
+        # Binary search the longest summary prefix (in sentences) that fits
+        best = None
+        low, high = 0, count_summary_sentences(doc.text) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = render(doc, trim_summary(doc.text, middle))
+            candidate_tokens = self.count_tokens(candidate)
+            if candidate_tokens <= limit:
+                best = (candidate, candidate_tokens, True)
+                low = middle + 1
+            else:
+                high = middle - 1
+        return best
+
+    def pack(self, documents: List[RetrievalResult],
+             render: Callable[[RetrievalResult, str], str]) -> PackedContext:
+        """
+        Select and render documents within the budget.
+
+        Args:
+            documents: Retrieved documents
+            render: Formats one document block from the document and its (possibly trimmed) text
+
+        Returns:
+            PackedContext with the context text and packing statistics
+        """
+        blocks: List[str] = []
+        packed: List[RetrievalResult] = []
+        dropped: List[str] = []
+        used = trimmed = 0
+
+        for doc in sorted(documents, key=lambda d: d.score, reverse=True):
+            fitted = self._fit(doc, render, min(self.max_doc_tokens, self.budget_tokens - used))
+            if fitted is None:
+                dropped.append(doc.event_id)
+                continue
+            block, tokens, was_trimmed = fitted
+            blocks.append(block)
+            packed.append(doc)
+            used += tokens
+            trimmed += was_trimmed
+
+        if dropped or trimmed:
+            logger.info(f"Context packed: {len(packed)} docs, {used}/{self.budget_tokens} tokens "
+                        f"({trimmed} trimmed, {len(dropped)} dropped)")
+        return PackedContext(text="".join(blocks), documents=packed, token_count=used,
+                             trimmed=trimmed, dropped=dropped)
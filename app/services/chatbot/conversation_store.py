@@ -0,0 +1,243 @@
+"""
+Server-side Conversation Store for DR Knowledge Chatbot.
+
+Chat history used to live in the Flask session. With cookie sessions
+(SESSION_TYPE='null') that is a signed cookie of up to 20 full messages,
+re-sent with every request to every tool and close to the browser's cookie
+size limit after a few long answers. The history now lives in SQLite and
+the session only holds a conversation id.
+
+Conversations expire ttl_seconds after their last message; expired rows
+are purged when new conversations are started. Each conversation belongs to
+one user, and an exchange carrying an exchange id is stored once (a
+streamed answer may be saved by the stream and again by /stream/commit).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.services.chatbot.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Messages kept per conversation (older ones are compacted away before generation anyway)
+MAX_MESSAGES = 50
+
+# Seconds SQLite waits for another worker's write lock
+BUSY_TIMEOUT = 10
+
+
+class ConversationStore:
+    """SQLite-backed chat histories with a TTL, keyed by conversation id."""
+
+    def __init__(self, db_path: Path, ttl_seconds: float = 86400, max_messages: int = MAX_MESSAGES):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+            ttl_seconds: Seconds a conversation is kept after its last message
+            max_messages: Messages kept per conversation, oldest dropped first
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Get database connection.
+
+        Returns:
+            sqlite3.Connection: Database connection with row factory
+        """
+        conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._get_connection()
+        try:
+            # Readers do not block the gunicorn worker that is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    conversation_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+                CREATE TABLE IF NOT EXISTS exchanges (
+                    exchange_id TEXT PRIMARY KEY,
+                    conversation_id TEXT NOT NULL
+                );
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _owner(self, conn: sqlite3.Connection, conversation_id: str) -> Optional[sqlite3.Row]:
+        """Conversation row if it exists and has not expired."""
+        row = conn.execute(
+            "SELECT user_id, updated_at FROM conversations WHERE conversation_id = ?",
+            (conversation_id,)
+        ).fetchone()
+        if row is None or time.time() - row['updated_at'] > self.ttl_seconds:
+            return None
+        return row
+
+    def new_conversation(self, user_id: str) -> str:
+        """
+        Start an empty conversation (and purge expired ones).
+
+        Returns:
+            str: New conversation id
+        """
+        self.purge_expired()
+        conversation_id = uuid.uuid4().hex
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO conversations (conversation_id, user_id, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, str(user_id), time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return conversation_id
+
+    def exists(self, conversation_id: Optional[str], user_id: str) -> bool:
+        """Whether the conversation is live and belongs to the user."""
+        if not conversation_id:
+            return False
+        conn = self._get_connection()
+        try:
+            row = self._owner(conn, conversation_id)
+            return row is not None and row['user_id'] == str(user_id)
+        finally:
+            conn.close()
+
+    def get_messages(self, conversation_id: str, user_id: str) -> List[Dict[str, str]]:
+        """
+        Messages of a conversation, oldest first.
+
+        Returns:
+            List of {role, content} dicts (empty if missing, expired or another user's)
+        """
+        conn = self._get_connection()
+        try:
+            row = self._owner(conn, conversation_id)
+            if row is None or row['user_id'] != str(user_id):
+                return []
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY id",
+                (conversation_id,)
+            ).fetchall()
+            return [{'role': r['role'], 'content': r['content']} for r in rows]
+        finally:
+            conn.close()
+
+    def append(self, conversation_id: str, user_id: str, messages: List[Dict[str, str]],
+               exchange_id: Optional[str] = None) -> bool:
+        """
+        Add messages to a conversation.
+
+        Args:
+            conversation_id: Conversation to extend
+            user_id: Owner; messages for another user's conversation are refused
+            messages: {role, content} dicts
+            exchange_id: If given, the messages are stored only the first time
+
+        Returns:
+            bool: True if the messages were stored
+        """
+        conn = self._get_connection()
+        try:
+            row = self._owner(conn, conversation_id)
+            if row is None or row['user_id'] != str(user_id):
+                return False
+            if exchange_id is not None:
+                try:
+                    conn.execute("INSERT INTO exchanges (exchange_id, conversation_id) VALUES (?, ?)",
+                                 (exchange_id, conversation_id))
+                except sqlite3.IntegrityError:
+                    return False
+
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                [(conversation_id, m['role'], m['content']) for m in messages]
+            )
+            conn.execute("""
+                DELETE FROM messages WHERE conversation_id = ? AND id NOT IN (
+                    SELECT id FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?
+                )
+            """, (conversation_id, conversation_id, self.max_messages))
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE conversation_id = ?",
+                         (time.time(), conversation_id))
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def clear(self, conversation_id: str) -> None:
+        """Delete a conversation and its messages."""
+        conn = self._get_connection()
+        try:
+            for table in ('messages', 'exchanges', 'conversations'):
+                conn.execute(f"DELETE FROM {table} WHERE conversation_id = ?", (conversation_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def purge_expired(self) -> int:
+        """
+        Delete conversations idle for longer than the TTL.
+
+        Returns:
+            int: Number of conversations deleted
+        """
+        cutoff = time.time() - self.ttl_seconds
+        conn = self._get_connection()
+        try:
+            expired = "SELECT conversation_id FROM conversations WHERE updated_at < ?"
+            for table in ('messages', 'exchanges'):
+                conn.execute(f"DELETE FROM {table} WHERE conversation_id IN ({expired})", (cutoff,))
+            deleted = conn.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if deleted:
+            logger.info(f"Purged {deleted} expired conversation(s)")
+        return deleted
+
+
+# Global store instance
+_conversation_store: Optional[ConversationStore] = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """
+    Get the global conversation store.
+
+    Returns:
+        ConversationStore: Store at CHATBOT_CONVERSATION_DB_PATH
+    """
+    global _conversation_store
+    with _conversation_store_lock:
+        if _conversation_store is None:
+            _conversation_store = ConversationStore(
+                db_path=Path(get_setting('CHATBOT_CONVERSATION_DB_PATH', 'app/data/chatbot/conversations.db')),
+                ttl_seconds=float(get_setting('CHATBOT_CONVERSATION_TTL', 86400))
+            )
+        return _conversation_store
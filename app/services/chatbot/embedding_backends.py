@@ -0,0 +1,228 @@
+"""
+Embedding Backends for DR Knowledge Chatbot.
+
+EmbeddingService delegates vector generation to a backend:
+- openai:  OpenAI embeddings API (text-embedding-3-small by default)
+- hashing: Local NumPy feature-hashing vectorizer (no network, deterministic),
+           for offline benchmarking, CI and air-gapped deployments
+"""
+
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Protocol, Tuple, runtime_checkable
+
+import numpy as np
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+
+@runtime_checkable
+class EmbeddingBackend(Protocol):
+    """Batched text → vector backend."""
+
+    name: str           # Backend identifier (e.g. "openai")
+    model: str          # Model identifier within the backend
+    dimensions: int     # Output vector dimension
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dimensions)
+        """
+        ...
+
+
+def cache_namespace(name: str, model: str, dimensions: int, dtype: str = "float32") -> str:
+    """
+    Cache namespace for a backend name, model, dimension and storage dtype.
+
+    Vectors from different backends, dimensions or precisions must never share
+    a cache entry, so the embedding cache is partitioned by this key.
+    """
+    raw = f"{name}-{model}-{dimensions}"
+    if dtype != "float32":
+        raw += f"-{dtype}"
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', raw)
+
+
+def backend_namespace(backend: EmbeddingBackend, dtype: str = "float32") -> str:
+    """Cache namespace for a backend instance."""
+    return cache_namespace(backend.name, backend.model, backend.dimensions, dtype)
+
+
+def truncate_embeddings(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Re-project embeddings to fewer dimensions (truncate, then L2-normalize).
+
+    text-embedding-3 models are trained so that a prefix of the vector is a
+    valid lower-dimensional embedding; this is what the API's `dimensions`
+    parameter returns, so existing vectors can be shortened without re-fetching.
+
+    Args:
+        vectors: Array of shape (n, d) or (d,)
+        dimensions: Target dimension (<= d)
+
+    Returns:
+        float32 array with last axis of size `dimensions`
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions > vectors.shape[-1]:
+        raise ValueError(f"Cannot re-project {vectors.shape[-1]}-dim vectors up to {dimensions} dims")
+
+    truncated = np.array(vectors[..., :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    np.divide(truncated, norms, out=truncated, where=norms > 0)
+    return truncated
+
+
+# Native output size of OpenAI embedding models (smaller sizes via `dimensions`)
+OPENAI_NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class OpenAIEmbeddingBackend:
+    """OpenAI embeddings API backend."""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "text-embedding-3-small",
+                 dimensions: int = 1536):
+        """
+        Initialize OpenAI backend.
+
+        Args:
+            api_key: OpenAI API key (defaults to env variable)
+            model: Embedding model name
+            dimensions: Output dimension
+        """
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        if not self.api_key:
+            raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+
+        native = OPENAI_NATIVE_DIMENSIONS.get(model)
+        if native and dimensions > native:
+            raise ValueError(f"{model} produces at most {native} dimensions (requested {dimensions})")
+
+        self.client = OpenAI(api_key=self.api_key)
+        self.model = model
+        self.dimensions = dimensions
+
+    def request_params(self) -> Dict[str, object]:
+        """Embeddings request body fields (shared with Batch API requests)."""
+        params: Dict[str, object] = {"model": self.model}
+        if self.dimensions != OPENAI_NATIVE_DIMENSIONS.get(self.model):
+            params["dimensions"] = self.dimensions
+        return params
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts with one embeddings API request."""
+        response = self.client.embeddings.create(
+            input=texts,
+            **self.request_params()
+        )
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return np.asarray([item.embedding for item in ordered], dtype=np.float32)
+
+
+class HashingEmbeddingBackend:
+    """
+    Feature-hashing vectorizer over word unigrams and bigrams.
+
+    Each feature is hashed (BLAKE2b, stable across processes) to a column and
+    a sign; counts are log-scaled and rows L2-normalized, so cosine similarity
+    behaves like a lexical-overlap score. Needs no model download or network.
+    """
+
+    name = "hashing"
+    model = "feature-hashing-v1"
+
+    _token_pattern = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+    def __init__(self, dimensions: int = 1536, ngram_range: Tuple[int, int] = (1, 2)):
+        """
+        Initialize hashing backend.
+
+        Args:
+            dimensions: Output dimension
+            ngram_range: Smallest and largest word n-gram to hash
+        """
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self._feature_cache: Dict[str, Tuple[int, float]] = {}
+
+    def _hash_feature(self, feature: str) -> Tuple[int, float]:
+        """Map a feature to (column, sign), memoized."""
+        cached = self._feature_cache.get(feature)
+        if cached is None:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            cached = (digest % self.dimensions, 1.0 if (digest >> 63) & 1 else -1.0)
+            self._feature_cache[feature] = cached
+        return cached
+
+    def _features(self, text: str) -> List[str]:
+        tokens = self._token_pattern.findall(text.lower())
+        low, high = self.ngram_range
+        features = []
+        for n in range(low, high + 1):
+            if n == 1:
+                features.extend(tokens)
+            else:
+                features.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts locally."""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                col, sign = self._hash_feature(feature)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+
+        # Sublinear term frequency, then unit length
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+def create_embedding_backend(name: str = "openai", api_key: Optional[str] = None,
+                             model: Optional[str] = None, dimensions: Optional[int] = None) -> EmbeddingBackend:
+    """
+    Create an embedding backend by name.
+
+    Args:
+        name: "openai" or "hashing"
+        api_key: OpenAI API key (openai backend only)
+        model: Model override (openai backend only)
+        dimensions: Output dimension override
+
+    Returns:
+        Backend instance
+    """
+    if name == "openai":
+        return OpenAIEmbeddingBackend(
+            api_key=api_key,
+            model=model or "text-embedding-3-small",
+            dimensions=dimensions or 1536
+        )
+    if name == "hashing":
+        return HashingEmbeddingBackend(dimensions=dimensions or 1536)
+
+    raise ValueError(f"Unknown embedding backend: {name} (expected 'openai' or 'hashing')")
@@ -0,0 +1,382 @@
+"""
+Embedding Cache for DR Knowledge Chatbot.
+
+Append-only binary store for embedding vectors, read through mmap.
+Replaces the embedding_cache.json dict that was rewritten on every new vector.
+
+On-disk layout (all files share the same name prefix):
+- <name>.vec  - raw vectors, one fixed-size row per entry (float32 or float16)
+- <name>.idx  - 16-byte MD5 digests, row i of .idx is the key for row i of .vec
+- <name>.json - header with format version, dtype and dimensions
+- <name>.lock - flock()ed by writers so processes append whole rows in turn
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.services.chatbot.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = "opstoolkit-embedding-cache"
+CACHE_FORMAT_VERSION = 1
+DIGEST_SIZE = 16  # MD5 digest bytes
+SUPPORTED_DTYPES = ("float32", "float16")
+
+# Buffered vectors appended by put() without waiting for flush()
+MAX_PENDING_ROWS = 1024
+
+
+class EmbeddingCache:
+    """
+    Memory-mapped embedding cache keyed by MD5 text hash.
+
+    New vectors are appended to the end of the vector file (O(1) disk I/O per
+    vector). Reads go through an mmap of the vector file, so loading the cache
+    only requires reading the small digest index.
+
+    Several processes (gunicorn workers, scripts) may share one cache: appends
+    happen under an exclusive flock on <name>.lock, and the row of each new
+    vector is taken from the file sizes while the lock is held. Rows appended
+    by other processes are picked up from the tail of the .idx file on a miss.
+    """
+
+    def __init__(self, cache_dir: str, name: str = "embeddings", dtype: str = "float32"):
+        """
+        Open (or create) an embedding cache.
+
+        Args:
+            cache_dir: Directory holding the cache files
+            name: File name prefix for the cache files
+            dtype: Storage precision ("float32" or "float16")
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported cache dtype: {dtype} (expected one of {SUPPORTED_DTYPES})")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.name = name
+        self.vec_path = self.cache_dir / f"{name}.vec"
+        self.idx_path = self.cache_dir / f"{name}.idx"
+        self.header_path = self.cache_dir / f"{name}.json"
+        self.lock_path = self.cache_dir / f"{name}.lock"
+
+        self.dtype = np.dtype(dtype)
+        self.dimensions: Optional[int] = None
+
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0  # Rows of the .idx file read into _index
+        self._pending: Dict[bytes, np.ndarray] = {}  # Written by flush()
+        self._lock = threading.RLock()
+
+        self._mmap: Optional[mmap.mmap] = None
+        self._matrix: Optional[np.ndarray] = None
+
+        self._open()
+
+    # ------------------------------------------------------------------
+    # Opening / loading
+    # ------------------------------------------------------------------
+
+    def _read_header(self):
+        """Load dtype and dimensions from the header, if it has been written."""
+        if not self.header_path.exists():
+            return
+        with open(self.header_path, 'r') as f:
+            header = json.load(f)
+
+        if header.get("format") != CACHE_FORMAT:
+            raise ValueError(f"Not an embedding cache header: {self.header_path}")
+
+        stored_dtype = np.dtype(header["dtype"])
+        if stored_dtype != self.dtype:
+            logger.warning(
+                f"Cache {self.name} stored as {stored_dtype}, requested {self.dtype} - "
+                f"using stored dtype"
+            )
+            self.dtype = stored_dtype
+        self.dimensions = int(header["dimensions"])
+
+    def _repair(self):
+        """Truncate a torn trailing write (caller holds the exclusive file lock)."""
+        row_bytes = self.dimensions * self.dtype.itemsize
+        vec_size = self.vec_path.stat().st_size if self.vec_path.exists() else 0
+        idx_size = self.idx_path.stat().st_size if self.idx_path.exists() else 0
+        rows = min(vec_size // row_bytes, idx_size // DIGEST_SIZE)
+
+        # A crash between the vector and digest writes leaves one side longer
+        if vec_size != rows * row_bytes:
+            os.truncate(self.vec_path, rows * row_bytes)
+        if idx_size != rows * DIGEST_SIZE:
+            os.truncate(self.idx_path, rows * DIGEST_SIZE)
+        return rows
+
+    def _read_tail(self, rows: int):
+        """Index digests of rows self._rows..rows of the .idx file."""
+        if rows <= self._rows:
+            return
+        with open(self.idx_path, 'rb') as f:
+            f.seek(self._rows * DIGEST_SIZE)
+            digests = f.read((rows - self._rows) * DIGEST_SIZE)
+        # Later rows win, so re-cached keys resolve to their newest vector
+        for i in range(len(digests) // DIGEST_SIZE):
+            self._index[digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]] = self._rows + i
+        self._rows += len(digests) // DIGEST_SIZE
+
+    def _load_tail(self):
+        """Pick up rows appended by other processes since the last read."""
+        if self.dimensions is None:
+            self._read_header()
+            if self.dimensions is None:
+                return
+        idx_size = self.idx_path.stat().st_size if self.idx_path.exists() else 0
+        if idx_size // DIGEST_SIZE > self._rows:
+            # Digests are appended after their vectors, so every indexed row is readable
+            with file_lock(self.lock_path, shared=True):
+                self._read_tail(self.idx_path.stat().st_size // DIGEST_SIZE)
+
+    def _open(self):
+        """Read header and digest index, repairing a torn trailing write."""
+        with file_lock(self.lock_path):
+            self._read_header()
+            if self.dimensions:
+                self._read_tail(self._repair())
+
+        logger.info(f"Embedding cache '{self.name}' opened: {len(self._index)} vectors "
+                    f"({self.dtype.name}, dim={self.dimensions})")
+
+    def _write_header(self):
+        """Write the cache header (once, when the dimension becomes known)."""
+        header = {
+            "format": CACHE_FORMAT,
+            "version": CACHE_FORMAT_VERSION,
+            "dtype": self.dtype.name,
+            "dimensions": self.dimensions
+        }
+        tmp_path = self.header_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.header_path)
+
+    def _remap(self):
+        """Map the vector file so rows up to self._rows are readable."""
+        # Drop old views; the previous mmap is released once no array references it
+        self._matrix = None
+        self._mmap = None
+
+        if self._rows == 0:
+            return
+
+        with open(self.vec_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._matrix = np.frombuffer(self._mmap, dtype=self.dtype).reshape(-1, self.dimensions)
+
+    # ------------------------------------------------------------------
+    # Key helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _digest(text_hash: str) -> bytes:
+        """Convert hex MD5 text hash to its 16-byte digest."""
+        return bytes.fromhex(text_hash)
+
+    def _row(self, digest: bytes) -> Optional[int]:
+        """Row of a digest, re-reading the .idx tail on a miss."""
+        row = self._index.get(digest)
+        if row is None:
+            self._load_tail()
+            row = self._index.get(digest)
+        return row
+
+    # ------------------------------------------------------------------
+    # Read API
+    # ------------------------------------------------------------------
+
+    def get_array(self, text_hash: str) -> Optional[np.ndarray]:
+        """
+        Get cached vector as a numpy array (read-only view of the mmap).
+
+        Args:
+            text_hash: MD5 hex hash of the text
+
+        Returns:
+            Vector or None if not cached
+        """
+        digest = self._digest(text_hash)
+        with self._lock:
+            pending = self._pending.get(digest)
+            if pending is not None:
+                return pending
+            row = self._row(digest)
+            if row is None:
+                return None
+            if self._matrix is None or row >= self._matrix.shape[0]:
+                self._remap()
+            return self._matrix[row]
+
+    def get(self, text_hash: str, default=None) -> Optional[List[float]]:
+        """
+        Get cached vector as a list of floats.
+
+        Args:
+            text_hash: MD5 hex hash of the text
+            default: Value returned when not cached
+
+        Returns:
+            Embedding vector or default
+        """
+        vector = self.get_array(text_hash)
+        if vector is None:
+            return default
+        return vector.astype(np.float32).tolist()
+
+    def __getitem__(self, text_hash: str) -> List[float]:
+        vector = self.get(text_hash)
+        if vector is None:
+            raise KeyError(text_hash)
+        return vector
+
+    def __contains__(self, text_hash: str) -> bool:
+        digest = self._digest(text_hash)
+        with self._lock:
+            return digest in self._pending or self._row(digest) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index) + sum(1 for digest in self._pending if digest not in self._index)
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over cached text hashes."""
+        with self._lock:
+            digests = list(self._index.keys()) + [d for d in self._pending if d not in self._index]
+        return (digest.hex() for digest in digests)
+
+    # ------------------------------------------------------------------
+    # Write API
+    # ------------------------------------------------------------------
+
+    def put(self, text_hash: str, embedding) -> None:
+        """
+        Add a vector to the cache.
+
+        Data is buffered in memory (and readable at once); call flush() to
+        append it to disk. Large buffers are flushed automatically.
+
+        Args:
+            text_hash: MD5 hex hash of the text
+            embedding: Vector (list of floats or numpy array)
+        """
+        vector = np.array(embedding, dtype=self.dtype)
+        if vector.ndim != 1:
+            raise ValueError(f"Expected 1-D embedding, got shape {vector.shape}")
+
+        with self._lock:
+            if self.dimensions is None:
+                self._read_header()  # Another process may have written it
+            if self.dimensions is None:
+                self.dimensions = int(vector.shape[0])
+            elif vector.shape[0] != self.dimensions:
+                raise ValueError(
+                    f"Embedding dimension {vector.shape[0]} does not match cache dimension {self.dimensions}"
+                )
+
+            self._pending[self._digest(text_hash)] = vector
+            if len(self._pending) >= MAX_PENDING_ROWS:
+                self.flush()
+
+    def __setitem__(self, text_hash: str, embedding) -> None:
+        self.put(text_hash, embedding)
+
+    def flush(self) -> None:
+        """Append buffered vectors to disk under the cache's file lock."""
+        with self._lock:
+            if not self._pending:
+                return
+            with file_lock(self.lock_path):
+                if self.header_path.exists():
+                    dimensions = self.dimensions
+                    self._read_header()
+                    if self.dimensions != dimensions:
+                        raise ValueError(f"Embedding dimension {dimensions} does not match "
+                                         f"cache dimension {self.dimensions}")
+                else:
+                    self._write_header()
+
+                # Rows are numbered from the files, not from this process's count
+                rows = self._repair()
+                self._read_tail(rows)
+
+                digests = list(self._pending.keys())
+                # Vectors first: a torn write leaves orphan vectors that are truncated later
+                with open(self.vec_path, 'ab') as f:
+                    f.write(b"".join(self._pending[d].tobytes() for d in digests))
+                with open(self.idx_path, 'ab') as f:
+                    f.write(b"".join(digests))
+
+                for offset, digest in enumerate(digests):
+                    self._index[digest] = rows + offset
+                self._rows = rows + len(digests)
+                self._pending.clear()
+
+    def close(self) -> None:
+        """Flush buffered vectors and drop the mmap."""
+        with self._lock:
+            self.flush()
+            self._matrix = None
+            self._mmap = None
+
+    def stats(self) -> Dict[str, object]:
+        """Get cache statistics."""
+        row_bytes = (self.dimensions or 0) * self.dtype.itemsize
+        return {
+            "vectors": len(self),
+            "rows": self._rows,
+            "pending": len(self._pending),
+            "dtype": self.dtype.name,
+            "dimensions": self.dimensions,
+            "disk_bytes": self._rows * (row_bytes + DIGEST_SIZE)
+        }
+
+
+def migrate_json_cache(json_path: str, cache: EmbeddingCache, archive: bool = True) -> int:
+    """
+    One-shot migration of a legacy embedding_cache.json into a binary cache.
+
+    Args:
+        json_path: Path to the legacy JSON cache ({text_hash: [floats]})
+        cache: Destination EmbeddingCache
+        archive: Rename the JSON file to *.migrated after a successful import
+
+    Returns:
+        Number of vectors migrated
+    """
+    path = Path(json_path)
+    if not path.exists():
+        return 0
+
+    logger.info(f"Migrating legacy JSON embedding cache: {path}")
+
+    with open(path, 'r') as f:
+        legacy = json.load(f)
+
+    migrated = 0
+    for text_hash, embedding in legacy.items():
+        if text_hash in cache:
+            continue
+        cache.put(text_hash, embedding)
+        migrated += 1
+    cache.flush()
+
+    if archive:
+        path.rename(path.with_name(path.name + ".migrated"))
+
+    logger.info(f"Migrated {migrated} embeddings ({len(legacy) - migrated} already present)")
+    return migrated
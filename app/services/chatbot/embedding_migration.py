@@ -0,0 +1,204 @@
+"""
+Embedding Profile Migration for DR Knowledge Chatbot.
+
+Moves stored vectors to a new storage profile (CHATBOT_EMBEDDING_DIMENSIONS /
+CHATBOT_EMBEDDING_DTYPE):
+- reproject: truncate + renormalize existing text-embedding-3 vectors
+             (no API calls; equivalent to requesting fewer `dimensions`)
+- refetch:   re-embed every document with the target backend
+
+Both the embedding cache and the vector store are migrated. The collection
+is rebuilt as a shadow version and swapped in at the end (see
+BaseVectorStore.rebuild), so an interrupted run leaves the old vectors
+untouched and rollback() returns to them. migrate_hnsw_index() uses the same
+shadow rebuild to move a collection to new HNSW settings (hnsw_index.py).
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.services.chatbot.embedding_cache import EmbeddingCache
+from app.services.chatbot.embedding_backends import (
+    OPENAI_NATIVE_DIMENSIONS,
+    cache_namespace,
+    truncate_embeddings,
+)
+from app.services.chatbot.embedding_service import EmbeddingService
+from app.services.chatbot.vector_store import BaseVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def supports_reprojection(embedding_service: EmbeddingService) -> bool:
+    """Whether stored vectors can be shortened instead of re-fetched."""
+    return (embedding_service.backend.name == "openai"
+            and embedding_service.model.startswith("text-embedding-3"))
+
+
+def reproject_cache(source: EmbeddingCache, target: EmbeddingCache, dimensions: int,
+                    batch_size: int = 1000) -> int:
+    """
+    Copy re-projected vectors from one cache into another.
+
+    Args:
+        source: Cache holding full-size vectors
+        target: Cache for the new profile (its dtype is applied on write)
+        dimensions: Target dimension
+        batch_size: Vectors per batch
+
+    Returns:
+        Number of vectors written (keys already in target are skipped)
+    """
+    keys = [key for key in source.keys() if key not in target]
+
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        vectors = truncate_embeddings(np.stack([source.get_array(key) for key in batch]), dimensions)
+        for key, vector in zip(batch, vectors):
+            target.put(key, vector)
+        target.flush()
+
+    return len(keys)
+
+
+def _migrated_vectors(page: Dict[str, Any], embedding_service: EmbeddingService,
+                      dimensions: int, refetch: bool) -> np.ndarray:
+    """New-profile vectors for one page of stored documents."""
+    if refetch:
+        embeddings = embedding_service.embed_batch(page['documents'], allow_batch_api=False)
+        return np.asarray([embeddings[embedding_service._text_hash(text)] for text in page['documents']],
+                          dtype=np.float32)
+    return truncate_embeddings(np.asarray(page['embeddings'], dtype=np.float32), dimensions)
+
+
+def rebuild_collection(embedding_service: EmbeddingService, vector_store: BaseVectorStore,
+                       refetch: bool = False, batch_size: int = 500) -> int:
+    """
+    Rewrite the collection's vectors in the vector store's storage profile.
+
+    Args:
+        embedding_service: Service for the target profile (used when refetching)
+        vector_store: Store configured with the target profile
+        refetch: Re-embed documents instead of re-projecting stored vectors
+        batch_size: Documents per page
+
+    Returns:
+        Number of documents migrated
+    """
+    target_dimensions = vector_store.embedding_dimensions
+
+    vector_store.create_collection()
+    if vector_store.count() == 0:
+        logger.info("Collection is empty - nothing to migrate")
+        return 0
+
+    return _rebuild_from_pages(
+        vector_store,
+        lambda page: _migrated_vectors(page, embedding_service, target_dimensions, refetch),
+        include_embeddings=not refetch,
+        batch_size=batch_size
+    )
+
+
+def migrate_hnsw_index(vector_store: BaseVectorStore, batch_size: int = 500) -> int:
+    """
+    Rebuild the collection with the store's configured HNSW settings.
+
+    Stored vectors are copied unchanged; only the index is rebuilt.
+
+    Args:
+        vector_store: ChromaDB store configured with the target settings
+        batch_size: Documents per page
+
+    Returns:
+        Number of documents migrated
+    """
+    vector_store.create_collection()
+    if vector_store.count() == 0:
+        logger.info("Collection is empty - nothing to migrate")
+        return 0
+
+    return _rebuild_from_pages(
+        vector_store,
+        lambda page: np.asarray(page['embeddings'], dtype=np.float32).tolist(),
+        include_embeddings=True,
+        batch_size=batch_size
+    )
+
+
+def _rebuild_from_pages(vector_store: BaseVectorStore, vectors_for, include_embeddings: bool,
+                        batch_size: int) -> int:
+    """Copy every page into a shadow version with vectors_for(page) and swap it in."""
+    # Written to a shadow version; the old vectors stay live until the swap
+    version = vector_store.begin_rebuild()
+    migrated = 0
+    sample = sample_id = None
+    try:
+        for page in vector_store.iter_documents(batch_size=batch_size, include_embeddings=include_embeddings):
+            vectors = vectors_for(page)
+            vector_store.add_to_rebuild(version, page['ids'], page['documents'], page['metadatas'], vectors)
+            if sample is None:
+                sample, sample_id = vectors[0], page['ids'][0]
+            migrated += len(page['ids'])
+            logger.info(f"Migrated {migrated} documents")
+
+        vector_store.publish_rebuild(version, expected_count=migrated, sample_embedding=sample,
+                                     sample_id=sample_id)
+    except Exception:
+        vector_store.abort_rebuild(version)
+        raise
+
+    return migrated
+
+
+def migrate_embedding_profile(embedding_service: EmbeddingService, vector_store: BaseVectorStore,
+                              refetch: bool = False, source_namespace: Optional[str] = None,
+                              batch_size: int = 500) -> Dict[str, Any]:
+    """
+    Migrate the embedding cache and vector store to the configured profile.
+
+    Args:
+        embedding_service: Service for the target profile
+        vector_store: Store configured with the target profile
+        refetch: Re-embed instead of re-projecting
+        source_namespace: Cache namespace to re-project from
+            (default: the model's native-dimension float32 cache)
+        batch_size: Documents per page
+
+    Returns:
+        Dict with migration counts and timing
+    """
+    start_time = time.time()
+
+    if not refetch and not supports_reprojection(embedding_service):
+        raise ValueError(f"Vectors from {embedding_service.backend.name}/{embedding_service.model} "
+                         f"cannot be re-projected; use refetch")
+
+    cached = 0
+    if not refetch:
+        source_namespace = source_namespace or cache_namespace(
+            "openai", embedding_service.model, OPENAI_NATIVE_DIMENSIONS[embedding_service.model]
+        )
+        source_header = Path(embedding_service.cache_dir) / f"{source_namespace}.json"
+        if source_namespace == embedding_service.cache_namespace:
+            logger.info("Source and target cache namespaces match - cache left as is")
+        elif source_header.exists():
+            source = EmbeddingCache(str(embedding_service.cache_dir), name=source_namespace)
+            cached = reproject_cache(source, embedding_service.cache, embedding_service.dimensions)
+            source.close()
+            logger.info(f"Re-projected {cached} cached embeddings from {source_namespace}")
+
+    documents = rebuild_collection(embedding_service, vector_store, refetch=refetch, batch_size=batch_size)
+
+    return {
+        "mode": "refetch" if refetch else "reproject",
+        "dimensions": embedding_service.dimensions,
+        "dtype": embedding_service.storage_dtype,
+        "cache_vectors_migrated": cached,
+        "documents_migrated": documents,
+        "seconds": round(time.time() - start_time, 1)
+    }
@@ -1,24 +1,82 @@
 """
 Embedding Service for DR Knowledge Chatbot.
 
-Handles OpenAI embeddings generation with batch processing and caching.
+Handles embeddings generation with batch processing and caching.
 Per chatbot_revised.md: text-embedding-3-small, Batch API for >100 chunks.
+Vectors come from a pluggable backend (see embedding_backends.py).
 """
 
 import logging
 import hashlib
 import json
 import time
-import os
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional, Any
 from dataclasses import dataclass
 from pathlib import Path
 
 import openai
-from openai import OpenAI
+
+from app.services.chatbot.embedding_cache import EmbeddingCache, migrate_json_cache
+from app.services.chatbot.embedding_backends import (
+    EmbeddingBackend,
+    OpenAIEmbeddingBackend,
+    backend_namespace,
+    create_embedding_backend,
+)
+from app.services.chatbot.settings import get_setting
 
 logger = logging.getLogger(__name__)
 
+# OpenAI limits: 2048 inputs AND 300K tokens per embeddings request
+MAX_ITEMS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 250000  # Safe buffer below the 300K hard limit
+
+# Batch API terminal failure statuses
+BATCH_FAILED_STATUSES = ("failed", "cancelled", "expired")
+
+# Errors worth retrying (transient server/network/rate-limit conditions)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def pack_by_token_budget(token_counts: List[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Greedily pack texts (in order) into request-sized groups.
+
+    A group is closed when adding the next text would exceed max_tokens or
+    max_items. A single text larger than max_tokens gets a group of its own.
+
+    Args:
+        token_counts: Token count per text
+        max_tokens: Token budget per request
+        max_items: Maximum number of texts per request
+
+    Returns:
+        List of groups, each a list of indices into token_counts
+    """
+    packs = []
+    current = []
+    current_tokens = 0
+
+    for i, count in enumerate(token_counts):
+        if current and (current_tokens + count > max_tokens or len(current) >= max_items):
+            packs.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += count
+
+    if current:
+        packs.append(current)
+
+    return packs
+
 
 # ============================================================================
 # Data Models
@@ -34,6 +92,7 @@ class BatchJob:
     error_file_id: Optional[str] = None
     created_at: int = 0
     completed_at: Optional[int] = None
+    request_count: int = 0
 
 
 # ============================================================================
@@ -41,49 +100,87 @@ class BatchJob:
 # ============================================================================
 
 class EmbeddingService:
-    """Generate embeddings using OpenAI API with caching and batch support."""
+    """Generate embeddings through a pluggable backend with caching and batch support."""
 
-    def __init__(self, api_key: Optional[str] = None, cache_dir: str = "app/data/chatbot/embedding_cache"):
+    def __init__(self, api_key: Optional[str] = None, cache_dir: str = "app/data/chatbot/embedding_cache",
+                 backend: Optional[EmbeddingBackend] = None, storage_dtype: Optional[str] = None):
         """
         Initialize embedding service.
 
         Args:
             api_key: OpenAI API key (defaults to env variable)
             cache_dir: Directory for caching embeddings
+            backend: Embedding backend (defaults to CHATBOT_EMBEDDING_BACKEND, "openai",
+                at CHATBOT_EMBEDDING_DIMENSIONS)
+            storage_dtype: Cache precision, "float32" or "float16"
+                (defaults to CHATBOT_EMBEDDING_DTYPE)
         """
-        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+        if backend is None:
+            backend = create_embedding_backend(
+                get_setting('CHATBOT_EMBEDDING_BACKEND', 'openai'),
+                api_key=api_key,
+                dimensions=int(get_setting('CHATBOT_EMBEDDING_DIMENSIONS', 1536))
+            )
+
+        self.backend = backend
+        self.model = backend.model
+        self.dimensions = backend.dimensions
+        self.storage_dtype = storage_dtype or get_setting('CHATBOT_EMBEDDING_DTYPE', 'float32')
+
+        # Batch API is only available on the OpenAI backend
+        self.client = getattr(backend, 'client', None)
+        self.api_key = getattr(backend, 'api_key', None)
 
-        self.client = OpenAI(api_key=self.api_key)
-        self.model = "text-embedding-3-small"  # 1536 dimensions, $0.02/1M tokens
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
+        # Cache is partitioned by backend name, model, dimension and precision
+        self.cache_namespace = backend_namespace(backend, self.storage_dtype)
+
+        # Legacy JSON cache (migrated once into the binary cache)
         self.cache_file = self.cache_dir / "embedding_cache.json"
         self.cache = self._load_cache()
 
-        logger.info(f"Embedding service initialized with model: {self.model}")
-
-    def _load_cache(self) -> Dict[str, List[float]]:
-        """Load embedding cache from disk."""
-        if self.cache_file.exists():
+        logger.info(f"Embedding service initialized with backend: {backend.name}, "
+                    f"model: {self.model}, dimensions: {self.dimensions}, storage: {self.storage_dtype}")
+
+    @property
+    def supports_batch_api(self) -> bool:
+        """Whether large jobs can be sent to the OpenAI Batch API."""
+        return isinstance(self.backend, OpenAIEmbeddingBackend)
+
+    def _is_legacy_namespace(self) -> bool:
+        """Unnamespaced caches were always produced by OpenAI text-embedding-3-small at 1536 dims."""
+        return (self.backend.name == "openai" and self.model == "text-embedding-3-small"
+                and self.dimensions == 1536 and self.storage_dtype == "float32")
+
+    def _load_cache(self) -> EmbeddingCache:
+        """Open the namespaced binary cache, migrating legacy caches if present."""
+        if self._is_legacy_namespace():
+            # Binary cache written before namespacing
+            legacy_prefix = self.cache_dir / "embeddings"
+            target_header = self.cache_dir / f"{self.cache_namespace}.json"
+            if Path(f"{legacy_prefix}.json").exists() and not target_header.exists():
+                for suffix in (".vec", ".idx", ".json"):
+                    legacy_file = Path(f"{legacy_prefix}{suffix}")
+                    if legacy_file.exists():
+                        legacy_file.rename(self.cache_dir / f"{self.cache_namespace}{suffix}")
+                logger.info(f"Renamed legacy embedding cache to namespace {self.cache_namespace}")
+
+        cache = EmbeddingCache(str(self.cache_dir), name=self.cache_namespace, dtype=self.storage_dtype)
+
+        if self.cache_file.exists() and self._is_legacy_namespace():
             try:
-                with open(self.cache_file, 'r') as f:
-                    cache = json.load(f)
-                logger.info(f"Loaded {len(cache)} cached embeddings")
-                return cache
+                migrate_json_cache(str(self.cache_file), cache)
             except Exception as e:
-                logger.error(f"Error loading cache: {e}")
-                return {}
-        return {}
+                logger.error(f"Error migrating legacy JSON cache: {e}")
+        return cache
 
     def _save_cache(self):
-        """Save embedding cache to disk."""
+        """Flush buffered cache writes to disk (appends only, never a full rewrite)."""
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f)
-            logger.debug(f"Saved {len(self.cache)} embeddings to cache")
+            self.cache.flush()
+            logger.debug(f"Flushed embedding cache ({len(self.cache)} embeddings)")
         except Exception as e:
             logger.error(f"Error saving cache: {e}")
 
@@ -112,7 +209,7 @@ class EmbeddingService:
             use_cache: Whether to use cache
 
         Returns:
-            Embedding vector (1536 dimensions)
+            Embedding vector (backend dimension, 1536 for OpenAI default)
         """
         # Check cache
         text_hash = self._text_hash(text)
@@ -124,11 +221,7 @@ class EmbeddingService:
 
         # Generate embedding
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=text
-            )
-            embedding = response.data[0].embedding
+            embedding = self._embed_request([text])[0]
 
             # Cache result
             if use_cache:
@@ -142,7 +235,8 @@ class EmbeddingService:
             logger.error(f"Error generating embedding: {e}")
             raise
 
-    def embed_batch(self, texts: List[str], use_cache: bool = True) -> Dict[str, List[float]]:
+    def embed_batch(self, texts: List[str], use_cache: bool = True,
+                    allow_batch_api: bool = True) -> Dict[str, List[float]]:
         """
         Generate embeddings for multiple texts.
 
@@ -152,6 +246,8 @@ class EmbeddingService:
         Args:
             texts: List of texts to embed
             use_cache: Whether to use cache
+            allow_batch_api: Set False to force the direct API (e.g. when
+                applying a finished batch whose output had failed lines)
 
         Returns:
             Dict mapping text hash to embedding vector
@@ -191,19 +287,13 @@ class EmbeddingService:
         logger.info(f"Generating embeddings for {len(uncached_texts)} texts (cache hits: {len(results)})")
         sys.stdout.flush()
 
-        # Check if Flask app context is available to get threshold from config
-        try:
-            from flask import current_app
-            batch_threshold = current_app.config.get('CHATBOT_BATCH_THRESHOLD', 500)
-        except:
-            # Fallback if not in Flask context
-            batch_threshold = 500
+        batch_threshold = get_setting('CHATBOT_BATCH_THRESHOLD', 500)
 
         logger.info(f"Batch API threshold: {batch_threshold}, uncached texts: {len(uncached_texts)}")
         sys.stdout.flush()
 
         # Use direct API for batches below threshold
-        if len(uncached_texts) < batch_threshold:
+        if len(uncached_texts) < batch_threshold or not allow_batch_api or not self.supports_batch_api:
             return self._embed_direct(uncached_texts, uncached_hashes, results, use_cache)
 
         # Use Batch API for large batches (50% discount)
@@ -213,89 +303,108 @@ class EmbeddingService:
 
     def _embed_direct(self, texts: List[str], hashes: List[str],
                      results: Dict[str, List[float]], use_cache: bool) -> Dict[str, List[float]]:
-        """Generate embeddings using direct API (for batches below threshold)."""
+        """
+        Generate embeddings using direct API (for batches below threshold).
+
+        Texts are packed into requests by token budget and item limit, then
+        sent over a bounded thread pool. Each finished pack is written to the
+        cache immediately, so an interrupted run resumes from the cache.
+        """
         import sys
-        import tiktoken
 
         logger.info(f"_embed_direct: Generating {len(texts)} embeddings via direct API...")
         sys.stdout.flush()
 
-        try:
-            # OpenAI API limits: 2048 texts AND 300K tokens per request
-            # Split into chunks if needed
-            encoding = tiktoken.get_encoding("cl100k_base")
-
-            # Calculate total tokens to determine if we need to split
-            total_tokens = sum(len(encoding.encode(text)) for text in texts)
-            logger.info(f"Total tokens in batch: {total_tokens:,}")
-            sys.stdout.flush()
+        max_tokens = int(get_setting('CHATBOT_EMBED_MAX_TOKENS_PER_REQUEST', MAX_TOKENS_PER_REQUEST))
+        max_items = int(get_setting('CHATBOT_EMBED_MAX_ITEMS_PER_REQUEST', MAX_ITEMS_PER_REQUEST))
+        max_workers = int(get_setting('CHATBOT_EMBED_WORKERS', 4))
+        max_retries = int(get_setting('CHATBOT_EMBED_MAX_RETRIES', 3))
 
-            # If under 250K tokens (safe buffer), send in one call
-            if total_tokens <= 250000:
-                logger.info(f"Calling OpenAI embeddings API with {len(texts)} texts ({total_tokens:,} tokens)...")
-                sys.stdout.flush()
+        token_counts = self._count_tokens(texts)
+        packs = pack_by_token_budget(token_counts, max_tokens=max_tokens, max_items=max_items)
 
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=texts
-                )
-
-                logger.info(f"Received response from OpenAI API")
-                sys.stdout.flush()
+        logger.info(f"Packed {len(texts)} texts ({sum(token_counts):,} tokens) into {len(packs)} requests "
+                    f"(max {max_tokens:,} tokens / {max_items} texts, {min(max_workers, len(packs))} workers)")
+        sys.stdout.flush()
 
-                for i, embedding_obj in enumerate(response.data):
-                    embedding = embedding_obj.embedding
-                    text_hash = hashes[i]
-                    results[text_hash] = embedding
+        generated = 0
 
-                    # Cache
-                    if use_cache:
-                        self.cache[text_hash] = embedding
+        def store(pack: List[int], embeddings: List[List[float]]):
+            nonlocal generated
+            for idx, embedding in zip(pack, embeddings):
+                results[hashes[idx]] = embedding
+                if use_cache:
+                    self.cache[hashes[idx]] = embedding
+            if use_cache:
+                self._save_cache()
+            generated += len(pack)
 
+        try:
+            if len(packs) == 1 or max_workers <= 1:
+                for pack_idx, pack in enumerate(packs, 1):
+                    embeddings = self._embed_request([texts[i] for i in pack], max_retries)
+                    store(pack, embeddings)
+                    logger.info(f"API call {pack_idx}/{len(packs)}: {len(pack)} texts done")
             else:
-                # Split into multiple API calls
-                logger.info(f"Batch exceeds 250K tokens, splitting into multiple API calls...")
-                sys.stdout.flush()
-
-                chunk_size = 100  # Process 100 texts at a time
-                num_chunks = (len(texts) + chunk_size - 1) // chunk_size
-
-                logger.info(f"Splitting {len(texts)} texts into {num_chunks} API calls")
-                sys.stdout.flush()
-
-                for chunk_idx in range(num_chunks):
-                    start = chunk_idx * chunk_size
-                    end = min(start + chunk_size, len(texts))
-
-                    chunk_texts = texts[start:end]
-                    chunk_hashes = hashes[start:end]
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(packs)),
+                                        thread_name_prefix="EmbedWorker") as executor:
+                    futures = {
+                        executor.submit(self._embed_request, [texts[i] for i in pack], max_retries): pack
+                        for pack in packs
+                    }
+                    try:
+                        for completed, future in enumerate(as_completed(futures), 1):
+                            pack = futures[future]
+                            store(pack, future.result())
+                            logger.info(f"API call {completed}/{len(packs)}: {len(pack)} texts done "
+                                        f"({generated}/{len(texts)})")
+                            sys.stdout.flush()
+                    except Exception:
+                        for future in futures:
+                            future.cancel()
+                        raise
+
+            logger.info(f"Generated {generated} new embeddings via direct API")
+            return results
 
-                    logger.info(f"API call {chunk_idx + 1}/{num_chunks}: {len(chunk_texts)} texts")
-                    sys.stdout.flush()
+        except Exception as e:
+            logger.error(f"Error in batch embedding after {generated}/{len(texts)} texts: {e}")
+            raise
 
-                    response = self.client.embeddings.create(
-                        model=self.model,
-                        input=chunk_texts
-                    )
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        """Token counts used for request packing (estimated for local backends)."""
+        if not self.supports_batch_api:
+            # Local backends have no request token limit; avoid loading tiktoken offline
+            return [max(1, len(text) // 4) for text in texts]
 
-                    for i, embedding_obj in enumerate(response.data):
-                        embedding = embedding_obj.embedding
-                        text_hash = chunk_hashes[i]
-                        results[text_hash] = embedding
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
 
-                        # Cache
-                        if use_cache:
-                            self.cache[text_hash] = embedding
+    def _embed_request(self, texts: List[str], max_retries: int = 3) -> List[List[float]]:
+        """
+        Embed one request-sized group via the backend, retrying transient failures.
 
-            if use_cache:
-                self._save_cache()
+        Args:
+            texts: Texts for a single request
+            max_retries: Retries after the first attempt
 
-            logger.info(f"Generated {len(results) - len([h for h in hashes if h in results and results[h]])} new embeddings via direct API")
-            return results
+        Returns:
+            Embeddings in input order
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.backend.embed(texts).tolist()
 
-        except Exception as e:
-            logger.error(f"Error in batch embedding: {e}")
-            raise
+            except RETRYABLE_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                attempt += 1
+                logger.warning(f"Embedding request failed ({type(e).__name__}), "
+                               f"retry {attempt}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
 
     def _embed_batch_api(self, texts: List[str], hashes: List[str],
                         results: Dict[str, List[float]], use_cache: bool) -> Dict[str, List[float]]:
@@ -319,7 +428,7 @@ class EmbeddingService:
                         "method": "POST",
                         "url": "/v1/embeddings",
                         "body": {
-                            "model": self.model,
+                            **self.backend.request_params(),
                             "input": text
                         }
                     }
@@ -345,7 +454,8 @@ class EmbeddingService:
                 id=batch.id,
                 status=batch.status,
                 input_file_id=batch_input_file.id,
-                created_at=batch.created_at
+                created_at=batch.created_at,
+                request_count=len(texts)
             )
 
             logger.info(f"Batch job created: {batch_job.id}")
@@ -364,6 +474,69 @@ class EmbeddingService:
             if batch_file_path.exists():
                 batch_file_path.unlink()
 
+    def get_batch_status(self, batch_id: str) -> BatchJob:
+        """
+        Fetch current status of a Batch API job.
+
+        Args:
+            batch_id: Batch job ID
+
+        Returns:
+            BatchJob with latest status and file IDs
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        return BatchJob(
+            id=batch.id,
+            status=batch.status,
+            input_file_id=batch.input_file_id,
+            output_file_id=batch.output_file_id,
+            error_file_id=batch.error_file_id,
+            created_at=batch.created_at,
+            completed_at=batch.completed_at
+        )
+
+    def collect_batch_results(self, batch_job: BatchJob) -> Dict[str, List[float]]:
+        """
+        Download a completed batch's output and store embeddings in the cache.
+
+        Args:
+            batch_job: Completed batch job (must have output_file_id)
+
+        Returns:
+            Dict mapping text hash to embedding vector
+        """
+        results = {}
+        failed = 0
+
+        if not batch_job.output_file_id:
+            logger.warning(f"Batch {batch_job.id} completed without an output file")
+            return results
+
+        output_file = self.client.files.content(batch_job.output_file_id)
+        output_data = output_file.read().decode('utf-8')
+
+        for line in output_data.strip().split('\n'):
+            if not line:
+                continue
+            result = json.loads(line)
+            custom_id = result['custom_id']  # text hash
+            response = result.get('response') or {}
+
+            if result.get('error') or response.get('status_code') != 200:
+                failed += 1
+                continue
+
+            embedding = response['body']['data'][0]['embedding']
+            results[custom_id] = embedding
+            self.cache[custom_id] = embedding
+
+        self._save_cache()
+
+        if failed:
+            logger.warning(f"Batch {batch_job.id}: {failed} requests failed (will be embedded directly on apply)")
+        logger.info(f"Retrieved {len(results)} embeddings from batch {batch_job.id}")
+        return results
+
     def wait_for_batch(self, batch_id: str, timeout: int = 3600, poll_interval: int = 30) -> Dict[str, List[float]]:
         """
         Wait for batch job to complete and retrieve results.
@@ -377,45 +550,24 @@ class EmbeddingService:
             Dict mapping text hash to embedding vector
         """
         start_time = time.time()
-        results = {}
 
         logger.info(f"Waiting for batch {batch_id} to complete...")
 
         while time.time() - start_time < timeout:
             try:
-                # Check batch status
-                batch = self.client.batches.retrieve(batch_id)
+                batch_job = self.get_batch_status(batch_id)
 
-                if batch.status == "completed":
+                if batch_job.status == "completed":
                     logger.info(f"Batch {batch_id} completed!")
+                    return self.collect_batch_results(batch_job)
 
-                    # Download results
-                    if batch.output_file_id:
-                        output_file = self.client.files.content(batch.output_file_id)
-                        output_data = output_file.read().decode('utf-8')
-
-                        # Parse results
-                        for line in output_data.strip().split('\n'):
-                            result = json.loads(line)
-                            custom_id = result['custom_id']  # text hash
-                            embedding = result['response']['body']['data'][0]['embedding']
-                            results[custom_id] = embedding
-
-                            # Cache
-                            self.cache[custom_id] = embedding
-
-                        self._save_cache()
-                        logger.info(f"Retrieved {len(results)} embeddings from batch")
-
-                    return results
-
-                elif batch.status in ["failed", "cancelled", "expired"]:
-                    error_msg = f"Batch {batch_id} failed with status: {batch.status}"
+                elif batch_job.status in BATCH_FAILED_STATUSES:
+                    error_msg = f"Batch {batch_id} failed with status: {batch_job.status}"
                     logger.error(error_msg)
                     raise RuntimeError(error_msg)
 
                 # Still in progress
-                logger.debug(f"Batch status: {batch.status} (elapsed: {int(time.time() - start_time)}s)")
+                logger.debug(f"Batch status: {batch_job.status} (elapsed: {int(time.time() - start_time)}s)")
                 time.sleep(poll_interval)
 
             except Exception as e:
@@ -428,6 +580,11 @@ class EmbeddingService:
         """Get embedding service statistics."""
         return {
             "cache_size": len(self.cache),
+            "cache": self.cache.stats(),
+            "backend": self.backend.name,
             "model": self.model,
+            "dimensions": self.dimensions,
+            "storage_dtype": self.storage_dtype,
+            "cache_namespace": self.cache_namespace,
             "cache_dir": str(self.cache_dir)
         }
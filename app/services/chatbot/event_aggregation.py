@@ -0,0 +1,121 @@
+"""
+Event-level Aggregation of Retrieval Hits for DR Knowledge Chatbot.
+
+DataProcessor.chunk_events splits long events into overlapping 512-token
+chunks, so a query about one event often retrieves several of its chunks.
+Scored and sent to the LLM separately they cost extra cross-encoder pairs
+and repeat the overlapping text in the prompt. RetrievalService therefore:
+
+    1. collapse_by_event()    keeps one hit per event (its best chunk, in
+                              retrieval order), so the re-ranker scores
+                              each event once;
+    2. reconstitute_events()  replaces the text of the final multi-chunk
+                              hits with the whole event, rebuilt from all of
+                              its chunks with the overlaps removed.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from app.services.chatbot.vector_store import BaseVectorStore, SearchResult
+
+logger = logging.getLogger(__name__)
+
+# Characters of the next chunk used to locate the overlap in the previous one
+OVERLAP_PROBE_CHARS = 32
+
+
+def event_key(result: SearchResult) -> str:
+    """Event a hit belongs to (chunk IDs are "{event_id}_{chunk_index}")."""
+    event_id = result.metadata.get('event_id')
+    return str(event_id) if event_id is not None else result.id.rsplit("_", 1)[0]
+
+
+def collapse_by_event(results: List[SearchResult]) -> List[SearchResult]:
+    """
+    Keep the first (best) hit of each event, in retrieval order.
+
+    The kept hit carries the best semantic score of its event's chunks and
+    'matched_chunks', the chunk indexes that were retrieved.
+
+    Args:
+        results: Retrieval candidates, best first
+
+    Returns:
+        One hit per event
+    """
+    collapsed: Dict[str, SearchResult] = {}
+    for result in results:
+        key = event_key(result)
+        chunk_index = result.metadata.get('chunk_index', 0)
+        leader = collapsed.get(key)
+        if leader is None:
+            result.metadata = dict(result.metadata, matched_chunks=[chunk_index])
+            collapsed[key] = result
+            continue
+
+        leader.metadata['matched_chunks'].append(chunk_index)
+        if result.semantic_score is not None and (leader.semantic_score is None
+                                                  or result.semantic_score > leader.semantic_score):
+            leader.semantic_score = result.semantic_score
+
+    if len(collapsed) < len(results):
+        logger.debug(f"Collapsed {len(results)} hits into {len(collapsed)} events")
+    return list(collapsed.values())
+
+
+def merge_chunk_texts(texts: List[str]) -> str:
+    """
+    Join consecutive overlapping chunk texts into one text.
+
+    Each chunk starts with the last tokens of the previous one; the overlap
+    is found by locating the start of the next chunk in the tail of the
+    text so far. Chunks that do not overlap are joined with a newline.
+    """
+    merged = texts[0] if texts else ""
+    for text in texts[1:]:
+        probe = text[:OVERLAP_PROBE_CHARS]
+        position = merged.rfind(probe) if probe else -1
+        while position >= 0 and not text.startswith(merged[position:]):
+            position = merged.rfind(probe, 0, position + len(probe) - 1)
+        if position >= 0:
+            merged += text[len(merged) - position:]
+        else:
+            merged += "\n" + text
+    return merged
+
+
+def reconstitute_events(results: List[SearchResult], vector_store: Optional[BaseVectorStore]) -> List[SearchResult]:
+    """
+    Give multi-chunk hits the full text of their event.
+
+    Missing sibling chunks are fetched with one get_documents() call; if the
+    store cannot return them, the text is left as the retrieved chunk.
+
+    Args:
+        results: Final hits (one per event)
+        vector_store: Store holding the sibling chunks
+
+    Returns:
+        The same hits, texts replaced in place
+    """
+    wanted = {}
+    for result in results:
+        total_chunks = int(result.metadata.get('total_chunks', 1) or 1)
+        if total_chunks > 1:
+            event_id = result.id.rsplit("_", 1)[0]
+            wanted[result.id] = [f"{event_id}_{index}" for index in range(total_chunks)]
+    if not wanted or vector_store is None:
+        return results
+
+    try:
+        chunks = {chunk.id: chunk.text for chunk in
+                  vector_store.get_documents([chunk_id for ids in wanted.values() for chunk_id in ids])}
+    except NotImplementedError:
+        return results
+
+    for result in results:
+        chunk_ids = wanted.get(result.id)
+        if chunk_ids and all(chunk_id in chunks for chunk_id in chunk_ids):
+            result.text = merge_chunk_texts([chunks[chunk_id] for chunk_id in chunk_ids])
+    return results
@@ -0,0 +1,183 @@
+"""
+Metadata Facet Index for DR Knowledge Chatbot.
+
+Inverted indexes from facet terms to rows, built at ingest so that query
+filters extracted by QueryProcessor (hazard, location) narrow the candidate
+set before any vector is scored.
+
+Facets (terms are lowercase tokens, see bm25_index.tokenize):
+- hazard:   tokens of hazard_normalized ("yellow fever" -> yellow, fever)
+- location: tokens of the reported location ("United States" -> united, states)
+- section:  the section value
+- year:     the event year
+
+A facet condition matches a row when the row has every term of the
+condition, e.g. location_contains "united states" matches "United States of
+America" but not "United Kingdom".
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.services.chatbot.bm25_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+FACETS = ("hazard", "location", "section", "year")
+
+# Metadata keys marking facet terms in engines that index metadata themselves (ChromaDB).
+# ChromaDB metadata values must be scalars, so each term is its own boolean key
+# (facet_location_canada: True) matched with $eq.
+FACET_METADATA_PREFIX = "facet_"
+
+# Stored in the collection metadata once its chunks carry this encoding
+# (True marked the earlier list-valued encoding, which is backfilled again)
+FACET_METADATA_VERSION = 2
+
+
+def facet_terms(metadata: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Facet terms of one chunk.
+
+    Args:
+        metadata: Chunk metadata
+
+    Returns:
+        Dict of facet -> sorted distinct terms (facets without terms omitted)
+    """
+    terms = {
+        "hazard": tokenize(str(metadata.get("hazard_normalized") or metadata.get("hazard") or "")),
+        "location": tokenize(str(metadata.get("location") or "")),
+        "section": [str(metadata["section"]).strip().lower()] if metadata.get("section") else [],
+        "year": [],
+    }
+
+    if metadata.get("date"):
+        terms["year"] = [str(metadata["date"])[:4]]
+    elif metadata.get("date_unix") is not None:
+        terms["year"] = [str(datetime.fromtimestamp(metadata["date_unix"]).year)]
+
+    return {facet: sorted(set(values)) for facet, values in terms.items() if values}
+
+
+def query_terms(facet: str, value: Any) -> List[str]:
+    """Terms a filter value must match (same normalization as facet_terms)."""
+    if facet in ("hazard", "location"):
+        return sorted(set(tokenize(str(value))))
+    return [str(value).strip().lower()]
+
+
+def facet_key(facet: str, term: str) -> str:
+    """Metadata key marking that a chunk has a facet term."""
+    return f"{FACET_METADATA_PREFIX}{facet}_{term}"
+
+
+def facet_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata with one boolean facet_key() per facet term added."""
+    enriched = dict(metadata)
+    for facet, terms in facet_terms(metadata).items():
+        for term in terms:
+            enriched[facet_key(facet, term)] = True
+    return enriched
+
+
+def strip_facet_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Metadata without facet term keys."""
+    return {key: value for key, value in (metadata or {}).items()
+            if not key.startswith(FACET_METADATA_PREFIX)}
+
+
+class FacetIndex:
+    """
+    Row postings per (facet, term), stored as one concatenated int32 array.
+
+    postings[facet][term] = (start, end) slice of rows
+    """
+
+    def __init__(self, postings: Dict[str, Dict[str, List[int]]], rows: np.ndarray, n_rows: int):
+        self.postings = postings
+        self.rows = rows
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, metadatas: Iterable[Dict[str, Any]]) -> "FacetIndex":
+        """Index metadata dicts as rows 0..n-1."""
+        builder = FacetIndexBuilder()
+        for metadata in metadatas:
+            builder.add(metadata)
+        return builder.finish()
+
+    def term_rows(self, facet: str, term: str) -> np.ndarray:
+        """Rows having a term (ascending)."""
+        span = self.postings.get(facet, {}).get(term)
+        if span is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.rows[span[0]:span[1]]
+
+    def mask(self, conditions: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Boolean row mask for facet conditions (every term of every facet).
+
+        Args:
+            conditions: Dict of facet -> required terms
+
+        Returns:
+            Boolean array of length n_rows
+        """
+        mask = np.ones(self.n_rows, dtype=bool)
+        for facet, terms in conditions.items():
+            for term in terms:
+                term_mask = np.zeros(self.n_rows, dtype=bool)
+                term_mask[self.term_rows(facet, term)] = True
+                mask &= term_mask
+        return mask
+
+    def save(self, directory: Path) -> None:
+        """Write facets.json and facet_rows.npy."""
+        np.save(directory / "facet_rows.npy", self.rows)
+        with open(directory / "facets.json", 'w') as f:
+            json.dump({"n_rows": self.n_rows, "postings": self.postings}, f)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (directory / "facets.json").exists()
+
+    @classmethod
+    def load(cls, directory: Path) -> "FacetIndex":
+        """Load a saved index (rows memory-mapped)."""
+        with open(directory / "facets.json", 'r') as f:
+            data = json.load(f)
+        rows = np.load(directory / "facet_rows.npy", mmap_mode='r' if data["n_rows"] else None)
+        return cls(data["postings"], rows, data["n_rows"])
+
+
+class FacetIndexBuilder:
+    """Accumulates postings row by row (used while a generation is streamed to disk)."""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, List[int]]] = {facet: {} for facet in FACETS}
+        self._row = 0
+
+    def add(self, metadata: Dict[str, Any]) -> None:
+        for facet, terms in facet_terms(metadata).items():
+            for term in terms:
+                self._postings[facet].setdefault(term, []).append(self._row)
+        self._row += 1
+
+    def finish(self) -> FacetIndex:
+        postings: Dict[str, Dict[str, List[int]]] = {}
+        parts = []
+        offset = 0
+        for facet, terms in self._postings.items():
+            postings[facet] = {}
+            for term, rows in sorted(terms.items()):
+                postings[facet][term] = [offset, offset + len(rows)]
+                parts.append(np.asarray(rows, dtype=np.int32))
+                offset += len(rows)
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        return FacetIndex(postings, rows, self._row)
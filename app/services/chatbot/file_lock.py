@@ -0,0 +1,57 @@
+"""
+Cross-process File Locks for DR Knowledge Chatbot.
+
+gunicorn workers, the batch poller and the CLI scripts share the files
+under app/data/chatbot. Writers serialize on an flock()ed lock file next to
+the data they change; on platforms without fcntl the locks are no-ops
+(single-process use only).
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    """
+    Hold an flock on path (created if missing) for the duration of the block.
+
+    Args:
+        path: Lock file
+        shared: Take a shared (reader) lock instead of an exclusive one
+    """
+    with open(path, 'a') as lock_fh:
+        if fcntl is not None:
+            fcntl.flock(lock_fh, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+
+def try_exclusive_lock(path: Path) -> Optional[IO]:
+    """
+    Take an exclusive flock on path without waiting.
+
+    The lock is held until the returned handle is closed (or the process
+    exits), which makes it suitable for electing one process among workers.
+
+    Returns:
+        Open lock file handle, or None if another process holds the lock
+    """
+    lock_fh = open(path, 'a')
+    if fcntl is None:
+        return lock_fh
+    try:
+        fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_fh.close()
+        return None
+    return lock_fh
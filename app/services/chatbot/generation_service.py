@@ -13,20 +13,15 @@ from datetime import datetime
 from openai import OpenAI
 
 from app.services.chatbot.retrieval_service import RetrievalResult
+from app.services.chatbot.context_packer import ContextPacker, PackedContext
+from app.services.chatbot.settings import get_setting
+from app.prompt_cache import PromptLayout, get_prompt_cache_stats
 
 logger = logging.getLogger(__name__)
 
 
-def get_system_prompt() -> str:
-    """Generate system prompt with current date."""
-    today = datetime.now().strftime('%B %d, %Y')
-    current_year = datetime.now().year
-
-    logger.info(f"Generating system prompt with date: {today}, year: {current_year}")
-
-    return f"""You are Gerardo, and you help analysts with historical epidemiological data.
-
-**IMPORTANT: Today's Date is {today}. The current year is {current_year}.**
+# Static system prompt: no per-request or per-day content, so it stays a cacheable prefix
+SYSTEM_PROMPT = """You are Gerardo, and you help analysts with historical epidemiological data.
 
 **Your Role:**
 - Help analysts find and understand historical disease outbreak data
@@ -44,8 +39,8 @@ def get_system_prompt() -> str:
 - Include full event details inline within your narrative response
 
 **Handling Ambiguous Queries:**
-- **CRITICAL:** When a date query mentions a month without a year (e.g., "October", "reports in May"), you MUST assume the current year {current_year}, NOT any other year
-- Always explicitly state the year in your response (e.g., "For October {current_year}..." not "For October 2024...")
+- **CRITICAL:** When a date query mentions a month without a year (e.g., "October", "reports in May"), you MUST assume the current year given with today's date, NOT any other year
+- Always explicitly state the year in your response (e.g., "For October <current year>..." not "For October 2024...")
 - If a query could have multiple interpretations, briefly clarify your assumption
 - If critical information is missing for an accurate response, politely ask for clarification
 
@@ -76,6 +71,20 @@ When mentioning an event, include ALL available details inline:
 Remember: You are a helpful assistant providing accurate, evidence-based information to public health professionals."""
 
 
+def get_date_guidelines() -> str:
+    """Guidelines with the current date (the same for every request of a day)."""
+    today = datetime.now().strftime('%B %d, %Y')
+    current_year = datetime.now().year
+
+    return (f"**IMPORTANT: Today's Date is {today}. The current year is {current_year}.**\n"
+            f"A month mentioned without a year refers to {current_year}.")
+
+
+def get_prompt_layout() -> PromptLayout:
+    """Chatbot prompt layout: static prompt, dated guidelines, history, query and context."""
+    return PromptLayout(tool='chatbot', system=SYSTEM_PROMPT, guidelines=get_date_guidelines())
+
+
 class GenerationService:
     """Generate conversational responses using GPT-4o."""
 
@@ -95,6 +104,12 @@ class GenerationService:
         self.temperature = 0.1  # Very deterministic for factual queries
         self.max_tokens = 2000
 
+        # Retrieved events are packed into a fixed prompt token budget
+        self.context_packer = ContextPacker(
+            budget_tokens=int(get_setting('CHATBOT_CONTEXT_TOKEN_BUDGET', 6000)),
+            max_doc_tokens=int(get_setting('CHATBOT_CONTEXT_MAX_DOC_TOKENS', 1500))
+        )
+
         logger.info(f"Generation service initialized with model: {self.model}")
 
     def generate_response(
@@ -114,17 +129,8 @@ class GenerationService:
         Returns:
             Dict with 'response', 'sources', and 'metadata'
         """
-        # Build conversation messages
-        messages = [
-            {"role": "system", "content": get_system_prompt()}
-        ]
-
-        # Add conversation history (last 5 turns)
-        if conversation_history:
-            messages.extend(conversation_history[-10:])  # Last 5 user + 5 assistant
-
         # Format retrieved context
-        context = self._format_context_with_full_details(retrieved_docs)
+        packed = self._pack_context(retrieved_docs)
 
         # Add current query with context
         user_message = f"""<query>
@@ -132,12 +138,14 @@ class GenerationService:
 </query>
 
 <retrieved_database_context>
-{context}
+{packed.text}
 </retrieved_database_context>
 
 Based ONLY on the above database context, please answer the query. Remember to include full event details (Event ID, date, location, summary, cases, deaths, sources) inline in your conversational response."""
 
-        messages.append({"role": "user", "content": user_message})
+        # Static prompt first, then history (bounded by RAGOrchestrator's HistoryCompactor), then the query
+        layout = get_prompt_layout()
+        messages = layout.messages(user_message, conversation_history)
 
         # Generate response
         try:
@@ -145,7 +153,8 @@ Based ONLY on the above database context, please answer the query. Remember to i
                 model=self.model,
                 messages=messages,
                 temperature=self.temperature,
-                max_tokens=self.max_tokens
+                max_tokens=self.max_tokens,
+                **layout.request_options()
             )
 
             assistant_message = response.choices[0].message.content
@@ -162,7 +171,9 @@ Based ONLY on the above database context, please answer the query. Remember to i
                 'metadata': {
                     'model': self.model,
                     'timestamp': datetime.now().isoformat(),
-                    'tokens_used': response.usage.total_tokens
+                    'tokens_used': response.usage.total_tokens,
+                    'cached_tokens': get_prompt_cache_stats().record(layout.tool, response.usage),
+                    **self._context_metadata(packed)
                 }
             }
 
@@ -172,32 +183,43 @@ Based ONLY on the above database context, please answer the query. Remember to i
                 'response': f"I apologize, but I encountered an error generating a response: {str(e)}",
                 'sources': [],
                 'retrieved_count': len(retrieved_docs),
-                'metadata': {'error': str(e)}
+                'metadata': {'error': str(e), **self._context_metadata(packed)}
             }
 
-    def _format_context_with_full_details(self, docs: List[RetrievalResult]) -> str:
-        """Format retrieved documents with complete event details."""
-        context_parts = []
+    def _format_event(self, doc: RetrievalResult, text: str) -> str:
+        """Format one retrieved document with complete event details."""
+        meta = doc.metadata
 
-        for i, doc in enumerate(docs, 1):
-            meta = doc.metadata
-
-            # Extract event details from metadata and text
-            event_id = meta.get('event_id', 'unknown')
-            date = meta.get('date', 'Unknown')
-            location = meta.get('location', 'Unknown')
-            hazard = meta.get('hazard', 'Unknown')
-
-            context_parts.append(f"=== Event #{event_id}: {hazard} ===\n")
-            context_parts.append(f"Date: {date}\n")
-            context_parts.append(f"Location: {location}\n")
+        # Extract event details from metadata and text
+        event_id = meta.get('event_id', 'unknown')
+        date = meta.get('date', 'Unknown')
+        location = meta.get('location', 'Unknown')
+        hazard = meta.get('hazard', 'Unknown')
 
+        context_parts = [
+            f"=== Event #{event_id}: {hazard} ===\n",
+            f"Date: {date}\n",
+            f"Location: {location}\n",
             # Include full text (contains summary and references)
-            context_parts.append(f"\nFull Event Details:\n{doc.text}\n")
-            context_parts.append("\n" + "="*60 + "\n\n")
-
+            f"\nFull Event Details:\n{text}\n",
+            "\n" + "="*60 + "\n\n"
+        ]
         return "".join(context_parts)
 
+    def _pack_context(self, docs: List[RetrievalResult]) -> PackedContext:
+        """Format retrieved documents within the context token budget."""
+        return self.context_packer.pack(docs, self._format_event)
+
+    @staticmethod
+    def _context_metadata(packed: PackedContext) -> Dict:
+        """Packing statistics reported in the response metadata."""
+        return {
+            'context_tokens': packed.token_count,
+            'context_documents': len(packed.documents),
+            'context_trimmed': packed.trimmed,
+            'context_dropped': packed.dropped
+        }
+
     def _extract_event_ids(self, response: str) -> List[str]:
         """Extract Event IDs mentioned in response (e.g., #00123)."""
         import re
@@ -221,25 +243,25 @@ Based ONLY on the above database context, please answer the query. Remember to i
 
         Yields:
             Response chunks as they're generated
-        """
-        # Build messages (same as generate_response)
-        messages = [{"role": "system", "content": get_system_prompt()}]
-
-        if conversation_history:
-            messages.extend(conversation_history[-10:])
 
-        context = self._format_context_with_full_details(retrieved_docs)
+        Raises:
+            Exception: If the API call fails (so callers do not mistake the
+                error for answer text)
+        """
+        packed = self._pack_context(retrieved_docs)
         user_message = f"""<query>
 {query}
 </query>
 
 <retrieved_database_context>
-{context}
+{packed.text}
 </retrieved_database_context>
 
 Based ONLY on the above database context, please answer the query with full event details."""
 
-        messages.append({"role": "user", "content": user_message})
+        # Same layout as generate_response
+        layout = get_prompt_layout()
+        messages = layout.messages(user_message, conversation_history)
 
         # Stream response
         try:
@@ -248,13 +270,18 @@ Based ONLY on the above database context, please answer the query with full even
                 messages=messages,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
-                stream=True
+                stream=True,
+                stream_options={"include_usage": True},
+                **layout.request_options()
             )
 
             for chunk in stream:
-                if chunk.choices[0].delta.content:
+                # The final chunk carries the usage and no choices
+                if chunk.usage is not None:
+                    get_prompt_cache_stats().record(layout.tool, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
 
         except Exception as e:
             logger.error(f"Error in streaming response: {e}")
-            yield f"Error: {str(e)}"
+            raise
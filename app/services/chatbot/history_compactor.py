@@ -0,0 +1,110 @@
+"""
+Token-budgeted Conversation History for DR Knowledge Chatbot.
+
+GenerationService used to resend the last 10 history messages verbatim.
+Assistant answers quote whole events, so a few turns could outweigh the
+retrieved context. HistoryCompactor bounds the history by tokens before it
+reaches GenerationService:
+
+    - the newest messages are kept whole while they fit the budget (and at
+      most max_messages of them);
+    - if even the newest message does not fit, it is cut to the budget;
+    - older messages are replaced by one short system note listing the
+      questions asked earlier, so follow-ups can still refer to them.
+
+Tokens are counted with the same encoding as ContextPacker.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from app.services.chatbot.context_packer import TOKEN_ENCODING, TRIM_MARKER
+
+logger = logging.getLogger(__name__)
+
+# Earlier questions listed in the note, most recent last
+NOTE_MAX_QUESTIONS = 8
+
+# Characters kept of each earlier question in the note
+NOTE_QUESTION_CHARS = 160
+
+
+def earlier_questions_note(messages: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """System note summarizing dropped messages by the questions asked (None if there were none)."""
+    questions = [m['content'].strip() for m in messages if m.get('role') == 'user'][-NOTE_MAX_QUESTIONS:]
+    if not questions:
+        return None
+    listed = "\n".join(
+        f"- {q[:NOTE_QUESTION_CHARS]}{TRIM_MARKER if len(q) > NOTE_QUESTION_CHARS else ''}" for q in questions
+    )
+    return {
+        'role': 'system',
+        'content': f"Earlier in this conversation (answers omitted), the user asked:\n{listed}"
+    }
+
+
+class HistoryCompactor:
+    """Fit conversation history into a token budget, newest messages first."""
+
+    def __init__(self, budget_tokens: int = 2000, max_messages: int = 10, encoding=None):
+        """
+        Args:
+            budget_tokens: Tokens available for the verbatim history
+            max_messages: Verbatim messages kept at most (last 5 user + 5 assistant)
+            encoding: Object with encode(text)/decode(tokens) (default: tiktoken TOKEN_ENCODING)
+        """
+        self.budget_tokens = budget_tokens
+        self.max_messages = max_messages
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, limit: int) -> str:
+        """Keep the first limit tokens of the text."""
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= limit:
+            return text
+        return self.encoding.decode(tokens[:limit]) + TRIM_MARKER
+
+    def compact(self, history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """
+        Bound the history sent to the model.
+
+        Args:
+            history: {role, content} dicts, oldest first
+
+        Returns:
+            New list: optional note on earlier questions, then the newest messages
+        """
+        if not history:
+            return []
+
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for message in reversed(history[-self.max_messages:]):
+            tokens = self.count_tokens(message['content'])
+            if used + tokens > self.budget_tokens:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+
+        if not kept:
+            newest = history[-1]
+            kept = [dict(newest, content=self.truncate(newest['content'], self.budget_tokens))]
+
+        earlier = history[:len(history) - len(kept)]
+        if not earlier:
+            return kept
+
+        logger.info(f"History compacted: {len(kept)}/{len(history)} messages kept verbatim ({used} tokens)")
+        note = earlier_questions_note(earlier)
+        return ([note] if note else []) + kept
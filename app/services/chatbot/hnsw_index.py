@@ -0,0 +1,145 @@
+"""
+HNSW Index Settings for DR Knowledge Chatbot.
+
+ChromaDB fixes a collection's HNSW parameters when the collection is
+created (collection metadata "hnsw:*"):
+- space:           distance function ("cosine", "ip" or "l2")
+- M:               graph links per node (recall and memory grow with it)
+- construction_ef: candidate list while inserting (build time vs graph quality)
+- search_ef:       candidate list while querying (latency vs recall)
+
+They come from CHATBOT_HNSW_* settings. Collections created with other
+settings (including pre-configuration collections, which ChromaDB built
+with "l2") are rebuilt with scripts/migrate_hnsw_index.py
+(embedding_migration.migrate_hnsw_index). hnsw_benchmark() measures
+recall@k and latency of candidate settings against exact search so the
+fastest setting meeting a recall target can be picked.
+"""
+
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HNSW_SPACES = ("cosine", "ip", "l2")
+
+# ChromaDB's space when a collection was created without "hnsw:space"
+DEFAULT_CHROMA_SPACE = "l2"
+
+
+@dataclass
+class HNSWSettings:
+    """HNSW parameters of one collection."""
+    space: str = "cosine"
+    m: int = 16
+    construction_ef: int = 100
+    search_ef: int = 64
+
+    def __post_init__(self):
+        if self.space not in HNSW_SPACES:
+            raise ValueError(f"Unknown HNSW space: {self.space} (expected one of {', '.join(HNSW_SPACES)})")
+
+    def metadata(self) -> Dict[str, Any]:
+        """Collection metadata keys ChromaDB reads the parameters from."""
+        return {
+            "hnsw:space": self.space,
+            "hnsw:M": self.m,
+            "hnsw:construction_ef": self.construction_ef,
+            "hnsw:search_ef": self.search_ef
+        }
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[Dict[str, Any]]) -> "HNSWSettings":
+        """Settings a collection was created with (ChromaDB defaults for missing keys)."""
+        metadata = metadata or {}
+        return cls(
+            space=metadata.get("hnsw:space", DEFAULT_CHROMA_SPACE),
+            m=int(metadata.get("hnsw:M", 16)),
+            construction_ef=int(metadata.get("hnsw:construction_ef", 100)),
+            search_ef=int(metadata.get("hnsw:search_ef", 10))
+        )
+
+
+def distance_to_score(distance: float, space: str) -> float:
+    """
+    Cosine similarity from a ChromaDB distance over unit vectors.
+
+    Args:
+        distance: Distance returned by a query
+        space: The collection's HNSW space
+
+    Returns:
+        Similarity in [-1, 1], higher is better
+    """
+    if space == "l2":
+        # Squared L2 between unit vectors: |a - b|^2 = 2 - 2 cos
+        return 1.0 - distance / 2.0
+    # cosine: 1 - cos; ip: 1 - a.b (= 1 - cos for unit vectors)
+    return 1.0 - distance
+
+
+def hnsw_benchmark(matrix: np.ndarray, queries: np.ndarray, settings: Sequence[HNSWSettings],
+                   top_k: int = 10, batch_size: int = 5000) -> List[Dict[str, Any]]:
+    """
+    Recall@k and query latency of HNSW settings against exact search.
+
+    Each setting gets a temporary in-memory ChromaDB collection holding the
+    matrix; queries run one at a time, as in chat.
+
+    Args:
+        matrix: Unit vectors to index (n, d)
+        queries: Unit query vectors (m, d)
+        settings: Settings to measure
+        top_k: k for recall@k
+        batch_size: Vectors per insert call
+
+    Returns:
+        One dict per setting with its parameters, recall, p50/p95 latency (ms)
+        and build time (s)
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    matrix = np.asarray(matrix, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    ids = [str(row) for row in range(len(matrix))]
+
+    exact = matrix @ queries.T
+    truth = [set(np.argsort(-exact[:, q], kind='stable')[:top_k].tolist()) for q in range(len(queries))]
+
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    report = []
+    for setting in settings:
+        name = f"bench_{uuid.uuid4().hex[:12]}"
+        collection = client.create_collection(name=name, metadata=setting.metadata())
+
+        start_time = time.perf_counter()
+        for start in range(0, len(matrix), batch_size):
+            collection.add(ids=ids[start:start + batch_size],
+                           embeddings=matrix[start:start + batch_size].tolist())
+        build_seconds = time.perf_counter() - start_time
+
+        times = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start_time = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=top_k, include=[])
+            times.append((time.perf_counter() - start_time) * 1000)
+            hits += len(expected.intersection(int(i) for i in result['ids'][0]))
+
+        report.append({
+            **asdict(setting),
+            "recall": round(hits / max(1, sum(len(t) for t in truth)), 4),
+            "p50_ms": round(float(np.percentile(times, 50)), 3),
+            "p95_ms": round(float(np.percentile(times, 95)), 3),
+            "build_seconds": round(build_seconds, 2)
+        })
+        client.delete_collection(name)
+        logger.info(f"Benchmarked {setting}: recall {report[-1]['recall']}")
+
+    return report
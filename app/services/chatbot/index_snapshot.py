@@ -0,0 +1,209 @@
+"""
+Vector Index Snapshots for DR Knowledge Chatbot.
+
+A snapshot is one file holding everything needed to restore the collection
+without calling the embedding API:
+
+    header.json         format, format_version, created_at, version_id,
+                        count, dimensions, dtype
+    embeddings.npy      (count, dimensions) matrix in the storage dtype
+    ids.json            chunk IDs in row order
+    texts.bin           UTF-8 chunk texts, concatenated
+    text_offsets.npy    byte offsets into texts.bin (count + 1)
+    metadata.json       columnar metadata: {key: [value per row]} (null = absent)
+
+The container is a ZIP archive (embeddings stored uncompressed so they can
+be read straight into an array, text members deflated). Snapshots are
+written by UpdateService after every successful update and restored with
+import_snapshot(), which loads them as a shadow rebuild of any engine.
+"""
+
+import json
+import logging
+import os
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.services.chatbot.vector_store import BaseVectorStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "dr-chatbot-index-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# File suffix of snapshots written next to the Excel backups
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Rows per add_to_rebuild call when importing
+IMPORT_BATCH_SIZE = 2000
+
+
+def export_snapshot(vector_store: BaseVectorStore, path: str, version_id: str = "",
+                    batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Write the live collection to a snapshot file.
+
+    The file is written next to the target and renamed into place, so a
+    failed export never leaves a truncated snapshot behind.
+
+    Args:
+        vector_store: Store to export
+        path: Snapshot file path
+        version_id: Knowledge base version recorded in the header
+        batch_size: Documents per page read from the store
+
+    Returns:
+        The snapshot header
+    """
+    start_time = time.time()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    count = vector_store.count()
+    dtype = np.dtype(vector_store.embedding_dtype)
+    ids: List[str] = []
+    texts: List[bytes] = []
+    metadatas: List[Dict[str, Any]] = []
+    dimensions = 0
+
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', allowZip64=True) as archive:
+            with archive.open("embeddings.npy", 'w', force_zip64=True) as f:
+                for page in vector_store.iter_documents(batch_size=batch_size, include_embeddings=True):
+                    matrix = np.ascontiguousarray(np.asarray(page['embeddings']), dtype=dtype)
+                    if not ids:
+                        dimensions = matrix.shape[1]
+                        np.lib.format.write_array_header_1_0(f, {
+                            'descr': np.lib.format.dtype_to_descr(dtype),
+                            'fortran_order': False,
+                            'shape': (count, dimensions)
+                        })
+                    f.write(matrix.tobytes())
+                    ids.extend(page['ids'])
+                    texts.extend(text.encode('utf-8') for text in page['documents'])
+                    metadatas.extend(page['metadatas'])
+
+                if not ids:
+                    np.lib.format.write_array_header_1_0(f, {
+                        'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (0, 0)
+                    })
+
+            if len(ids) != count:
+                raise RuntimeError(f"Collection changed during export ({len(ids)} rows read, {count} expected)")
+
+            offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(text) for text in texts])
+            keys = sorted({key for metadata in metadatas for key in metadata})
+            columns = {key: [metadata.get(key) for metadata in metadatas] for key in keys}
+
+            header = {
+                "format": SNAPSHOT_FORMAT,
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "created_at": datetime.now().isoformat(),
+                "version_id": version_id,
+                "count": count,
+                "dimensions": dimensions,
+                "dtype": dtype.name
+            }
+
+            with archive.open("text_offsets.npy", 'w') as f:
+                np.lib.format.write_array(f, offsets)
+            archive.writestr("texts.bin", b"".join(texts), compress_type=zipfile.ZIP_DEFLATED)
+            archive.writestr("ids.json", json.dumps(ids), compress_type=zipfile.ZIP_DEFLATED)
+            archive.writestr("metadata.json", json.dumps(columns, ensure_ascii=False),
+                             compress_type=zipfile.ZIP_DEFLATED)
+            archive.writestr("header.json", json.dumps(header, indent=2))
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, path)
+    logger.info(f"Exported snapshot {path.name}: {count} chunks, {dimensions} dims "
+                f"({time.time() - start_time:.1f}s, {path.stat().st_size / 1e6:.1f} MB)")
+    return header
+
+
+def read_snapshot_header(path: str) -> Dict[str, Any]:
+    """
+    Read and check a snapshot header.
+
+    Raises:
+        ValueError: If the file is not a snapshot of a supported format version
+    """
+    try:
+        with zipfile.ZipFile(path, 'r') as archive:
+            header = json.loads(archive.read("header.json"))
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ValueError(f"{path} is not an index snapshot: {e}")
+
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not an index snapshot")
+    if header.get("format_version", 0) > SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Snapshot format version {header['format_version']} is newer than supported "
+                         f"({SNAPSHOT_FORMAT_VERSION})")
+    return header
+
+
+def import_snapshot(vector_store: BaseVectorStore, path: str,
+                    batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Load a snapshot into the store as a new live version (no API calls).
+
+    Args:
+        vector_store: Target store (its embedding profile must match the snapshot)
+        path: Snapshot file path
+        batch_size: Rows per add_to_rebuild call
+
+    Returns:
+        The snapshot header
+
+    Raises:
+        ValueError: If the snapshot is invalid or its dimension does not match
+            the store's embedding profile
+    """
+    start_time = time.time()
+    header = read_snapshot_header(path)
+
+    expected_dimensions = vector_store.embedding_dimensions
+    if header["count"] and expected_dimensions and header["dimensions"] != expected_dimensions:
+        raise ValueError(f"Snapshot holds {header['dimensions']}-dim vectors but the embedding profile is "
+                         f"{expected_dimensions}-dim")
+
+    with zipfile.ZipFile(path, 'r') as archive:
+        with archive.open("embeddings.npy") as f:
+            matrix = np.lib.format.read_array(f)
+        with archive.open("text_offsets.npy") as f:
+            offsets = np.lib.format.read_array(f)
+        texts = archive.read("texts.bin")
+        ids = json.loads(archive.read("ids.json"))
+        columns = json.loads(archive.read("metadata.json"))
+
+    vector_store.create_collection()
+    version = vector_store.begin_rebuild()
+    try:
+        for start in range(0, len(ids), batch_size):
+            rows = range(start, min(start + batch_size, len(ids)))
+            vector_store.add_to_rebuild(
+                version,
+                [ids[row] for row in rows],
+                [texts[offsets[row]:offsets[row + 1]].decode('utf-8') for row in rows],
+                [{key: values[row] for key, values in columns.items() if values[row] is not None}
+                 for row in rows],
+                np.asarray(matrix[start:start + len(rows)], dtype=np.float32)
+            )
+
+        vector_store.publish_rebuild(version, expected_count=len(ids),
+                                     sample_embedding=matrix[0].tolist() if len(ids) else None,
+                                     sample_id=ids[0] if len(ids) else None)
+    except Exception:
+        vector_store.abort_rebuild(version)
+        raise
+
+    logger.info(f"Imported snapshot {Path(path).name}: {len(ids)} chunks ({time.time() - start_time:.1f}s)")
+    return header
@@ -0,0 +1,393 @@
+"""
+IVF-PQ Approximate Nearest-Neighbour Index for DR Knowledge Chatbot.
+
+Inverted-file index with product-quantized residuals, in pure NumPy:
+
+- Coarse quantizer: k-means centroids; every row is assigned to its nearest
+  centroid ("list").
+- Residual codes: row - centroid is split into `subspaces` slices and each
+  slice is replaced by the id (uint8) of its nearest codebook entry, so a
+  1536-dim float32 row (6 KB) is stored as 96 bytes.
+- Search: score the query against the centroids, probe the `nprobe` best
+  lists, estimate scores from the codes with one lookup table per query
+  (q.x ~= q.centroid + sum_j q_j.codebook_j[code_j]), keep the
+  `rerank_depth` best estimates and rescore that shortlist exactly against
+  the stored vectors.
+
+nprobe trades recall for latency (more lists scanned); rerank_depth
+recovers the ranking error of the compressed codes. recall_report()
+measures both against exact search.
+
+On-disk files (inside a NumPy store generation directory):
+    ann.json                        nlist, subspaces, dimensions, trained_rows
+    ann_centroids.npy               (nlist, d) float32
+    ann_codebooks.npy               (subspaces, k, d / subspaces) float32
+    ann_labels.npy                  (n,) int32 list of each row
+    ann_codes.npy                   (n, subspaces) uint8 (memory-mapped)
+    ann_list_rows.npy, ann_list_offsets.npy   rows grouped by list
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Search knobs (CHATBOT_ANN_NPROBE / CHATBOT_ANN_RERANK_DEPTH)
+DEFAULT_NPROBE = 16
+DEFAULT_RERANK_DEPTH = 200
+
+# Entries per PQ codebook (codes fit in one byte)
+PQ_CODEBOOK_SIZE = 256
+
+# Dimensions per PQ subspace when the subspace count is derived from d
+PQ_SUBSPACE_DIMENSIONS = 16
+
+# k-means settings: rows sampled for coarse / PQ training and Lloyd iterations
+TRAIN_SAMPLE_ROWS = 65536
+PQ_TRAIN_SAMPLE_ROWS = 16384
+KMEANS_ITERATIONS = 15
+
+# Rows assigned / encoded per block (bounds temporary memory on large corpora)
+ENCODE_BLOCK_ROWS = 16384
+
+
+def auto_nlist(n_rows: int) -> int:
+    """Number of coarse lists for a corpus size (~4 * sqrt(n))."""
+    return max(1, min(n_rows, int(4 * np.sqrt(max(n_rows, 1)))))
+
+
+def auto_subspaces(dimensions: int) -> int:
+    """Number of PQ subspaces for a vector dimension (largest divisor <= d / 16)."""
+    target = max(1, dimensions // PQ_SUBSPACE_DIMENSIONS)
+    for subspaces in range(target, 0, -1):
+        if dimensions % subspaces == 0:
+            return subspaces
+    return 1
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (L2) of every row, computed block by block."""
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ENCODE_BLOCK_ROWS):
+        block = np.asarray(data[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin
+        labels[start:start + len(block)] = np.argmin(centroid_norms - 2.0 * (block @ centroids.T), axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS,
+           seed: int = 0) -> np.ndarray:
+    """
+    Lloyd's k-means.
+
+    Args:
+        data: Training rows (n, d) float32
+        k: Number of centroids (capped at n)
+        iterations: Assignment / update rounds
+        seed: Random seed for initialization and empty-cluster reseeding
+
+    Returns:
+        Centroids (k, d) float32
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), size=k, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        labels = _assign(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+
+        order = np.argsort(labels, kind='stable')
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]])
+        centroids[present] = np.add.reduceat(data[order], starts, axis=0) / counts[present, None]
+
+        # Reseed empty clusters on random rows so every list stays usable
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), size=len(empty), replace=False)]
+
+    return centroids
+
+
+class IVFPQIndex:
+    """Coarse lists plus residual product-quantization codes over rows 0..n-1."""
+
+    def __init__(self, centroids: np.ndarray, codebooks: np.ndarray,
+                 labels: np.ndarray, codes: np.ndarray, trained_rows: int,
+                 list_rows: Optional[np.ndarray] = None, list_offsets: Optional[np.ndarray] = None):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.labels = labels
+        self.codes = codes
+        self.trained_rows = trained_rows
+
+        if list_rows is None or list_offsets is None:
+            list_rows = np.argsort(labels, kind='stable').astype(np.int32)
+            list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.nlist))])
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def subspaces(self) -> int:
+        return len(self.codebooks)
+
+    @property
+    def dimensions(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def count(self) -> int:
+        return len(self.labels)
+
+    # ------------------------------------------------------------------
+    # Training and encoding
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, nlist: int = 0, subspaces: int = 0,
+              seed: int = 0) -> "IVFPQIndex":
+        """
+        Train the coarse quantizer and PQ codebooks on a sample of rows.
+
+        Args:
+            matrix: Stored vectors (n, d), may be memory-mapped
+            nlist: Number of coarse lists (0 = auto_nlist)
+            subspaces: Number of PQ subspaces, must divide d (0 = auto_subspaces)
+            seed: Random seed
+
+        Returns:
+            An index with trained quantizers and no rows
+        """
+        n_rows, dimensions = matrix.shape
+        nlist = nlist or auto_nlist(n_rows)
+        subspaces = subspaces or auto_subspaces(dimensions)
+        if dimensions % subspaces:
+            raise ValueError(f"PQ subspaces ({subspaces}) must divide the vector dimension ({dimensions})")
+
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n_rows, size=min(n_rows, TRAIN_SAMPLE_ROWS), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+
+        start_time = time.time()
+        centroids = kmeans(sample, nlist, seed=seed)
+        residuals = sample - centroids[_assign(sample, centroids)]
+
+        # Codebooks have few entries per subspace; a smaller sample trains them as well
+        residuals = residuals[:PQ_TRAIN_SAMPLE_ROWS]
+        step = dimensions // subspaces
+        codebooks = np.zeros((subspaces, PQ_CODEBOOK_SIZE, step), dtype=np.float32)
+        for j in range(subspaces):
+            trained = kmeans(residuals[:, j * step:(j + 1) * step], PQ_CODEBOOK_SIZE, seed=seed + j + 1)
+            codebooks[j, :len(trained)] = trained
+
+        logger.info(f"Trained IVF-PQ quantizers: {len(centroids)} lists, {subspaces} subspaces "
+                    f"on {len(sample)} rows ({time.time() - start_time:.1f}s)")
+        return cls(centroids, codebooks, np.zeros(0, dtype=np.int32),
+                   np.zeros((0, subspaces), dtype=np.uint8), trained_rows=n_rows)
+
+    def encode(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        List labels and PQ codes for rows, block by block.
+
+        Args:
+            matrix: Vectors (n, d), may be memory-mapped
+
+        Returns:
+            (labels (n,) int32, codes (n, subspaces) uint8)
+        """
+        step = self.dimensions // self.subspaces
+        labels = np.empty(len(matrix), dtype=np.int32)
+        codes = np.empty((len(matrix), self.subspaces), dtype=np.uint8)
+        for start in range(0, len(matrix), ENCODE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+            block_labels = _assign(block, self.centroids)
+            residuals = block - self.centroids[block_labels]
+            labels[start:start + len(block)] = block_labels
+            for j in range(self.subspaces):
+                codes[start:start + len(block), j] = _assign(residuals[:, j * step:(j + 1) * step],
+                                                             self.codebooks[j])
+        return labels, codes
+
+    def with_rows(self, labels: np.ndarray, codes: np.ndarray) -> "IVFPQIndex":
+        """Same quantizers over a new set of encoded rows."""
+        return IVFPQIndex(self.centroids, self.codebooks, labels, codes, self.trained_rows)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = 0, subspaces: int = 0, seed: int = 0) -> "IVFPQIndex":
+        """Train on matrix and encode all of its rows."""
+        index = cls.train(matrix, nlist=nlist, subspaces=subspaces, seed=seed)
+        return index.with_rows(*index.encode(matrix))
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, matrix: np.ndarray, queries: np.ndarray, top_k: int,
+               nprobe: int = DEFAULT_NPROBE, rerank_depth: int = DEFAULT_RERANK_DEPTH,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Approximate top_k rows per query, rescored exactly.
+
+        Lists are probed best first until at least nprobe lists and top_k
+        allowed rows have been visited.
+
+        Args:
+            matrix: Stored vectors the index was built over (for exact rescoring)
+            queries: Unit query vectors (m, d) float32
+            top_k: Results per query
+            nprobe: Lists to probe per query
+            rerank_depth: Shortlist size rescored exactly (at least top_k)
+            mask: Allowed rows (None = all)
+
+        Returns:
+            One (rows, scores) pair per query, best first
+        """
+        coarse = queries @ self.centroids.T
+        step = self.dimensions // self.subspaces
+        # luts[q, j, c] = q_j . codebooks[j, c]
+        luts = np.einsum('qjd,jcd->qjc', queries.reshape(len(queries), self.subspaces, step), self.codebooks)
+
+        if mask is None:
+            allowed_per_list = np.diff(self.list_offsets)
+        else:
+            allowed_per_list = np.bincount(self.labels[mask], minlength=self.nlist)
+        shortlist_size = max(top_k, rerank_depth)
+        subspace_index = np.arange(self.subspaces)
+
+        results = []
+        for q in range(len(queries)):
+            order = np.argsort(-coarse[q], kind='stable')
+            visited = np.cumsum(allowed_per_list[order])
+            probes = max(min(nprobe, self.nlist), int(np.searchsorted(visited, top_k)) + 1)
+            probed = order[:probes]
+
+            rows = np.concatenate([self.list_rows[self.list_offsets[lst]:self.list_offsets[lst + 1]]
+                                   for lst in probed])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) == 0:
+                results.append((rows.astype(np.int64), np.zeros(0, dtype=np.float32)))
+                continue
+
+            estimates = coarse[q, self.labels[rows]] + luts[q][subspace_index, self.codes[rows]].sum(axis=1)
+            if len(rows) > shortlist_size:
+                rows = rows[np.argpartition(-estimates, shortlist_size - 1)[:shortlist_size]]
+            rows = np.sort(rows)
+
+            exact = np.asarray(matrix[rows], dtype=np.float32) @ queries[q]
+            best = np.argsort(-exact, kind='stable')[:top_k]
+            results.append((rows[best].astype(np.int64), exact[best]))
+        return results
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, directory: Path) -> None:
+        """Write ann.json and ann_*.npy."""
+        np.save(directory / "ann_centroids.npy", self.centroids)
+        np.save(directory / "ann_codebooks.npy", self.codebooks)
+        np.save(directory / "ann_labels.npy", self.labels)
+        np.save(directory / "ann_codes.npy", self.codes)
+        np.save(directory / "ann_list_rows.npy", self.list_rows)
+        np.save(directory / "ann_list_offsets.npy", self.list_offsets)
+        with open(directory / "ann.json", 'w') as f:
+            json.dump({
+                "nlist": self.nlist,
+                "subspaces": self.subspaces,
+                "dimensions": self.dimensions,
+                "count": self.count,
+                "trained_rows": self.trained_rows
+            }, f)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (directory / "ann.json").exists()
+
+    @classmethod
+    def load(cls, directory: Path) -> "IVFPQIndex":
+        """Load a saved index (codes memory-mapped)."""
+        with open(directory / "ann.json", 'r') as f:
+            info = json.load(f)
+        return cls(
+            centroids=np.load(directory / "ann_centroids.npy"),
+            codebooks=np.load(directory / "ann_codebooks.npy"),
+            labels=np.load(directory / "ann_labels.npy"),
+            codes=np.load(directory / "ann_codes.npy", mmap_mode='r' if info["count"] else None),
+            trained_rows=info["trained_rows"],
+            list_rows=np.load(directory / "ann_list_rows.npy"),
+            list_offsets=np.load(directory / "ann_list_offsets.npy")
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nlist": self.nlist,
+            "subspaces": self.subspaces,
+            "code_bytes_per_row": self.subspaces,
+            "trained_rows": self.trained_rows
+        }
+
+
+def recall_report(matrix: np.ndarray, index: IVFPQIndex, queries: np.ndarray, top_k: int = 10,
+                  nprobes: Sequence[int] = (1, 4, 8, 16, 32, 64),
+                  rerank_depths: Sequence[int] = (50, 200, 1000)) -> List[Dict[str, Any]]:
+    """
+    Recall@k and latency of the index against exact search, per knob setting.
+
+    Args:
+        matrix: Stored vectors the index was built over
+        index: IVF-PQ index
+        queries: Unit query vectors (m, d)
+        top_k: k for recall@k
+        nprobes: nprobe values to measure
+        rerank_depths: rerank_depth values to measure
+
+    Returns:
+        One dict per (nprobe, rerank_depth) with recall, mean/p95 latency (ms)
+        and the exact-search mean latency for comparison
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+
+    exact_matrix = np.asarray(matrix, dtype=np.float32)
+
+    exact_times = []
+    truth = []
+    for query in queries:
+        start_time = time.perf_counter()
+        scores = exact_matrix @ query
+        top = np.argpartition(-scores, min(top_k, len(scores)) - 1)[:top_k]
+        exact_times.append((time.perf_counter() - start_time) * 1000)
+        truth.append(set(top.tolist()))
+    exact_ms = float(np.mean(exact_times))
+
+    report = []
+    for nprobe in nprobes:
+        for rerank_depth in rerank_depths:
+            times = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                start_time = time.perf_counter()
+                rows, _ = index.search(matrix, query[None, :], top_k, nprobe=nprobe,
+                                       rerank_depth=rerank_depth)[0]
+                times.append((time.perf_counter() - start_time) * 1000)
+                hits += len(expected.intersection(rows.tolist()))
+            report.append({
+                "nprobe": nprobe,
+                "rerank_depth": rerank_depth,
+                "recall": round(hits / max(1, sum(len(t) for t in truth)), 4),
+                "mean_ms": round(float(np.mean(times)), 3),
+                "p95_ms": round(float(np.percentile(times, 95)), 3),
+                "exact_mean_ms": round(exact_ms, 3)
+            })
+    return report
@@ -7,7 +7,7 @@ Per chatbot_revised.md: 2-day backup retention, track all updates.
 
 import logging
 import json
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -28,12 +28,21 @@ class MetadataService:
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
         self.metadata_file = self.data_dir / "metadata.json"
+        self._metadata_mtime: Optional[int] = None
+        self._update_listeners: List[Callable[[str], None]] = []
         self.metadata = self._load_metadata()
 
         logger.info("Metadata service initialized")
 
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return self.metadata_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
     def _load_metadata(self) -> Dict[str, Any]:
         """Load metadata from disk."""
+        self._metadata_mtime = self._file_mtime()
         if self.metadata_file.exists():
             try:
                 with open(self.metadata_file, 'r') as f:
@@ -75,18 +84,51 @@ class MetadataService:
 
             with open(self.metadata_file, 'w') as f:
                 json.dump(self.metadata, f, indent=2)
+            self._metadata_mtime = self._file_mtime()
             logger.info(f"Metadata saved to {self.metadata_file}")
         except Exception as e:
             logger.error(f"Error saving metadata to {self.metadata_file}: {e}", exc_info=True)
 
+    def add_update_listener(self, callback: Callable[[str], None]):
+        """
+        Call callback(version_id) whenever a new knowledge base version is seen.
+
+        Args:
+            callback: Listener (e.g. a cache invalidation)
+        """
+        self._update_listeners.append(callback)
+
+    def _notify_update(self, version_id: str):
+        for callback in self._update_listeners:
+            try:
+                callback(version_id)
+            except Exception as e:
+                logger.warning(f"Update listener failed: {e}")
+
+    def current_version_id(self) -> str:
+        """
+        Current knowledge base version id.
+
+        metadata.json is re-read when it changed on disk, so versions recorded
+        by another worker process are picked up (one stat() per call).
+        """
+        previous = self.metadata.get("current_version", {}).get("id", "")
+        if self._file_mtime() != self._metadata_mtime:
+            self.metadata = self._load_metadata()
+            current = self.metadata.get("current_version", {}).get("id", "")
+            if current != previous:
+                self._notify_update(current)
+            return current
+        return previous
+
     def get_last_update(self) -> Dict[str, Any]:
         """Get information about the last update."""
         return self.metadata.get("current_version", {})
 
     def get_statistics(self) -> Dict[str, Any]:
         """Get database statistics."""
-        # Reload metadata from disk to ensure we have latest data
-        self.metadata = self._load_metadata()
+        # Reload metadata from disk if another process changed it
+        self.current_version_id()
         current = self.metadata.get("current_version", {})
         return {
             "total_events": current.get("total_events", 0),
@@ -184,6 +226,7 @@ class MetadataService:
 
         # Save
         self._save_metadata()
+        self._notify_update(version_id)
 
         logger.info(f"Recorded update: {version_id}")
 
@@ -202,10 +245,17 @@ class MetadataService:
         cutoff_date = datetime.now() - timedelta(days=retention_days)
         deleted_count = 0
 
-        for backup_file in backup_path.glob("backup_*.db"):
+        # Excel backups (backup_<ts>.xlsx) and index snapshots (backup_<ts>.snapshot);
+        # the newest backup of each kind is always kept
+        backup_files = sorted(backup_path.glob("backup_*.*"))
+        newest = {backup_file.suffix: backup_file for backup_file in backup_files}
+
+        for backup_file in backup_files:
+            if newest[backup_file.suffix] == backup_file:
+                continue
             try:
-                # Extract timestamp from filename (e.g., backup_20251023_143000.db)
-                timestamp_str = backup_file.stem.replace("backup_", "")
+                # Extract timestamp from filename (e.g., backup_20251023_143000.xlsx)
+                timestamp_str = backup_file.name.split(".", 1)[0].replace("backup_", "")
                 file_date = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
 
                 if file_date < cutoff_date:
@@ -237,26 +287,21 @@ class MetadataService:
             bool: True if sync was successful
         """
         try:
-            # Get collection from ChromaDB
-            collection = vector_store.client.get_collection(vector_store.collection_name)
-            chunk_count = collection.count()
+            chunk_count = vector_store.count()
 
             if chunk_count == 0:
                 logger.warning("ChromaDB collection is empty, nothing to sync")
                 return False
 
-            # Get a sample document to extract event info
-            sample = collection.peek(limit=1)
-
             # Create basic metadata
             logger.info(f"Syncing metadata from ChromaDB ({chunk_count} chunks)")
 
             # Count unique events from metadata
-            all_metadata = collection.get(limit=chunk_count, include=['metadatas'])
             unique_events = set()
-            for meta in all_metadata['metadatas']:
-                if 'event_id' in meta:
-                    unique_events.add(meta['event_id'])
+            for page in vector_store.iter_documents(include_embeddings=False):
+                for meta in page['metadatas']:
+                    if 'event_id' in meta:
+                        unique_events.add(meta['event_id'])
 
             event_count = len(unique_events)
 
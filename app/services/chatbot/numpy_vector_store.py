@@ -0,0 +1,1126 @@
+"""
+NumPy Vector Store for DR Knowledge Chatbot.
+
+In-process exact-search engine (CHATBOT_VECTOR_ENGINE=numpy). At tens of
+thousands of chunks a contiguous matrix and one vectorized dot product beat
+an HNSW round-trip plus result dict parsing, and results are exact.
+
+On-disk layout (one directory per collection):
+    <collection>/CURRENT            name of the live generation
+    <collection>/PREVIOUS           name of the generation live before it (rollback target)
+    <collection>/gen-000001/
+        embeddings.npy              (n, d) unit vectors in the profile dtype (memory-mapped)
+        date_unix.npy               int64 column (DATE_MISSING when absent)
+        location.npy, section.npy   int32 category codes (-1 when absent)
+        vocab.json                  code -> value lists for category columns
+        ids.json                    chunk IDs in row order
+        records.jsonl               {"text", "metadata"} per row, read by offset
+        offsets.npy                 byte offsets into records.jsonl (n + 1)
+        bm25_*.npy, bm25_vocab.json BM25 postings over the same rows (bm25_index.py)
+        facets.json, facet_rows.npy hazard/location/section/year postings (facet_index.py)
+        manifest.json               count, dimensions, dtype
+
+Writes build a complete new generation and flip CURRENT with os.replace, so
+readers always see one consistent snapshot and never block on a writer.
+Writers (threads and processes) take an flock on <collection>/WRITE.lock.
+Every write, including an incremental upload of a few events, rewrites the
+whole generation: O(corpus) disk I/O, about (dimensions * dtype size +
+record size) bytes per chunk. That is seconds at tens of thousands of
+chunks, paid by the writer, never by readers.
+The generation that was live before is recorded in PREVIOUS and kept, so
+rollback() is another pointer flip; every other generation is pruned.
+Readers never write: a generation missing its BM25 or facet files is indexed
+in memory, and only publishing it (under the lock) saves them.
+"""
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.chatbot.bm25_index import BM25Index
+from app.services.chatbot.facet_index import FacetIndex, FacetIndexBuilder
+from app.services.chatbot.data_processor import Chunk
+from app.services.chatbot.file_lock import file_lock
+from app.services.chatbot.vector_store import (
+    FACET_MIN_MATCHES,
+    STREAM_BATCH_SIZE,
+    BaseVectorStore,
+    FilterSpec,
+    SearchResult,
+)
+
+logger = logging.getLogger(__name__)
+
+# Category columns available as boolean-mask prefilters
+CATEGORY_COLUMNS = ("location", "section")
+
+# Sentinel for chunks without a date
+DATE_MISSING = np.iinfo(np.int64).min
+
+# Rows scored per block when the matrix is stored as float16
+SCORE_BLOCK_ROWS = 16384
+
+@dataclass
+class IndexSnapshot:
+    """Immutable view of one index generation."""
+    generation: str
+    ids: List[str]
+    row_of: Dict[str, int]
+    matrix: np.ndarray
+    date_unix: np.ndarray
+    categories: Dict[str, np.ndarray]
+    vocab: Dict[str, List[str]]
+    offsets: np.ndarray
+    records: Any  # mmap of records.jsonl (b"" when empty)
+    bm25: BM25Index
+    facets: FacetIndex
+    manifest: Dict[str, Any]
+    extras: Dict[str, Any] = field(default_factory=dict)  # Engine-specific structures (e.g. ANN index)
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Hydrate one row's text and metadata."""
+        return json.loads(self.records[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+
+# One page of rows for _write_generation: (documents, metadatas, unit vectors)
+Page = Tuple[List[str], List[Dict[str, Any]], np.ndarray]
+
+
+class _Spill:
+    """Append-only staging area on disk for rows not yet written to a generation."""
+
+    def __init__(self, directory: Path, dtype: str):
+        self.directory = directory
+        self.directory.mkdir(parents=True)
+        self.dtype = np.dtype(dtype)
+        self.ids: List[str] = []
+        self.dimensions: Optional[int] = None
+        self._vectors = open(self.directory / "vectors.bin", 'wb')
+        self._records = open(self.directory / "records.jsonl", 'wb')
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def append(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               matrix: np.ndarray) -> None:
+        """Stage rows (matrix already in the storage profile)."""
+        if self.dimensions is not None and matrix.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dim vectors, got {matrix.shape[1]}")
+        self.dimensions = matrix.shape[1]
+
+        self._vectors.write(np.ascontiguousarray(matrix, dtype=self.dtype).tobytes())
+        for text, metadata in zip(documents, metadatas):
+            self._records.write(json.dumps({"text": text, "metadata": metadata},
+                                           ensure_ascii=False).encode('utf-8') + b"\n")
+        self.ids.extend(ids)
+
+    def _close_writers(self):
+        for handle in (self._vectors, self._records):
+            if not handle.closed:
+                handle.close()
+
+    def texts(self) -> Iterator[str]:
+        """Staged texts in row order."""
+        self._close_writers()
+        with open(self.directory / "records.jsonl", 'rb') as f:
+            for line in f:
+                yield json.loads(line)["text"]
+
+    def pages(self, page_size: int = STREAM_BATCH_SIZE) -> Iterator[Page]:
+        """Staged rows as generation pages."""
+        self._close_writers()
+        if not self.ids:
+            return
+        vectors = np.memmap(self.directory / "vectors.bin", dtype=self.dtype, mode='r',
+                            shape=(len(self.ids), self.dimensions))
+        with open(self.directory / "records.jsonl", 'rb') as f:
+            for start in range(0, len(self.ids), page_size):
+                records = [json.loads(f.readline()) for _ in range(min(page_size, len(self.ids) - start))]
+                yield ([r["text"] for r in records], [r["metadata"] for r in records],
+                       np.asarray(vectors[start:start + len(records)], dtype=np.float32))
+
+    def remove(self) -> None:
+        self._close_writers()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _event_of(chunk_id: str) -> str:
+    """Event ID part of a chunk ID ("{event_id}_{chunk_index}")."""
+    return chunk_id.rsplit("_", 1)[0]
+
+
+class NumpyVectorStore(BaseVectorStore):
+    """Exact cosine search over a memory-mapped embedding matrix."""
+
+    def __init__(self, persist_directory: str = "app/data/chatbot/vector_index",
+                 embedding_dimensions: Optional[int] = None, embedding_dtype: str = "float32"):
+        """
+        Initialize NumPy vector store.
+
+        Args:
+            persist_directory: Path to persistent storage
+            embedding_dimensions: Expected vector dimension (None = not enforced)
+            embedding_dtype: Matrix precision on disk ("float32" or "float16")
+        """
+        if embedding_dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding dtype: {embedding_dtype}")
+
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_dtype = embedding_dtype
+
+        self.collection_name = "epidemiological_events"
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._current_mtime = None
+        self._write_lock = threading.Lock()
+        self._rebuilds: Dict[str, _Spill] = {}
+
+        logger.info(f"NumPy vector store initialized at: {self.persist_directory}")
+
+    # ------------------------------------------------------------------
+    # Snapshot loading
+    # ------------------------------------------------------------------
+
+    @property
+    def collection_dir(self) -> Path:
+        return self.persist_directory / self.collection_name
+
+    def _current_file(self) -> Path:
+        return self.collection_dir / "CURRENT"
+
+    @contextmanager
+    def _locked(self):
+        """
+        Serialize writers across threads and processes.
+
+        gunicorn workers, the batch poller and the CLI scripts all write
+        generations; the flock on <collection>/WRITE.lock covers allocating
+        the generation number, writing it and flipping CURRENT.
+        """
+        with self._write_lock:
+            self.collection_dir.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.collection_dir / "WRITE.lock"):
+                yield
+
+    def _load_generation(self, generation: str, persist_missing: bool = False) -> IndexSnapshot:
+        """
+        Open one generation directory (memory-mapping the large files).
+
+        Args:
+            generation: Generation directory name
+            persist_missing: Save derived indexes the generation lacks (writers
+                only, under _locked(); readers build them in memory)
+        """
+        gen_dir = self.collection_dir / generation
+        with open(gen_dir / "manifest.json", 'r') as f:
+            manifest = json.load(f)
+        with open(gen_dir / "ids.json", 'r') as f:
+            ids = json.load(f)
+        with open(gen_dir / "vocab.json", 'r') as f:
+            vocab = json.load(f)
+
+        records: Any = b""
+        if (gen_dir / "records.jsonl").stat().st_size > 0:
+            with open(gen_dir / "records.jsonl", 'rb') as f:
+                records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offsets = np.load(gen_dir / "offsets.npy")
+
+        if BM25Index.exists(gen_dir):
+            bm25 = BM25Index.load(gen_dir)
+        else:
+            # Generation written before keyword indexing
+            logger.info(f"Building BM25 index for {self.collection_name}/{generation}")
+            texts = (json.loads(records[int(offsets[row]):int(offsets[row + 1])])["text"]
+                     for row in range(len(ids)))
+            bm25 = BM25Index.build(texts)
+            if persist_missing:
+                self._save_into_generation(gen_dir, bm25.save, "bm25_vocab.json")
+
+        if FacetIndex.exists(gen_dir):
+            facets = FacetIndex.load(gen_dir)
+        else:
+            # Generation written before facet indexing
+            logger.info(f"Building facet index for {self.collection_name}/{generation}")
+            facets = FacetIndex.build(json.loads(records[int(offsets[row]):int(offsets[row + 1])])["metadata"]
+                                      for row in range(len(ids)))
+            if persist_missing:
+                self._save_into_generation(gen_dir, facets.save, "facets.json")
+
+        mmap_mode = 'r' if ids else None
+        snapshot = IndexSnapshot(
+            generation=generation,
+            ids=ids,
+            row_of={chunk_id: row for row, chunk_id in enumerate(ids)},
+            matrix=np.load(gen_dir / "embeddings.npy", mmap_mode=mmap_mode),
+            date_unix=np.load(gen_dir / "date_unix.npy"),
+            categories={col: np.load(gen_dir / f"{col}.npy") for col in CATEGORY_COLUMNS},
+            vocab=vocab,
+            offsets=offsets,
+            records=records,
+            bm25=bm25,
+            facets=facets,
+            manifest=manifest
+        )
+        self._load_extras(gen_dir, snapshot, persist_missing)
+        return snapshot
+
+    def _load_extras(self, gen_dir: Path, snapshot: IndexSnapshot, persist_missing: bool) -> None:
+        """Hook for subclasses: attach engine-specific structures to a loaded snapshot."""
+
+    def _save_into_generation(self, gen_dir: Path, save: Callable[[Path], None], marker: str) -> None:
+        """
+        Add derived index files to a published generation without exposing partial files.
+
+        save() writes into a temporary directory; the files are then renamed in
+        with the marker (the file exists() checks) last. Call under _locked().
+        """
+        tmp_dir = self.collection_dir / f".{gen_dir.name}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        try:
+            save(tmp_dir)
+            for path in sorted(tmp_dir.iterdir(), key=lambda p: p.name == marker):
+                os.replace(path, gen_dir / path.name)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _write_extras(self, gen_dir: Path, count: int, source_rows: Optional[np.ndarray]) -> None:
+        """
+        Hook for subclasses: write engine-specific files into a generation being built.
+
+        Args:
+            gen_dir: Generation directory (embeddings.npy is complete)
+            count: Number of rows
+            source_rows: Live-snapshot row each new row was copied from (-1 = new
+                or changed), or None when the rows have no relation to the live snapshot
+        """
+
+    def _current(self) -> IndexSnapshot:
+        """
+        Return the live snapshot, reloading if another process flipped CURRENT.
+
+        Costs one stat() per call when nothing changed.
+        """
+        current_file = self._current_file()
+        try:
+            stat = current_file.stat()
+            mtime = (stat.st_ino, stat.st_mtime_ns)  # os.replace always yields a new inode
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is None:
+            # Nothing written yet
+            return self._snapshot if self._snapshot is not None else self._empty_snapshot()
+
+        if self._snapshot is None or mtime != self._current_mtime:
+            generation = current_file.read_text().strip()
+            self._snapshot = self._load_generation(generation)
+            self._current_mtime = mtime
+            logger.info(f"Loaded index {self.collection_name}/{generation} ({self._snapshot.count} chunks)")
+
+        return self._snapshot
+
+    def _empty_snapshot(self) -> IndexSnapshot:
+        return IndexSnapshot(
+            generation="",
+            ids=[],
+            row_of={},
+            matrix=np.zeros((0, self.embedding_dimensions or 0), dtype=self.embedding_dtype),
+            date_unix=np.zeros(0, dtype=np.int64),
+            categories={col: np.zeros(0, dtype=np.int32) for col in CATEGORY_COLUMNS},
+            vocab={col: [] for col in CATEGORY_COLUMNS},
+            offsets=np.zeros(1, dtype=np.int64),
+            records=b"",
+            bm25=BM25Index.empty(),
+            facets=FacetIndex({}, np.zeros(0, dtype=np.int32), 0),
+            manifest={"count": 0, "dimensions": self.embedding_dimensions or 0, "dtype": self.embedding_dtype}
+        )
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _next_generation(self) -> str:
+        existing = [p.name for p in self.collection_dir.glob("gen-*") if p.is_dir()]
+        numbers = [int(name.split("-")[1]) for name in existing if name.split("-")[1].isdigit()]
+        return f"gen-{max(numbers, default=0) + 1:06d}"
+
+    def _write_generation(self, ids: List[str], pages: Iterable[Page], dimensions: int,
+                          bm25: BM25Index, publish: bool = True,
+                          source_rows: Optional[np.ndarray] = None) -> str:
+        """
+        Write a complete generation (and by default make it live).
+
+        Rows arrive page by page and vectors go straight into a memory-mapped
+        .npy, so memory is bounded by the page size, not the corpus.
+
+        Args:
+            ids: Chunk IDs in row order
+            pages: (documents, metadatas, unit vectors) per page, in row order
+            dimensions: Vector dimension
+            bm25: Keyword index over the same rows
+            publish: Flip CURRENT to the new generation
+            source_rows: Live-snapshot row each row was copied from (-1 = new), if known
+
+        Returns:
+            The generation name
+        """
+        self.collection_dir.mkdir(parents=True, exist_ok=True)
+        generation = self._next_generation()
+        gen_dir = self.collection_dir / generation
+        tmp_dir = self.collection_dir / f".{generation}.tmp"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        count = len(ids)
+        matrix = np.lib.format.open_memmap(tmp_dir / "embeddings.npy", mode="w+",
+                                           dtype=self.embedding_dtype, shape=(count, dimensions))
+        date_unix = np.full(count, DATE_MISSING, dtype=np.int64)
+        raw_categories: Dict[str, List[Optional[str]]] = {col: [] for col in CATEGORY_COLUMNS}
+        facets = FacetIndexBuilder()
+
+        # Row records, hydrated by byte offset
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        row = 0
+        with open(tmp_dir / "records.jsonl", 'wb') as f:
+            for documents, metadatas, vectors in pages:
+                matrix[row:row + len(documents)] = vectors
+                for text, metadata in zip(documents, metadatas):
+                    if metadata.get("date_unix") is not None:
+                        date_unix[row] = metadata["date_unix"]
+                    for col in CATEGORY_COLUMNS:
+                        raw_categories[col].append(str(metadata[col]) if metadata.get(col) is not None else None)
+                    facets.add(metadata)
+
+                    line = json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False).encode('utf-8') + b"\n"
+                    f.write(line)
+                    offsets[row + 1] = offsets[row] + len(line)
+                    row += 1
+
+        if row != count:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise ValueError(f"Generation expected {count} rows but received {row}")
+
+        matrix.flush()
+        del matrix
+
+        # Columnar metadata for prefilters
+        np.save(tmp_dir / "date_unix.npy", date_unix)
+
+        vocab: Dict[str, List[str]] = {}
+        for col in CATEGORY_COLUMNS:
+            values = sorted({value for value in raw_categories[col] if value is not None})
+            code_of = {value: code for code, value in enumerate(values)}
+            codes = np.array([code_of[value] if value is not None else -1 for value in raw_categories[col]],
+                             dtype=np.int32)
+            np.save(tmp_dir / f"{col}.npy", codes)
+            vocab[col] = values
+
+        with open(tmp_dir / "vocab.json", 'w') as f:
+            json.dump(vocab, f)
+        with open(tmp_dir / "ids.json", 'w') as f:
+            json.dump(list(ids), f)
+
+        np.save(tmp_dir / "offsets.npy", offsets)
+        bm25.save(tmp_dir)
+        facets.finish().save(tmp_dir)
+        self._write_extras(tmp_dir, count, source_rows)
+
+        manifest = {
+            "collection": self.collection_name,
+            "generation": generation,
+            "count": count,
+            "dimensions": int(dimensions),
+            "dtype": self.embedding_dtype,
+            "created_at": datetime.now().isoformat()
+        }
+        with open(tmp_dir / "manifest.json", 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(tmp_dir, gen_dir)
+
+        if publish:
+            self._publish_generation(generation)
+        return generation
+
+    def _read_pointer(self, name: str) -> Optional[str]:
+        try:
+            return (self.collection_dir / name).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name: str, generation: str) -> None:
+        pointer_tmp = self.collection_dir / f"{name}.tmp"
+        pointer_tmp.write_text(generation)
+        os.replace(pointer_tmp, self.collection_dir / name)
+
+    def _previous_generation(self) -> Optional[str]:
+        """Generation that was live before the current one, if it is still on disk."""
+        previous = self._read_pointer("PREVIOUS")
+        if previous is None:
+            # Collections written before PREVIOUS was recorded
+            older = [name for name in self._generations() if name != self._read_pointer("CURRENT")]
+            previous = older[-1] if older else None
+        if previous is None or not (self.collection_dir / previous).is_dir():
+            return None
+        return previous
+
+    def _publish_generation(self, generation: str) -> IndexSnapshot:
+        """Flip CURRENT to a written generation (the old one becomes PREVIOUS) and load it."""
+        live = self._read_pointer("CURRENT")
+        if live and live != generation:
+            self._write_pointer("PREVIOUS", live)
+
+        # Flip the pointer atomically
+        self._write_pointer("CURRENT", generation)
+
+        self._snapshot = self._load_generation(generation, persist_missing=True)
+        stat = self._current_file().stat()
+        self._current_mtime = (stat.st_ino, stat.st_mtime_ns)
+        self._prune_generations()
+        return self._snapshot
+
+    def _prune_generations(self):
+        """Delete every generation except the live and the previous one."""
+        keep = {self._read_pointer("CURRENT"), self._previous_generation()}
+        for path in self.collection_dir.glob("gen-*"):
+            if path.is_dir() and path.name not in keep:
+                # Open memory maps stay valid after unlink on POSIX
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _dimensions(self, snap: IndexSnapshot) -> int:
+        """Vector dimension for a new generation."""
+        return self.embedding_dimensions or (snap.matrix.shape[1] if snap.matrix.ndim == 2 else 0)
+
+    @staticmethod
+    def _snapshot_pages(snap: IndexSnapshot, rows: List[int],
+                        page_size: int = STREAM_BATCH_SIZE) -> Iterator[Page]:
+        """Existing rows of a snapshot as generation pages."""
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            records = [snap.record(row) for row in page]
+            yield ([r["text"] for r in records], [r["metadata"] for r in records],
+                   np.asarray(snap.matrix[page], dtype=np.float32))
+
+    @staticmethod
+    def _source_rows(keep: List[int], new_rows: int) -> np.ndarray:
+        """source_rows for a generation laid out as kept live rows followed by new rows."""
+        return np.concatenate([np.asarray(keep, dtype=np.int64), np.full(new_rows, -1, dtype=np.int64)])
+
+    def _new_spill(self, name: Optional[str] = None) -> "_Spill":
+        return _Spill(self.collection_dir / f".spill-{name or uuid.uuid4().hex[:12]}", self.embedding_dtype)
+
+    def write_records(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                      embeddings: List[List[float]], replace: bool = False,
+                      stale_event_ids: Optional[List[str]] = None) -> int:
+        """
+        Store raw records as one new generation.
+
+        Rows whose ID already exists are replaced. The whole corpus is
+        rewritten (unchanged rows are copied page by page from the live
+        generation).
+
+        Args:
+            ids: Chunk IDs
+            documents: Chunk texts
+            metadatas: Chunk metadata dicts
+            embeddings: Vectors (profile dimension)
+            replace: Drop all existing rows first
+            stale_event_ids: Events whose existing chunks are dropped first
+
+        Returns:
+            Number of existing rows dropped
+        """
+        new_matrix = self._normalize(self._profile_matrix(embeddings)) if len(ids) else None
+        stale = set(stale_event_ids or [])
+
+        with self._locked():
+            snap = self._current()
+            incoming = set(ids)
+            keep = [] if replace else [
+                row for row, chunk_id in enumerate(snap.ids)
+                if chunk_id not in incoming and _event_of(chunk_id) not in stale
+            ]
+            if not ids and len(keep) == snap.count:
+                return 0
+
+            pages = self._snapshot_pages(snap, keep)
+            if new_matrix is not None:
+                pages = chain(pages, [(list(documents), list(metadatas), new_matrix)])
+
+            # Existing rows keep their postings; only new texts are tokenized
+            bm25 = BM25Index.build(documents) if replace else snap.bm25.select(keep).extend(documents)
+
+            self._write_generation([snap.ids[row] for row in keep] + list(ids), pages,
+                                   new_matrix.shape[1] if new_matrix is not None else self._dimensions(snap), bm25,
+                                   source_rows=None if replace else self._source_rows(keep, len(ids)))
+            return snap.count - len(keep)
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    # ------------------------------------------------------------------
+    # Collection API
+    # ------------------------------------------------------------------
+
+    def create_collection(self, name: Optional[str] = None, reset: bool = False) -> None:
+        """
+        Create or open collection.
+
+        Args:
+            name: Collection name (default: epidemiological_events)
+            reset: Whether to empty the collection
+        """
+        if name and name != self.collection_name:
+            self.collection_name = name
+            self._snapshot = None
+            self._current_mtime = None
+
+        if reset:
+            with self._locked():
+                self._write_generation([], [], self.embedding_dimensions or 0, BM25Index.empty())
+                logger.info(f"Reset collection: {self.collection_name}")
+
+        snap = self._current()
+        stored_dimensions = snap.manifest.get("dimensions")
+        if snap.count and self.embedding_dimensions and stored_dimensions != self.embedding_dimensions:
+            logger.error(f"Collection {self.collection_name} holds {stored_dimensions}-dim vectors but the "
+                         f"embedding profile is {self.embedding_dimensions}-dim; "
+                         f"run scripts/migrate_embedding_profile.py")
+
+        logger.info(f"Collection ready: {self.collection_name} ({snap.count} documents)")
+
+    def add_documents(self, chunks: List[Chunk], embeddings: List[List[float]]) -> None:
+        """
+        Add chunks with embeddings to collection.
+
+        Args:
+            chunks: List of Chunk objects
+            embeddings: Corresponding embedding vectors
+        """
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch")
+
+        self.add_stream(zip(chunks, embeddings))
+
+        logger.info(f"Added {len(chunks)} documents to collection")
+
+    def add_stream(self, pairs: Iterable[Tuple[Chunk, List[float]]], batch_size: Optional[int] = None,
+                   progress_callback: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Upsert (chunk, embedding) pairs from an iterator as one new generation.
+
+        Batches are staged on disk while the stream is consumed, then merged
+        with the live rows page by page, so memory stays bounded by the batch
+        size however long the stream is.
+
+        Args:
+            pairs: (Chunk, embedding) pairs, consumed lazily
+            batch_size: Pairs per staged batch (default STREAM_BATCH_SIZE)
+            progress_callback: Called with the number of pairs staged so far
+
+        Returns:
+            Number of pairs written
+        """
+        spill = self._new_spill()
+        try:
+            for chunks, embeddings in self._iter_batches(pairs, batch_size or STREAM_BATCH_SIZE):
+                spill.append([f"{chunk.event_id}_{chunk.chunk_index}" for chunk in chunks],
+                             [chunk.text for chunk in chunks],
+                             [chunk.metadata for chunk in chunks],
+                             self._normalize(self._profile_matrix(embeddings)))
+                if progress_callback:
+                    progress_callback(spill.count)
+
+            if not spill.count:
+                return 0
+
+            with self._locked():
+                snap = self._current()
+                incoming = set(spill.ids)
+                keep = [row for row, chunk_id in enumerate(snap.ids) if chunk_id not in incoming]
+
+                # Existing rows keep their postings; only streamed texts are tokenized
+                bm25 = snap.bm25.select(keep).extend(spill.texts())
+                self._write_generation([snap.ids[row] for row in keep] + spill.ids,
+                                       chain(self._snapshot_pages(snap, keep), spill.pages()),
+                                       spill.dimensions, bm25, source_rows=self._source_rows(keep, spill.count))
+            return spill.count
+        finally:
+            spill.remove()
+
+    def delete_events(self, event_ids: List[str]) -> int:
+        """
+        Remove every chunk of the given events.
+
+        Args:
+            event_ids: Event IDs
+
+        Returns:
+            Number of chunks removed
+        """
+        removed = self.write_records([], [], [], [], stale_event_ids=event_ids)
+        logger.info(f"Deleted {removed} chunks for {len(set(event_ids))} events")
+        return removed
+
+    def replace_events(self, chunks: List[Chunk], embeddings: List[List[float]],
+                       stale_event_ids: List[str]) -> None:
+        """
+        Apply an incremental update as a single new generation.
+
+        Args:
+            chunks: Chunks of new and modified events
+            embeddings: Corresponding embedding vectors
+            stale_event_ids: Modified and deleted event IDs whose old chunks are removed
+        """
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch")
+
+        removed = self.write_records(
+            ids=[f"{chunk.event_id}_{chunk.chunk_index}" for chunk in chunks],
+            documents=[chunk.text for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks],
+            embeddings=embeddings,
+            stale_event_ids=stale_event_ids
+        )
+
+        logger.info(f"Replaced events: {removed} chunks removed, {len(chunks)} upserted")
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _filter_mask(self, snap: IndexSnapshot, spec: FilterSpec) -> Optional[np.ndarray]:
+        """Boolean row mask for a filter spec (None = all rows)."""
+        if spec.is_empty():
+            return None
+
+        mask = np.ones(snap.count, dtype=bool)
+        for col, value in spec.equals.items():
+            values = snap.vocab.get(col, [])
+            try:
+                code = values.index(str(value))
+            except ValueError:
+                return np.zeros(snap.count, dtype=bool)
+            mask &= snap.categories[col] == code
+
+        if spec.date_from_unix is not None or spec.date_to_unix is not None:
+            mask &= snap.date_unix != DATE_MISSING
+            if spec.date_from_unix is not None:
+                mask &= snap.date_unix >= spec.date_from_unix
+            if spec.date_to_unix is not None:
+                mask &= snap.date_unix <= spec.date_to_unix
+
+        if spec.facets:
+            facet_mask = mask & snap.facets.mask(spec.facets)
+            matches = int(facet_mask.sum())
+            if matches >= FACET_MIN_MATCHES:
+                return facet_mask
+            logger.info(f"Facet filters {spec.facets} match {matches} chunks - searching without them")
+            if spec.without_facets().is_empty():
+                return None
+
+        return mask
+
+    def _score(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Dot products of every row with every query, in float32.
+
+        Args:
+            matrix: Stored vectors (n, d)
+            queries: Unit query vectors (m, d)
+
+        Returns:
+            Scores of shape (n, m)
+        """
+        if matrix.dtype == np.float32:
+            return matrix @ queries.T
+
+        # Upcast half-precision rows block by block to bound temporary memory
+        scores = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the top_k scores, best first."""
+        if top_k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def _rank(self, snap: IndexSnapshot, queries: np.ndarray, mask: Optional[np.ndarray],
+              top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Exact top_k rows per query.
+
+        Args:
+            snap: Snapshot to search
+            queries: Unit query vectors (m, d)
+            mask: Allowed rows (None = all)
+            top_k: Results per query
+
+        Returns:
+            One (rows, scores) pair per query, best first
+        """
+        if mask is None:
+            rows = np.arange(snap.count)
+            scores = self._score(snap.matrix, queries)
+        else:
+            rows = np.flatnonzero(mask)
+            scores = self._score(snap.matrix[rows], queries)
+
+        ranked = []
+        for q in range(len(queries)):
+            best = self._top_k(scores[:, q], top_k)
+            ranked.append((rows[best], scores[best, q]))
+        return ranked
+
+    def semantic_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """
+        Perform exact semantic search using query embedding.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filters: Metadata filters (e.g., {"location": "Canada"})
+
+        Returns:
+            List of SearchResult objects
+        """
+        return self.search_many([query_embedding], top_k=top_k, filters=filters)[0]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Exact semantic search for several queries with one matrix product.
+
+        The filter mask is built once, all queries are scored together and
+        each matched row is hydrated once even if several queries return it.
+
+        Args:
+            query_embeddings: Query vectors
+            top_k: Number of results per query
+            filters: Metadata filters shared by all queries
+
+        Returns:
+            One SearchResult list per query, in input order
+        """
+        start_time = time.time()
+        snap = self._current()
+        if not query_embeddings:
+            return []
+        if snap.count == 0 or top_k <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = self._normalize(self._profile_matrix(query_embeddings))
+        mask = self._filter_mask(snap, self._parse_filters(filters))
+        if mask is not None and not mask.any():
+            return [[] for _ in query_embeddings]
+
+        ranked = self._rank(snap, queries, mask, top_k)
+
+        # Hydrate each distinct row once
+        records = {}
+        for rows, _ in ranked:
+            for row in rows:
+                row = int(row)
+                if row not in records:
+                    records[row] = snap.record(row)
+
+        all_results = []
+        for rows, scores in ranked:
+            search_results = []
+            for row, score in zip(rows, scores):
+                row, score = int(row), float(score)
+                search_results.append(SearchResult(
+                    id=snap.ids[row],
+                    text=records[row]["text"],
+                    metadata=dict(records[row]["metadata"]),
+                    distance=1.0 - score,
+                    score=score,
+                    semantic_score=score
+                ))
+            all_results.append(search_results)
+
+        logger.debug(f"Semantic search: {len(queries)} queries, {len(records)} distinct results "
+                     f"({(time.time() - start_time) * 1000:.1f}ms)")
+        return all_results
+
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """
+        Perform BM25 keyword search over the snapshot's inverted index.
+
+        Args:
+            query: Query text
+            top_k: Number of results to return
+            filters: Metadata filters
+
+        Returns:
+            List of SearchResult objects (score = BM25 score)
+        """
+        snap = self._current()
+        if snap.count == 0 or top_k <= 0:
+            return []
+
+        mask = self._filter_mask(snap, self._parse_filters(filters))
+        search_results = []
+        for row, score in snap.bm25.top(query, top_k, mask=mask):
+            record = snap.record(row)
+            search_results.append(SearchResult(
+                id=snap.ids[row],
+                text=record["text"],
+                metadata=record["metadata"],
+                distance=0.0,  # Not applicable for keyword search
+                score=score
+            ))
+
+        logger.debug(f"Keyword search returned {len(search_results)} results")
+        return search_results
+
+    # ------------------------------------------------------------------
+    # Inspection / maintenance
+    # ------------------------------------------------------------------
+
+    def get_documents(self, ids: List[str]) -> List[SearchResult]:
+        """Stored chunks by ID, in input order (unknown IDs are skipped)."""
+        snap = self._current()
+        search_results = []
+        for chunk_id in ids:
+            row = snap.row_of.get(chunk_id)
+            if row is None:
+                continue
+            record = snap.record(row)
+            search_results.append(SearchResult(id=chunk_id, text=record["text"], metadata=record["metadata"],
+                                               distance=0.0, score=0.0))
+        return search_results
+
+    def count(self) -> int:
+        """Number of stored chunks."""
+        return self._current().count
+
+    def iter_documents(self, batch_size: int = 1000, include_embeddings: bool = True,
+                       name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Page through every stored document.
+
+        Args:
+            batch_size: Documents per page
+            include_embeddings: Whether to return vectors
+            name: Collection to read (default: the active collection)
+
+        Yields:
+            Dicts with 'ids', 'documents', 'metadatas' (and 'embeddings')
+        """
+        if name and name != self.collection_name:
+            other = NumpyVectorStore(str(self.persist_directory), self.embedding_dimensions, self.embedding_dtype)
+            other.collection_name = name
+            yield from other.iter_documents(batch_size, include_embeddings)
+            return
+
+        snap = self._current()
+        for start in range(0, snap.count, batch_size):
+            rows = range(start, min(start + batch_size, snap.count))
+            records = [snap.record(row) for row in rows]
+            page = {
+                'ids': [snap.ids[row] for row in rows],
+                'documents': [r["text"] for r in records],
+                'metadatas': [r["metadata"] for r in records]
+            }
+            if include_embeddings:
+                page['embeddings'] = np.asarray(snap.matrix[start:start + len(rows)], dtype=np.float32)
+            yield page
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get collection statistics."""
+        snap = self._current()
+        return {
+            "name": self.collection_name,
+            "count": snap.count,
+            "metadata": snap.manifest
+        }
+
+    def delete_collection(self, name: Optional[str] = None) -> None:
+        """Delete collection."""
+        collection_dir = self.persist_directory / (name or self.collection_name)
+        shutil.rmtree(collection_dir, ignore_errors=True)
+        logger.info(f"Deleted collection: {name or self.collection_name}")
+        if not name or name == self.collection_name:
+            self._snapshot = None
+            self._current_mtime = None
+
+    def reset(self) -> None:
+        """Reset vector store (delete all data)."""
+        self.create_collection(reset=True)
+        logger.warning("Vector store reset - all data deleted")
+
+    # ------------------------------------------------------------------
+    # Blue/green rebuilds
+    # ------------------------------------------------------------------
+    #
+    # Every write is already a new generation behind the CURRENT pointer; a
+    # rebuild stages its records on disk, writes one unpublished generation,
+    # validates it and flips CURRENT. The generation it replaces is recorded
+    # in PREVIOUS and kept for rollback().
+
+    def begin_rebuild(self) -> str:
+        """
+        Start staging a shadow version on disk.
+
+        Returns:
+            Rebuild handle (the generation name is assigned on publish)
+        """
+        version = f"rebuild-{uuid.uuid4().hex[:12]}"
+        self._rebuilds[version] = self._new_spill(version)
+        return version
+
+    def add_to_rebuild(self, version: str, ids: List[str], documents: List[str],
+                       metadatas: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        """
+        Stage records for a shadow version.
+
+        Args:
+            version: Handle returned by begin_rebuild()
+            ids: Chunk IDs
+            documents: Chunk texts
+            metadatas: Chunk metadata dicts
+            embeddings: Vectors (profile dimension)
+        """
+        if len(ids):
+            self._rebuilds[version].append(list(ids), list(documents), list(metadatas),
+                                           self._normalize(self._profile_matrix(embeddings)))
+
+    def publish_rebuild(self, version: str, expected_count: int,
+                        sample_embedding: Optional[List[float]] = None,
+                        sample_id: Optional[str] = None) -> str:
+        """
+        Write the shadow generation, validate it and flip CURRENT to it.
+
+        Args:
+            version: Handle returned by begin_rebuild()
+            expected_count: Number of documents written
+            sample_embedding: Stored vector the shadow must find (self-retrieval check)
+            sample_id: ID stored with sample_embedding (must be the top hit)
+
+        Returns:
+            The new live generation name
+
+        Raises:
+            RuntimeError: If validation fails (the live generation is untouched)
+        """
+        spill = self._rebuilds.pop(version)
+        try:
+            with self._locked():
+                generation = self._write_generation(
+                    spill.ids, spill.pages(), spill.dimensions or self.embedding_dimensions or 0,
+                    BM25Index.build(spill.texts()), publish=False
+                )
+                try:
+                    shadow = self._load_generation(generation)
+                    sample_score = top_score = None
+                    if sample_embedding is not None:
+                        query = self._normalize(self._profile_matrix([sample_embedding]))
+                        scores = self._score(shadow.matrix, query)[:, 0]
+                        top_score = float(scores.max()) if len(scores) else 0.0
+                        sample_score = top_score
+                        if sample_id is not None:
+                            row = shadow.row_of.get(sample_id)
+                            sample_score = float(scores[row]) if row is not None else 0.0
+                    self._validate_rebuild(generation, shadow.count, expected_count,
+                                           sample_score, top_score, sample_id)
+                except Exception:
+                    shutil.rmtree(self.collection_dir / generation, ignore_errors=True)
+                    raise
+
+                previous = self._current().generation
+                self._publish_generation(generation)
+        finally:
+            spill.remove()
+
+        logger.info(f"Published generation {generation} ({expected_count} documents, previous: {previous})")
+        return generation
+
+    def abort_rebuild(self, version: str) -> None:
+        """Discard a shadow version."""
+        spill = self._rebuilds.pop(version, None)
+        if spill is not None:
+            spill.remove()
+        logger.warning(f"Discarded shadow version: {version}")
+
+    def _generations(self) -> List[str]:
+        return sorted(p.name for p in self.collection_dir.glob("gen-*") if p.is_dir())
+
+    def rollback(self) -> str:
+        """
+        Make the previous generation live again (the current one becomes previous).
+
+        Returns:
+            The new live generation name
+
+        Raises:
+            RuntimeError: If there is no previous generation
+        """
+        with self._locked():
+            previous = self._previous_generation()
+            if previous is None:
+                raise RuntimeError(f"No previous version of {self.collection_name} to roll back to")
+            self._publish_generation(previous)
+
+        logger.warning(f"Rolled back {self.collection_name} to {previous}")
+        return previous
+
+    def live_version(self) -> str:
+        """Live generation name (one stat() of CURRENT per call)."""
+        return self._current().generation
+
+    def list_versions(self) -> Dict[str, Any]:
+        """Live and previous generation names plus every stored generation's count."""
+        live = self._current().generation
+        versions = {}
+        for name in self._generations():
+            with open(self.collection_dir / name / "manifest.json", 'r') as f:
+                versions[name] = json.load(f)["count"]
+        return {
+            "live": live,
+            "previous": self._previous_generation(),
+            "versions": versions
+        }
@@ -6,19 +6,25 @@ Provides same interface for backward compatibility with existing routes.
 """
 
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterator, Optional, List
 from pathlib import Path
 from flask import current_app
 
 from app.services.chatbot.data_processor import DataProcessor
 from app.services.chatbot.embedding_service import EmbeddingService
-from app.services.chatbot.vector_store import VectorStore
+from app.services.chatbot.vector_store import create_vector_store
 from app.services.chatbot.query_processor import QueryProcessor
-from app.services.chatbot.retrieval_service import RetrievalService
+from app.services.chatbot.retrieval_service import RetrievalResult, RetrievalService
+from app.services.chatbot.retrieval_cache import RetrievalCache
+from app.services.chatbot.answer_cache import AnswerCache, is_follow_up
 from app.services.chatbot.generation_service import GenerationService
+from app.services.chatbot.history_compactor import HistoryCompactor
 from app.services.chatbot.metadata_service import MetadataService
 from app.services.chatbot.update_service import UpdateService
+from app.services.chatbot.batch_jobs import BatchJobStore, BatchJobPoller
+from app.services.chatbot.settings import get_app, get_setting
 
 logger = logging.getLogger(__name__)
 
@@ -39,36 +45,112 @@ class RAGOrchestrator:
         """
         self.data_dir = data_dir
 
+        # Seconds spent loading each component (reported by the warm-up)
+        self.load_times: Dict[str, float] = {}
+
         # Initialize all services
         self.data_processor = DataProcessor()
-        self.embedding_service = EmbeddingService(
+        self.embedding_service = self._timed('embedding_service', lambda: EmbeddingService(
             api_key=None,  # Will load from env
             cache_dir=f"{data_dir}/embedding_cache"
+        ))
+        self.vector_store = self._timed('vector_store', lambda: create_vector_store(
+            get_setting('CHATBOT_VECTOR_ENGINE', 'chroma'),
+            data_dir=data_dir,
+            embedding_dimensions=self.embedding_service.dimensions,
+            embedding_dtype=self.embedding_service.storage_dtype
+        ))
+        self.query_processor = QueryProcessor()
+        self.metadata_service = MetadataService(data_dir=data_dir)
+
+        # Retrieval results are cached per knowledge base and live index version
+        self.retrieval_cache = RetrievalCache(
+            max_entries=int(get_setting('CHATBOT_RETRIEVAL_CACHE_SIZE', 512)),
+            ttl_seconds=float(get_setting('CHATBOT_RETRIEVAL_CACHE_TTL', 600)),
+            version_source=self.index_version
         )
-        self.vector_store = VectorStore(
-            persist_directory=f"{data_dir}/chroma_db"
+        self.metadata_service.add_update_listener(self.retrieval_cache.invalidate)
+
+        # Generated answers are reused for paraphrased questions
+        self.answer_cache = AnswerCache(
+            max_entries=int(get_setting('CHATBOT_ANSWER_CACHE_SIZE', 256)),
+            threshold=float(get_setting('CHATBOT_ANSWER_CACHE_THRESHOLD', 0.95)),
+            ttl_seconds=float(get_setting('CHATBOT_ANSWER_CACHE_TTL', 21600)),
+            version_source=self.index_version
         )
-        self.query_processor = QueryProcessor()
-        self.retrieval_service = RetrievalService(
+        self.metadata_service.add_update_listener(self.answer_cache.purge)
+
+        self.retrieval_service = self._timed('retrieval_service', lambda: RetrievalService(
             vector_store=self.vector_store,
-            embedding_service=self.embedding_service
-        )
+            embedding_service=self.embedding_service,
+            cache=self.retrieval_cache
+        ))
         self.generation_service = GenerationService(api_key=None)  # Will load from env
-        self.metadata_service = MetadataService(data_dir=data_dir)
+
+        # Conversation history is bounded by tokens before generation
+        self.history_compactor = HistoryCompactor(
+            budget_tokens=int(get_setting('CHATBOT_HISTORY_TOKEN_BUDGET', 2000))
+        )
+
+        # Batch API jobs are persisted and finished in the background
+        self.batch_jobs = BatchJobStore(data_dir=data_dir)
+        self.batch_poller = BatchJobPoller(
+            store=self.batch_jobs,
+            embedding_service=self.embedding_service,
+            poll_interval=int(get_setting('CHATBOT_BATCH_POLL_INTERVAL', 60)),
+            app=get_app()
+        )
+        self.batch_poller.register_handler("knowledge_base_load", self._complete_knowledge_base_load)
+
         self.update_service = UpdateService(
             data_processor=self.data_processor,
             embedding_service=self.embedding_service,
             vector_store=self.vector_store,
             metadata_service=self.metadata_service,
-            data_dir=data_dir
+            data_dir=data_dir,
+            batch_poller=self.batch_poller
         )
 
+        # Resume jobs submitted before a restart
+        pending_jobs = self.batch_jobs.pending_jobs()
+        if pending_jobs:
+            logger.info(f"Resuming {len(pending_jobs)} pending batch job(s)")
+            self.batch_poller.start()
+
         # Legacy compatibility
         self.knowledge_base = None
 
         logger.info("RAG Orchestrator initialized")
 
-    def load_knowledge_base(self, file_path: Path) -> Dict[str, Any]:
+    def _timed(self, name: str, build):
+        """Build a component, recording its load time under name."""
+        start_time = time.perf_counter()
+        component = build()
+        self.load_times[name] = round(time.perf_counter() - start_time, 3)
+        return component
+
+    def index_version(self) -> str:
+        """
+        Version the caches key on: knowledge base version plus live index version.
+
+        A rollback (in any worker) flips the live index without recording a
+        knowledge base version, so it must change the key as well.
+        """
+        return f"{self.metadata_service.current_version_id()}@{self.vector_store.live_version()}"
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Run a dummy retrieval pass so the first chat does not pay for lazy
+        initialization (index pages, torch kernels, re-rank workers).
+
+        Returns:
+            Seconds per warmed component
+        """
+        timings = self.retrieval_service.warm_up()
+        self.load_times.update(timings)
+        return timings
+
+    def load_knowledge_base(self, file_path: Path, allow_batch_api: bool = True) -> Dict[str, Any]:
         """
         Load DR knowledge base from Excel file.
 
@@ -77,22 +159,35 @@ class RAGOrchestrator:
 
         Args:
             file_path: Path to Excel knowledge base file
+            allow_batch_api: Whether large embedding jobs may go to the Batch API
 
         Returns:
             dict: Load result with keys:
                 - success: bool
                 - document_count: int
                 - error: str (if failed)
+                - batch_job_id: str (if embeddings were sent to the Batch API)
         """
         result = {
             'success': False,
             'document_count': 0,
-            'error': None
+            'error': None,
+            'batch_job_id': None
         }
 
         try:
             logger.info(f"Loading knowledge base from: {file_path}")
 
+            # Empty index: restore the latest snapshot instead of re-embedding
+            if self.vector_store.count() == 0:
+                try:
+                    header = self.update_service.restore_snapshot()
+                except Exception as e:
+                    logger.warning(f"Snapshot restore failed, loading from Excel: {e}")
+                    header = None
+                if header and self.metadata_service.get_statistics()['total_chunks'] == 0:
+                    self.metadata_service.sync_from_chromadb(self.vector_store)
+
             # Check if already loaded
             stats = self.metadata_service.get_statistics()
             if stats['total_chunks'] > 0:
@@ -121,12 +216,30 @@ class RAGOrchestrator:
             if len(chunks) >= 100:
                 logger.info("Using Batch API for embeddings (>100 chunks)")
                 texts = [chunk.text for chunk in chunks]
-                embeddings_dict = self.embedding_service.embed_batch(texts)
 
-                # Check for pending batch
-                if 'batch_job' in embeddings_dict and embeddings_dict.get('pending'):
-                    result['error'] = "Batch processing started - knowledge base will be ready in 10-20 minutes"
-                    return result
+                # One job per source file, however many workers or restarts ask for it
+                with self.batch_jobs.submitting():
+                    pending = (self.batch_jobs.find_pending("knowledge_base_load", source_file=str(file_path))
+                               if allow_batch_api else None)  # False: finishing that very job
+                    if pending:
+                        logger.info(f"Knowledge base load already waiting on batch job {pending['id']}")
+                        result['batch_job_id'] = pending['id']
+                        result['error'] = "Batch processing in progress - knowledge base will be ready in 10-20 minutes"
+                        return result
+
+                    embeddings_dict = self.embedding_service.embed_batch(texts, allow_batch_api=allow_batch_api)
+
+                    # Check for pending batch - the poller finishes the load when it completes
+                    if 'batch_job' in embeddings_dict and embeddings_dict.get('pending'):
+                        batch_job = embeddings_dict['batch_job']
+                        self.batch_poller.track(
+                            batch_job,
+                            purpose="knowledge_base_load",
+                            source_file=str(file_path)
+                        )
+                        result['batch_job_id'] = batch_job.id
+                        result['error'] = "Batch processing started - knowledge base will be ready in 10-20 minutes"
+                        return result
 
                 # Extract embeddings in order
                 embeddings = []
@@ -137,9 +250,9 @@ class RAGOrchestrator:
                 logger.info("Using direct API for embeddings (<100 chunks)")
                 embeddings = [self.embedding_service.embed_single(chunk.text) for chunk in chunks]
 
-            # Create collection and add documents
-            self.vector_store.create_collection(reset=True)
-            self.vector_store.add_documents(chunks, embeddings)
+            # Build a shadow version and swap it in: readers keep the old index until then
+            live_version = self.vector_store.rebuild(chunks, embeddings)
+            logger.info(f"Knowledge base published as {live_version}")
 
             # Update metadata
             self.metadata_service.record_update(
@@ -164,6 +277,23 @@ class RAGOrchestrator:
 
         return result
 
+    def _complete_knowledge_base_load(self, job_record: Dict[str, Any]) -> None:
+        """
+        Finish a knowledge base load once its Batch API job has completed.
+
+        Args:
+            job_record: Batch job record (context holds source_file)
+
+        Raises:
+            RuntimeError: If the load could not be completed
+        """
+        source_file = Path(job_record["context"]["source_file"])
+        logger.info(f"Completing knowledge base load from {source_file} (batch {job_record['id']})")
+
+        result = self.load_knowledge_base(source_file, allow_batch_api=False)
+        if not result['success']:
+            raise RuntimeError(result['error'] or "Knowledge base load failed")
+
     def semantic_search(self,
                        query: str,
                        top_k: int = 5,
@@ -230,6 +360,7 @@ class RAGOrchestrator:
                 - context_used: list of relevant documents
                 - processing_time: float (seconds)
                 - error: str (if failed)
+                - cached: True (if the answer came from the answer cache)
         """
         start_time = time.time()
 
@@ -242,49 +373,32 @@ class RAGOrchestrator:
         }
 
         try:
-            # Parse query and extract filters
-            parsed_query = self.query_processor.parse_query(message)
-            logger.info(f"Parsed query - Original: '{parsed_query.original}', Enhanced: '{parsed_query.enhanced}', Filters: {parsed_query.filters}")
-
-            # Retrieve relevant documents
-            if include_context:
-                # Try with original query (query enhancement might be hurting retrieval)
-                retrieved_docs = self.retrieval_service.retrieve(
-                    query=parsed_query.original,  # Using original query for better matching
-                    filters=parsed_query.filters,
-                    top_k=10,
-                    use_hybrid=False,  # Disabled hybrid search due to ChromaDB embedding dimension mismatch
-                    use_reranking=True
-                )
-
-                logger.info(f"Retrieved {len(retrieved_docs)} documents. Scores: {[round(doc.score, 3) for doc in retrieved_docs[:5]]}")
-                if len(retrieved_docs) > 0:
-                    logger.info(f"Top result: Event {retrieved_docs[0].metadata.get('event_id')}, Hazard: {retrieved_docs[0].metadata.get('hazard')}, Score: {retrieved_docs[0].score:.3f}")
-                else:
-                    logger.warning("No documents retrieved! Database might be empty or query is too restrictive.")
-
-                # Format for legacy interface
-                result['context_used'] = [
-                    {
-                        'text': doc.text,
-                        'score': doc.score,
-                        'data': doc.metadata
-                    }
-                    for doc in retrieved_docs
-                ]
-            else:
-                retrieved_docs = []
+            retrieved_docs = self._retrieve_context(message) if include_context else []
+            result['context_used'] = self._context_used(retrieved_docs)
+
+            # Reuse the answer to a paraphrase of this question
+            query_embedding, cached = self._cached_answer(message, chat_history, retrieved_docs)
+            if cached is not None:
+                result['response'] = cached.response
+                result['cached'] = True
+                result['success'] = True
+                logger.info(f"Answer cache hit: '{message[:50]}' matched '{cached.query[:50]}'")
+                return result
 
             # Generate response
             generation_result = self.generation_service.generate_response(
                 query=message,
                 retrieved_docs=retrieved_docs,
-                conversation_history=chat_history
+                conversation_history=self.history_compactor.compact(chat_history)
             )
 
             result['response'] = generation_result['response']
             result['success'] = True
 
+            if query_embedding is not None and 'error' not in generation_result.get('metadata', {}):
+                self.answer_cache.put(message, query_embedding, [doc.event_id for doc in retrieved_docs],
+                                      generation_result['response'])
+
             logger.info(f"Chat completed: {len(retrieved_docs)} docs retrieved, "
                        f"{len(generation_result['response'])} chars generated")
 
@@ -297,6 +411,111 @@ class RAGOrchestrator:
 
         return result
 
+    def _retrieve_context(self, message: str) -> List[RetrievalResult]:
+        """Parse the message and retrieve the documents used as context."""
+        # Parse query and extract filters
+        parsed_query = self.query_processor.parse_query(message)
+        logger.info(f"Parsed query - Original: '{parsed_query.original}', Enhanced: '{parsed_query.enhanced}', Filters: {parsed_query.filters}")
+
+        # Try with original query (query enhancement might be hurting retrieval)
+        retrieved_docs = self.retrieval_service.retrieve(
+            query=parsed_query.original,  # Using original query for better matching
+            filters=parsed_query.filters,
+            top_k=10,
+            use_hybrid=get_setting('CHATBOT_USE_HYBRID', True),  # Semantic + local BM25 (RRF)
+            use_reranking=True
+        )
+
+        logger.info(f"Retrieved {len(retrieved_docs)} documents. Scores: {[round(doc.score, 3) for doc in retrieved_docs[:5]]}")
+        if len(retrieved_docs) > 0:
+            logger.info(f"Top result: Event {retrieved_docs[0].metadata.get('event_id')}, Hazard: {retrieved_docs[0].metadata.get('hazard')}, Score: {retrieved_docs[0].score:.3f}")
+        else:
+            logger.warning("No documents retrieved! Database might be empty or query is too restrictive.")
+        return retrieved_docs
+
+    def _cached_answer(self, message: str, chat_history: Optional[List[Dict[str, str]]],
+                       retrieved_docs: List[RetrievalResult]):
+        """
+        Look the message up in the answer cache.
+
+        Returns:
+            (query embedding, CachedAnswer or None); the embedding is None when
+            the message must not be cached (cache off, no context, follow-up)
+        """
+        if not self.answer_cache.enabled or not retrieved_docs:
+            return None, None
+        if is_follow_up(message, chat_history):
+            self.answer_cache.record_skip()
+            return None, None
+
+        # Already embedded by retrieval: served from the embedding cache
+        query_embedding = self.embedding_service.embed_single(message)
+        return query_embedding, self.answer_cache.lookup(query_embedding, [doc.event_id for doc in retrieved_docs])
+
+    @staticmethod
+    def _context_used(retrieved_docs: List[RetrievalResult]) -> List[Dict[str, Any]]:
+        """Format retrieved documents for the legacy interface."""
+        return [
+            {
+                'text': doc.text,
+                'score': doc.score,
+                'data': doc.metadata
+            }
+            for doc in retrieved_docs
+        ]
+
+    def chat_stream(self,
+                    message: str,
+                    chat_history: Optional[List[Dict[str, str]]] = None,
+                    include_context: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a chatbot response as a stream of events.
+
+        Retrieval runs first; the answer is then streamed as it is generated.
+
+        Args:
+            message: User message
+            chat_history: Previous conversation history (list of {role, content} dicts)
+            include_context: Whether to include knowledge base context
+
+        Yields:
+            Event dicts {'event': name, 'data': dict}, in order:
+                - context: {'context_used': [...]} once retrieval is done
+                - token: {'text': str} per generated fragment
+                - done: {'response': str, 'processing_time': float} ('cached': True
+                  if the answer came from the answer cache)
+
+        Raises:
+            Exception: If retrieval or generation fails (nothing further is yielded)
+        """
+        start_time = time.time()
+
+        retrieved_docs = self._retrieve_context(message) if include_context else []
+        yield {'event': 'context', 'data': {'context_used': self._context_used(retrieved_docs)}}
+
+        query_embedding, cached = self._cached_answer(message, chat_history, retrieved_docs)
+        if cached is not None:
+            logger.info(f"Answer cache hit: '{message[:50]}' matched '{cached.query[:50]}'")
+            yield {'event': 'token', 'data': {'text': cached.response}}
+            yield {'event': 'done', 'data': {'response': cached.response, 'cached': True,
+                                             'processing_time': time.time() - start_time}}
+            return
+
+        parts = []
+        for fragment in self.generation_service.generate_stream(
+            query=message,
+            retrieved_docs=retrieved_docs,
+            conversation_history=self.history_compactor.compact(chat_history)
+        ):
+            parts.append(fragment)
+            yield {'event': 'token', 'data': {'text': fragment}}
+
+        response = "".join(parts)
+        if query_embedding is not None:
+            self.answer_cache.put(message, query_embedding, [doc.event_id for doc in retrieved_docs], response)
+        logger.info(f"Chat streamed: {len(retrieved_docs)} docs retrieved, {len(response)} chars generated")
+        yield {'event': 'done', 'data': {'response': response, 'processing_time': time.time() - start_time}}
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Get knowledge base statistics.
@@ -311,19 +530,14 @@ class RAGOrchestrator:
         # Also check ChromaDB collection directly as fallback
         is_loaded = metadata_stats['total_chunks'] > 0
 
-        # Double-check by trying to get collection info from ChromaDB
+        # Double-check against the vector store itself
         try:
-            # First, list all collections to see what exists
-            all_collections = self.vector_store.client.list_collections()
-            logger.info(f"Available ChromaDB collections: {[c.name for c in all_collections]}")
+            stored_chunks = self.vector_store.count()
+            logger.info(f"Vector store count: {stored_chunks}, metadata shows loaded: {is_loaded}")
 
-            collection = self.vector_store.client.get_collection(self.vector_store.collection_name)
-            chroma_count = collection.count()
-            logger.info(f"ChromaDB collection count: {chroma_count}, metadata shows loaded: {is_loaded}")
-
-            if chroma_count > 0 and not is_loaded:
-                # ChromaDB has data but metadata doesn't - sync metadata from ChromaDB
-                logger.warning(f"ChromaDB has {chroma_count} chunks but metadata shows 0 - syncing metadata")
+            if stored_chunks > 0 and not is_loaded:
+                # Vector store has data but metadata doesn't - sync metadata from it
+                logger.warning(f"Vector store has {stored_chunks} chunks but metadata shows 0 - syncing metadata")
                 if self.metadata_service.sync_from_chromadb(self.vector_store):
                     # Reload stats after sync
                     metadata_stats = self.metadata_service.get_statistics()
@@ -341,8 +555,9 @@ class RAGOrchestrator:
             'document_count': metadata_stats['total_events'],
             'chunk_count': metadata_stats['total_chunks'],
             'model_loaded': True,
-            'model_name': 'text-embedding-3-small',
-            'embedding_dimension': 1536,
+            'model_name': self.embedding_service.model,
+            'embedding_backend': self.embedding_service.backend.name,
+            'embedding_dimension': self.embedding_service.dimensions,
             'last_update': metadata_stats.get('last_update'),
             'unique_hazards': metadata_stats.get('unique_hazards', 0),
             'unique_locations': metadata_stats.get('unique_locations', 0)
@@ -352,6 +567,9 @@ class RAGOrchestrator:
 # Global service instance
 _rag_orchestrator: Optional[RAGOrchestrator] = None
 
+# Serializes the first build (startup warm-up and early requests)
+_rag_orchestrator_lock = threading.Lock()
+
 
 def get_chatbot_service() -> RAGOrchestrator:
     """
@@ -364,17 +582,23 @@ def get_chatbot_service() -> RAGOrchestrator:
     """
     global _rag_orchestrator
 
-    if _rag_orchestrator is None:
-        _rag_orchestrator = RAGOrchestrator()
+    if _rag_orchestrator is not None:
+        return _rag_orchestrator
 
-        # Auto-load knowledge base if configured
-        kb_path = current_app.config.get('CHATBOT_KNOWLEDGE_BASE_PATH')
-        if kb_path and Path(kb_path).exists():
-            logger.info(f"Auto-loading knowledge base from config: {kb_path}")
-            result = _rag_orchestrator.load_knowledge_base(Path(kb_path))
-            if result['success']:
-                logger.info(f"Knowledge base loaded: {result['document_count']} events")
-            else:
-                logger.warning(f"Failed to auto-load knowledge base: {result.get('error')}")
+    with _rag_orchestrator_lock:
+        if _rag_orchestrator is None:
+            service = RAGOrchestrator()
+
+            # Auto-load knowledge base if configured
+            kb_path = current_app.config.get('CHATBOT_KNOWLEDGE_BASE_PATH')
+            if kb_path and Path(kb_path).exists():
+                logger.info(f"Auto-loading knowledge base from config: {kb_path}")
+                result = service._timed('knowledge_base', lambda: service.load_knowledge_base(Path(kb_path)))
+                if result['success']:
+                    logger.info(f"Knowledge base loaded: {result['document_count']} events")
+                else:
+                    logger.warning(f"Failed to auto-load knowledge base: {result.get('error')}")
+
+            _rag_orchestrator = service
 
     return _rag_orchestrator
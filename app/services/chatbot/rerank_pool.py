@@ -0,0 +1,441 @@
+"""
+Out-of-process Cross-Encoder Pool for DR Knowledge Chatbot.
+
+Cross-encoder inference is CPU-bound Python/torch work; run in the Flask
+request thread it serializes concurrent chats on the GIL. RerankPool runs
+it in a few worker processes instead, each loading the model once:
+
+    request thread --(query, texts)--> request queue --> worker process
+          ^                                                   |
+          +-- Future <-- result queue <-- scores written into shared memory
+
+Scores come back through a per-request shared-memory block that the worker
+fills in place (no pickled arrays). Callers wait on a Future with a timeout
+and fall back to the retrieval order when it expires (RerankUnavailable).
+
+With several gunicorn workers, run one shared pool with
+scripts/rerank_server.py and set CHATBOT_RERANK_SERVER; each app process
+then connects to it (RemoteRerankClient) instead of starting its own pool,
+so the model is loaded once per pool worker rather than once per app worker.
+
+multiprocessing connections pickle their messages, so anyone who can
+authenticate to the server can run code in it. There is no default secret:
+the server and its clients refuse to start without CHATBOT_RERANK_AUTHKEY,
+and a Unix socket is created readable by its owner only.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.chatbot.reranker import RERANK_MODEL, Reranker
+from app.services.chatbot.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request thread waits for scores before falling back
+DEFAULT_RERANK_TIMEOUT = 2.0
+
+
+
+class RerankUnavailable(RuntimeError):
+    """Scores could not be produced in time (timeout, no live worker, server down)."""
+
+
+def _authkey(authkey: Optional[str]) -> bytes:
+    """
+    Encode the shared secret for RerankServer connections.
+
+    Raises:
+        ValueError: If no secret is configured
+    """
+    if not authkey:
+        raise ValueError("CHATBOT_RERANK_AUTHKEY must be set to a secret shared by the rerank "
+                         "server and the app (connections carry pickled messages)")
+    return authkey.encode("utf-8")
+
+
+def _worker_main(model_name: str, batch_size: int, threads: int, requests, results) -> None:
+    """Worker process: load the model once, then score requests until None arrives."""
+    try:
+        reranker = Reranker(model_name=model_name, batch_size=batch_size, threads=threads, cache_size=0)
+    except Exception as e:
+        results.put(("failed", os.getpid(), repr(e)))
+        return
+    results.put(("ready", os.getpid(), None))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, query, texts, shm_name = item
+        results.put(("started", os.getpid(), request_id))
+        try:
+            scores = reranker.predict([(query, text) for text in texts])
+            shm = SharedMemory(name=shm_name)
+            np.ndarray(len(texts), dtype=np.float32, buffer=shm.buf)[:] = scores
+            shm.close()
+            results.put((request_id, os.getpid(), None))
+        except Exception as e:
+            results.put((request_id, os.getpid(), repr(e)))
+
+
+class RerankPool:
+    """Cross-encoder worker processes behind a request queue."""
+
+    def __init__(self, processes: int = 2, model_name: str = RERANK_MODEL, batch_size: int = 32,
+                 threads: int = 0):
+        """
+        Start the worker processes (models load in the background).
+
+        Args:
+            processes: Worker processes
+            model_name: Cross-encoder model
+            batch_size: Pairs per forward pass
+            threads: Torch threads per worker (0 = cores / processes)
+        """
+        self.processes = processes
+        self.model_name = model_name
+        self._args = (model_name, batch_size, threads or max(1, (os.cpu_count() or 1) // processes))
+
+        # Spawned (not forked) workers: torch and a forked Flask process do not mix
+        self._context = multiprocessing.get_context("spawn")
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._workers: List = []
+        self._ready = set()
+        self._failed: Optional[str] = None
+        self._pending: Dict[int, Tuple[Future, SharedMemory, int]] = {}
+        self._in_flight: Dict[int, int] = {}  # worker pid -> request it is scoring
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for _ in range(processes):
+            self._start_worker()
+
+        self._collector = threading.Thread(target=self._collect, name="rerank-pool-results", daemon=True)
+        self._collector.start()
+        atexit.register(self.close)
+
+        logger.info(f"Rerank pool started: {processes} processes ({model_name})")
+
+    def _start_worker(self):
+        worker = self._context.Process(target=_worker_main, args=(*self._args, self._requests, self._results),
+                                       name="rerank-worker", daemon=True)
+        worker.start()
+        self._workers.append(worker)
+
+    @property
+    def ready(self) -> bool:
+        """Whether at least one worker has loaded the model."""
+        return bool(self._ready)
+
+    @property
+    def failed(self) -> Optional[str]:
+        """Model load error reported by the workers, if any."""
+        return self._failed
+
+    def _collect(self) -> None:
+        """Resolve futures from worker results (runs in a daemon thread)."""
+        while True:
+            try:
+                key, pid, error = self._results.get()
+            except (EOFError, OSError, ValueError):
+                return
+            if key is None:
+                return
+            if key == "ready":
+                self._ready.add(pid)
+                continue
+            if key == "failed":
+                self._failed = error
+                logger.warning(f"Rerank worker could not load the model: {error}")
+                continue
+            if key == "started":
+                self._in_flight[pid] = error  # the request id
+                continue
+
+            self._in_flight.pop(pid, None)
+            with self._lock:
+                entry = self._pending.pop(key, None)
+            if entry is None:
+                continue  # already failed (timeout or dead worker)
+            future, shm, count = entry
+            if error is None:
+                future.set_result(np.array(np.ndarray(count, dtype=np.float32, buffer=shm.buf)))
+            else:
+                future.set_exception(RuntimeError(error))
+            shm.close()
+            shm.unlink()
+
+    def _fail(self, request_id: int, error: str) -> None:
+        """Fail a pending request and release its shared memory (no-op if it already finished)."""
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        future, shm, _ = entry
+        if not future.done():
+            future.set_exception(RerankUnavailable(error))
+        shm.close()
+        shm.unlink()
+
+    def _restart_dead_workers(self) -> None:
+        for worker in [w for w in self._workers if not w.is_alive()]:
+            self._workers.remove(worker)
+            self._ready.discard(worker.pid)
+            request_id = self._in_flight.pop(worker.pid, None)
+            if request_id is not None:
+                self._fail(request_id, f"Rerank worker {worker.pid} exited")
+            if self._failed is None:
+                logger.warning(f"Rerank worker {worker.pid} exited; restarting")
+                self._start_worker()
+
+    def submit(self, query: str, texts: List[str]) -> Future:
+        """
+        Queue a scoring request.
+
+        Returns:
+            Future resolving to float32 scores aligned with texts
+
+        Raises:
+            RerankUnavailable: If the pool is closed or no worker has loaded the model
+        """
+        return self._submit(query, texts)[1]
+
+    def _submit(self, query: str, texts: List[str]) -> Tuple[int, Future]:
+        if self._closed or self._failed is not None:
+            raise RerankUnavailable(self._failed or "Rerank pool is closed")
+        self._restart_dead_workers()
+        if not self._ready:
+            raise RerankUnavailable("Rerank workers are still loading the model")
+
+        shm = SharedMemory(create=True, size=max(4 * len(texts), 4))
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = (future, shm, len(texts))
+        self._requests.put((request_id, query, list(texts), shm.name))
+        return request_id, future
+
+    def score(self, query: str, texts: List[str], timeout: float = DEFAULT_RERANK_TIMEOUT) -> np.ndarray:
+        """
+        Scores for (query, text) pairs, waiting at most timeout seconds.
+
+        Raises:
+            RerankUnavailable: On timeout or worker failure
+        """
+        request_id, future = self._submit(query, texts)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Nobody waits for a late answer: release the block now
+            self._fail(request_id, f"Rerank timed out after {timeout}s")
+            raise RerankUnavailable(f"Rerank timed out after {timeout}s")
+        except RuntimeError as e:
+            if isinstance(e, RerankUnavailable):
+                raise
+            raise RerankUnavailable(str(e))
+
+    def close(self) -> None:
+        """Stop the workers and fail pending requests."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._results.put((None, None, None))
+        self._collector.join(timeout=5)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, shm, _ in pending.values():
+            future.set_exception(RerankUnavailable("Rerank pool closed"))
+            shm.close()
+            shm.unlink()
+
+
+def _parse_address(address: str):
+    """"host:port" -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+class RerankServer:
+    """Serves a RerankPool to other processes over multiprocessing connections."""
+
+    def __init__(self, pool: RerankPool, address: str, authkey: str):
+        """
+        Args:
+            pool: RerankPool (or any object with score(query, texts, timeout))
+            address: "host:port" or Unix socket path
+            authkey: Shared secret clients must present
+
+        Raises:
+            ValueError: If authkey is empty
+        """
+        self.pool = pool
+        parsed = _parse_address(address)
+        key = _authkey(authkey)
+        if isinstance(parsed, str):
+            # Unix socket: created owner-only (no window before a chmod)
+            old_umask = os.umask(0o177)
+            try:
+                self.listener = Listener(parsed, authkey=key)
+            finally:
+                os.umask(old_umask)
+        else:
+            self.listener = Listener(parsed, authkey=key)
+
+    def serve_forever(self) -> None:
+        """Accept clients; one thread per connection."""
+        logger.info(f"Rerank server listening on {self.listener.address}")
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                logger.warning(f"Rejected rerank client: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection) -> None:
+        with connection:
+            while True:
+                try:
+                    query, texts, timeout = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    scores = self.pool.score(query, texts, timeout=timeout)
+                    connection.send((None, scores.astype(np.float32).tobytes()))
+                except RerankUnavailable as e:
+                    connection.send((str(e), None))
+
+    def close(self) -> None:
+        self.listener.close()
+
+
+class RemoteRerankClient:
+    """Client for a RerankServer (one connection per thread)."""
+
+    def __init__(self, address: str, authkey: str):
+        """
+        Raises:
+            ValueError: If authkey is empty
+        """
+        self.address = _parse_address(address)
+        self.authkey = _authkey(authkey)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def score(self, query: str, texts: List[str], timeout: float = DEFAULT_RERANK_TIMEOUT) -> np.ndarray:
+        """
+        Scores for (query, text) pairs from the server.
+
+        Raises:
+            RerankUnavailable: On timeout, server error or connection failure
+        """
+        try:
+            connection = self._connection()
+            connection.send((query, list(texts), timeout))
+            if not connection.poll(timeout + 0.5):
+                # A late answer would desynchronize the connection: start a new one next time
+                self._drop_connection()
+                raise RerankUnavailable(f"Rerank server timed out after {timeout}s")
+            error, payload = connection.recv()
+        except (OSError, EOFError) as e:
+            self._drop_connection()
+            raise RerankUnavailable(f"Rerank server unavailable: {e}")
+
+        if error is not None:
+            raise RerankUnavailable(error)
+        return np.frombuffer(payload, dtype=np.float32)
+
+
+class PooledReranker(Reranker):
+    """Reranker whose model runs in a RerankPool or behind a RerankServer."""
+
+    def __init__(self, client, model_name: str = RERANK_MODEL, cache_size: int = 4096,
+                 timeout: float = DEFAULT_RERANK_TIMEOUT):
+        """
+        Args:
+            client: RerankPool or RemoteRerankClient
+            model_name: Model the client serves (part of the cache key)
+            cache_size: Scores kept in the LRU cache
+            timeout: Seconds to wait for scores
+        """
+        self.client = client
+        self.timeout = timeout
+        super().__init__(model_name=model_name, cache_size=cache_size)
+
+    def _load_model(self, threads: int):
+        return None  # The model lives in the pool's processes
+
+    def predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Scores from the pool (all pairs share one query)."""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return self.client.score(pairs[0][0], [text for _, text in pairs], timeout=self.timeout)
+
+
+def create_reranker() -> Optional[Reranker]:
+    """
+    Reranker configured by settings.
+
+    CHATBOT_RERANK_SERVER set: connect to a shared rerank server.
+    CHATBOT_RERANK_PROCESSES > 0: start a private process pool (per app
+    worker: prefer the shared server under gunicorn).
+    Otherwise: load the model in this process.
+
+    Returns:
+        Reranker, or None if the model cannot be loaded
+    """
+    batch_size = int(get_setting('CHATBOT_RERANK_BATCH_SIZE', 32))
+    threads = int(get_setting('CHATBOT_RERANK_THREADS', 0))
+    cache_size = int(get_setting('CHATBOT_RERANK_CACHE_SIZE', 4096))
+    timeout = float(get_setting('CHATBOT_RERANK_TIMEOUT', DEFAULT_RERANK_TIMEOUT))
+    server = get_setting('CHATBOT_RERANK_SERVER', '')
+    processes = int(get_setting('CHATBOT_RERANK_PROCESSES', 0))
+
+    try:
+        if server:
+            logger.info(f"Using rerank server at {server}")
+            client = RemoteRerankClient(server, authkey=get_setting('CHATBOT_RERANK_AUTHKEY', ''))
+            return PooledReranker(client, cache_size=cache_size, timeout=timeout)
+        if processes > 0:
+            pool = RerankPool(processes=processes, batch_size=batch_size, threads=threads)
+            return PooledReranker(pool, cache_size=cache_size, timeout=timeout)
+        return Reranker(batch_size=batch_size, threads=threads, cache_size=cache_size)
+    except Exception as e:
+        logger.warning(f"Could not load re-ranker: {e}. Re-ranking disabled.")
+        return None
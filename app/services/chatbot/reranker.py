@@ -0,0 +1,170 @@
+"""
+Cross-Encoder Re-ranker for DR Knowledge Chatbot.
+
+The MiniLM cross-encoder is the dominant local cost of a chat message, so
+RetrievalService only sends it the candidates that can still change the
+answer (select_rerank_candidates) and scores each (query, chunk) pair once:
+scores are kept in an LRU cache keyed by (query hash, chunk ID, model), so
+follow-up and repeated questions skip the model for chunks already scored.
+The key also carries a checksum of the chunk text so chunks rewritten by an
+update are scored again.
+"""
+
+import hashlib
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.chatbot.vector_store import SearchResult
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+class ScoreCache:
+    """Thread-safe LRU map of (query hash, chunk ID, model, text checksum) -> cross-encoder score."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[float]]:
+        """Cached scores (None when missing), refreshing the hits."""
+        with self._lock:
+            found = []
+            for key in keys:
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                found.append(score)
+            hits = sum(score is not None for score in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            return found
+
+    def put_many(self, keys: Sequence[Hashable], scores: Sequence[float]) -> None:
+        """Store scores, evicting the least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+def select_rerank_candidates(candidates: List[SearchResult], top_k: int, margin: float,
+                             max_depth: int) -> List[SearchResult]:
+    """
+    Candidates worth sending to the cross-encoder.
+
+    Semantic candidates more than `margin` below the leader's semantic score
+    are pruned; keyword-only hybrid hits have no semantic score and are kept.
+    At most max_depth candidates are kept (in retrieval order), and never
+    fewer than top_k when that many exist.
+
+    Args:
+        candidates: Retrieval candidates, best first
+        top_k: Results the caller needs
+        margin: Semantic-score margin below the leader (<= 0 disables pruning)
+        max_depth: Maximum candidates to re-rank
+
+    Returns:
+        The selected candidates, in retrieval order
+    """
+    depth = max(top_k, max_depth)
+    if margin <= 0 or not candidates:
+        return candidates[:depth]
+
+    semantic = [c.semantic_score for c in candidates]
+    known = [s for s in semantic if s is not None]
+    if not known:
+        return candidates[:depth]
+
+    floor = max(known) - margin
+    selected = [c for c, s in zip(candidates, semantic) if s is None or s >= floor][:depth]
+
+    # Keep at least top_k: top up in retrieval order
+    if len(selected) < top_k:
+        chosen = {id(c) for c in selected}
+        extra = [c for c in candidates if id(c) not in chosen][:top_k - len(selected)]
+        order = {id(c): i for i, c in enumerate(candidates)}
+        selected = sorted(selected + extra, key=lambda c: order[id(c)])
+    return selected
+
+
+class Reranker:
+    """Cross-encoder scoring with a score cache and configurable batching."""
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = 32, threads: int = 0,
+                 cache_size: int = 4096):
+        """
+        Load the cross-encoder.
+
+        Args:
+            model_name: Sentence-transformers cross-encoder model
+            batch_size: Pairs per forward pass in CrossEncoder.predict
+            threads: Torch intra-op threads (0 = torch default); process-wide
+            cache_size: Scores kept in the LRU cache (0 disables caching)
+
+        Raises:
+            Exception: If the model cannot be loaded
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = ScoreCache(cache_size)
+        self.model = self._load_model(threads)
+
+    def _load_model(self, threads: int):
+        """Load the cross-encoder in this process."""
+        from sentence_transformers import CrossEncoder
+
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+
+        # Explicitly specify device='cpu' to avoid meta tensor issues with newer transformers
+        return CrossEncoder(self.model_name, device='cpu')
+
+    def predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Raw cross-encoder scores for (query, text) pairs."""
+        return np.asarray(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False),
+                          dtype=np.float32)
+
+    def score(self, query: str, results: List[SearchResult]) -> np.ndarray:
+        """
+        Cross-encoder score of each result for the query, using the cache.
+
+        Args:
+            query: User query
+            results: Candidates to score
+
+        Returns:
+            Scores aligned with results
+        """
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        keys = [(query_hash, result.id, self.model_name, zlib.crc32(result.text.encode('utf-8')))
+                for result in results]
+        cached = self.cache.get_many(keys)
+
+        missing = [i for i, score in enumerate(cached) if score is None]
+        scores = np.array([score if score is not None else 0.0 for score in cached], dtype=np.float32)
+        if missing:
+            fresh = self.predict([(query, results[i].text) for i in missing])
+            scores[missing] = fresh
+            self.cache.put_many([keys[i] for i in missing], fresh)
+
+        logger.debug(f"Cross-encoder scored {len(missing)} pairs ({len(results) - len(missing)} cached)")
+        return scores
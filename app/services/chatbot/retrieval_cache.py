@@ -0,0 +1,94 @@
+"""
+Retrieval Result Cache for DR Knowledge Chatbot.
+
+Operators often ask near-identical questions within minutes ("latest
+measles in Canada"); each one costs a query embedding, a vector query and a
+cross-encoder pass. RetrievalService keeps its final results here, keyed by
+the normalized query text, the extracted filters, the retrieval options and
+the knowledge base version id from MetadataService.
+
+Entries expire after a TTL and the least recently used are evicted beyond
+max_entries. Because the version id is part of the key, a recorded update
+makes every older entry unreachable; MetadataService also notifies the
+cache so those entries are dropped at once rather than aged out.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Punctuation and whitespace that do not change what a question asks for
+_QUERY_NOISE = re.compile(r"[\s?!.,;:]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace/punctuation so trivial variants share a key."""
+    return _QUERY_NOISE.sub(" ", query.casefold()).strip()
+
+
+class RetrievalCache:
+    """Thread-safe LRU + TTL cache of retrieval results per knowledge base version."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 600,
+                 version_source: Optional[Callable[[], str]] = None):
+        """
+        Args:
+            max_entries: Result lists kept (0 disables caching)
+            ttl_seconds: Seconds an entry stays valid
+            version_source: Returns the current knowledge base version id
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_source = version_source or (lambda: "")
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, query: str, filters: Optional[Dict[str, Any]], **options) -> Hashable:
+        """Cache key for a retrieval call under the current knowledge base version."""
+        return (
+            self.version_source(),
+            normalize_query(query),
+            json.dumps(filters or {}, sort_keys=True, default=str),
+            tuple(sorted(options.items()))
+        )
+
+    def get(self, key: Hashable) -> Optional[List[Any]]:
+        """Cached results (a new list), or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: Hashable, results: List[Any]) -> None:
+        """Store results, evicting the least recently used entries."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, version_id: Optional[str] = None) -> None:
+        """Drop all entries (called when a new knowledge base version is recorded)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
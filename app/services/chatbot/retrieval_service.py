@@ -6,13 +6,19 @@ Per chatbot_revised.md: Top-50 hybrid retrieval → re-rank to top-10.
 """
 
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 
-from sentence_transformers import CrossEncoder
+import numpy as np
 
-from app.services.chatbot.vector_store import VectorStore, SearchResult
+from app.services.chatbot.vector_store import BaseVectorStore, SearchResult
 from app.services.chatbot.embedding_service import EmbeddingService
+from app.services.chatbot.event_aggregation import collapse_by_event, reconstitute_events
+from app.services.chatbot.reranker import Reranker, select_rerank_candidates
+from app.services.chatbot.rerank_pool import RerankUnavailable, create_reranker
+from app.services.chatbot.retrieval_cache import RetrievalCache
+from app.services.chatbot.settings import get_setting
 
 logger = logging.getLogger(__name__)
 
@@ -29,26 +35,72 @@ class RetrievalResult:
 class RetrievalService:
     """Retrieve and rank relevant documents for queries."""
 
-    def __init__(self, vector_store: VectorStore, embedding_service: EmbeddingService):
+    def __init__(self, vector_store: BaseVectorStore, embedding_service: EmbeddingService,
+                 reranker: Optional[Reranker] = None, cache: Optional[RetrievalCache] = None):
         """
         Initialize retrieval service.
 
         Args:
             vector_store: Vector store instance
             embedding_service: Embedding service instance
+            reranker: Cross-encoder re-ranker (default: loaded from settings)
+            cache: Result cache for retrieve() (default: no caching)
         """
         self.vector_store = vector_store
         self.embedding_service = embedding_service
+        self.cache = cache
+
+        # Candidate pool and adaptive re-rank depth
+        self.candidate_count = int(get_setting('CHATBOT_RERANK_CANDIDATES', 100))
+        self.rerank_max_depth = int(get_setting('CHATBOT_RERANK_MAX_DEPTH', 30))
+        self.rerank_margin = float(get_setting('CHATBOT_RERANK_MARGIN', 0.15))
+
+        # One hit per event: re-rank each event once, send each event's text once
+        self.collapse_events = bool(get_setting('CHATBOT_COLLAPSE_EVENTS', True))
 
         # Initialize cross-encoder for re-ranking
-        try:
-            # Explicitly specify device='cpu' to avoid meta tensor issues with newer transformers
-            self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', device='cpu')
-            self.reranking_enabled = True
-            logger.info("Cross-encoder re-ranker loaded successfully")
-        except Exception as e:
-            logger.warning(f"Could not load re-ranker: {e}. Re-ranking disabled.")
-            self.reranking_enabled = False
+        self.reranker = reranker
+        if self.reranker is None:
+            self.reranker = create_reranker()
+            if self.reranker is not None:
+                logger.info("Cross-encoder re-ranker loaded successfully")
+        self.reranking_enabled = self.reranker is not None
+
+    def warm_up(self, timeout: float = 120.0) -> Dict[str, float]:
+        """
+        Run a dummy search and cross-encoder pass (no embedding API call).
+
+        A random unit vector touches the index so its pages and search
+        structures are loaded; a single scored pair initializes torch, and
+        for a re-rank pool waits until a worker has loaded the model.
+
+        Args:
+            timeout: Seconds to wait for the re-ranker to become available
+
+        Returns:
+            Seconds spent per step ('vector_search', 'reranker')
+        """
+        timings = {}
+
+        start_time = time.perf_counter()
+        if self.vector_store.count() > 0:
+            vector = np.random.default_rng(0).standard_normal(self.embedding_service.dimensions)
+            self.vector_store.semantic_search((vector / np.linalg.norm(vector)).tolist(), top_k=self.candidate_count)
+        timings['vector_search'] = round(time.perf_counter() - start_time, 3)
+
+        if self.reranking_enabled:
+            start_time = time.perf_counter()
+            while True:
+                try:
+                    self.reranker.predict([("warm-up", "warm-up")])
+                    break
+                except RerankUnavailable:
+                    if time.perf_counter() - start_time > timeout:
+                        raise
+                    time.sleep(0.5)
+            timings['reranker'] = round(time.perf_counter() - start_time, 3)
+
+        return timings
 
     def retrieve(
         self,
@@ -71,17 +123,26 @@ class RetrievalService:
         Returns:
             List of RetrievalResult objects
         """
+        cache_key = None
+        if self.cache is not None and self.cache.enabled:
+            cache_key = self.cache.key(query, filters, top_k=top_k, use_hybrid=use_hybrid,
+                                       use_reranking=use_reranking and self.reranking_enabled)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Retrieval cache hit: '{query}', Filters: {filters}")
+                return cached
+
         # Generate query embedding
         logger.info(f"Retrieval query: '{query}', Filters: {filters}")
         query_embedding = self.embedding_service.embed_single(query)
 
         # Retrieve candidates
         if use_hybrid:
-            # Hybrid search: retrieve top-50 for re-ranking
+            # Hybrid search: wide candidate pool for re-ranking
             candidates = self.vector_store.hybrid_search(
                 query=query,
                 query_embedding=query_embedding,
-                top_k=100,  # Increased to get more candidates for re-ranking
+                top_k=self.candidate_count,
                 alpha=0.7,  # 70% semantic, 30% keyword
                 filters=filters
             )
@@ -89,10 +150,13 @@ class RetrievalService:
             # Pure semantic search - retrieve more candidates for better coverage
             candidates = self.vector_store.semantic_search(
                 query_embedding=query_embedding,
-                top_k=100,  # Increased from 50 to cast wider net
+                top_k=self.candidate_count,
                 filters=filters
             )
 
+        if self.collapse_events:
+            candidates = collapse_by_event(candidates)
+
         logger.info(f"Retrieved {len(candidates)} candidates before re-ranking")
         if len(candidates) > 0:
             logger.info(f"Top 3 candidates: {[(c.metadata.get('event_id'), c.metadata.get('hazard'), round(c.score, 3)) for c in candidates[:3]]}")
@@ -106,6 +170,9 @@ class RetrievalService:
             results = candidates[:top_k]
             logger.info(f"No re-ranking, returning top {len(results)} candidates")
 
+        if self.collapse_events:
+            results = reconstitute_events(results, self.vector_store)
+
         # Convert to RetrievalResult
         retrieval_results = [
             RetrievalResult(
@@ -117,9 +184,54 @@ class RetrievalService:
             for r in results
         ]
 
+        if cache_key is not None:
+            self.cache.put(cache_key, retrieval_results)
+
         logger.info(f"Retrieval returned {len(retrieval_results)} results")
         return retrieval_results
 
+    def retrieve_many(
+        self,
+        queries: List[str],
+        filters: Dict[str, Any] = None,
+        top_k: int = 10
+    ) -> List[List[RetrievalResult]]:
+        """
+        Semantic retrieval for several queries at once (no re-ranking).
+
+        Embeds all queries in one request and searches them with one
+        VectorStore.search_many call; used for query expansion,
+        multi-question messages and offline evaluation.
+
+        Args:
+            queries: Query texts
+            filters: Metadata filters shared by all queries
+            top_k: Number of results per query
+
+        Returns:
+            One RetrievalResult list per query, in input order
+        """
+        if not queries:
+            return []
+
+        embeddings = self.embedding_service.embed_batch(queries, allow_batch_api=False)
+        query_embeddings = [embeddings[self.embedding_service._text_hash(q)] for q in queries]
+
+        per_query = self.vector_store.search_many(query_embeddings, top_k=top_k, filters=filters)
+
+        return [
+            [
+                RetrievalResult(
+                    event_id=r.metadata.get('event_id', 'unknown'),
+                    text=r.text,
+                    score=r.score,
+                    metadata=r.metadata
+                )
+                for r in results
+            ]
+            for results in per_query
+        ]
+
     def rerank(
         self,
         query: str,
@@ -129,6 +241,12 @@ class RetrievalService:
         """
         Re-rank results using cross-encoder.
 
+        Only candidates within CHATBOT_RERANK_MARGIN of the leader's semantic
+        score (at most CHATBOT_RERANK_MAX_DEPTH) are scored; the rest cannot
+        realistically reach the top_k and are dropped. If the re-rank pool
+        cannot answer within CHATBOT_RERANK_TIMEOUT, the retrieval order is
+        kept.
+
         Args:
             query: User query
             results: Initial search results
@@ -140,15 +258,18 @@ class RetrievalService:
         if not self.reranking_enabled:
             return results[:top_k]
 
-        # Prepare query-document pairs
-        pairs = [(query, result.text) for result in results]
+        candidates = select_rerank_candidates(results, top_k, self.rerank_margin, self.rerank_max_depth)
 
-        # Score with cross-encoder
-        scores = self.reranker.predict(pairs)
+        # Score with cross-encoder (cached pairs are not recomputed)
+        try:
+            scores = self.reranker.score(query, candidates)
+        except RerankUnavailable as e:
+            logger.warning(f"Re-ranking skipped, keeping semantic order: {e}")
+            return results[:top_k]
 
         # Combine results with new scores
         reranked = sorted(
-            zip(results, scores),
+            zip(candidates, scores),
             key=lambda x: x[1],
             reverse=True
         )
@@ -159,7 +280,7 @@ class RetrievalService:
             result.score = float(score)  # Update with re-ranker score
             final_results.append(result)
 
-        logger.debug(f"Re-ranked {len(results)} results to top-{top_k}")
+        logger.debug(f"Re-ranked {len(candidates)} of {len(results)} results to top-{top_k}")
         return final_results
 
     def format_context(
@@ -0,0 +1,40 @@
+"""
+Settings helper for DR Knowledge Chatbot services.
+
+Chatbot services also run outside a request (background pollers, warm-up,
+scripts), so config lookups must fall back to defaults without an app context.
+"""
+
+from typing import Any, Optional
+
+
+def get_setting(key: str, default: Any) -> Any:
+    """
+    Read a value from Flask config, falling back to default outside app context.
+
+    Args:
+        key: Config key (e.g. 'CHATBOT_BATCH_THRESHOLD')
+        default: Value returned when no app context or key is missing
+
+    Returns:
+        Configured value or default
+    """
+    try:
+        from flask import current_app
+        return current_app.config.get(key, default)
+    except Exception:
+        return default
+
+
+def get_app() -> Optional[Any]:
+    """
+    The current Flask app, for background threads that need its context.
+
+    Returns:
+        The app object, or None outside an app context
+    """
+    try:
+        from flask import current_app
+        return current_app._get_current_object()
+    except Exception:
+        return None
@@ -8,7 +8,7 @@ Per chatbot_revised.md: Daily updates, 2-day backup retention, MD5 change detect
 import logging
 import shutil
 import sys
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from pathlib import Path
 from dataclasses import dataclass
@@ -18,8 +18,10 @@ from flask import current_app
 
 from app.services.chatbot.data_processor import DataProcessor
 from app.services.chatbot.embedding_service import EmbeddingService
-from app.services.chatbot.vector_store import VectorStore
+from app.services.chatbot.vector_store import BaseVectorStore
 from app.services.chatbot.metadata_service import MetadataService
+from app.services.chatbot.index_snapshot import SNAPSHOT_SUFFIX, export_snapshot, import_snapshot
+from app.services.chatbot.batch_jobs import BatchJobPoller
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,8 @@ class ChangeSet:
     """Changes detected between old and new database."""
     new_events: List
     modified_events: List
-    deleted_events: List
+    deleted_events: List  # Entry IDs (the events no longer exist in the new file)
+    full_rebuild: bool = False  # Diff unavailable - re-index everything
 
     def is_empty(self) -> bool:
         """Check if there are any changes."""
@@ -43,6 +46,14 @@ class ChangeSet:
             "deleted": len(self.deleted_events)
         }
 
+    def events_to_index(self) -> List:
+        """Events that must be (re-)chunked and embedded."""
+        return list(self.new_events) + list(self.modified_events)
+
+    def stale_event_ids(self) -> List[str]:
+        """Event IDs whose stored chunks must be removed."""
+        return [event.entry_id for event in self.modified_events] + list(self.deleted_events)
+
 
 @dataclass
 class UpdateResult:
@@ -53,6 +64,7 @@ class UpdateResult:
     backup_id: str = ""
     changes: Dict[str, int] = None
     error: str = ""
+    batch_job_id: str = ""
 
 
 class UpdateService:
@@ -62,9 +74,10 @@ class UpdateService:
         self,
         data_processor: DataProcessor,
         embedding_service: EmbeddingService,
-        vector_store: VectorStore,
+        vector_store: BaseVectorStore,
         metadata_service: MetadataService,
-        data_dir: str = "app/data/chatbot"
+        data_dir: str = "app/data/chatbot",
+        batch_poller: Optional[BatchJobPoller] = None
     ):
         """
         Initialize update service.
@@ -75,11 +88,16 @@ class UpdateService:
             vector_store: Vector store
             metadata_service: Metadata service
             data_dir: Data directory
+            batch_poller: Poller that finishes uploads sent to the Batch API
         """
         self.data_processor = data_processor
         self.embedding_service = embedding_service
         self.vector_store = vector_store
         self.metadata_service = metadata_service
+        self.batch_poller = batch_poller
+
+        if self.batch_poller is not None:
+            self.batch_poller.register_handler("upload", self.resume_upload)
 
         self.data_dir = Path(data_dir)
         self.uploads_dir = self.data_dir / "uploads"
@@ -114,6 +132,59 @@ class UpdateService:
             excel_file.save(str(upload_path))
             logger.info(f"Saved upload to: {upload_path}")
 
+        except Exception as e:
+            error_msg = f"Update failed: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return UpdateResult(success=False, message=error_msg, error=str(e))
+
+        return self._apply_upload(upload_path, uploaded_by, version_id)
+
+    def resume_upload(self, job_record: Dict[str, Any]) -> None:
+        """
+        Finish an upload whose embeddings were produced by a Batch API job.
+
+        Called by the batch job poller once the batch output is in the
+        embedding cache. Re-runs the update from the saved upload file; all
+        embeddings are now cache hits.
+
+        Args:
+            job_record: Batch job record (context holds upload_path, uploaded_by, version_id)
+
+        Raises:
+            RuntimeError: If the update could not be applied
+        """
+        context = job_record["context"]
+        logger.info(f"Resuming upload {context['version_id']} after batch job {job_record['id']}")
+
+        result = self._apply_upload(
+            Path(context["upload_path"]),
+            context["uploaded_by"],
+            context["version_id"],
+            allow_batch_api=False
+        )
+        if not result.success:
+            raise RuntimeError(result.error or result.message)
+
+    def _apply_upload(
+        self,
+        upload_path: Path,
+        uploaded_by: str,
+        version_id: str,
+        allow_batch_api: bool = True
+    ) -> UpdateResult:
+        """
+        Validate a saved upload and apply it to the vector store.
+
+        Args:
+            upload_path: Saved Excel file
+            uploaded_by: User who uploaded the file
+            version_id: Version identifier for this update
+            allow_batch_api: Whether large embedding jobs may go to the Batch API
+
+        Returns:
+            UpdateResult with operation details
+        """
+        try:
             # 2. Load and validate
             new_df = self.data_processor.load_excel(str(upload_path))
             validation = self.data_processor.validate_data(new_df)
@@ -125,13 +196,13 @@ class UpdateService:
 
             # 3. Check if ChromaDB has data (first upload vs update)
             try:
-                collection = self.vector_store.client.get_collection(self.vector_store.collection_name)
-                has_existing_data = collection.count() > 0
-            except:
+                has_existing_data = self.vector_store.count() > 0
+            except Exception:
                 has_existing_data = False
 
             # 3b. Detect changes (compare with current database)
             changeset = self._detect_changes(new_df)
+            total_events = int(new_df['ENTRY_#'].notna().sum())
 
             if changeset.is_empty() and has_existing_data:
                 logger.info("No changes detected and database already loaded")
@@ -140,14 +211,14 @@ class UpdateService:
                     message="No changes detected - database is already up to date",
                     version_id=version_id
                 )
-            elif changeset.is_empty() and not has_existing_data:
-                # No changes but database is empty - this is first load, process everything
-                logger.info("No changes detected but database is empty - processing all events as initial load")
-                all_events = self.data_processor.extract_events(new_df)
+            elif not has_existing_data and not changeset.full_rebuild:
+                # Vector store is empty - this is a first load, process everything
+                logger.info("Vector store is empty - processing all events as initial load")
                 changeset = ChangeSet(
-                    new_events=all_events,
+                    new_events=self.data_processor.extract_events(new_df),
                     modified_events=[],
-                    deleted_events=[]
+                    deleted_events=[],
+                    full_rebuild=True
                 )
 
             logger.info(f"Changes detected: {changeset.summary()}")
@@ -156,16 +227,15 @@ class UpdateService:
             backup_id = self._create_backup()
             logger.info(f"Backup created: {backup_id}")
 
-            # 5. Process new/modified events
-            logger.info("Step 5: Extracting events from uploaded file...")
-            sys.stdout.flush()
-            all_events = self.data_processor.extract_events(new_df)
-            logger.info(f"Extracted {len(all_events)} events")
+            # 5. Process new/modified events only
+            events_to_index = changeset.events_to_index()
+            logger.info(f"Step 5: {len(events_to_index)} new/modified events to index"
+                        f"{' (full rebuild)' if changeset.full_rebuild else ''}")
             sys.stdout.flush()
 
             logger.info("Step 6: Chunking events...")
             sys.stdout.flush()
-            chunks = self.data_processor.chunk_events(all_events)
+            chunks = self.data_processor.chunk_events(events_to_index)
             logger.info(f"Created {len(chunks)} chunks")
             sys.stdout.flush()
 
@@ -184,17 +254,37 @@ class UpdateService:
             # Use embed_batch which handles caching and batching intelligently
             logger.info(f"Calling embed_batch for {len(texts)} texts...")
             sys.stdout.flush()
-            embeddings_dict = self.embedding_service.embed_batch(texts)
+            embeddings_dict = self.embedding_service.embed_batch(texts, allow_batch_api=allow_batch_api)
 
             # Check if Batch API was used (async processing)
             if 'batch_job' in embeddings_dict and embeddings_dict.get('pending'):
-                logger.info("Batch API job pending - embeddings will be processed asynchronously")
+                batch_job = embeddings_dict['batch_job']
+                logger.info(f"Batch API job {batch_job.id} pending - update will be applied when it completes")
                 sys.stdout.flush()
+
+                if self.batch_poller is None:
+                    return UpdateResult(
+                        success=False,
+                        message="Batch processing started but no batch poller is configured",
+                        version_id=version_id,
+                        error=f"Batch job {batch_job.id} must be applied manually"
+                    )
+
+                self.batch_poller.track(
+                    batch_job,
+                    purpose="upload",
+                    upload_path=str(upload_path),
+                    uploaded_by=uploaded_by,
+                    version_id=version_id
+                )
                 return UpdateResult(
-                    success=False,
-                    message="Batch processing started - update will complete in 10-20 minutes",
+                    success=True,
+                    message=(f"Batch embedding job submitted for {len(texts)} chunks - the update "
+                             f"will be applied automatically when it completes (typically 10-20 minutes)"),
                     version_id=version_id,
-                    error="Use check_batch_status endpoint to monitor progress"
+                    backup_id=backup_id,
+                    changes=changeset.summary(),
+                    batch_job_id=batch_job.id
                 )
 
             # Extract embeddings in same order as chunks
@@ -211,18 +301,26 @@ class UpdateService:
             logger.info(f"All {len(embeddings)} embeddings ready")
             sys.stdout.flush()
 
-            # 7. Update vector store (atomic operation)
-            logger.info("Updating vector store...")
-            self.vector_store.create_collection(reset=True)  # Reset and recreate
-            self.vector_store.add_documents(chunks, embeddings)
+            # 7. Update vector store
+            if changeset.full_rebuild:
+                # Shadow build + alias flip: chat keeps using the old index meanwhile
+                logger.info("Rebuilding vector store...")
+                live_version = self.vector_store.rebuild(
+                    chunks, embeddings,
+                    progress_callback=lambda done: logger.info(f"Indexed {done}/{len(chunks)} chunks")
+                )
+                logger.info(f"Live index version: {live_version}")
+            else:
+                logger.info("Applying incremental vector store update...")
+                self.vector_store.replace_events(chunks, embeddings, changeset.stale_event_ids())
 
             # 8. Update metadata
             logger.info("Updating metadata...")
             self.metadata_service.record_update(
                 version_id=version_id,
                 source_file=str(upload_path),
-                total_events=len(all_events),
-                total_chunks=len(chunks),
+                total_events=total_events,
+                total_chunks=self.vector_store.count(),
                 changes=changeset.summary(),
                 uploaded_by=uploaded_by,
                 status="completed"
@@ -231,14 +329,19 @@ class UpdateService:
             # 9. Replace current database file
             shutil.copy(upload_path, self.current_db_path)
 
-            # 10. Cleanup old backups (keep last 2 days)
+            # 10. Snapshot the updated index (restorable without re-embedding)
+            self._write_snapshot(version_id)
+
+            # 11. Cleanup old backups (keep last 2 days)
             self.metadata_service.cleanup_old_backups(str(self.backups_dir), retention_days=2)
 
             logger.info(f"Update completed successfully: {version_id}")
 
             return UpdateResult(
                 success=True,
-                message=f"Update successful: {changeset.summary()['new']} new, {changeset.summary()['modified']} modified events",
+                message=(f"Update successful: {changeset.summary()['new']} new, "
+                         f"{changeset.summary()['modified']} modified, "
+                         f"{changeset.summary()['deleted']} deleted events"),
                 version_id=version_id,
                 backup_id=backup_id,
                 changes=changeset.summary()
@@ -271,7 +374,8 @@ class UpdateService:
             return ChangeSet(
                 new_events=all_events,
                 modified_events=[],
-                deleted_events=[]
+                deleted_events=[],
+                full_rebuild=True
             )
 
         try:
@@ -286,14 +390,14 @@ class UpdateService:
             deleted_ids = set(old_events.keys()) - set(new_events.keys())
             common_ids = set(new_events.keys()) & set(old_events.keys())
 
-            # Detect modifications (simple: check if any field changed)
+            # Detect modifications: any indexed field changed (text or metadata)
+            compare_columns = [col for col in new_df.columns if col in old_df.columns]
             modified_ids = []
             for entry_id in common_ids:
                 old_row = old_events[entry_id]
                 new_row = new_events[entry_id]
 
-                # Compare SUMMARY field (most likely to change)
-                if str(old_row.get('SUMMARY', '')) != str(new_row.get('SUMMARY', '')):
+                if any(str(old_row.get(col, '')) != str(new_row.get(col, '')) for col in compare_columns):
                     modified_ids.append(entry_id)
 
             # Extract actual events
@@ -305,24 +409,26 @@ class UpdateService:
                 new_df[new_df['ENTRY_#'].astype(str).isin(modified_ids)]
             )
 
-            deleted_event_objects = []  # We don't delete, just track
+            # Only the IDs are needed to drop their chunks (same form as Event.entry_id)
+            deleted_event_ids = sorted(entry_id.zfill(5) for entry_id in deleted_ids if entry_id != 'nan')
 
             logger.info(f"Changes: {len(new_ids)} new, {len(modified_ids)} modified, {len(deleted_ids)} deleted")
 
             return ChangeSet(
                 new_events=new_event_objects,
                 modified_events=modified_event_objects,
-                deleted_events=deleted_event_objects
+                deleted_events=deleted_event_ids
             )
 
         except Exception as e:
             logger.error(f"Error detecting changes: {e}")
-            # If comparison fails, treat all as new
+            # If comparison fails, rebuild from the new file
             all_events = self.data_processor.extract_events(new_df)
             return ChangeSet(
                 new_events=all_events,
                 modified_events=[],
-                deleted_events=[]
+                deleted_events=[],
+                full_rebuild=True
             )
 
     def _create_backup(self) -> str:
@@ -339,6 +445,43 @@ class UpdateService:
         logger.info(f"Created backup: {backup_path}")
         return backup_id
 
+    def _write_snapshot(self, version_id: str) -> Optional[Path]:
+        """
+        Export the live index to backups/backup_<timestamp>.snapshot.
+
+        A failed export is logged and does not fail the update.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_path = self.backups_dir / f"backup_{timestamp}{SNAPSHOT_SUFFIX}"
+        try:
+            export_snapshot(self.vector_store, str(snapshot_path), version_id=version_id)
+            return snapshot_path
+        except Exception as e:
+            logger.warning(f"Index snapshot failed: {e}")
+            return None
+
+    def latest_snapshot(self) -> Optional[Path]:
+        """Most recent index snapshot, if any."""
+        snapshots = sorted(self.backups_dir.glob(f"backup_*{SNAPSHOT_SUFFIX}"))
+        return snapshots[-1] if snapshots else None
+
+    def restore_snapshot(self, snapshot_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load an index snapshot into the vector store (no embedding API calls).
+
+        Args:
+            snapshot_path: Snapshot to load (default: the most recent one)
+
+        Returns:
+            The snapshot header, or None if there is no snapshot
+        """
+        snapshot_path = snapshot_path or self.latest_snapshot()
+        if snapshot_path is None:
+            return None
+
+        logger.info(f"Restoring index from snapshot: {snapshot_path.name}")
+        return import_snapshot(self.vector_store, str(snapshot_path))
+
     def _rollback(self, backup_id: str):
         """
         Rollback to a previous backup.
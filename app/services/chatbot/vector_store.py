@@ -3,21 +3,71 @@ Vector Store Service for DR Knowledge Chatbot.
 
 Handles ChromaDB operations: semantic search, metadata filtering, hybrid search.
 Per chatbot_revised.md: ChromaDB with persistent storage, hybrid search (semantic + BM25).
+
+Engines share BaseVectorStore (filter parsing, hybrid search / RRF) and are
+selected with CHATBOT_VECTOR_ENGINE via create_vector_store():
+- chroma: ChromaDB persistent collection (VectorStore, default)
+- numpy:  in-process exact search over a memory-mapped matrix (numpy_vector_store.py)
+- ivfpq:  the numpy engine searched through an IVF-PQ index (ann_vector_store.py)
+
+Full reloads go through rebuild(): a shadow version is loaded, validated and
+swapped in with one pointer flip (ChromaDB: aliases.json -> versioned
+collection; NumPy: CURRENT -> generation), keeping the previous version for
+rollback().
 """
 
+import json
 import logging
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import os
+from datetime import datetime
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, Callable
+from dataclasses import dataclass, field
 from pathlib import Path
 
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions
 
+from app.services.chatbot.bm25_index import KeywordIndex
+from app.services.chatbot.file_lock import file_lock
+from app.services.chatbot.facet_index import (
+    FACET_METADATA_VERSION,
+    facet_key,
+    facet_metadata,
+    query_terms,
+    strip_facet_metadata,
+)
+from app.services.chatbot.hnsw_index import HNSWSettings, distance_to_score
+from app.services.chatbot.settings import get_setting
 from app.services.chatbot.data_processor import Chunk
 
 logger = logging.getLogger(__name__)
 
+# BM25 candidates checked against ChromaDB metadata filters
+KEYWORD_FILTER_CANDIDATES = 2000
+
+# Event IDs per metadata delete query
+DELETE_BATCH_SIZE = 500
+
+# Chunks per write for streaming ingest and shadow rebuilds (ChromaDB also
+# caps this at the client's max batch size)
+STREAM_BATCH_SIZE = 1000
+
+# A shadow version's sample query must find its own vector at least this well
+REBUILD_MIN_SAMPLE_SCORE = 0.99
+
+# ... and rank it first (scores this close to the top hit count as a tie)
+REBUILD_SAMPLE_TIE = 1e-4
+
+# Hits fetched for the sample query (duplicated vectors may outrank the sample's ID)
+SAMPLE_QUERY_HITS = 10
+
+# Facet filters narrowing the corpus below this many chunks are dropped
+# (the extracted hazard/location was probably wrong) and search runs unfiltered
+FACET_MIN_MATCHES = 5
+
 
 # ============================================================================
 # Data Models
@@ -31,187 +81,279 @@ class SearchResult:
     metadata: Dict[str, Any]
     distance: float  # Lower is better (cosine distance)
     score: float  # Higher is better (similarity score)
+    semantic_score: Optional[float] = None  # Cosine similarity, kept when score is replaced (RRF, re-ranking)
+
+
+@dataclass
+class FilterSpec:
+    """Engine-neutral form of retrieval metadata filters."""
+    equals: Dict[str, Any] = field(default_factory=dict)  # Exact matches (location, section)
+    date_from_unix: Optional[int] = None
+    date_to_unix: Optional[int] = None
+    # Facet terms (hazard, location, year); relaxed when they match too few rows
+    facets: Dict[str, List[str]] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        """Check if no condition is set."""
+        return (not self.equals and not self.facets
+                and self.date_from_unix is None and self.date_to_unix is None)
+
+    def without_facets(self) -> "FilterSpec":
+        """Same hard conditions, no facet conditions."""
+        return FilterSpec(equals=dict(self.equals), date_from_unix=self.date_from_unix,
+                          date_to_unix=self.date_to_unix)
 
 
 # ============================================================================
-# Vector Store
+# Base Vector Store
 # ============================================================================
 
-class VectorStore:
-    """ChromaDB vector store with hybrid search capabilities."""
+class BaseVectorStore:
+    """
+    Engine-independent part of the vector store.
 
-    def __init__(self, persist_directory: str = "app/data/chatbot/chroma_db"):
-        """
-        Initialize ChromaDB vector store.
+    Engines implement storage and single-mode search; filter parsing and
+    hybrid search (RRF) are shared so RetrievalService works with any engine.
+    """
 
-        Args:
-            persist_directory: Path to persistent storage
-        """
-        self.persist_directory = Path(persist_directory)
-        self.persist_directory.mkdir(parents=True, exist_ok=True)
+    collection_name = "epidemiological_events"
+    embedding_dimensions: Optional[int] = None
+    embedding_dtype: str = "float32"
 
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=str(self.persist_directory),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+    # ------------------------------------------------------------------
+    # Engine interface
+    # ------------------------------------------------------------------
 
-        self.collection_name = "epidemiological_events"
-        self.collection = None
+    def create_collection(self, name: Optional[str] = None, reset: bool = False) -> None:
+        """Create or open the collection (reset=True empties it)."""
+        raise NotImplementedError
 
-        logger.info(f"Vector store initialized at: {self.persist_directory}")
+    def add_documents(self, chunks: List[Chunk], embeddings: List[List[float]]) -> None:
+        """Add chunks with embeddings."""
+        raise NotImplementedError
 
-    def create_collection(self, name: Optional[str] = None, reset: bool = False) -> None:
+    def add_stream(self, pairs: Iterable[Tuple[Chunk, List[float]]], batch_size: Optional[int] = None,
+                   progress_callback: Optional[Callable[[int], None]] = None) -> int:
         """
-        Create or get collection.
+        Upsert (chunk, embedding) pairs from an iterator in bounded batches.
 
         Args:
-            name: Collection name (default: epidemiological_events)
-            reset: Whether to delete existing collection
-        """
-        collection_name = name or self.collection_name
-
-        if reset:
-            try:
-                self.client.delete_collection(collection_name)
-                logger.info(f"Deleted existing collection: {collection_name}")
-            except:
-                pass  # Collection didn't exist
+            pairs: (Chunk, embedding) pairs, consumed lazily
+            batch_size: Pairs per write (default STREAM_BATCH_SIZE)
+            progress_callback: Called with the number of pairs written so far
 
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"description": "Disease outbreak surveillance database"}
-        )
+        Returns:
+            Number of pairs written
+        """
+        raise NotImplementedError
 
-        logger.info(f"Collection ready: {collection_name} ({self.collection.count()} documents)")
+    def delete_events(self, event_ids: List[str]) -> int:
+        """Remove every chunk of the given events; returns the number of chunks removed."""
+        raise NotImplementedError
 
-    def add_documents(self, chunks: List[Chunk], embeddings: List[List[float]]) -> None:
+    def replace_events(self, chunks: List[Chunk], embeddings: List[List[float]],
+                       stale_event_ids: List[str]) -> None:
         """
-        Add chunks with embeddings to collection.
+        Apply an incremental update: drop stale events' chunks, then upsert new ones.
 
         Args:
-            chunks: List of Chunk objects
+            chunks: Chunks of new and modified events
             embeddings: Corresponding embedding vectors
+            stale_event_ids: Modified and deleted event IDs whose old chunks are removed
         """
-        if not self.collection:
-            self.create_collection()
+        if stale_event_ids:
+            self.delete_events(stale_event_ids)
+        if chunks:
+            self.add_documents(chunks, embeddings)
+
+    def semantic_search(self, query_embedding: List[float], top_k: int = 10,
+                        filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Nearest-neighbour search by query vector."""
+        raise NotImplementedError
+
+    def search_many(self, query_embeddings: List[List[float]], top_k: int = 10,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[SearchResult]]:
+        """Nearest-neighbour search for several query vectors at once (one list per query)."""
+        raise NotImplementedError
+
+    def keyword_search(self, query: str, top_k: int = 10,
+                       filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Lexical search by query text."""
+        raise NotImplementedError
+
+    def get_documents(self, ids: List[str]) -> List[SearchResult]:
+        """Stored chunks by ID (unknown IDs are skipped; score fields are 0)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of stored chunks."""
+        raise NotImplementedError
+
+    def iter_documents(self, batch_size: int = 1000, include_embeddings: bool = True,
+                       name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Page through stored documents."""
+        raise NotImplementedError
 
-        if len(chunks) != len(embeddings):
-            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch")
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get collection statistics."""
+        raise NotImplementedError
 
-        # Prepare data for ChromaDB
-        ids = [f"{chunk.event_id}_{chunk.chunk_index}" for chunk in chunks]
-        documents = [chunk.text for chunk in chunks]
-        metadatas = [chunk.metadata for chunk in chunks]
-
-        # Add to collection
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas
-        )
+    def delete_collection(self, name: Optional[str] = None) -> None:
+        """Delete collection."""
+        raise NotImplementedError
 
-        logger.info(f"Added {len(chunks)} documents to collection")
+    def reset(self) -> None:
+        """Reset vector store (delete all data)."""
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # Blue/green rebuilds
+    # ------------------------------------------------------------------
+    #
+    # A full reload is written to a shadow version that readers cannot see,
+    # validated, and made live with a single pointer flip. The version it
+    # replaces is kept for rollback().
+
+    def begin_rebuild(self) -> str:
+        """Create an empty shadow version and return its name."""
+        raise NotImplementedError
+
+    def add_to_rebuild(self, version: str, ids: List[str], documents: List[str],
+                       metadatas: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        """Write records into a shadow version."""
+        raise NotImplementedError
+
+    def publish_rebuild(self, version: str, expected_count: int,
+                        sample_embedding: Optional[List[float]] = None,
+                        sample_id: Optional[str] = None) -> str:
+        """Validate a shadow version and make it live; returns the live version name."""
+        raise NotImplementedError
+
+    def abort_rebuild(self, version: str) -> None:
+        """Discard a shadow version."""
+        raise NotImplementedError
+
+    def rollback(self) -> str:
+        """Make the previous version live again; returns its name."""
+        raise NotImplementedError
+
+    def list_versions(self) -> Dict[str, Any]:
+        """Live and previous version names plus every stored version's count."""
+        raise NotImplementedError
+
+    def live_version(self) -> str:
+        """
+        Name of the live version, following flips made by other processes.
 
-    def semantic_search(
-        self,
-        query_embedding: List[float],
-        top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
-    ) -> List[SearchResult]:
+        Changes on publish_rebuild() and rollback(); caches key on it so a
+        rollback in any worker invalidates results built from the old index.
         """
-        Perform semantic search using query embedding.
+        raise NotImplementedError
+
+    def rebuild(self, chunks: List[Chunk], embeddings: List[List[float]],
+                batch_size: int = STREAM_BATCH_SIZE,
+                progress_callback: Optional[Callable[[int], None]] = None) -> str:
+        """
+        Replace the whole collection without readers seeing a partial index.
 
         Args:
-            query_embedding: Query vector
-            top_k: Number of results to return
-            filters: Metadata filters (e.g., {"hazard": "measles"})
+            chunks: Every chunk of the new corpus
+            embeddings: Corresponding embedding vectors
+            batch_size: Chunks per write
+            progress_callback: Called with the number of chunks written so far
 
         Returns:
-            List of SearchResult objects
+            Name of the new live version
         """
-        if not self.collection:
-            self.create_collection()
-
-        # Build where clause from filters
-        where = self._build_where_clause(filters) if filters else None
-
-        # Query collection
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=where
-        )
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch")
 
-        # Parse results
-        search_results = []
-        for i in range(len(results['ids'][0])):
-            # Convert distance to similarity score (cosine similarity = 1 - cosine distance)
-            distance = results['distances'][0][i]
-            score = 1.0 - distance  # Higher is better
-
-            result = SearchResult(
-                id=results['ids'][0][i],
-                text=results['documents'][0][i],
-                metadata=results['metadatas'][0][i],
-                distance=distance,
-                score=score
+        version = self.begin_rebuild()
+        try:
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                self.add_to_rebuild(
+                    version,
+                    ids=[f"{chunk.event_id}_{chunk.chunk_index}" for chunk in batch],
+                    documents=[chunk.text for chunk in batch],
+                    metadatas=[chunk.metadata for chunk in batch],
+                    embeddings=embeddings[start:start + batch_size]
+                )
+                if progress_callback:
+                    progress_callback(start + len(batch))
+            return self.publish_rebuild(
+                version,
+                expected_count=len(chunks),
+                sample_embedding=embeddings[0] if len(embeddings) else None,
+                sample_id=f"{chunks[0].event_id}_{chunks[0].chunk_index}" if chunks else None
             )
-            search_results.append(result)
-
-        logger.debug(f"Semantic search returned {len(search_results)} results")
-        return search_results
-
-    def keyword_search(
-        self,
-        query: str,
-        top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
-    ) -> List[SearchResult]:
+        except Exception:
+            self.abort_rebuild(version)
+            raise
+
+    @staticmethod
+    def _validate_rebuild(version: str, count: int, expected_count: int,
+                          sample_score: Optional[float], top_score: Optional[float] = None,
+                          sample_id: Optional[str] = None) -> None:
         """
-        Perform keyword search (BM25) using query text.
-
-        Note: ChromaDB uses its built-in search when providing query_texts.
+        Check a shadow version before it goes live.
 
         Args:
-            query: Query text
-            top_k: Number of results to return
-            filters: Metadata filters
-
-        Returns:
-            List of SearchResult objects
+            version: Shadow version name
+            count: Documents in the shadow
+            expected_count: Documents written
+            sample_score: Score of the sample's own row for the sample query (None = no check)
+            top_score: Best score of any row for the sample query
+            sample_id: Document the sample embedding was stored under
+
+        Raises:
+            RuntimeError: If the count differs or the sample query misses its own row
         """
-        if not self.collection:
-            self.create_collection()
+        if count != expected_count:
+            raise RuntimeError(f"Shadow version {version} holds {count} documents, expected {expected_count}")
+        if sample_score is None:
+            return
+        if sample_score < REBUILD_MIN_SAMPLE_SCORE:
+            raise RuntimeError(f"Shadow version {version} failed the sample query (score {sample_score:.3f})")
+        if top_score is not None and sample_score < top_score - REBUILD_SAMPLE_TIE:
+            raise RuntimeError(f"Shadow version {version} failed the sample query "
+                               f"({sample_id} scores {sample_score:.3f}, top hit {top_score:.3f})")
+
+    # ------------------------------------------------------------------
+    # Shared helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _iter_batches(pairs: Iterable[Tuple[Chunk, List[float]]],
+                      batch_size: int) -> Iterator[Tuple[List[Chunk], List[List[float]]]]:
+        """Group (chunk, embedding) pairs into (chunks, embeddings) batches without materializing the stream."""
+        iterator = iter(pairs)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            chunks, embeddings = zip(*batch)
+            yield list(chunks), list(embeddings)
+
+    def _profile_matrix(self, embeddings: List[List[float]]) -> np.ndarray:
+        """
+        Apply the storage profile to vectors before they are stored or queried.
 
-        # Build where clause
-        where = self._build_where_clause(filters) if filters else None
+        Raises:
+            ValueError: If the vector dimension does not match the profile
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a 2-D embedding matrix, got shape {matrix.shape}")
 
-        # Query with text (uses BM25)
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k,
-            where=where
-        )
+        if self.embedding_dimensions and matrix.shape[1] != self.embedding_dimensions:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match "
+                             f"the storage profile ({self.embedding_dimensions})")
 
-        # Parse results (keyword search doesn't return distances in same way)
-        search_results = []
-        for i in range(len(results['ids'][0])):
-            result = SearchResult(
-                id=results['ids'][0][i],
-                text=results['documents'][0][i],
-                metadata=results['metadatas'][0][i],
-                distance=0.0,  # Not applicable for keyword search
-                score=1.0 / (i + 1)  # Simple rank-based score
-            )
-            search_results.append(result)
+        if self.embedding_dtype == "float16":
+            matrix = matrix.astype(np.float16).astype(np.float32)
 
-        logger.debug(f"Keyword search returned {len(search_results)} results")
-        return search_results
+        return matrix
 
     def hybrid_search(
         self,
@@ -315,55 +457,528 @@ class VectorStore:
 
         return combined_results
 
-    def _build_where_clause(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+    def _parse_filters(self, filters: Optional[Dict[str, Any]]) -> FilterSpec:
         """
-        Build ChromaDB where clause from filters.
+        Normalize retrieval filters.
 
         Supports:
-        - Exact match: {"hazard": "measles"}
+        - Exact match: {"location": "Canada"}, {"section": "..."}
         - Date range: {"date_from": "2024-01-01", "date_to": "2025-12-31"}
-        - Contains: {"location_contains": "united states"}
-        - Multiple conditions with $and
+        - Facets: {"hazard_normalized": "measles"}, {"location_contains": "united states"},
+          {"year": 2024} (see facet_index.py; relaxed below FACET_MIN_MATCHES)
 
         Args:
             filters: Filter dictionary
 
         Returns:
-            ChromaDB where clause
+            FilterSpec
         """
-        conditions = []
+        spec = FilterSpec()
+        if not filters:
+            return spec
 
         # Exact matches (only for location and section)
-        # Note: Hazard filtering disabled - semantic search handles this better
         for key in ['location', 'section']:
             if key in filters and filters[key]:
-                conditions.append({key: {"$eq": filters[key]}})
+                spec.equals[key] = filters[key]
+
+        # Facet conditions
+        for key, facet in (('hazard_normalized', 'hazard'), ('location_contains', 'location'), ('year', 'year')):
+            if key in filters and filters[key]:
+                terms = query_terms(facet, filters[key])
+                if terms:
+                    spec.facets[facet] = terms
 
         # Date range - convert to unix timestamps for numeric comparison
-        if 'date_from' in filters and filters['date_from']:
-            # Convert date string to unix timestamp
-            try:
-                from datetime import datetime
-                date_obj = datetime.strptime(filters['date_from'], '%Y-%m-%d')
-                timestamp = int(date_obj.timestamp())
-                conditions.append({"date_unix": {"$gte": timestamp}})
-            except Exception as e:
-                logger.warning(f"Could not parse date_from: {filters['date_from']}, error: {e}")
-
-        if 'date_to' in filters and filters['date_to']:
-            # Convert date string to unix timestamp
+        for key, attr in (('date_from', 'date_from_unix'), ('date_to', 'date_to_unix')):
+            if key in filters and filters[key]:
+                try:
+                    date_obj = datetime.strptime(filters[key], '%Y-%m-%d')
+                    setattr(spec, attr, int(date_obj.timestamp()))
+                except Exception as e:
+                    logger.warning(f"Could not parse {key}: {filters[key]}, error: {e}")
+
+        return spec
+
+
+# ============================================================================
+# ChromaDB Vector Store
+# ============================================================================
+
+class VectorStore(BaseVectorStore):
+    """ChromaDB vector store with hybrid search capabilities."""
+
+    def __init__(self, persist_directory: str = "app/data/chatbot/chroma_db",
+                 embedding_dimensions: Optional[int] = None, embedding_dtype: str = "float32",
+                 hnsw: Optional[HNSWSettings] = None):
+        """
+        Initialize ChromaDB vector store.
+
+        Args:
+            persist_directory: Path to persistent storage
+            embedding_dimensions: Expected vector dimension (None = not enforced)
+            embedding_dtype: Storage profile precision; "float16" vectors are
+                rounded to half precision before insert so the collection
+                matches the embedding cache exactly
+            hnsw: HNSW parameters for new collections (default: cosine space)
+        """
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_dtype = embedding_dtype
+        self.hnsw = hnsw or HNSWSettings()
+
+        # Initialize ChromaDB client
+        self.client = chromadb.PersistentClient(
+            path=str(self.persist_directory),
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
+            )
+        )
+
+        self.collection_name = "epidemiological_events"
+        self.collection = None
+        self._keyword_indexes: Dict[str, KeywordIndex] = {}
+
+        # Alias pointer: logical collection name -> live/previous versions
+        self.aliases_path = self.persist_directory / "aliases.json"
+
+        # Facet encoding of backfilled collections (collection metadata cannot be
+        # rewritten without dropping its hnsw:* keys)
+        self.facet_versions_path = self.persist_directory / "facet_index.json"
+        self._alias_stamp = None
+        self._follow_alias = True
+
+        logger.info(f"Vector store initialized at: {self.persist_directory}")
+
+    # ------------------------------------------------------------------
+    # Alias pointer
+    # ------------------------------------------------------------------
+
+    def _read_alias(self) -> Dict[str, Optional[str]]:
+        """Live/previous versions of the logical collection (legacy: unversioned name)."""
+        try:
+            with open(self.aliases_path, 'r') as f:
+                aliases = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            aliases = {}
+        return aliases.get(self.collection_name, {"live": self.collection_name, "previous": None})
+
+    def _write_alias(self, live: str, previous: Optional[str]) -> None:
+        """Point the logical collection at a version (atomic rename)."""
+        try:
+            with open(self.aliases_path, 'r') as f:
+                aliases = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            aliases = {}
+        aliases[self.collection_name] = {"live": live, "previous": previous,
+                                         "updated_at": datetime.now().isoformat()}
+
+        tmp_path = self.aliases_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(aliases, f, indent=2)
+        os.replace(tmp_path, self.aliases_path)
+
+    def _alias_file_stamp(self):
+        try:
+            stat = self.aliases_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _ensure_collection(self) -> None:
+        """Open the live collection, following alias flips made by other processes."""
+        if not self.collection:
+            self.create_collection()
+            return
+
+        stamp = self._alias_file_stamp()
+        if self._follow_alias and stamp != self._alias_stamp:
+            self._alias_stamp = stamp
+            live = self._read_alias()["live"]
+            if live != self.collection.name:
+                self.collection = self.client.get_or_create_collection(name=live)
+                logger.info(f"Switched to live collection version: {live}")
+
+    def _collection_metadata(self) -> Dict[str, Any]:
+        metadata = {"description": "Disease outbreak surveillance database",
+                    "facet_index": FACET_METADATA_VERSION,
+                    **self.hnsw.metadata()}
+        if self.embedding_dimensions:
+            metadata["embedding_dimensions"] = self.embedding_dimensions
+            metadata["embedding_dtype"] = self.embedding_dtype
+        return metadata
+
+    def _keyword_index(self, name: Optional[str] = None) -> KeywordIndex:
+        """BM25 index for a collection (default: the active one)."""
+        name = name or (self.collection.name if self.collection else self.collection_name)
+        if name not in self._keyword_indexes:
+            self._keyword_indexes[name] = KeywordIndex(str(self.persist_directory / "keyword_index" / name))
+        return self._keyword_indexes[name]
+
+    def create_collection(self, name: Optional[str] = None, reset: bool = False) -> None:
+        """
+        Create or get collection.
+
+        Args:
+            name: Physical collection name (default: the live version of
+                epidemiological_events)
+            reset: Whether to delete existing collection
+        """
+        self._follow_alias = name is None
+        self._alias_stamp = self._alias_file_stamp()
+        collection_name = name or self._read_alias()["live"]
+
+        if reset:
             try:
-                from datetime import datetime
-                date_obj = datetime.strptime(filters['date_to'], '%Y-%m-%d')
-                timestamp = int(date_obj.timestamp())
-                conditions.append({"date_unix": {"$lte": timestamp}})
-            except Exception as e:
-                logger.warning(f"Could not parse date_to: {filters['date_to']}, error: {e}")
-
-        # Contains (for location search)
-        if 'location_contains' in filters and filters['location_contains']:
-            # ChromaDB doesn't have direct contains, but we can use keywords
-            pass  # Handled in query text
+                self.client.delete_collection(collection_name)
+                logger.info(f"Deleted existing collection: {collection_name}")
+            except:
+                pass  # Collection didn't exist
+            self._keyword_index(collection_name).clear()
+
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            metadata=self._collection_metadata()
+        )
+
+        stored_dimensions = (self.collection.metadata or {}).get("embedding_dimensions")
+        if self.embedding_dimensions and stored_dimensions and stored_dimensions != self.embedding_dimensions:
+            logger.error(f"Collection {collection_name} holds {stored_dimensions}-dim vectors but the "
+                         f"embedding profile is {self.embedding_dimensions}-dim; "
+                         f"run scripts/migrate_embedding_profile.py")
+
+        stored_hnsw = HNSWSettings.from_metadata(self.collection.metadata)
+        if stored_hnsw != self.hnsw:
+            logger.warning(f"Collection {collection_name} was built with HNSW {stored_hnsw} but the "
+                           f"configuration is {self.hnsw}; run scripts/migrate_hnsw_index.py")
+
+        if self._facet_version() != FACET_METADATA_VERSION:
+            self._backfill_facets()
+
+        logger.info(f"Collection ready: {collection_name} ({self.collection.count()} documents)")
+
+    def _read_facet_versions(self) -> Dict[str, int]:
+        try:
+            with open(self.facet_versions_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _facet_version(self) -> Optional[int]:
+        """Facet encoding of the open collection (set at creation, or recorded by a backfill)."""
+        recorded = self._read_facet_versions().get(self.collection.name)
+        return recorded or (self.collection.metadata or {}).get("facet_index")
+
+    def _backfill_facets(self) -> None:
+        """Add facet term metadata to a collection written before the current facet encoding."""
+        backfilled = 0
+        offset = 0
+        while True:
+            page = self.collection.get(limit=self._batch_limit(), offset=offset, include=["metadatas"])
+            if not page['ids']:
+                break
+            self.collection.update(ids=page['ids'],
+                                   metadatas=[facet_metadata(m or {}) for m in page['metadatas']])
+            backfilled += len(page['ids'])
+            offset += len(page['ids'])
+
+        # Recorded beside the collection: modify() would replace its metadata, and
+        # the hnsw:* keys it holds cannot be passed back in
+        with file_lock(self.persist_directory / "facet_index.lock"):
+            versions = self._read_facet_versions()
+            versions[self.collection.name] = FACET_METADATA_VERSION
+            tmp_path = self.facet_versions_path.with_suffix(".json.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(versions, f, indent=2)
+            os.replace(tmp_path, self.facet_versions_path)
+        if backfilled:
+            logger.info(f"Backfilled facet metadata for {backfilled} chunks in {self.collection.name}")
+
+    def _prepare_embeddings(self, embeddings: List[List[float]]) -> List[List[float]]:
+        """Apply the storage profile and convert to ChromaDB's list format."""
+        return self._profile_matrix(embeddings).tolist()
+
+    def add_documents(self, chunks: List[Chunk], embeddings: List[List[float]]) -> None:
+        """
+        Add chunks with embeddings to collection (existing IDs are overwritten).
+
+        Args:
+            chunks: List of Chunk objects
+            embeddings: Corresponding embedding vectors
+        """
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch")
+
+        self.add_stream(zip(chunks, embeddings))
+
+        logger.info(f"Added {len(chunks)} documents to collection")
+
+    def _batch_limit(self, batch_size: Optional[int] = None) -> int:
+        """Rows per ChromaDB write (never above the client's max batch size)."""
+        # chromadb 0.4.x exposes a max_batch_size property, later releases get_max_batch_size()
+        max_batch_size = getattr(self.client, 'max_batch_size', None)
+        if max_batch_size is None and callable(getattr(self.client, 'get_max_batch_size', None)):
+            max_batch_size = self.client.get_max_batch_size()
+        return min(batch_size or STREAM_BATCH_SIZE, max_batch_size or STREAM_BATCH_SIZE)
+
+    def add_stream(self, pairs: Iterable[Tuple[Chunk, List[float]]], batch_size: Optional[int] = None,
+                   progress_callback: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Upsert (chunk, embedding) pairs from an iterator in bounded batches.
+
+        Args:
+            pairs: (Chunk, embedding) pairs, consumed lazily
+            batch_size: Pairs per write (capped at ChromaDB's max batch size)
+            progress_callback: Called with the number of pairs written so far
+
+        Returns:
+            Number of pairs written
+        """
+        self._ensure_collection()
+        keyword_index = self._keyword_index()
+        written = 0
+
+        for chunks, embeddings in self._iter_batches(pairs, self._batch_limit(batch_size)):
+            ids = [f"{chunk.event_id}_{chunk.chunk_index}" for chunk in chunks]
+            documents = [chunk.text for chunk in chunks]
+
+            # Upsert so re-applying an update (e.g. after a batch job) is idempotent
+            self.collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=self._prepare_embeddings(embeddings),
+                metadatas=[facet_metadata(chunk.metadata) for chunk in chunks]
+            )
+            keyword_index.upsert(ids, documents, save=False)
+
+            written += len(chunks)
+            if progress_callback:
+                progress_callback(written)
+
+        # One save per stream; a crash before it is repaired by _ensure_keyword_index
+        if written:
+            keyword_index.save()
+        return written
+
+    def delete_events(self, event_ids: List[str]) -> int:
+        """
+        Remove every chunk of the given events.
+
+        Args:
+            event_ids: Event IDs (matched against chunk metadata)
+
+        Returns:
+            Number of chunks removed
+        """
+        self._ensure_collection()
+
+        event_ids = sorted(set(event_ids))
+        removed = []
+        for start in range(0, len(event_ids), DELETE_BATCH_SIZE):
+            batch = event_ids[start:start + DELETE_BATCH_SIZE]
+            ids = self.collection.get(where={"event_id": {"$in": batch}}, include=[])['ids']
+            if ids:
+                self.collection.delete(ids=ids)
+                removed.extend(ids)
+
+        if removed:
+            self._keyword_index().delete(removed)
+
+        logger.info(f"Deleted {len(removed)} chunks for {len(event_ids)} events")
+        return len(removed)
+
+    def semantic_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """
+        Perform semantic search using query embedding.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filters: Metadata filters (e.g., {"hazard": "measles"})
+
+        Returns:
+            List of SearchResult objects
+        """
+        return self.search_many([query_embedding], top_k=top_k, filters=filters)[0]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Semantic search for several query vectors in one collection.query call.
+
+        Args:
+            query_embeddings: Query vectors
+            top_k: Number of results per query
+            filters: Metadata filters shared by all queries
+
+        Returns:
+            One SearchResult list per query, in input order
+        """
+        if not query_embeddings:
+            return []
+
+        self._ensure_collection()
+
+        # Build where clause from filters
+        where = self._resolve_where(filters)
+
+        # Query collection
+        results = self.collection.query(
+            query_embeddings=self._prepare_embeddings(query_embeddings),
+            n_results=top_k,
+            where=where
+        )
+        space = HNSWSettings.from_metadata(self.collection.metadata).space
+
+        # Parse results
+        all_results = []
+        for q in range(len(query_embeddings)):
+            search_results = []
+            for i in range(len(results['ids'][q])):
+                # Convert the collection's distance to cosine similarity (higher is better)
+                distance = results['distances'][q][i]
+                score = distance_to_score(distance, space)
+
+                result = SearchResult(
+                    id=results['ids'][q][i],
+                    text=results['documents'][q][i],
+                    metadata=strip_facet_metadata(results['metadatas'][q][i]),
+                    distance=distance,
+                    score=score,
+                    semantic_score=score
+                )
+                search_results.append(result)
+            all_results.append(search_results)
+
+        logger.debug(f"Semantic search: {len(query_embeddings)} queries, "
+                     f"{sum(len(r) for r in all_results)} results")
+        return all_results
+
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """
+        Perform keyword search (BM25) using query text.
+
+        Scores come from the local inverted index (bm25_index.py); ChromaDB is
+        only used to fetch text and metadata for the winners (and to apply
+        metadata filters to the BM25 candidates).
+
+        Args:
+            query: Query text
+            top_k: Number of results to return
+            filters: Metadata filters
+
+        Returns:
+            List of SearchResult objects (score = BM25 score)
+        """
+        self._ensure_collection()
+
+        keyword_index = self._ensure_keyword_index()
+        where = self._resolve_where(filters)
+
+        # Over-fetch when filtering, since ChromaDB drops non-matching candidates
+        candidates = keyword_index.search(query, KEYWORD_FILTER_CANDIDATES if where else top_k)
+        if not candidates:
+            return []
+
+        scores = dict(candidates)
+        fetched = self.collection.get(
+            ids=[chunk_id for chunk_id, _ in candidates],
+            where=where,
+            include=["documents", "metadatas"]
+        )
+
+        search_results = [
+            SearchResult(
+                id=chunk_id,
+                text=text,
+                metadata=strip_facet_metadata(metadata),
+                distance=0.0,  # Not applicable for keyword search
+                score=scores[chunk_id]
+            )
+            for chunk_id, text, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+        ]
+        search_results.sort(key=lambda r: r.score, reverse=True)
+
+        logger.debug(f"Keyword search returned {len(search_results[:top_k])} results")
+        return search_results[:top_k]
+
+    def _ensure_keyword_index(self) -> KeywordIndex:
+        """Return the collection's BM25 index, (re)building it if out of sync."""
+        keyword_index = self._keyword_index()
+        stored = self.collection.count()
+        if keyword_index.count != stored:
+            logger.info(f"Building BM25 index for {self.collection.name} ({stored} chunks)")
+            ids, texts = [], []
+            for page in self.iter_documents(include_embeddings=False):
+                ids.extend(page['ids'])
+                texts.extend(page['documents'])
+            keyword_index.rebuild(ids, texts)
+        return keyword_index
+
+    def _build_where_clause(self, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Build ChromaDB where clause from filters.
+
+        Multiple conditions are combined with $and.
+
+        Args:
+            filters: Filter dictionary
+
+        Returns:
+            ChromaDB where clause (None if no condition applies)
+        """
+        return self._where_for(self._parse_filters(filters))
+
+    def _resolve_where(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Where clause for a search, dropping facet conditions that match too few chunks.
+
+        Args:
+            filters: Filter dictionary
+
+        Returns:
+            ChromaDB where clause (None if no condition applies)
+        """
+        if not filters:
+            return None
+
+        spec = self._parse_filters(filters)
+        where = self._where_for(spec)
+        if spec.facets:
+            # Facet terms live in ChromaDB's metadata index, so this lookup is cheap
+            matches = self.collection.get(where=where, limit=FACET_MIN_MATCHES, include=[])['ids']
+            if len(matches) < FACET_MIN_MATCHES:
+                logger.info(f"Facet filters {spec.facets} match {len(matches)} chunks - searching without them")
+                where = self._where_for(spec.without_facets())
+        return where
+
+    def _where_for(self, spec: FilterSpec) -> Optional[Dict[str, Any]]:
+        """ChromaDB where clause for a filter spec."""
+        conditions = [{key: {"$eq": value}} for key, value in spec.equals.items()]
+
+        if spec.date_from_unix is not None:
+            conditions.append({"date_unix": {"$gte": spec.date_from_unix}})
+        if spec.date_to_unix is not None:
+            conditions.append({"date_unix": {"$lte": spec.date_to_unix}})
+
+        for facet, terms in spec.facets.items():
+            conditions.extend({facet_key(facet, term): {"$eq": True}} for term in terms)
 
         # Combine with $and
         if len(conditions) == 0:
@@ -375,8 +990,7 @@ class VectorStore:
 
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics."""
-        if not self.collection:
-            self.create_collection()
+        self._ensure_collection()
 
         return {
             "name": self.collection.name,
@@ -384,10 +998,67 @@ class VectorStore:
             "metadata": self.collection.metadata
         }
 
+    def get_documents(self, ids: List[str]) -> List[SearchResult]:
+        """
+        Stored chunks by ID.
+
+        Args:
+            ids: Chunk IDs
+
+        Returns:
+            SearchResult per found ID, in input order (distance/score 0)
+        """
+        if not ids:
+            return []
+        self._ensure_collection()
+        page = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        found = {
+            chunk_id: SearchResult(id=chunk_id, text=text, metadata=strip_facet_metadata(metadata),
+                                   distance=0.0, score=0.0)
+            for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+        }
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def count(self) -> int:
+        """Number of stored chunks."""
+        self._ensure_collection()
+        return self.collection.count()
+
+    def iter_documents(self, batch_size: int = 1000, include_embeddings: bool = True,
+                       name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Page through every stored document.
+
+        Args:
+            batch_size: Documents per page
+            include_embeddings: Whether to return vectors
+            name: Collection to read (default: the active collection)
+
+        Yields:
+            Dicts with 'ids', 'documents', 'metadatas' (and 'embeddings')
+        """
+        if name:
+            collection = self.client.get_collection(name)
+        else:
+            if not self.collection:
+                self.create_collection()
+            collection = self.collection
+
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        offset = 0
+        while True:
+            page = collection.get(limit=batch_size, offset=offset, include=include)
+            if not page['ids']:
+                return
+            page['metadatas'] = [strip_facet_metadata(m) for m in page['metadatas']]
+            yield page
+            offset += len(page['ids'])
+
     def delete_collection(self, name: Optional[str] = None) -> None:
         """Delete collection."""
-        collection_name = name or self.collection_name
+        collection_name = name or self._read_alias()["live"]
         self.client.delete_collection(collection_name)
+        self._keyword_index(collection_name).destroy()
         logger.info(f"Deleted collection: {collection_name}")
         self.collection = None
 
@@ -397,3 +1068,197 @@ class VectorStore:
             self.delete_collection()
         self.create_collection()
         logger.warning("Vector store reset - all data deleted")
+
+    # ------------------------------------------------------------------
+    # Blue/green rebuilds
+    # ------------------------------------------------------------------
+
+    def _version_names(self) -> List[str]:
+        """Stored versions of the logical collection (including a legacy unversioned one)."""
+        prefix = f"{self.collection_name}__v"
+        return sorted(c.name for c in self.client.list_collections()
+                      if c.name == self.collection_name or c.name.startswith(prefix))
+
+    def begin_rebuild(self) -> str:
+        """
+        Create an empty shadow collection.
+
+        Returns:
+            Version name ("epidemiological_events__v<timestamp>")
+        """
+        version = f"{self.collection_name}__v{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        self.client.create_collection(name=version, metadata=self._collection_metadata())
+        self._keyword_index(version).clear()
+        logger.info(f"Started shadow collection: {version}")
+        return version
+
+    def add_to_rebuild(self, version: str, ids: List[str], documents: List[str],
+                       metadatas: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        """
+        Write records into a shadow collection.
+
+        Args:
+            version: Name returned by begin_rebuild()
+            ids: Chunk IDs
+            documents: Chunk texts
+            metadatas: Chunk metadata dicts
+            embeddings: Vectors (profile dimension)
+        """
+        shadow = self.client.get_collection(version)
+        step = self._batch_limit()
+        for start in range(0, len(ids), step):
+            shadow.upsert(
+                ids=list(ids[start:start + step]),
+                documents=list(documents[start:start + step]),
+                embeddings=self._prepare_embeddings(embeddings[start:start + step]),
+                metadatas=[facet_metadata(m) for m in metadatas[start:start + step]]
+            )
+
+    def publish_rebuild(self, version: str, expected_count: int,
+                        sample_embedding: Optional[List[float]] = None,
+                        sample_id: Optional[str] = None) -> str:
+        """
+        Validate a shadow collection and flip the alias to it.
+
+        Args:
+            version: Name returned by begin_rebuild()
+            expected_count: Number of documents written
+            sample_embedding: Stored vector the shadow must find (self-retrieval check)
+            sample_id: ID stored with sample_embedding (must be the top hit)
+
+        Returns:
+            The new live version name
+
+        Raises:
+            RuntimeError: If validation fails (the live collection is untouched)
+        """
+        shadow = self.client.get_collection(version)
+
+        sample_score = top_score = None
+        if sample_embedding is not None:
+            hits = shadow.query(query_embeddings=self._prepare_embeddings([sample_embedding]),
+                                n_results=min(SAMPLE_QUERY_HITS, max(shadow.count(), 1)), include=["distances"])
+            space = HNSWSettings.from_metadata(shadow.metadata).space
+            scores = {hit_id: distance_to_score(distance, space)
+                      for hit_id, distance in zip(hits['ids'][0], hits['distances'][0])}
+            top_score = max(scores.values(), default=0.0)
+            sample_score = scores.get(sample_id, 0.0) if sample_id is not None else top_score
+        self._validate_rebuild(version, shadow.count(), expected_count, sample_score, top_score, sample_id)
+
+        # Keyword index is built once from the finished shadow
+        ids, documents = [], []
+        for page in self.iter_documents(include_embeddings=False, name=version):
+            ids.extend(page['ids'])
+            documents.extend(page['documents'])
+        self._keyword_index(version).rebuild(ids, documents)
+
+        previous = self._read_alias()["live"]
+        self._write_alias(version, previous)
+        self.collection = shadow
+        self._follow_alias = True
+        self._alias_stamp = self._alias_file_stamp()
+
+        # Keep live + previous; older versions go
+        for name in self._version_names():
+            if name not in (version, previous):
+                self._drop_version(name)
+
+        logger.info(f"Published collection version {version} ({expected_count} documents, previous: {previous})")
+        return version
+
+    def _drop_version(self, name: str) -> None:
+        try:
+            self.client.delete_collection(name)
+        except Exception as e:
+            logger.warning(f"Could not delete collection version {name}: {e}")
+        self._keyword_index(name).destroy()
+        self._keyword_indexes.pop(name, None)
+
+    def abort_rebuild(self, version: str) -> None:
+        """Discard a shadow collection."""
+        self._drop_version(version)
+        logger.warning(f"Discarded shadow collection: {version}")
+
+    def rollback(self) -> str:
+        """
+        Make the previous version live again (the current one becomes previous).
+
+        Returns:
+            The new live version name
+
+        Raises:
+            RuntimeError: If there is no previous version
+        """
+        alias = self._read_alias()
+        previous = alias.get("previous")
+        if not previous or previous not in self._version_names():
+            raise RuntimeError(f"No previous version of {self.collection_name} to roll back to")
+
+        self._write_alias(previous, alias["live"])
+        self.create_collection()
+        logger.warning(f"Rolled back {self.collection_name} to {previous}")
+        return previous
+
+    def live_version(self) -> str:
+        """Live collection name (one stat() of aliases.json per call)."""
+        self._ensure_collection()
+        return self.collection.name
+
+    def list_versions(self) -> Dict[str, Any]:
+        """Live and previous version names plus every stored version's count."""
+        alias = self._read_alias()
+        return {
+            "live": alias["live"],
+            "previous": alias.get("previous"),
+            "versions": {name: self.client.get_collection(name).count() for name in self._version_names()}
+        }
+
+
+def create_vector_store(engine: str = "chroma", data_dir: str = "app/data/chatbot",
+                        embedding_dimensions: Optional[int] = None,
+                        embedding_dtype: str = "float32") -> BaseVectorStore:
+    """
+    Create a vector store engine by name.
+
+    Args:
+        engine: "chroma", "numpy" or "ivfpq"
+        data_dir: Chatbot data directory (each engine uses its own subdirectory)
+        embedding_dimensions: Storage profile dimension
+        embedding_dtype: Storage profile precision
+
+    Returns:
+        Vector store instance
+    """
+    if engine == "chroma":
+        return VectorStore(
+            persist_directory=f"{data_dir}/chroma_db",
+            embedding_dimensions=embedding_dimensions,
+            embedding_dtype=embedding_dtype,
+            hnsw=HNSWSettings(
+                space=get_setting('CHATBOT_HNSW_SPACE', 'cosine'),
+                m=int(get_setting('CHATBOT_HNSW_M', 16)),
+                construction_ef=int(get_setting('CHATBOT_HNSW_CONSTRUCTION_EF', 100)),
+                search_ef=int(get_setting('CHATBOT_HNSW_SEARCH_EF', 64))
+            )
+        )
+    if engine == "numpy":
+        from app.services.chatbot.numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore(
+            persist_directory=f"{data_dir}/vector_index",
+            embedding_dimensions=embedding_dimensions,
+            embedding_dtype=embedding_dtype
+        )
+
+    if engine == "ivfpq":
+        from app.services.chatbot.ann_vector_store import IVFPQVectorStore
+        return IVFPQVectorStore(
+            persist_directory=f"{data_dir}/vector_index",
+            embedding_dimensions=embedding_dimensions,
+            embedding_dtype=embedding_dtype,
+            nprobe=int(get_setting('CHATBOT_ANN_NPROBE', 16)),
+            rerank_depth=int(get_setting('CHATBOT_ANN_RERANK_DEPTH', 200)),
+            nlist=int(get_setting('CHATBOT_ANN_NLIST', 0)),
+            subspaces=int(get_setting('CHATBOT_ANN_PQ_SUBSPACES', 0))
+        )
+
+    raise ValueError(f"Unknown vector engine: {engine} (expected 'chroma', 'numpy' or 'ivfpq')")
@@ -0,0 +1,163 @@
+"""
+Startup Warm-up for DR Knowledge Chatbot.
+
+get_chatbot_service() builds the RAG pipeline lazily, so without a warm-up
+the first chat request pays for the cross-encoder load, the vector store
+open, the embedding cache load and possibly a knowledge base load. The app
+factory starts a background thread that builds the service, runs a dummy
+retrieval pass and records the load time of each component.
+
+Progress is exposed through get_warmup_status() and GET /health?ready,
+which answers 503 while the first warm-up runs so load balancers can hold
+traffic back. A failed warm-up does not take the worker out of rotation
+(the other tools still work): the endpoint reports the chatbot as degraded
+and the warm-up is retried in the background with exponential backoff.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Warm-up states ('disabled' when the app did not start a warm-up)
+WARMUP_DISABLED = 'disabled'
+WARMUP_RUNNING = 'running'
+WARMUP_READY = 'ready'
+WARMUP_FAILED = 'failed'
+
+# Seconds before the first retry of a failed warm-up (doubled per attempt)
+WARMUP_RETRY_DELAY = 5.0
+
+# Longest wait between retries
+WARMUP_RETRY_MAX_DELAY = 300.0
+
+
+class WarmupStatus:
+    """Thread-safe record of the warm-up state and component load times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = WARMUP_DISABLED
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.attempts = 0
+
+    def start(self, retry: bool = False) -> None:
+        """
+        Record the start of an attempt.
+
+        Args:
+            retry: Retry of a failed warm-up (the state stays 'failed' until it succeeds)
+        """
+        with self._lock:
+            self.attempts = self.attempts + 1 if retry else 1
+            if not retry:
+                self.state = WARMUP_RUNNING
+                self.timings, self.error = {}, None
+                self.started_at, self.finished_at = datetime.utcnow().isoformat(), None
+
+    def finish(self, timings: Dict[str, float], error: Optional[str] = None) -> None:
+        with self._lock:
+            self.state = WARMUP_FAILED if error else WARMUP_READY
+            self.timings, self.error = dict(timings), error
+            self.finished_at = datetime.utcnow().isoformat()
+
+    @property
+    def ready(self) -> bool:
+        """Whether traffic can be served without a cold start."""
+        return self.state in (WARMUP_READY, WARMUP_DISABLED)
+
+    @property
+    def degraded(self) -> bool:
+        """Whether the warm-up failed (the chatbot may not work until a retry succeeds)."""
+        return self.state == WARMUP_FAILED
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'attempts': self.attempts,
+                'timings': dict(self.timings),
+                'error': self.error,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+
+# Process-wide warm-up status
+_status = WarmupStatus()
+
+
+def get_warmup_status() -> WarmupStatus:
+    """Get the process-wide warm-up status."""
+    return _status
+
+
+def run_warmup(app, retry: bool = False) -> Dict[str, float]:
+    """
+    Build the chatbot service and warm it up (blocking).
+
+    Args:
+        app: Flask application (the service reads its config)
+        retry: Retry of a failed warm-up
+
+    Returns:
+        Seconds per component
+    """
+    from app.services.chatbot.rag_orchestrator import get_chatbot_service
+
+    _status.start(retry=retry)
+    start_time = time.perf_counter()
+    timings: Dict[str, float] = {}
+    try:
+        with app.app_context():
+            service = get_chatbot_service()
+            service.warm_up()
+            timings.update(service.load_times)
+        timings['total'] = round(time.perf_counter() - start_time, 3)
+        _status.finish(timings)
+        logger.info(f"Chatbot warm-up finished in {timings['total']:.1f}s: {timings}")
+    except Exception as e:
+        timings['total'] = round(time.perf_counter() - start_time, 3)
+        _status.finish(timings, error=str(e))
+        logger.error(f"Chatbot warm-up failed after {timings['total']:.1f}s: {e}", exc_info=True)
+    return timings
+
+
+def warm_up_until_ready(app, delay: float = WARMUP_RETRY_DELAY,
+                        max_delay: float = WARMUP_RETRY_MAX_DELAY) -> None:
+    """
+    Run the warm-up, retrying with exponential backoff until it succeeds.
+
+    Args:
+        app: Flask application
+        delay: Seconds before the first retry
+        max_delay: Longest wait between retries
+    """
+    run_warmup(app)
+    while _status.degraded:
+        logger.info(f"Retrying chatbot warm-up in {delay:.0f}s")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        run_warmup(app, retry=True)
+
+
+def start_warmup(app) -> threading.Thread:
+    """
+    Warm the chatbot up in a background thread (retried until it succeeds).
+
+    Args:
+        app: Flask application
+
+    Returns:
+        The started daemon thread
+    """
+    thread = threading.Thread(target=warm_up_until_ready, args=(app,), name="chatbot-warmup", daemon=True)
+    _status.start()
+    thread.start()
+    return thread
@@ -17,6 +17,8 @@ import xlsxwriter
 from openai import OpenAI
 from flask import current_app
 
+from app.prompt_cache import PromptLayout, get_prompt_cache_stats
+
 from .html_processor import process_html_file
 from .hazard_matcher import HazardMatcher
 from .models import DREntry, ProcessingResult
@@ -135,7 +137,8 @@ class DRTrackerService:
                     'model': self.model,
                     'processing_time': processing_time,
                     'entry_count': len(entries),
-                    'openai_time': openai_result.get('processing_time', 0)
+                    'openai_time': openai_result.get('processing_time', 0),
+                    'cached_tokens': openai_result.get('cached_tokens', 0)
                 }
             )
 
@@ -162,25 +165,27 @@ class DRTrackerService:
         start_time = time.time()
 
         try:
+            # The large preprompt is the cached prefix; only the report changes
+            layout = PromptLayout(tool='dr_tracker', system=self.preprompt)
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": self.preprompt},
-                    {"role": "user", "content": html_content}
-                ],
+                messages=layout.messages(html_content),
                 temperature=0.7,
-                timeout=timeout
+                timeout=timeout,
+                **layout.request_options()
             )
 
             processing_time = time.time() - start_time
             content = response.choices[0].message.content.strip()
+            cached = get_prompt_cache_stats().record(layout.tool, response.usage)
 
-            logger.info(f"OpenAI call successful in {processing_time:.2f}s")
+            logger.info(f"OpenAI call successful in {processing_time:.2f}s ({cached} prompt tokens cached)")
 
             return {
                 'success': True,
                 'content': content,
-                'processing_time': processing_time
+                'processing_time': processing_time,
+                'cached_tokens': cached
             }
 
         except Exception as e:
@@ -13,6 +13,8 @@ from typing import Dict, Any, Optional, List
 from openai import OpenAI
 from flask import current_app
 
+from app.prompt_cache import get_prompt_cache_stats
+
 logger = logging.getLogger(__name__)
 
 # Editing guidelines for text revision
@@ -199,7 +201,8 @@ class RevisionService:
             result['usage'] = {
                 'prompt_tokens': response.usage.prompt_tokens,
                 'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
+                'total_tokens': response.usage.total_tokens,
+                'cached_tokens': get_prompt_cache_stats().record('summary_revision', response.usage)
             }
 
             result['revised_text'] = revised_text
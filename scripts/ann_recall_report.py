@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency report for the IVF-PQ engine over the existing collection.
+
+Reads every stored vector from the configured engine, trains an IVF-PQ index
+on them and compares it with exact search for a grid of nprobe /
+rerank_depth values:
+
+    python scripts/ann_recall_report.py --queries 200 --top-k 10
+
+Queries are stored chunks sampled at random (each chunk is its own nearest
+neighbour, as in a "more like this" lookup). Pick the smallest settings that
+reach the recall you need and set CHATBOT_ANN_NPROBE /
+CHATBOT_ANN_RERANK_DEPTH accordingly.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.services.chatbot.ivf_index import IVFPQIndex, recall_report
+from app.services.chatbot.vector_store import create_vector_store
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    """Main report function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='app/data/chatbot', help='Chatbot data directory')
+    parser.add_argument('--engine', default=os.getenv('CHATBOT_VECTOR_ENGINE', 'chroma'),
+                        help='Engine holding the collection')
+    parser.add_argument('--queries', type=int, default=200, help='Sampled query chunks')
+    parser.add_argument('--top-k', type=int, default=10, help='k for recall@k')
+    parser.add_argument('--nprobe', type=_int_list, default=[1, 4, 8, 16, 32, 64],
+                        help='Comma-separated nprobe values')
+    parser.add_argument('--rerank-depth', type=_int_list, default=[50, 200, 1000],
+                        help='Comma-separated rerank_depth values')
+    parser.add_argument('--nlist', type=int, default=int(os.getenv('CHATBOT_ANN_NLIST', '0')),
+                        help='Coarse lists (0 = auto)')
+    parser.add_argument('--subspaces', type=int, default=int(os.getenv('CHATBOT_ANN_PQ_SUBSPACES', '0')),
+                        help='PQ subspaces (0 = auto)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for training and query sampling')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    print("=" * 60)
+    print("IVF-PQ Recall Report")
+    print("=" * 60)
+
+    vector_store = create_vector_store(
+        args.engine,
+        data_dir=args.data_dir,
+        embedding_dimensions=int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536')),
+        embedding_dtype=os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32')
+    )
+    pages = [np.asarray(page['embeddings'], dtype=np.float32)
+             for page in vector_store.iter_documents(include_embeddings=True)]
+    if not pages:
+        print("✗ Collection is empty")
+        sys.exit(1)
+
+    matrix = np.concatenate(pages)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    print(f"Collection: {matrix.shape[0]} vectors, {matrix.shape[1]} dims ({args.engine})")
+
+    index = IVFPQIndex.build(matrix, nlist=args.nlist, subspaces=args.subspaces, seed=args.seed)
+    print(f"Index: {index.nlist} lists, {index.subspaces} bytes per vector")
+
+    rng = np.random.default_rng(args.seed)
+    queries = matrix[rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)]
+
+    report = recall_report(matrix, index, queries, top_k=args.top_k,
+                           nprobes=args.nprobe, rerank_depths=args.rerank_depth)
+
+    print()
+    print(f"{'nprobe':>7} {'rerank':>7} {f'recall@{args.top_k}':>10} {'mean ms':>9} {'p95 ms':>9}")
+    for row in report:
+        print(f"{row['nprobe']:>7} {row['rerank_depth']:>7} {row['recall']:>10.4f} "
+              f"{row['mean_ms']:>9.3f} {row['p95_ms']:>9.3f}")
+    print()
+    print(f"Exact search: {report[0]['exact_mean_ms']:.3f} ms per query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Recall / latency benchmark of ChromaDB HNSW settings on the existing collection.
+
+Every combination of the given values is built into a temporary in-memory
+collection from the stored vectors and compared with exact search:
+
+    python scripts/hnsw_benchmark.py --m 8,16,32 --search-ef 10,32,64,128 --recall-target 0.95
+
+Queries are stored chunks sampled at random. The fastest setting (by p95
+latency) that meets --recall-target is reported at the end; apply it with
+scripts/migrate_hnsw_index.py.
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.services.chatbot.hnsw_index import HNSW_SPACES, HNSWSettings, hnsw_benchmark
+from app.services.chatbot.vector_store import create_vector_store
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    """Main benchmark function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='app/data/chatbot', help='Chatbot data directory')
+    parser.add_argument('--engine', default=os.getenv('CHATBOT_VECTOR_ENGINE', 'chroma'),
+                        help='Engine holding the collection')
+    parser.add_argument('--space', choices=HNSW_SPACES, default='cosine', help='Distance function')
+    parser.add_argument('--m', type=_int_list, default=[16], help='Comma-separated M values')
+    parser.add_argument('--construction-ef', type=_int_list, default=[100],
+                        help='Comma-separated construction_ef values')
+    parser.add_argument('--search-ef', type=_int_list, default=[10, 32, 64, 128],
+                        help='Comma-separated search_ef values')
+    parser.add_argument('--queries', type=int, default=200, help='Sampled query chunks')
+    parser.add_argument('--top-k', type=int, default=10, help='k for recall@k')
+    parser.add_argument('--recall-target', type=float, default=0.95, help='Minimum acceptable recall@k')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for query sampling')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    print("=" * 60)
+    print("HNSW Benchmark")
+    print("=" * 60)
+
+    vector_store = create_vector_store(
+        args.engine,
+        data_dir=args.data_dir,
+        embedding_dimensions=int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536')),
+        embedding_dtype=os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32')
+    )
+    pages = [np.asarray(page['embeddings'], dtype=np.float32)
+             for page in vector_store.iter_documents(include_embeddings=True)]
+    if not pages:
+        print("✗ Collection is empty")
+        sys.exit(1)
+
+    matrix = np.concatenate(pages)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    print(f"Collection: {matrix.shape[0]} vectors, {matrix.shape[1]} dims")
+
+    rng = np.random.default_rng(args.seed)
+    queries = matrix[rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)]
+
+    settings = [HNSWSettings(space=args.space, m=m, construction_ef=ef_c, search_ef=ef_s)
+                for m, ef_c, ef_s in itertools.product(args.m, args.construction_ef, args.search_ef)]
+    report = hnsw_benchmark(matrix, queries, settings, top_k=args.top_k)
+
+    print()
+    print(f"{'M':>4} {'ef_c':>6} {'ef_s':>6} {f'recall@{args.top_k}':>10} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    for row in report:
+        print(f"{row['m']:>4} {row['construction_ef']:>6} {row['search_ef']:>6} {row['recall']:>10.4f} "
+              f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['build_seconds']:>8.2f}")
+
+    passing = [row for row in report if row['recall'] >= args.recall_target]
+    print()
+    if passing:
+        best = min(passing, key=lambda row: row['p95_ms'])
+        print(f"✓ Fastest setting with recall >= {args.recall_target}: "
+              f"M={best['m']} construction_ef={best['construction_ef']} search_ef={best['search_ef']}")
+    else:
+        print(f"✗ No setting reached recall {args.recall_target}; try larger M / search_ef")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Export or import a DR Knowledge Chatbot vector index snapshot.
+
+Snapshots hold embeddings, texts and metadata in one file, so an index can
+be backed up, moved between engines or restored without re-embedding:
+
+    python scripts/index_snapshot.py export backups/index.snapshot
+    python scripts/index_snapshot.py import app/data/chatbot/backups/backup_20251023_143000.snapshot
+
+Updates write a snapshot to app/data/chatbot/backups automatically; with no
+path, import restores the most recent one.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+from app.services.chatbot.index_snapshot import SNAPSHOT_SUFFIX, export_snapshot, import_snapshot
+from app.services.chatbot.vector_store import create_vector_store
+
+
+def main():
+    """Main snapshot function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=['export', 'import'], help='Snapshot operation')
+    parser.add_argument('path', nargs='?', help='Snapshot file (import default: latest backup)')
+    parser.add_argument('--data-dir', default='app/data/chatbot', help='Chatbot data directory')
+    parser.add_argument('--engine', default=os.getenv('CHATBOT_VECTOR_ENGINE', 'chroma'),
+                        help='Vector store engine')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    vector_store = create_vector_store(
+        args.engine,
+        data_dir=args.data_dir,
+        embedding_dimensions=int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536')),
+        embedding_dtype=os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32')
+    )
+
+    path = args.path
+    if path is None:
+        if args.action == 'export':
+            parser.error("export needs a snapshot path")
+        snapshots = sorted((Path(args.data_dir) / "backups").glob(f"backup_*{SNAPSHOT_SUFFIX}"))
+        if not snapshots:
+            print("✗ No snapshot found")
+            sys.exit(1)
+        path = str(snapshots[-1])
+
+    if args.action == 'export':
+        vector_store.create_collection()
+        header = export_snapshot(vector_store, path)
+    else:
+        header = import_snapshot(vector_store, path)
+
+    print(f"✓ {args.action.capitalize()}ed {header['count']} chunks ({header['dimensions']} dims, "
+          f"{header['dtype']}) {'to' if args.action == 'export' else 'from'} {path}")
+
+
+if __name__ == '__main__':
+    main()
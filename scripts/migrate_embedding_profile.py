@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Migrate DR Knowledge Chatbot vectors to a new embedding storage profile.
+
+Run after changing CHATBOT_EMBEDDING_DIMENSIONS / CHATBOT_EMBEDDING_DTYPE:
+
+    python scripts/migrate_embedding_profile.py --dimensions 512 --dtype float16
+
+By default existing text-embedding-3 vectors are re-projected (truncated and
+renormalized), which needs no API calls. Use --refetch to re-embed every
+document instead.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+from app.services.chatbot.embedding_backends import create_embedding_backend
+from app.services.chatbot.embedding_migration import migrate_embedding_profile
+from app.services.chatbot.embedding_service import EmbeddingService
+from app.services.chatbot.vector_store import create_vector_store
+
+
+def main():
+    """Main migration function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='app/data/chatbot', help='Chatbot data directory')
+    parser.add_argument('--dimensions', type=int,
+                        default=int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536')),
+                        help='Target vector dimension')
+    parser.add_argument('--dtype', choices=['float32', 'float16'],
+                        default=os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32'),
+                        help='Target storage precision')
+    parser.add_argument('--refetch', action='store_true', help='Re-embed documents instead of re-projecting')
+    parser.add_argument('--batch-size', type=int, default=500, help='Documents per page')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    print("=" * 60)
+    print("Embedding Profile Migration")
+    print("=" * 60)
+    print(f"Target profile: {args.dimensions} dims, {args.dtype} ({'refetch' if args.refetch else 'reproject'})")
+
+    backend = create_embedding_backend(
+        os.getenv('CHATBOT_EMBEDDING_BACKEND', 'openai'),
+        dimensions=args.dimensions
+    )
+    embedding_service = EmbeddingService(
+        cache_dir=f"{args.data_dir}/embedding_cache",
+        backend=backend,
+        storage_dtype=args.dtype
+    )
+    vector_store = create_vector_store(
+        os.getenv('CHATBOT_VECTOR_ENGINE', 'chroma'),
+        data_dir=args.data_dir,
+        embedding_dimensions=args.dimensions,
+        embedding_dtype=args.dtype
+    )
+
+    result = migrate_embedding_profile(
+        embedding_service,
+        vector_store,
+        refetch=args.refetch,
+        batch_size=args.batch_size
+    )
+
+    print(f"✓ Cache vectors migrated: {result['cache_vectors_migrated']}")
+    print(f"✓ Documents migrated: {result['documents_migrated']}")
+    print(f"✓ Done in {result['seconds']}s")
+    print()
+    print(f"Set CHATBOT_EMBEDDING_DIMENSIONS={args.dimensions} and CHATBOT_EMBEDDING_DTYPE={args.dtype}, "
+          f"then restart the app.")
+
+
+if __name__ == '__main__':
+    main()
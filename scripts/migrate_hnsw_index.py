@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Rebuild the DR Knowledge Chatbot ChromaDB collection with new HNSW settings.
+
+Run after changing CHATBOT_HNSW_SPACE / _M / _CONSTRUCTION_EF / _SEARCH_EF,
+or once for collections created before they existed (ChromaDB's "l2"
+default):
+
+    python scripts/migrate_hnsw_index.py --space cosine --m 16 --search-ef 64
+
+Stored vectors are copied into a new collection version that is swapped in
+when complete; the old version is kept for rollback.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+from app.services.chatbot.embedding_migration import migrate_hnsw_index
+from app.services.chatbot.hnsw_index import HNSW_SPACES, HNSWSettings
+from app.services.chatbot.vector_store import VectorStore
+
+
+def main():
+    """Main migration function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='app/data/chatbot', help='Chatbot data directory')
+    parser.add_argument('--space', choices=HNSW_SPACES, default=os.getenv('CHATBOT_HNSW_SPACE', 'cosine'),
+                        help='Distance function')
+    parser.add_argument('--m', type=int, default=int(os.getenv('CHATBOT_HNSW_M', '16')),
+                        help='Graph links per node')
+    parser.add_argument('--construction-ef', type=int,
+                        default=int(os.getenv('CHATBOT_HNSW_CONSTRUCTION_EF', '100')),
+                        help='Build-time candidate list')
+    parser.add_argument('--search-ef', type=int, default=int(os.getenv('CHATBOT_HNSW_SEARCH_EF', '64')),
+                        help='Query-time candidate list')
+    parser.add_argument('--batch-size', type=int, default=500, help='Documents per page')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    settings = HNSWSettings(space=args.space, m=args.m, construction_ef=args.construction_ef,
+                            search_ef=args.search_ef)
+
+    print("=" * 60)
+    print("HNSW Index Migration")
+    print("=" * 60)
+    print(f"Target settings: {settings}")
+
+    vector_store = VectorStore(
+        persist_directory=f"{args.data_dir}/chroma_db",
+        embedding_dimensions=int(os.getenv('CHATBOT_EMBEDDING_DIMENSIONS', '1536')),
+        embedding_dtype=os.getenv('CHATBOT_EMBEDDING_DTYPE', 'float32'),
+        hnsw=settings
+    )
+
+    migrated = migrate_hnsw_index(vector_store, batch_size=args.batch_size)
+
+    print(f"✓ Documents migrated: {migrated}")
+    print(f"✓ Live version: {vector_store.list_versions()['live']}")
+    print()
+    print("Set the matching CHATBOT_HNSW_* values, then restart the app.")
+
+
+if __name__ == '__main__':
+    main()
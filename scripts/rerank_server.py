@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run a cross-encoder re-rank pool shared by all app workers.
+
+Each gunicorn worker otherwise loads its own copy of the model (in-process, or
+CHATBOT_RERANK_PROCESSES copies with a private pool). Run one server instead
+and point the app at it:
+
+    export CHATBOT_RERANK_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')
+    python scripts/rerank_server.py --address 127.0.0.1:6010 --processes 2
+    CHATBOT_RERANK_SERVER=127.0.0.1:6010 gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
+Connections carry pickled messages, so the server refuses to start without
+CHATBOT_RERANK_AUTHKEY; keep the secret out of the repository and prefer a
+Unix socket path (created owner-only) or a loopback address.
+
+If the server is down or slow, chats keep their semantic order.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+from app.services.chatbot.rerank_pool import RerankPool, RerankServer
+from app.services.chatbot.reranker import RERANK_MODEL
+
+
+def main():
+    """Main rerank server function."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--address', default=os.getenv('CHATBOT_RERANK_SERVER') or '127.0.0.1:6010',
+                        help='host:port or Unix socket path to listen on')
+    parser.add_argument('--processes', type=int, default=2, help='Cross-encoder worker processes')
+    parser.add_argument('--model', default=RERANK_MODEL, help='Cross-encoder model')
+    parser.add_argument('--batch-size', type=int, default=int(os.getenv('CHATBOT_RERANK_BATCH_SIZE', '32')),
+                        help='Pairs per forward pass')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('CHATBOT_RERANK_THREADS', '0')),
+                        help='Torch threads per worker (0 = cores / processes)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    authkey = os.getenv('CHATBOT_RERANK_AUTHKEY', '')
+    if not authkey:
+        print("✗ CHATBOT_RERANK_AUTHKEY is not set; refusing to serve pickled connections without a secret")
+        sys.exit(1)
+
+    pool = RerankPool(processes=args.processes, model_name=args.model, batch_size=args.batch_size,
+                      threads=args.threads)
+    server = RerankServer(pool, args.address, authkey=authkey)
+
+    print(f"✓ Rerank server on {args.address} ({args.processes} processes, {args.model})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
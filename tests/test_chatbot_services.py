@@ -0,0 +1,1558 @@
+"""
+Unit tests for DR Knowledge Chatbot service modules.
+
+Tests chatbot storage, indexing and retrieval helpers without network access.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from app.services.chatbot.embedding_cache import EmbeddingCache, migrate_json_cache
+from app.services.chatbot.embedding_service import BatchJob, EmbeddingService, pack_by_token_budget
+from app.services.chatbot.embedding_backends import (
+    HashingEmbeddingBackend,
+    OpenAIEmbeddingBackend,
+    truncate_embeddings,
+)
+from app.services.chatbot.embedding_migration import rebuild_collection, reproject_cache
+from app.services.chatbot.data_processor import Chunk
+from app.services.chatbot.numpy_vector_store import NumpyVectorStore
+from app.services.chatbot.bm25_index import BM25Index, KeywordIndex
+from app.services.chatbot.batch_jobs import BatchJobStore, BatchJobPoller
+
+
+def _hash(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+class TestEmbeddingCache:
+    """Tests for the memory-mapped embedding cache."""
+
+    def test_put_get_roundtrip(self, tmp_path):
+        """Test vectors survive a close/reopen cycle."""
+        cache = EmbeddingCache(str(tmp_path))
+        cache[_hash('a')] = [0.1, 0.2, 0.3]
+        cache[_hash('b')] = [0.4, 0.5, 0.6]
+        cache.close()
+
+        reopened = EmbeddingCache(str(tmp_path))
+        assert len(reopened) == 2
+        assert _hash('a') in reopened
+        assert reopened.get(_hash('b')) == pytest.approx([0.4, 0.5, 0.6])
+        assert reopened.get(_hash('missing')) is None
+
+    def test_read_after_append_without_reopen(self, tmp_path):
+        """Test newly appended vectors are readable through the remapped file."""
+        cache = EmbeddingCache(str(tmp_path))
+        cache[_hash('a')] = [1.0, 0.0]
+        assert cache.get(_hash('a')) == pytest.approx([1.0, 0.0])
+        cache[_hash('b')] = [0.0, 1.0]
+        assert cache.get(_hash('b')) == pytest.approx([0.0, 1.0])
+
+    def test_dimension_mismatch_rejected(self, tmp_path):
+        """Test vectors of a different dimension are rejected."""
+        cache = EmbeddingCache(str(tmp_path))
+        cache[_hash('a')] = [1.0, 0.0]
+        with pytest.raises(ValueError):
+            cache[_hash('b')] = [1.0, 0.0, 0.0]
+
+    def test_torn_write_is_truncated(self, tmp_path):
+        """Test a trailing vector without a digest is dropped on load."""
+        cache = EmbeddingCache(str(tmp_path))
+        cache[_hash('a')] = [1.0, 2.0]
+        cache.close()
+        with open(tmp_path / 'embeddings.vec', 'ab') as f:
+            f.write(np.array([3.0, 4.0], dtype=np.float32).tobytes())
+
+        reopened = EmbeddingCache(str(tmp_path))
+        assert len(reopened) == 1
+        assert (tmp_path / 'embeddings.vec').stat().st_size == 2 * 4
+
+    def test_concurrent_writers_share_rows(self, tmp_path):
+        """Test two processes' caches appending to the same files keep keys on their own vectors."""
+        first = EmbeddingCache(str(tmp_path))
+        second = EmbeddingCache(str(tmp_path))
+        first[_hash('a')] = [1.0, 0.0]
+        second[_hash('b')] = [0.0, 1.0]
+        second.flush()
+        first.flush()
+        first[_hash('c')] = [0.5, 0.5]
+        first.flush()
+
+        assert first.get(_hash('b')) == pytest.approx([0.0, 1.0])
+        assert second.get(_hash('a')) == pytest.approx([1.0, 0.0])
+        assert second.get(_hash('c')) == pytest.approx([0.5, 0.5])
+
+        reopened = EmbeddingCache(str(tmp_path))
+        assert len(reopened) == 3
+        for key, vector in (('a', [1.0, 0.0]), ('b', [0.0, 1.0]), ('c', [0.5, 0.5])):
+            assert reopened.get(_hash(key)) == pytest.approx(vector)
+
+    def test_migrate_json_cache(self, tmp_path):
+        """Test one-shot migration of the legacy JSON cache."""
+        legacy = tmp_path / 'embedding_cache.json'
+        legacy.write_text(json.dumps({_hash('a'): [0.5, 0.5], _hash('b'): [0.25, 0.75]}))
+
+        cache = EmbeddingCache(str(tmp_path), dtype='float16')
+        assert migrate_json_cache(str(legacy), cache) == 2
+        assert not legacy.exists()
+        assert (tmp_path / 'embedding_cache.json.migrated').exists()
+        assert cache.get(_hash('b')) == pytest.approx([0.25, 0.75], abs=1e-3)
+
+
+class TestTokenPacking:
+    """Tests for token-budget request packing."""
+
+    def test_packs_respect_token_budget(self):
+        """Test groups close before exceeding the token budget."""
+        packs = pack_by_token_budget([40, 40, 40, 10], max_tokens=100, max_items=10)
+        assert packs == [[0, 1], [2, 3]]
+
+    def test_packs_respect_item_limit(self):
+        """Test groups close at the item limit."""
+        packs = pack_by_token_budget([1] * 5, max_tokens=1000, max_items=2)
+        assert packs == [[0, 1], [2, 3], [4]]
+
+    def test_oversized_text_gets_own_pack(self):
+        """Test a text above the budget is still sent, alone."""
+        packs = pack_by_token_budget([10, 500, 10], max_tokens=100, max_items=10)
+        assert packs == [[0], [1], [2]]
+
+
+class _FakeBatchEmbeddingService:
+    """Stand-in for EmbeddingService's Batch API calls."""
+
+    def __init__(self, status='in_progress'):
+        self.status = status
+        self.collected = []
+
+    def get_batch_status(self, batch_id):
+        return BatchJob(id=batch_id, status=self.status, input_file_id='file-in',
+                        output_file_id='file-out' if self.status == 'completed' else None)
+
+    def collect_batch_results(self, batch_job):
+        self.collected.append(batch_job.id)
+        return {_hash('a'): [1.0, 0.0]}
+
+
+class TestBatchJobs:
+    """Tests for persisted Batch API job tracking."""
+
+    def test_store_persists_across_instances(self, tmp_path):
+        """Test job records survive a restart."""
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='validating', input_file_id='f'),
+                  purpose='upload', upload_path='x.xlsx')
+
+        reopened = BatchJobStore(str(tmp_path))
+        assert [job['id'] for job in reopened.pending_jobs()] == ['batch_1']
+        assert reopened.get('batch_1')['context'] == {'upload_path': 'x.xlsx'}
+
+    def test_poll_in_progress_updates_status(self, tmp_path):
+        """Test an unfinished job is only status-updated."""
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='validating', input_file_id='f'), purpose='upload')
+        poller = BatchJobPoller(store, _FakeBatchEmbeddingService('in_progress'))
+
+        record = poller.poll_once('batch_1')
+        assert record['status'] == 'in_progress'
+
+    def test_poll_completed_runs_handler_once(self, tmp_path):
+        """Test a completed job is downloaded, applied and not re-applied."""
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='in_progress', input_file_id='f'), purpose='upload')
+        service = _FakeBatchEmbeddingService('completed')
+        applied = []
+        poller = BatchJobPoller(store, service)
+        poller.register_handler('upload', applied.append)
+
+        record = poller.poll_once('batch_1')
+        poller.poll_once('batch_1')
+
+        assert record['status'] == 'applied'
+        assert record['embeddings_received'] == 1
+        assert len(applied) == 1
+        assert service.collected == ['batch_1']
+        assert store.pending_jobs() == []
+
+    def test_handler_failure_marks_apply_failed(self, tmp_path):
+        """Test handler errors are recorded on the job."""
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='in_progress', input_file_id='f'), purpose='upload')
+        poller = BatchJobPoller(store, _FakeBatchEmbeddingService('completed'))
+
+        def fail(record):
+            raise RuntimeError('boom')
+
+        poller.register_handler('upload', fail)
+        record = poller.poll_once('batch_1')
+        assert record['status'] == 'apply_failed'
+        assert record['error'] == 'boom'
+
+    def test_resumed_handler_sees_app_config(self, tmp_path):
+        """Test handlers run by the poller thread read the app's CHATBOT_* settings."""
+        from flask import Flask
+        from app.services.chatbot.settings import get_setting
+
+        app = Flask(__name__)
+        app.config['CHATBOT_VECTOR_ENGINE'] = 'numpy'
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='in_progress', input_file_id='f'), purpose='upload')
+        poller = BatchJobPoller(store, _FakeBatchEmbeddingService('completed'), poll_interval=0, app=app)
+        engines = []
+        poller.register_handler('upload', lambda record: engines.append(get_setting('CHATBOT_VECTOR_ENGINE', 'chroma')))
+
+        poller.start()
+        poller._thread.join(timeout=5)
+        assert engines == ['numpy']
+
+    def test_only_lock_holder_polls(self, tmp_path):
+        """Test a poller waits while another process holds the poller lock, then takes over."""
+        import time
+        from app.services.chatbot.file_lock import try_exclusive_lock
+
+        store = BatchJobStore(str(tmp_path))
+        store.add(BatchJob(id='batch_1', status='in_progress', input_file_id='f'), purpose='upload')
+        service = _FakeBatchEmbeddingService('completed')
+        poller = BatchJobPoller(store, service, poll_interval=0.05)
+        poller.register_handler('upload', lambda record: None)
+
+        other_process = try_exclusive_lock(tmp_path / 'batch_poller.lock')
+        poller.start()
+        time.sleep(0.3)
+        assert service.collected == [] and poller.is_running()
+
+        other_process.close()
+        poller._thread.join(timeout=5)
+        assert service.collected == ['batch_1'] and store.pending_jobs() == []
+
+    def test_knowledge_base_load_submits_one_job_per_source(self, tmp_path):
+        """Test workers loading the same file while its batch job is pending reuse that job."""
+        from types import SimpleNamespace
+        from app.services.chatbot.rag_orchestrator import RAGOrchestrator
+
+        submitted = []
+
+        def embed_batch(texts, allow_batch_api=True):
+            submitted.append(len(texts))
+            return {'batch_job': BatchJob(id=f'batch_{len(submitted)}', status='validating', input_file_id='f'),
+                    'pending': True}
+
+        def worker():
+            store = BatchJobStore(str(tmp_path))
+            orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+            orchestrator.vector_store = SimpleNamespace(count=lambda: 1)
+            orchestrator.metadata_service = SimpleNamespace(
+                get_statistics=lambda: {'total_chunks': 0, 'total_events': 0})
+            orchestrator.data_processor = SimpleNamespace(
+                load_excel=lambda path: None, validate_data=lambda df: {'valid': True},
+                extract_events=lambda df: ['event'] * 100,
+                chunk_events=lambda events: [SimpleNamespace(text=f'chunk {i}') for i in range(len(events))])
+            orchestrator.embedding_service = SimpleNamespace(embed_batch=embed_batch)
+            orchestrator.batch_jobs = store
+            orchestrator.batch_poller = SimpleNamespace(
+                track=lambda job, purpose, **context: store.add(job, purpose, **context))
+            return orchestrator
+
+        first = worker().load_knowledge_base(tmp_path / 'kb.xlsx')
+        second = worker().load_knowledge_base(tmp_path / 'kb.xlsx')
+
+        assert submitted == [100]
+        assert first['batch_job_id'] == second['batch_job_id'] == 'batch_1'
+        assert len(BatchJobStore(str(tmp_path)).pending_jobs()) == 1
+
+
+class TestHashingBackend:
+    """Tests for the offline feature-hashing embedding backend."""
+
+    def test_deterministic_unit_vectors(self):
+        """Test vectors are stable and L2-normalized."""
+        backend = HashingEmbeddingBackend(dimensions=256)
+        first = backend.embed(['Measles outbreak in Canada', ''])
+        second = HashingEmbeddingBackend(dimensions=256).embed(['Measles outbreak in Canada'])
+
+        assert first.shape == (2, 256)
+        assert first.dtype == np.float32
+        assert np.allclose(first[0], second[0])
+        assert np.linalg.norm(first[0]) == pytest.approx(1.0)
+        assert not first[1].any()
+
+    def test_lexical_overlap_ranks_higher(self):
+        """Test related texts score above unrelated ones."""
+        vectors = HashingEmbeddingBackend(dimensions=512).embed([
+            'measles outbreak ontario',
+            'measles cases ontario canada',
+            'cholera in yemen'
+        ])
+        assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+    def test_embedding_service_offline(self, tmp_path):
+        """Test EmbeddingService runs without an API key and namespaces its cache."""
+        service = EmbeddingService(cache_dir=str(tmp_path), backend=HashingEmbeddingBackend(dimensions=64))
+        results = service.embed_batch(['alpha', 'beta'])
+        assert len(results) == 2
+        assert service.embed_single('alpha') == pytest.approx(results[service._text_hash('alpha')])
+        assert (tmp_path / 'hashing-feature-hashing-v1-64.vec').exists()
+
+
+class TestStorageProfile:
+    """Tests for reduced-dimension / half-precision embedding storage."""
+
+    def test_truncate_embeddings_renormalizes(self):
+        """Test re-projected vectors keep the prefix direction at unit length."""
+        vectors = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+        projected = truncate_embeddings(vectors, 2)
+
+        assert projected.shape == (2, 2)
+        assert projected[0] == pytest.approx([0.6, 0.8])
+        assert not projected[1].any()
+        with pytest.raises(ValueError):
+            truncate_embeddings(vectors, 4)
+
+    def test_openai_dimensions_request_param(self):
+        """Test `dimensions` is only sent below the model's native size."""
+        native = OpenAIEmbeddingBackend(api_key='sk-test')
+        reduced = OpenAIEmbeddingBackend(api_key='sk-test', dimensions=512)
+
+        assert native.request_params() == {'model': 'text-embedding-3-small'}
+        assert reduced.request_params() == {'model': 'text-embedding-3-small', 'dimensions': 512}
+
+    def test_float16_profile_namespaces_cache(self, tmp_path):
+        """Test a float16 profile gets its own half-precision cache."""
+        service = EmbeddingService(cache_dir=str(tmp_path), backend=HashingEmbeddingBackend(dimensions=32),
+                                   storage_dtype='float16')
+        service.embed_batch(['alpha'])
+
+        assert service.cache_namespace == 'hashing-feature-hashing-v1-32-float16'
+        assert service.cache.stats()['dtype'] == 'float16'
+        assert (tmp_path / 'hashing-feature-hashing-v1-32-float16.vec').stat().st_size == 32 * 2
+
+    def test_reproject_cache(self, tmp_path):
+        """Test cached vectors are shortened into the target cache once."""
+        source = EmbeddingCache(str(tmp_path), name='source')
+        source[_hash('a')] = [3.0, 4.0, 12.0]
+        target = EmbeddingCache(str(tmp_path), name='target', dtype='float16')
+
+        assert reproject_cache(source, target, 2) == 1
+        assert reproject_cache(source, target, 2) == 0
+        assert target.get(_hash('a')) == pytest.approx([0.6, 0.8], abs=1e-3)
+
+    def test_rebuild_collection_reprojects_vectors(self, tmp_path):
+        """Test the collection is rebuilt with shorter vectors as a new live version."""
+        from app.services.chatbot.vector_store import VectorStore
+
+        full = VectorStore(str(tmp_path))
+        full.create_collection()
+        full.collection.add(ids=['e1_0', 'e2_0'], documents=['one', 'two'],
+                            embeddings=[[3.0, 4.0, 12.0], [1.0, 0.0, 0.0]],
+                            metadatas=[{'event_id': 'e1'}, {'event_id': 'e2'}])
+
+        reduced = VectorStore(str(tmp_path), embedding_dimensions=2, embedding_dtype='float16')
+        assert rebuild_collection(None, reduced) == 2
+
+        stored = next(reduced.iter_documents())
+        vectors = dict(zip(stored['ids'], np.asarray(stored['embeddings'])))
+        versions = reduced.list_versions()
+        assert reduced.collection.name == versions['live'] != 'epidemiological_events'
+        assert versions['previous'] == 'epidemiological_events'
+        assert reduced.collection.metadata['embedding_dimensions'] == 2
+        assert vectors['e1_0'] == pytest.approx([0.6, 0.8], abs=1e-3)
+
+
+def _chunk(event_id: str, text: str, **metadata) -> Chunk:
+    metadata.setdefault('event_id', event_id)
+    return Chunk(text=text, event_id=event_id, chunk_index=0, metadata=metadata, token_count=len(text.split()))
+
+
+def _numpy_store(path, dtype='float32') -> NumpyVectorStore:
+    """Store with three unit-axis vectors and varied metadata."""
+    store = NumpyVectorStore(str(path), embedding_dimensions=3, embedding_dtype=dtype)
+    store.add_documents(
+        [
+            _chunk('e1', 'measles in canada', location='Canada', section='Americas', date_unix=1700000000),
+            _chunk('e2', 'cholera in yemen', location='Yemen', section='EMRO', date_unix=1710000000),
+            _chunk('e3', 'measles in mexico', location='Mexico', section='Americas'),
+        ],
+        [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.8, 0.0, 0.6]]
+    )
+    return store
+
+
+class TestNumpyVectorStore:
+    """Tests for the in-process exact-search vector store engine."""
+
+    def test_semantic_search_ranks_by_cosine(self, tmp_path):
+        """Test exact top-k ordering and score/distance conversion."""
+        results = _numpy_store(tmp_path).semantic_search([2.0, 0.0, 0.0], top_k=2)
+
+        assert [r.id for r in results] == ['e1_0', 'e3_0']
+        assert results[0].score == pytest.approx(1.0)
+        assert results[1].distance == pytest.approx(0.2)
+        assert results[1].text == 'measles in mexico'
+        assert results[1].metadata['location'] == 'Mexico'
+
+    def test_filters_apply_as_masks(self, tmp_path):
+        """Test location/section/date filters restrict candidates."""
+        store = _numpy_store(tmp_path)
+        query = [1.0, 1.0, 1.0]
+
+        assert [r.id for r in store.semantic_search(query, filters={'section': 'Americas'})] == ['e3_0', 'e1_0']
+        assert [r.id for r in store.semantic_search(query, filters={'location': 'Yemen'})] == ['e2_0']
+        assert store.semantic_search(query, filters={'location': 'Atlantis'}) == []
+        # Chunks without a date never match a date filter
+        dated = store.semantic_search(query, filters={'date_from': '2023-01-01'})
+        assert sorted(r.id for r in dated) == ['e1_0', 'e2_0']
+
+    def test_persists_and_replaces_ids(self, tmp_path):
+        """Test a reopened store sees the data and re-adding an ID replaces it."""
+        _numpy_store(tmp_path)
+        reopened = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        assert reopened.count() == 3
+
+        reopened.add_documents([_chunk('e2', 'cholera update', location='Yemen')], [[0.0, 0.0, 1.0]])
+        assert reopened.count() == 3
+        assert reopened.semantic_search([0.0, 0.0, 1.0], top_k=1)[0].text == 'cholera update'
+
+    def test_float16_matrix_and_hybrid_surface(self, tmp_path):
+        """Test half-precision storage and that hybrid_search works on this engine."""
+        store = _numpy_store(tmp_path, dtype='float16')
+        assert store._current().matrix.dtype == np.float16
+
+        results = store.hybrid_search('measles', [1.0, 0.0, 0.0], top_k=3)
+        assert [r.id for r in results][0] == 'e1_0'
+        with pytest.raises(ValueError):
+            store.semantic_search([1.0, 0.0])
+
+    def test_writers_in_other_processes_wait_for_the_lock(self, tmp_path):
+        """Test a writer blocks on the collection's file lock and builds on the other writer's generation."""
+        import threading
+        from app.services.chatbot.file_lock import file_lock
+
+        first = _numpy_store(tmp_path)
+        second = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        done = threading.Event()
+
+        with file_lock(first.collection_dir / 'WRITE.lock'):
+            writer = threading.Thread(target=lambda: (
+                second.add_documents([_chunk('e4', 'dengue in brazil')], [[0.0, 1.0, 1.0]]), done.set()))
+            writer.start()
+            assert not done.wait(0.3)
+
+        writer.join(timeout=5)
+        assert done.is_set()
+        first.add_documents([_chunk('e5', 'mpox in congo')], [[1.0, 1.0, 0.0]])
+        assert NumpyVectorStore(str(tmp_path), embedding_dimensions=3).count() == 5
+
+
+class TestBM25Index:
+    """Tests for the BM25 inverted index."""
+
+    texts = [
+        'measles outbreak in ontario schools',
+        'cholera outbreak in yemen',
+        'measles measles measles vaccination campaign',
+        'avian influenza in poultry',
+    ]
+
+    def test_rare_terms_and_frequency_rank_higher(self):
+        """Test idf and tf drive the ranking and stopwords are ignored."""
+        index = BM25Index.build(self.texts)
+        ranked = [row for row, _ in index.top('measles in yemen', top_k=4)]
+
+        assert ranked[0] == 1  # 'yemen' is the rarest matching term
+        assert set(ranked) == {0, 1, 2}
+        assert index.top('the of and', top_k=4) == []
+
+    def test_incremental_updates_match_rebuild(self):
+        """Test select() + extend() give the same scores as a fresh build."""
+        incremental = BM25Index.build(self.texts[:3]).select([0, 2]).extend([self.texts[3], 'cholera in haiti'])
+        rebuilt = BM25Index.build([self.texts[0], self.texts[2], self.texts[3], 'cholera in haiti'])
+
+        for query in ('measles', 'cholera haiti', 'influenza poultry', 'outbreak'):
+            assert np.allclose(incremental.scores(query), rebuilt.scores(query))
+
+    def test_save_load_and_mask(self, tmp_path):
+        """Test persistence and prefilter masks."""
+        BM25Index.build(self.texts).save(tmp_path)
+        index = BM25Index.load(tmp_path)
+
+        mask = np.array([False, True, True, True])
+        assert [row for row, _ in index.top('measles outbreak', top_k=5, mask=mask)] == [2, 1]
+
+    def test_keyword_index_upsert_and_delete(self, tmp_path):
+        """Test ID-keyed replace/delete persist across instances."""
+        keyword_index = KeywordIndex(str(tmp_path / 'kw'))
+        keyword_index.upsert(['a', 'b'], ['measles canada', 'cholera yemen'])
+        keyword_index.upsert(['a'], ['dengue brazil'])
+        keyword_index.delete(['b'])
+
+        reopened = KeywordIndex(str(tmp_path / 'kw'))
+        assert reopened.count == 1
+        assert reopened.search('dengue', top_k=5)[0][0] == 'a'
+        assert reopened.search('measles cholera', top_k=5) == []
+
+    def test_engines_keyword_search(self, tmp_path):
+        """Test both engines answer keyword_search from the BM25 index with filters."""
+        from app.services.chatbot.vector_store import VectorStore
+
+        chroma = VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3)
+        chroma.add_documents(
+            [
+                _chunk('e1', 'measles in canada', location='Canada', section='Americas', date_unix=1700000000),
+                _chunk('e2', 'cholera in yemen', location='Yemen', section='EMRO', date_unix=1710000000),
+                _chunk('e3', 'measles in mexico', location='Mexico', section='Americas', date_unix=1690000000),
+            ],
+            [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.8, 0.0, 0.6]]
+        )
+        numpy_store = _numpy_store(tmp_path / 'numpy')
+
+        for store in (chroma, numpy_store):
+            assert sorted(r.id for r in store.keyword_search('measles', top_k=5)) == ['e1_0', 'e3_0']
+            filtered = store.keyword_search('measles', top_k=5, filters={'location': 'Mexico'})
+            assert [r.id for r in filtered] == ['e3_0']
+            assert filtered[0].score > 0
+
+
+class TestSearchMany:
+    """Tests for batched multi-query vector search."""
+
+    def test_matches_single_query_search(self, tmp_path):
+        """Test each engine returns the same lists as per-query semantic_search."""
+        from app.services.chatbot.vector_store import VectorStore
+
+        chroma = VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3)
+        chroma.add_documents(
+            [_chunk('e1', 'a', location='Canada'), _chunk('e2', 'b', location='Yemen'),
+             _chunk('e3', 'c', location='Canada')],
+            [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.8, 0.0, 0.6]]
+        )
+        queries = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.1], [0.0, 0.0, 1.0]]
+
+        for store in (chroma, _numpy_store(tmp_path / 'numpy')):
+            for filters in (None, {'location': 'Canada'}):
+                batched = store.search_many(queries, top_k=2, filters=filters)
+                single = [store.semantic_search(q, top_k=2, filters=filters) for q in queries]
+                assert [[r.id for r in results] for results in batched] == \
+                       [[r.id for r in results] for results in single]
+
+    def test_shared_rows_hydrated_independently(self, tmp_path):
+        """Test a row returned for two queries yields independent metadata dicts."""
+        first, second = _numpy_store(tmp_path).search_many([[1.0, 0.0, 0.0], [0.9, 0.1, 0.0]], top_k=1)
+
+        assert first[0].id == second[0].id == 'e1_0'
+        first[0].metadata['location'] = 'changed'
+        assert second[0].metadata['location'] == 'Canada'
+        assert _numpy_store(tmp_path).search_many([], top_k=1) == []
+
+
+class TestIncrementalIndexing:
+    """Tests for per-event delete/upsert used by incremental uploads."""
+
+    def _stores(self, tmp_path):
+        from app.services.chatbot.vector_store import VectorStore
+        return [VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3),
+                NumpyVectorStore(str(tmp_path / 'numpy'), embedding_dimensions=3)]
+
+    def test_replace_events_drops_stale_chunks(self, tmp_path):
+        """Test modified events lose chunks that no longer exist and deleted events disappear."""
+        first, second = _chunk('00001', 'measles outbreak'), _chunk('00001', 'measles vaccine')
+        second.chunk_index = 1
+
+        for store in self._stores(tmp_path):
+            store.add_documents(
+                [first, second, _chunk('00002', 'cholera yemen'), _chunk('00003', 'dengue brazil')],
+                [[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+            )
+
+            store.replace_events([_chunk('00001', 'measles ended'), _chunk('00004', 'mpox drc')],
+                                 [[1.0, 0.0, 0.0], [0.5, 0.5, 0.0]], stale_event_ids=['00001', '00003'])
+
+            ids = sorted(i for page in store.iter_documents(include_embeddings=False) for i in page['ids'])
+            assert ids == ['00001_0', '00002_0', '00004_0']
+            assert [r.id for r in store.keyword_search('vaccine')] == []
+            assert [r.id for r in store.keyword_search('ended')] == ['00001_0']
+
+    def test_delete_events_counts_removed_chunks(self, tmp_path):
+        """Test delete_events removes by event ID and ignores unknown IDs."""
+        for store in self._stores(tmp_path):
+            store.add_documents([_chunk('00001', 'a b'), _chunk('00002', 'c d')],
+                                [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+            assert store.delete_events(['00002', '99999']) == 1
+            assert store.delete_events(['99999']) == 0
+            assert store.count() == 1
+
+
+class TestBlueGreenRebuild:
+    """Tests for shadow rebuilds, alias swaps and rollback."""
+
+    def _stores(self, tmp_path):
+        from app.services.chatbot.vector_store import VectorStore
+        return [VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3),
+                NumpyVectorStore(str(tmp_path / 'numpy'), embedding_dimensions=3)]
+
+    def test_rebuild_swaps_and_rolls_back(self, tmp_path):
+        """Test readers see the old index until publish, and rollback restores it."""
+        for store in self._stores(tmp_path):
+            store.add_documents([_chunk('00001', 'old measles')], [[1.0, 0.0, 0.0]])
+
+            version = store.begin_rebuild()
+            store.add_to_rebuild(version, ['00002_0', '00003_0'], ['new cholera', 'new dengue'],
+                                 [{'event_id': '00002'}, {'event_id': '00003'}],
+                                 [[0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+            assert store.count() == 1  # shadow is invisible
+
+            live = store.publish_rebuild(version, expected_count=2, sample_embedding=[0.0, 1.0, 0.0])
+            assert store.count() == 2
+            assert store.list_versions()['live'] == live
+            assert [r.id for r in store.keyword_search('cholera')] == ['00002_0']
+
+            store.rollback()
+            assert [r.id for r in store.semantic_search([1.0, 0.0, 0.0], top_k=5)] == ['00001_0']
+
+    def test_failed_validation_keeps_live_index(self, tmp_path):
+        """Test a shadow with the wrong count is discarded and never published."""
+        for store in self._stores(tmp_path):
+            store.add_documents([_chunk('00001', 'old measles')], [[1.0, 0.0, 0.0]])
+            before = store.list_versions()
+
+            version = store.begin_rebuild()
+            store.add_to_rebuild(version, ['00002_0'], ['new'], [{'event_id': '00002'}], [[0.0, 1.0, 0.0]])
+            with pytest.raises(RuntimeError):
+                store.publish_rebuild(version, expected_count=5)
+            store.abort_rebuild(version)
+
+            assert store.list_versions() == before
+            assert store.count() == 1
+
+    def test_sample_query_must_find_the_sample_row(self, tmp_path):
+        """Test a shadow whose sample document is not the sample query's top hit is rejected."""
+        for store in self._stores(tmp_path):
+            store.add_documents([_chunk('00001', 'old measles')], [[1.0, 0.0, 0.0]])
+            before = store.list_versions()
+
+            version = store.begin_rebuild()
+            store.add_to_rebuild(version, ['00002_0', '00003_0'], ['new cholera', 'new dengue'],
+                                 [{'event_id': '00002'}, {'event_id': '00003'}],
+                                 [[0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+            with pytest.raises(RuntimeError):
+                store.publish_rebuild(version, expected_count=2, sample_embedding=[0.0, 0.0, 1.0],
+                                      sample_id='00002_0')
+            store.abort_rebuild(version)
+            assert store.list_versions() == before
+
+    def test_rollback_after_update_restores_the_previously_live_version(self, tmp_path):
+        """Test numpy rollback targets the generation that was live before, not the newest non-live one."""
+        store = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        store.add_documents([_chunk('00001', 'good')], [[1.0, 0.0, 0.0]])
+        good = store.list_versions()['live']
+        store.rebuild([_chunk('00002', 'bad')], [[0.0, 1.0, 0.0]])
+        store.rollback()
+        assert store.list_versions()['live'] == good
+
+        store.add_documents([_chunk('00003', 'fix')], [[0.0, 0.0, 1.0]])
+        assert store.list_versions()['previous'] == good
+        store.rollback()
+        assert sorted(r.id for r in store.semantic_search([1.0, 1.0, 1.0], top_k=5)) == ['00001_0']
+
+    def test_rollback_in_another_worker_invalidates_caches(self, tmp_path):
+        """Test cached results stop matching once any worker rolls the index back."""
+        from app.services.chatbot.metadata_service import MetadataService
+        from app.services.chatbot.rag_orchestrator import RAGOrchestrator
+        from app.services.chatbot.retrieval_cache import RetrievalCache
+        from app.services.chatbot.vector_store import VectorStore
+
+        for engine in (VectorStore, NumpyVectorStore):
+            data_dir = tmp_path / engine.__name__
+            orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+            orchestrator.metadata_service = MetadataService(data_dir=str(data_dir))
+            orchestrator.vector_store = engine(str(data_dir / 'index'), embedding_dimensions=3)
+            cache = RetrievalCache(version_source=orchestrator.index_version)
+
+            orchestrator.vector_store.add_documents([_chunk('00001', 'old')], [[1.0, 0.0, 0.0]])
+            orchestrator.vector_store.rebuild([_chunk('00002', 'new')], [[0.0, 1.0, 0.0]])
+            cache.put(cache.key('q', None), ['from new'])
+
+            engine(str(data_dir / 'index'), embedding_dimensions=3).rollback()
+            assert cache.get(cache.key('q', None)) is None
+
+    def test_knowledge_base_load_swaps_in_a_shadow_version(self, tmp_path):
+        """Test loading the knowledge base never truncates the live index."""
+        from types import SimpleNamespace
+        from app.services.chatbot.metadata_service import MetadataService
+        from app.services.chatbot.rag_orchestrator import RAGOrchestrator
+
+        store = NumpyVectorStore(str(tmp_path / 'index'), embedding_dimensions=3)
+        store.add_documents([_chunk('00001', 'old')], [[1.0, 0.0, 0.0]])
+        old = store.list_versions()['live']
+
+        orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+        orchestrator.vector_store = store
+        orchestrator.metadata_service = MetadataService(data_dir=str(tmp_path))
+        orchestrator.data_processor = SimpleNamespace(
+            load_excel=lambda path: None, validate_data=lambda df: {'valid': True},
+            extract_events=lambda df: ['00002', '00003'],
+            chunk_events=lambda events: [_chunk(event_id, f'new {event_id}') for event_id in events])
+        orchestrator.embedding_service = SimpleNamespace(embed_single=lambda text: [0.0, 1.0, 0.0])
+
+        assert orchestrator.load_knowledge_base(tmp_path / 'kb.xlsx')['success']
+        assert store.count() == 2
+        assert store.list_versions()['previous'] == old
+
+    def test_other_instance_follows_alias(self, tmp_path):
+        """Test a second process-level instance picks up the swap on its next query."""
+        from app.services.chatbot.vector_store import VectorStore
+
+        writer = VectorStore(str(tmp_path), embedding_dimensions=3)
+        reader = VectorStore(str(tmp_path), embedding_dimensions=3)
+        writer.add_documents([_chunk('00001', 'old')], [[1.0, 0.0, 0.0]])
+        assert reader.count() == 1
+
+        writer.rebuild([_chunk('00002', 'new'), _chunk('00003', 'newer')],
+                       [[0.0, 1.0, 0.0], [0.0, 0.0, 1.0]], batch_size=1)
+
+        assert reader.count() == 2
+
+
+class TestStreamingIngest:
+    """Tests for add_stream batched ingest."""
+
+    def _pairs(self, n):
+        for i in range(n):
+            yield _chunk(f'{i:05d}', f'event number {i}'), [1.0, float(i), 0.0]
+
+    def test_stream_writes_in_batches(self, tmp_path, monkeypatch):
+        """Test both engines consume a generator in batches and report progress."""
+        from app.services.chatbot.vector_store import VectorStore
+
+        chroma = VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3)
+        monkeypatch.setattr(chroma.client, 'get_max_batch_size', lambda: 4)
+        numpy_store = NumpyVectorStore(str(tmp_path / 'numpy'), embedding_dimensions=3)
+
+        for store, expected in ((chroma, [4, 8, 10]), (numpy_store, [5, 10])):
+            progress = []
+            assert store.add_stream(self._pairs(10), batch_size=5, progress_callback=progress.append) == 10
+            assert progress == expected
+            assert store.count() == 10
+            assert [r.id for r in store.keyword_search('number 7')][:1] == ['00007_0']
+
+        assert not list((tmp_path / 'numpy').rglob('.spill-*'))
+
+    def test_batch_limit_supports_chromadb_0_4_clients(self, tmp_path):
+        """Test the pinned chromadb's max_batch_size property caps writes as well."""
+        from types import SimpleNamespace
+        from app.services.chatbot.vector_store import VectorStore
+
+        chroma = VectorStore(str(tmp_path), embedding_dimensions=3)
+        chroma.client = SimpleNamespace(max_batch_size=3)
+        assert chroma._batch_limit(5) == 3
+
+    def test_stream_upserts_existing_ids(self, tmp_path):
+        """Test streamed chunks replace stored chunks with the same ID."""
+        store = _numpy_store(tmp_path)
+
+        store.add_stream(iter([(_chunk('e2', 'cholera in aden', location='Yemen'), [0.0, 1.0, 0.0])]))
+
+        assert store.count() == 3
+        assert store.keyword_search('aden')[0].id == 'e2_0'
+        assert store.keyword_search('canada')[0].metadata['location'] == 'Canada'
+
+
+class TestFacetFilters:
+    """Tests for hazard/location/year facet pushdown."""
+
+    def _corpus(self):
+        chunks = [
+            _chunk(f'0000{i}', f'measles cases {i}', hazard_normalized='measles',
+                   location='United States of America', date='2024-03-0' + str(i + 1))
+            for i in range(5)
+        ]
+        chunks.append(_chunk('00009', 'cholera cases', hazard_normalized='cholera',
+                             location='Yemen', date='2023-05-01'))
+        embeddings = [[1.0, 0.1 * i, 0.0] for i in range(5)] + [[0.0, 1.0, 0.0]]
+        return chunks, embeddings
+
+    def _stores(self, tmp_path):
+        from app.services.chatbot.vector_store import VectorStore
+        stores = [VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3),
+                  NumpyVectorStore(str(tmp_path / 'numpy'), embedding_dimensions=3)]
+        for store in stores:
+            store.add_documents(*self._corpus())
+        return stores
+
+    def test_facet_terms(self):
+        """Test facet terms are tokenized and query terms use the same normalization."""
+        from app.services.chatbot.facet_index import FacetIndex, facet_terms, query_terms
+
+        terms = facet_terms({'hazard_normalized': 'yellow fever', 'location': 'United States of America',
+                             'section': 'Americas', 'date': '2024-03-01'})
+        assert terms == {'hazard': ['fever', 'yellow'], 'location': ['america', 'states', 'united'],
+                         'section': ['americas'], 'year': ['2024']}
+        assert query_terms('location', 'United States') == ['states', 'united']
+
+        index = FacetIndex.build([{'location': 'United States'}, {'location': 'United Kingdom'}])
+        assert index.mask({'location': ['united', 'states']}).tolist() == [True, False]
+
+    def test_facets_narrow_search(self, tmp_path):
+        """Test hazard and location facets restrict candidates before scoring."""
+        for store in self._stores(tmp_path):
+            results = store.semantic_search([0.0, 1.0, 0.0], top_k=3,
+                                            filters={'hazard_normalized': 'measles',
+                                                     'location_contains': 'united states'})
+            assert len(results) == 3
+            assert all(r.metadata['hazard_normalized'] == 'measles' for r in results)
+            assert not any(key.startswith('facet_') for key in results[0].metadata)
+
+            keyword = store.keyword_search('cases', top_k=10, filters={'year': 2024})
+            assert len(keyword) == 5
+
+    def test_small_facet_subset_falls_back(self, tmp_path):
+        """Test facets matching too few chunks are dropped instead of starving retrieval."""
+        for store in self._stores(tmp_path):
+            results = store.semantic_search([0.0, 1.0, 0.0], top_k=1, filters={'hazard_normalized': 'cholera'})
+            assert [r.id for r in results] == ['00009_0']
+
+            results = store.semantic_search([0.0, 1.0, 0.0], top_k=6, filters={'location_contains': 'atlantis'})
+            assert len(results) == 6
+
+    def test_legacy_generation_indexed_in_memory_by_readers(self, tmp_path):
+        """Test readers build missing keyword/facet indexes without writing; a publish saves them."""
+        from app.services.chatbot.bm25_index import BM25Index
+        from app.services.chatbot.facet_index import FacetIndex
+
+        NumpyVectorStore(str(tmp_path), embedding_dimensions=3).add_documents(*self._corpus())
+        store = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        gen_dir = store.collection_dir / store._current().generation
+        for path in list(gen_dir.glob('bm25_*')) + list(gen_dir.glob('facet*')):
+            path.unlink()
+        files = sorted(path.name for path in gen_dir.iterdir())
+
+        reader = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        assert len(reader.keyword_search('cases', top_k=10, filters={'year': 2024})) == 5
+        results = reader.semantic_search([0.0, 1.0, 0.0], top_k=1, filters={'hazard_normalized': 'cholera'})
+        assert [r.id for r in results] == ['00009_0']
+        assert sorted(path.name for path in gen_dir.iterdir()) == files
+
+        reader.add_documents([_chunk('00010', 'new cases')], [[0.0, 0.0, 1.0]])
+        reader.rollback()
+        assert BM25Index.exists(gen_dir) and FacetIndex.exists(gen_dir)
+        assert len(reader.keyword_search('cases', top_k=10, filters={'year': 2024})) == 5
+
+    def test_chroma_backfills_legacy_collection(self, tmp_path):
+        """Test a collection written without facet metadata is backfilled on open, keeping its HNSW settings."""
+        from app.services.chatbot.facet_index import FACET_METADATA_VERSION
+        from app.services.chatbot.hnsw_index import HNSWSettings
+        from app.services.chatbot.vector_store import VectorStore
+
+        legacy = VectorStore(str(tmp_path)).client.get_or_create_collection(
+            'epidemiological_events', metadata={'hnsw:space': 'cosine'})
+        chunks, embeddings = self._corpus()
+        legacy.add(ids=[f'{c.event_id}_0' for c in chunks], documents=[c.text for c in chunks],
+                   embeddings=embeddings, metadatas=[c.metadata for c in chunks])
+
+        store = VectorStore(str(tmp_path))
+        store.create_collection()
+
+        assert store._facet_version() == FACET_METADATA_VERSION
+        assert VectorStore(str(tmp_path))._read_facet_versions() == {'epidemiological_events': FACET_METADATA_VERSION}
+        assert HNSWSettings.from_metadata(store.collection.metadata).space == 'cosine'
+        assert len(store.keyword_search('cases', filters={'hazard_normalized': 'measles'})) == 5
+
+        # chromadb 0.4 only stores str/int/float/bool metadata values
+        stored = store.collection.get(include=['metadatas'])['metadatas']
+        assert all(isinstance(value, (str, int, float, bool)) for m in stored for value in m.values())
+        assert stored[0]['facet_hazard_measles'] is True
+
+
+class TestIVFPQIndex:
+    """Tests for the IVF-PQ approximate index and engine."""
+
+    def _vectors(self, n=600, d=16, seed=0):
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(12, d))
+        matrix = centers[rng.integers(0, 12, size=n)] + 0.3 * rng.normal(size=(n, d))
+        return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+    def test_full_probe_matches_exact(self):
+        """Test probing every list with a full rerank returns the exact top-k."""
+        from app.services.chatbot.ivf_index import IVFPQIndex, recall_report
+
+        matrix = self._vectors()
+        index = IVFPQIndex.build(matrix, nlist=8, subspaces=4)
+        queries = matrix[:5]
+
+        for (rows, scores), query in zip(index.search(matrix, queries, 10, nprobe=8, rerank_depth=600), queries):
+            exact = np.argsort(-(matrix @ query), kind='stable')[:10]
+            assert set(rows.tolist()) == set(exact.tolist())
+            assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+        report = recall_report(matrix, index, queries, top_k=10, nprobes=(1, 8), rerank_depths=(600,))
+        assert [(r['nprobe'], r['rerank_depth']) for r in report] == [(1, 600), (8, 600)]
+        assert report[1]['recall'] == 1.0 and report[0]['recall'] <= 1.0
+
+    def test_engine_search_and_incremental_codes(self, tmp_path):
+        """Test the engine searches through the index and reuses codes on upsert."""
+        from app.services.chatbot.ann_vector_store import IVFPQVectorStore
+        from app.services.chatbot.ivf_index import IVFPQIndex
+
+        matrix = self._vectors(n=300)
+        store = IVFPQVectorStore(str(tmp_path), embedding_dimensions=16, nprobe=8, rerank_depth=300,
+                                 nlist=8, subspaces=4, min_rows=100)
+        store.add_documents([_chunk(f'{i:05d}', f'event {i}', section='EMRO' if i % 2 else 'AFRO')
+                             for i in range(300)], matrix.tolist())
+        gen_dir = store.collection_dir / store._current().generation
+        before = IVFPQIndex.load(gen_dir)
+
+        assert store.get_collection_stats()['ann']['enabled'] is True
+        assert store.semantic_search(matrix[7].tolist(), top_k=1)[0].id == '00007_0'
+
+        store.add_documents([_chunk('00300', 'event 300')], [matrix[3].tolist()])
+        after = IVFPQIndex.load(store.collection_dir / store._current().generation)
+
+        assert after.count == 301
+        np.testing.assert_array_equal(after.centroids, before.centroids)
+        np.testing.assert_array_equal(after.codes[:300], before.codes)
+        assert after.codes[300].tolist() == before.codes[3].tolist()
+        assert {r.id for r in store.semantic_search(matrix[3].tolist(), top_k=2)} == {'00003_0', '00300_0'}
+
+    def test_reader_never_builds_missing_index(self, tmp_path):
+        """Test a numpy-written generation is searched exactly until a write indexes it."""
+        from app.services.chatbot.ann_vector_store import IVFPQVectorStore
+        from app.services.chatbot.ivf_index import IVFPQIndex
+        from app.services.chatbot.numpy_vector_store import NumpyVectorStore
+
+        matrix = self._vectors(n=300)
+        NumpyVectorStore(str(tmp_path), embedding_dimensions=16).add_documents(
+            [_chunk(f'{i:05d}', f'event {i}') for i in range(300)], matrix.tolist())
+        store = IVFPQVectorStore(str(tmp_path), embedding_dimensions=16, nlist=8, subspaces=4, min_rows=100)
+        gen_dir = store.collection_dir / store._current().generation
+        files = sorted(path.name for path in gen_dir.iterdir())
+
+        assert store.semantic_search(matrix[7].tolist(), top_k=1)[0].id == '00007_0'
+        assert store.get_collection_stats()['ann']['enabled'] is False
+        assert sorted(path.name for path in gen_dir.iterdir()) == files
+
+        store.add_documents([_chunk('00300', 'event 300')], [matrix[3].tolist()])
+        assert IVFPQIndex.exists(store.collection_dir / store._current().generation)
+
+
+class TestHNSWSettings:
+    """Tests for configurable ChromaDB HNSW parameters."""
+
+    def test_scores_match_cosine_in_every_space(self, tmp_path):
+        """Test semantic scores are cosine similarity whatever the collection space."""
+        from app.services.chatbot.hnsw_index import HNSWSettings
+        from app.services.chatbot.vector_store import VectorStore
+
+        for space in ('cosine', 'ip', 'l2'):
+            store = VectorStore(str(tmp_path / space), hnsw=HNSWSettings(space=space, m=8, search_ef=32))
+            store.create_collection()
+            store.add_documents([_chunk('e1', 'a'), _chunk('e2', 'b')], [[1.0, 0.0], [0.6, 0.8]])
+
+            assert store.collection.metadata['hnsw:space'] == space
+            results = store.semantic_search([1.0, 0.0], top_k=2)
+            assert [r.score for r in results] == pytest.approx([1.0, 0.6], abs=1e-4)
+
+    def test_migrate_legacy_l2_collection(self, tmp_path):
+        """Test migration rebuilds a default-space collection with the configured settings."""
+        from app.services.chatbot.embedding_migration import migrate_hnsw_index
+        from app.services.chatbot.hnsw_index import HNSWSettings, hnsw_benchmark
+        from app.services.chatbot.vector_store import VectorStore
+
+        legacy = VectorStore(str(tmp_path)).client.get_or_create_collection(
+            'epidemiological_events', metadata={'facet_index': True})
+        legacy.add(ids=['e1_0', 'e2_0'], documents=['a', 'b'], embeddings=[[1.0, 0.0], [0.6, 0.8]],
+                   metadatas=[{'event_id': 'e1'}, {'event_id': 'e2'}])
+
+        store = VectorStore(str(tmp_path), hnsw=HNSWSettings(space='cosine', m=8))
+        assert migrate_hnsw_index(store) == 2
+
+        assert HNSWSettings.from_metadata(store.collection.metadata) == store.hnsw
+        assert store.list_versions()['previous'] == 'epidemiological_events'
+        assert store.semantic_search([0.6, 0.8], top_k=1)[0].score == pytest.approx(1.0, abs=1e-4)
+
+        matrix = np.eye(4, dtype=np.float32)
+        report = hnsw_benchmark(matrix, matrix[:2], [HNSWSettings(m=8, search_ef=ef) for ef in (4, 16)], top_k=1)
+        assert [row['search_ef'] for row in report] == [4, 16]
+        assert all(row['recall'] == 1.0 and row['p95_ms'] >= row['p50_ms'] for row in report)
+
+
+class TestIndexSnapshot:
+    """Tests for single-file vector index snapshots."""
+
+    def test_export_import_across_engines(self, tmp_path):
+        """Test a NumPy snapshot restores into an empty ChromaDB store unchanged."""
+        from app.services.chatbot.index_snapshot import export_snapshot, import_snapshot, read_snapshot_header
+        from app.services.chatbot.vector_store import VectorStore
+
+        source = _numpy_store(tmp_path / 'numpy', dtype='float16')
+        header = export_snapshot(source, str(tmp_path / 'index.snapshot'), version_id='v1')
+        assert header['count'] == 3 and header['dimensions'] == 3 and header['dtype'] == 'float16'
+        assert read_snapshot_header(str(tmp_path / 'index.snapshot'))['version_id'] == 'v1'
+
+        target = VectorStore(str(tmp_path / 'chroma'), embedding_dimensions=3)
+        import_snapshot(target, str(tmp_path / 'index.snapshot'))
+
+        assert target.count() == 3
+        result = target.semantic_search([0.8, 0.0, 0.6], top_k=1)[0]
+        assert result.id == 'e3_0' and result.text == 'measles in mexico'
+        assert result.metadata == {'event_id': 'e3', 'location': 'Mexico', 'section': 'Americas'}
+        assert target.keyword_search('yemen')[0].metadata['date_unix'] == 1710000000
+
+        with pytest.raises(ValueError):
+            import_snapshot(VectorStore(str(tmp_path / 'other'), embedding_dimensions=4),
+                            str(tmp_path / 'index.snapshot'))
+
+    def test_cleanup_keeps_newest_backup_of_each_kind(self, tmp_path):
+        """Test old Excel backups and snapshots are pruned, but never the newest."""
+        from app.services.chatbot.metadata_service import MetadataService
+
+        for name in ('backup_20200101_000000.xlsx', 'backup_20200102_000000.xlsx',
+                     'backup_20200101_000000.snapshot', 'backup_20200103_000000.snapshot'):
+            (tmp_path / name).write_bytes(b'x')
+
+        MetadataService(data_dir=str(tmp_path / 'meta')).cleanup_old_backups(str(tmp_path), retention_days=2)
+
+        assert sorted(p.name for p in tmp_path.glob('backup_*')) == [
+            'backup_20200102_000000.xlsx', 'backup_20200103_000000.snapshot']
+
+
+class TestReranking:
+    """Tests for adaptive re-rank depth and the cross-encoder score cache."""
+
+    def _candidates(self, scores):
+        from app.services.chatbot.vector_store import SearchResult
+        return [SearchResult(id=f'c{i}', text=f'text {i}', metadata={}, distance=1 - s, score=s,
+                             semantic_score=s) for i, s in enumerate(scores)]
+
+    def test_select_candidates_by_margin(self):
+        """Test candidates far below the leader are pruned, within depth and top_k bounds."""
+        from app.services.chatbot.reranker import select_rerank_candidates
+
+        candidates = self._candidates([0.9, 0.85, 0.8, 0.5, 0.4])
+        keyword_only = self._candidates([0.0])[0]
+        keyword_only.id, keyword_only.semantic_score = 'kw', None
+
+        assert [c.id for c in select_rerank_candidates(candidates, 2, 0.15, 10)] == ['c0', 'c1', 'c2']
+        assert [c.id for c in select_rerank_candidates(candidates, 2, 0.15, 2)] == ['c0', 'c1']
+        assert [c.id for c in select_rerank_candidates(candidates, 4, 0.15, 10)] == ['c0', 'c1', 'c2', 'c3']
+        assert [c.id for c in select_rerank_candidates(candidates + [keyword_only], 1, 0.03, 10)] == ['c0', 'kw']
+        assert len(select_rerank_candidates(candidates, 1, 0.0, 10)) == 5
+
+    def test_scores_cached_per_query_and_chunk(self):
+        """Test repeated pairs skip the model and the LRU evicts old entries."""
+        from app.services.chatbot.reranker import Reranker, ScoreCache
+        from app.services.chatbot.retrieval_service import RetrievalService
+
+        class CountingReranker(Reranker):
+            def __init__(self):
+                self.model_name, self.batch_size, self.cache, self.pairs = 'test', 8, ScoreCache(3), []
+
+            def predict(self, pairs):
+                self.pairs.extend(pairs)
+                return np.array([float(text.split()[-1]) for _, text in pairs], dtype=np.float32)
+
+        reranker = CountingReranker()
+        service = RetrievalService(vector_store=None, embedding_service=None, reranker=reranker)
+
+        results = service.rerank('q', self._candidates([0.9, 0.85, 0.8]), top_k=2)
+        assert [r.id for r in results] == ['c2', 'c1'] and results[0].score == 2.0
+        service.rerank('q', self._candidates([0.9, 0.85, 0.8]), top_k=2)
+        assert len(reranker.pairs) == 3
+
+        reranker.score('other', self._candidates([0.9]))
+        assert len(reranker.cache) == 3 and len(reranker.pairs) == 4
+        assert reranker.cache.hits == 3
+
+    def test_pool_timeout_keeps_semantic_order(self):
+        """Test an unavailable re-rank pool falls back to retrieval order."""
+        from app.services.chatbot.rerank_pool import PooledReranker, RerankUnavailable
+        from app.services.chatbot.retrieval_service import RetrievalService
+
+        class SlowClient:
+            def score(self, query, texts, timeout):
+                raise RerankUnavailable(f"Rerank timed out after {timeout}s")
+
+        service = RetrievalService(vector_store=None, embedding_service=None,
+                                   reranker=PooledReranker(SlowClient(), timeout=0.01))
+        results = service.rerank('q', self._candidates([0.9, 0.85, 0.8]), top_k=2)
+        assert [r.id for r in results] == ['c0', 'c1'] and results[0].score == 0.9
+
+    def test_warm_up_waits_for_rerank_workers(self):
+        """Test warm-up searches the index and retries until the re-rank pool answers."""
+        from app.services.chatbot.rerank_pool import PooledReranker, RerankUnavailable
+        from app.services.chatbot.retrieval_service import RetrievalService
+
+        class LoadingClient:
+            calls = 0
+
+            def score(self, query, texts, timeout):
+                self.calls += 1
+                if self.calls < 2:
+                    raise RerankUnavailable("Rerank workers are still loading the model")
+                return np.zeros(len(texts), dtype=np.float32)
+
+        class Store:
+            searches = []
+
+            def count(self):
+                return 3
+
+            def semantic_search(self, query_embedding, top_k=10, filters=None):
+                self.searches.append(len(query_embedding))
+                return []
+
+        client, store = LoadingClient(), Store()
+        embeddings = type('Embeddings', (), {'dimensions': 8})()
+        service = RetrievalService(vector_store=store, embedding_service=embeddings,
+                                   reranker=PooledReranker(client))
+
+        timings = service.warm_up(timeout=5)
+        assert set(timings) == {'vector_search', 'reranker'}
+        assert store.searches == [8] and client.calls == 2
+
+    def test_rerank_server_round_trip(self, tmp_path):
+        """Test scores travel from a rerank server to a remote client."""
+        import threading
+        from app.services.chatbot.rerank_pool import PooledReranker, RemoteRerankClient, RerankServer
+
+        class LengthPool:
+            def score(self, query, texts, timeout):
+                return np.array([len(text) for text in texts], dtype=np.float32)
+
+        address = str(tmp_path / 'rerank.sock')
+        with pytest.raises(ValueError):
+            RerankServer(LengthPool(), address, authkey='')
+        with pytest.raises(ValueError):
+            RemoteRerankClient(address, authkey=None)
+
+        server = RerankServer(LengthPool(), address, authkey='test')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            assert (tmp_path / 'rerank.sock').stat().st_mode & 0o777 == 0o600
+            reranker = PooledReranker(RemoteRerankClient(address, authkey='test'))
+            scores = reranker.score('q', self._candidates([0.9, 0.8]))
+            assert scores.tolist() == [6.0, 6.0]
+        finally:
+            server.close()
+
+    def test_dead_worker_releases_shared_memory(self):
+        """Test the request a dead pool worker was scoring fails and frees its block."""
+        import threading
+        from concurrent.futures import Future
+        from multiprocessing.shared_memory import SharedMemory
+        from app.services.chatbot.rerank_pool import RerankPool, RerankUnavailable
+
+        class DeadWorker:
+            pid = 4242
+
+            def is_alive(self):
+                return False
+
+        pool = RerankPool.__new__(RerankPool)
+        pool._lock, pool._failed = threading.Lock(), 'no model'
+        pool._workers, pool._ready = [DeadWorker()], {4242}
+        shm, future = SharedMemory(create=True, size=8), Future()
+        pool._pending, pool._in_flight = {7: (future, shm, 2)}, {4242: 7}
+
+        pool._restart_dead_workers()
+
+        assert pool._pending == {} and pool._workers == []
+        with pytest.raises(RerankUnavailable):
+            future.result(timeout=0)
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=shm.name)
+
+
+class TestRetrievalCache:
+    """Tests for the versioned retrieval result cache."""
+
+    def test_normalized_key_ttl_and_lru(self, monkeypatch):
+        """Test trivial query variants share entries, which expire and are evicted."""
+        from app.services.chatbot import retrieval_cache
+        from app.services.chatbot.retrieval_cache import RetrievalCache
+
+        now = [100.0]
+        monkeypatch.setattr(retrieval_cache.time, 'monotonic', lambda: now[0])
+        cache = RetrievalCache(max_entries=2, ttl_seconds=60, version_source=lambda: 'v1')
+
+        key = cache.key('Latest measles in Canada?', {'location': 'Canada'}, top_k=10)
+        cache.put(key, ['r1'])
+        assert cache.get(cache.key('  latest MEASLES in canada ', {'location': 'Canada'}, top_k=10)) == ['r1']
+        assert cache.get(cache.key('latest measles in canada', {'location': 'Mexico'}, top_k=10)) is None
+
+        now[0] += 61
+        assert cache.get(key) is None
+
+        for query in ('a', 'b', 'c'):
+            cache.put(cache.key(query, None), [query])
+        assert len(cache) == 2 and cache.get(cache.key('a', None)) is None
+
+    def test_invalidated_when_version_recorded(self, tmp_path):
+        """Test record_update (in this or another process) invalidates cached results."""
+        from app.services.chatbot.metadata_service import MetadataService
+        from app.services.chatbot.retrieval_cache import RetrievalCache
+
+        metadata = MetadataService(data_dir=str(tmp_path))
+        cache = RetrievalCache(version_source=metadata.current_version_id)
+        metadata.add_update_listener(cache.invalidate)
+
+        cache.put(cache.key('q', None), ['old'])
+        metadata.record_update('v_1', 'kb.xlsx', 1, 1, {}, 'test')
+        assert len(cache) == 0 and cache.get(cache.key('q', None)) is None
+
+        cache.put(cache.key('q', None), ['v1 result'])
+        other_worker = MetadataService(data_dir=str(tmp_path))
+        other_worker.record_update('v_2', 'kb.xlsx', 2, 2, {}, 'test')
+        assert metadata.current_version_id() == 'v_2'
+        assert len(cache) == 0
+
+
+class TestEventAggregation:
+    """Tests for collapsing multi-chunk hits into one result per event."""
+
+    def test_merge_chunk_texts_removes_overlap(self):
+        """Test overlapping chunks rebuild the original text."""
+        from app.services.chatbot.event_aggregation import merge_chunk_texts
+
+        text = " ".join(f"word{i}" for i in range(300))
+        chunks = [text[:900], text[700:1700], text[1500:]]
+        assert merge_chunk_texts(chunks) == text
+        assert merge_chunk_texts(['alpha', 'beta']) == 'alpha\nbeta'
+
+    def test_retrieve_scores_each_event_once(self, tmp_path):
+        """Test chunks of one event are re-ranked once and returned as the whole event."""
+        from app.services.chatbot.reranker import Reranker
+        from app.services.chatbot.retrieval_service import RetrievalService
+
+        class PairCounter(Reranker):
+            pairs = []
+
+            def _load_model(self, threads):
+                return None
+
+            def predict(self, pairs):
+                self.pairs.extend(pairs)
+                return np.zeros(len(pairs), dtype=np.float32)
+
+        class Embeddings:
+            dimensions = 3
+
+            def embed_single(self, text):
+                return [1.0, 0.0, 0.0]
+
+        text = " ".join(f"measles case {i} reported" for i in range(60))
+        parts = [text[:400], text[300:700], text[600:]]
+        chunks = [Chunk(text=part, event_id='e1', chunk_index=i,
+                        metadata={'event_id': 'e1', 'chunk_index': i, 'total_chunks': 3}, token_count=80)
+                  for i, part in enumerate(parts)]
+        chunks.append(_chunk('e2', 'cholera in yemen', chunk_index=0, total_chunks=1))
+        store = NumpyVectorStore(str(tmp_path), embedding_dimensions=3)
+        store.add_documents(chunks, [[1.0, 0.1, 0.0], [1.0, 0.0, 0.1], [0.9, 0.2, 0.0], [0.5, 0.5, 0.0]])
+
+        reranker = PairCounter(cache_size=0)
+        service = RetrievalService(vector_store=store, embedding_service=Embeddings(), reranker=reranker)
+        results = service.retrieve('measles', top_k=5, use_hybrid=False)
+
+        assert [r.event_id for r in results] == ['e1', 'e2']
+        assert len(reranker.pairs) == 2
+        assert results[0].text == text
+        assert sorted(results[0].metadata['matched_chunks']) == [0, 1, 2]
+
+
+class TestContextPacker:
+    """Tests for the token-budgeted generation context."""
+
+    class WordEncoding:
+        def encode(self, text):
+            return text.split()
+
+        def decode(self, tokens):
+            return " ".join(tokens)
+
+    def _doc(self, event_id, score, sentences):
+        from app.services.chatbot.retrieval_service import RetrievalResult
+        summary = " ".join(f"Sentence {i} of event {event_id}." for i in range(sentences))
+        text = f"# Event #{event_id}: Measles\n\n**Summary:**\n{summary}\n\n**Classification:**\n- Section: Americas"
+        return RetrievalResult(event_id=event_id, text=text, score=score, metadata={'event_id': event_id})
+
+    def test_greedy_by_score_with_sentence_trimming(self):
+        """Test the budget is filled best-first, trimming summaries and skipping what cannot fit."""
+        from app.services.chatbot.context_packer import ContextPacker, TRIM_MARKER
+
+        packer = ContextPacker(budget_tokens=60, max_doc_tokens=40, encoding=self.WordEncoding())
+        docs = [self._doc('low', 0.2, 1), self._doc('long', 0.9, 20), self._doc('mid', 0.5, 2)]
+        packed = packer.pack(docs, lambda doc, text: text)
+
+        assert [d.event_id for d in packed.documents] == ['long', 'mid']
+        assert packed.token_count <= 60 and packed.trimmed == 1 and packed.dropped == ['low']
+        long_block = packed.text.split('# Event')[1]
+        assert TRIM_MARKER in long_block and long_block.count('Sentence') == 6
+        assert '**Classification:**' in long_block
+
+    def test_generation_reports_packed_tokens(self):
+        """Test the packed token count is recorded in the response metadata."""
+        from types import SimpleNamespace
+        from app.services.chatbot.context_packer import ContextPacker
+        from app.services.chatbot.generation_service import GenerationService
+
+        service = GenerationService(api_key='test-key')
+        service.context_packer = ContextPacker(budget_tokens=100, encoding=self.WordEncoding())
+        sent = []
+
+        def create(**kwargs):
+            sent.append(kwargs['messages'][-1]['content'])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Event #00001'))],
+                                   usage=SimpleNamespace(total_tokens=42))
+
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        result = service.generate_response('measles?', [self._doc('00001', 0.9, 3)])
+
+        assert result['metadata']['context_tokens'] > 0
+        assert result['metadata']['context_documents'] == 1
+        assert 'Sentence 2 of event 00001.' in sent[0]
+
+
+class TestChatStream:
+    """Tests for the streamed chat pipeline."""
+
+    def _orchestrator(self, fragments):
+        from types import SimpleNamespace
+        from app.services.chatbot.answer_cache import AnswerCache
+        from app.services.chatbot.history_compactor import HistoryCompactor
+        from app.services.chatbot.rag_orchestrator import RAGOrchestrator
+        from app.services.chatbot.retrieval_service import RetrievalResult
+
+        def generate_stream(query, retrieved_docs, conversation_history):
+            for fragment in fragments:
+                if isinstance(fragment, Exception):
+                    raise fragment
+                yield fragment
+
+        orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+        orchestrator.answer_cache = AnswerCache(max_entries=0)
+        orchestrator.history_compactor = HistoryCompactor(encoding=TestContextPacker.WordEncoding())
+        orchestrator._retrieve_context = lambda message: [
+            RetrievalResult(event_id='00001', text='measles in canada', score=0.9, metadata={'event_id': '00001'})
+        ]
+        orchestrator.generation_service = SimpleNamespace(generate_stream=generate_stream)
+        return orchestrator
+
+    def test_events_in_order(self):
+        """Test context comes first, then tokens, then the full response."""
+        events = list(self._orchestrator(['Event ', '#00001']).chat_stream('measles?'))
+
+        assert [e['event'] for e in events] == ['context', 'token', 'token', 'done']
+        assert events[0]['data']['context_used'][0]['data']['event_id'] == '00001'
+        assert events[-1]['data']['response'] == 'Event #00001'
+
+    def test_generation_error_stops_stream(self):
+        """Test a failed generation raises instead of completing (nothing to commit)."""
+        stream = self._orchestrator(['Event ', RuntimeError('API down')]).chat_stream('measles?')
+
+        assert next(stream)['event'] == 'context'
+        assert next(stream)['event'] == 'token'
+        with pytest.raises(RuntimeError):
+            next(stream)
+
+
+class TestAnswerCache:
+    """Tests for the semantic answer cache."""
+
+    def test_hit_requires_similarity_events_and_version(self):
+        """Test answers are served only for close queries over the same events and version."""
+        from app.services.chatbot.answer_cache import AnswerCache
+
+        version = ['v1']
+        cache = AnswerCache(threshold=0.95, version_source=lambda: version[0])
+        cache.put('measles in canada?', [1.0, 0.0, 0.0], ['e1', 'e2'], 'answer')
+
+        assert cache.lookup([0.99, 0.1, 0.0], ['e2', 'e1']).response == 'answer'
+        assert cache.lookup([0.7, 0.7, 0.0], ['e1', 'e2']) is None
+        assert cache.lookup([1.0, 0.0, 0.0], ['e1']) is None
+        version[0] = 'v2'
+        assert cache.lookup([1.0, 0.0, 0.0], ['e1', 'e2']) is None
+
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 3, 1)
+        assert cache.purge() == 1 and len(cache) == 0
+
+    def test_follow_ups_bypass_cache(self):
+        """Test history-dependent follow-ups are neither served nor stored."""
+        from types import SimpleNamespace
+        from app.services.chatbot.answer_cache import AnswerCache, is_follow_up
+        from app.services.chatbot.history_compactor import HistoryCompactor
+        from app.services.chatbot.rag_orchestrator import RAGOrchestrator
+        from app.services.chatbot.retrieval_service import RetrievalResult
+
+        history = [{'role': 'user', 'content': 'measles in canada?'}, {'role': 'assistant', 'content': '...'}]
+        assert is_follow_up('and in Mexico?', history)
+        assert is_follow_up('tell me more about them', history)
+        assert not is_follow_up('How many cholera cases were there in Yemen this year?', history)
+        assert not is_follow_up('and in Mexico?', [])
+
+        generated = []
+        orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+        orchestrator.answer_cache = AnswerCache()
+        orchestrator.history_compactor = HistoryCompactor(encoding=TestContextPacker.WordEncoding())
+        orchestrator.embedding_service = SimpleNamespace(embed_single=lambda text: [1.0, 0.0])
+        orchestrator._retrieve_context = lambda message: [
+            RetrievalResult(event_id='e1', text='measles', score=0.9, metadata={})
+        ]
+
+        def generate_response(query, retrieved_docs, conversation_history):
+            generated.append(query)
+            return {'response': f'answer {len(generated)}', 'metadata': {}}
+
+        orchestrator.generation_service = SimpleNamespace(generate_response=generate_response)
+
+        first = orchestrator.chat('Measles cases in Canada in 2025?')
+        again = orchestrator.chat('Measles cases in Canada in 2025?')
+        follow_up = orchestrator.chat('and in Mexico?', history)
+
+        assert again['cached'] and again['response'] == first['response']
+        assert 'cached' not in follow_up and len(generated) == 2
+        assert orchestrator.answer_cache.stats()['skipped_follow_ups'] == 1
+
+
+
+class TestConversationStore:
+    """Tests for the server-side chat history."""
+
+    def test_round_trip_owner_and_dedup(self, tmp_path):
+        """Test messages are kept per owner, trimmed, and an exchange is stored once."""
+        from app.services.chatbot.conversation_store import ConversationStore
+
+        store = ConversationStore(tmp_path / 'conversations.db', max_messages=4)
+        conversation_id = store.new_conversation('alice')
+        exchange = [{'role': 'user', 'content': 'measles?'}, {'role': 'assistant', 'content': 'Event #00001'}]
+
+        assert store.append(conversation_id, 'alice', exchange, exchange_id='x1')
+        assert not store.append(conversation_id, 'alice', exchange, exchange_id='x1')
+        assert not store.append(conversation_id, 'mallory', exchange)
+        assert store.get_messages(conversation_id, 'alice') == exchange
+        assert store.get_messages(conversation_id, 'mallory') == []
+
+        for turn in range(3):
+            store.append(conversation_id, 'alice', [{'role': 'user', 'content': f'q{turn}'}])
+        assert [m['content'] for m in store.get_messages(conversation_id, 'alice')] == \
+            ['Event #00001', 'q0', 'q1', 'q2']
+
+    def test_expired_conversations_are_purged(self, tmp_path):
+        """Test idle conversations disappear after the TTL."""
+        import time
+        from app.services.chatbot.conversation_store import ConversationStore
+
+        store = ConversationStore(tmp_path / 'conversations.db', ttl_seconds=0.05)
+        conversation_id = store.new_conversation('alice')
+        store.append(conversation_id, 'alice', [{'role': 'user', 'content': 'measles?'}])
+        time.sleep(0.1)
+
+        assert not store.exists(conversation_id, 'alice')
+        assert store.get_messages(conversation_id, 'alice') == []
+        assert store.purge_expired() == 1
+
+
+class TestHistoryCompactor:
+    """Tests for token-budgeted conversation history."""
+
+    def _history(self, turns, answer_words):
+        history = []
+        for turn in range(turns):
+            history.append({'role': 'user', 'content': f'question {turn}'})
+            history.append({'role': 'assistant', 'content': ' '.join(['word'] * answer_words)})
+        return history
+
+    def test_short_history_unchanged(self):
+        """Test a history within budget is passed through as is."""
+        from app.services.chatbot.history_compactor import HistoryCompactor
+
+        compactor = HistoryCompactor(budget_tokens=100, encoding=TestContextPacker.WordEncoding())
+        history = self._history(2, 10)
+
+        assert compactor.compact(history) == history
+        assert compactor.compact(None) == []
+
+    def test_older_turns_become_a_note(self):
+        """Test older turns are summarized by their questions and an oversized answer is cut."""
+        from app.services.chatbot.context_packer import TRIM_MARKER
+        from app.services.chatbot.history_compactor import HistoryCompactor
+
+        compactor = HistoryCompactor(budget_tokens=25, encoding=TestContextPacker.WordEncoding())
+        compacted = compactor.compact(self._history(4, 20))
+
+        assert compacted[0]['role'] == 'system'
+        assert 'question 0' in compacted[0]['content'] and 'question 3' not in compacted[0]['content']
+        assert compacted[1:] == self._history(4, 20)[-2:]
+
+        oversized = compactor.compact([{'role': 'assistant', 'content': ' '.join(['word'] * 40)}])
+        assert len(oversized) == 1 and oversized[0]['content'].endswith(TRIM_MARKER)
+
+
+class TestPromptLayout:
+    """Tests for the cache-friendly prompt layout and cached-token metrics."""
+
+    def _usage(self, prompt_tokens, cached_tokens):
+        from types import SimpleNamespace
+        return SimpleNamespace(prompt_tokens=prompt_tokens, total_tokens=prompt_tokens + 10,
+                               prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens))
+
+    def test_static_prefix_first_and_cached_tokens_recorded(self):
+        """Test the static prompt leads, the query comes last, and cached tokens are reported."""
+        from types import SimpleNamespace
+        from app.prompt_cache import get_prompt_cache_stats
+        from app.services.chatbot.context_packer import ContextPacker
+        from app.services.chatbot.generation_service import SYSTEM_PROMPT, GenerationService
+
+        service = GenerationService(api_key='test-key')
+        service.context_packer = ContextPacker(encoding=TestContextPacker.WordEncoding())
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='ok'))],
+                                   usage=self._usage(2048, 1536))
+
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        history = [{'role': 'user', 'content': 'measles?'}, {'role': 'assistant', 'content': 'Event #00001'}]
+        get_prompt_cache_stats().reset()
+        first = service.generate_response('cholera?', [], history)
+        service.generate_response('dengue?', [])
+
+        messages = calls[0]['messages']
+        assert messages[0] == {'role': 'system', 'content': SYSTEM_PROMPT}
+        assert "Today's Date" in messages[1]['content'] and messages[2:4] == history
+        assert 'cholera?' in messages[-1]['content'] and len(messages) == 5
+        assert calls[0]['extra_body'] == calls[1]['extra_body']
+        assert calls[0]['messages'][:2] == calls[1]['messages'][:2]
+        assert first['metadata']['cached_tokens'] == 1536
+        assert get_prompt_cache_stats().stats()['chatbot']['cache_hit_ratio'] == 0.75
+
+    def test_stream_records_usage_chunk(self):
+        """Test the streamed usage-only chunk is recorded and not yielded."""
+        from types import SimpleNamespace
+        from app.prompt_cache import get_prompt_cache_stats
+        from app.services.chatbot.context_packer import ContextPacker
+        from app.services.chatbot.generation_service import GenerationService
+
+        service = GenerationService(api_key='test-key')
+        service.context_packer = ContextPacker(encoding=TestContextPacker.WordEncoding())
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='Event '))], usage=None),
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='#00001'))], usage=None),
+            SimpleNamespace(choices=[], usage=self._usage(1200, 0))
+        ]
+
+        def create(**kwargs):
+            assert kwargs['stream_options'] == {'include_usage': True}
+            return iter(chunks)
+
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        get_prompt_cache_stats().reset()
+
+        assert "".join(service.generate_stream('measles?', [])) == 'Event #00001'
+        stats = get_prompt_cache_stats().stats()['chatbot']
+        assert stats['requests'] == 1 and stats['requests_with_hits'] == 0 and stats['cache_hit_ratio'] == 0.0
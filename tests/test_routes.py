@@ -45,6 +45,51 @@ class TestLandingRoutes:
         assert data['status'] == 'healthy'
         assert 'version' in data
 
+    def test_health_readiness_gates_on_warmup(self, client):
+        """Test /health?ready answers 503 until the chatbot warm-up finishes."""
+        from app.services.chatbot.warmup import get_warmup_status
+
+        status = get_warmup_status()
+        status.start()
+        try:
+            response = client.get('/health?ready')
+            assert response.status_code == 503
+            assert json.loads(response.data)['services']['chatbot']['state'] == 'running'
+
+            status.finish({'vector_store': 0.5, 'total': 1.0})
+            response = client.get('/health?ready')
+            assert response.status_code == 200
+            assert json.loads(response.data)['services']['chatbot']['timings']['total'] == 1.0
+        finally:
+            status.state = 'disabled'
+
+    def test_health_reports_failed_warmup_as_degraded(self, client, monkeypatch):
+        """Test a failed warm-up keeps the worker in rotation and is retried until it succeeds."""
+        from app.services.chatbot import warmup
+
+        attempts = []
+
+        def flaky_warmup(app, retry=False):
+            warmup.get_warmup_status().start(retry=retry)
+            attempts.append(retry)
+            if len(attempts) == 1:
+                warmup.get_warmup_status().finish({}, error='index missing')
+                response = client.get('/health?ready')
+                assert response.status_code == 200
+                assert json.loads(response.data)['status'] == 'degraded'
+            else:
+                warmup.get_warmup_status().finish({'total': 1.0})
+
+        monkeypatch.setattr(warmup, 'run_warmup', flaky_warmup)
+        monkeypatch.setattr(warmup.time, 'sleep', lambda seconds: None)
+        try:
+            warmup.warm_up_until_ready(app=None)
+            assert attempts == [False, True]
+            data = json.loads(client.get('/health?ready').data)
+            assert data['status'] == 'healthy' and data['services']['chatbot']['attempts'] == 2
+        finally:
+            warmup.get_warmup_status().state = 'disabled'
+
 
 class TestGeolocationTool:
     """Tests for Geolocation tool (FR-006)."""